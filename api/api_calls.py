@@ -1,26 +1,45 @@
 import ast
-import itertools
+import collections
 import json
 import logging
 import threading
 
 from http import HTTPStatus
-from os import path
 from rauth import OAuth2Service
-from requests import ConnectionError
-from requests.adapters import HTTPAdapter
+from requests import ConnectionError, Timeout
 from urllib.parse import urljoin, urlparse
 from urllib.error import URLError
 
+import messaging
 import model
+import progress
 
-from . import exceptions
+from . import exceptions, fastq_compression, http_metrics, upload_watchdog
+
+# Prefix used to store an upload fingerprint in the description of a sequencing run
+FINGERPRINT_DESCRIPTION_TAG = "irida-uploader-fingerprint:"
+# Number of times the files of a sample are sent again after their upload stalls
+UPLOAD_STALL_RETRIES = 3
+
+
+def _count_bytes_sent(data, record):
+    """
+    Passes on the chunks of a streamed request body, adding their size to a request record
+
+    :param data: iterable of bytes
+    :param record: http_metrics.RequestRecord of the request
+    :return: generator of the chunks
+    """
+    for chunk in data:
+        record.bytes_sent += len(chunk)
+        yield chunk
 
 
 class ApiCalls(object):
 
     def __init__(self, client_id, client_secret,
-                 base_url, username, password, max_wait_time=20, http_max_retries=5):
+                 base_url, username, password, max_wait_time=20, http_max_retries=5, max_connections=10,
+                 compress_uploads=False, upload_stall_timeout=300, min_upload_throughput=0):
         """
         Create OAuth2Session and store it
 
@@ -30,6 +49,13 @@ class ApiCalls(object):
             base_url -- url of the IRIDA server
             username -- username for server
             password -- password for given username
+            max_connections -- maximum number of open connections to the server. When an instance is shared
+                               between threads, requests wait for a free connection once this many are in use
+            compress_uploads -- when True, uncompressed sequence files are gzipped while they are sent
+            upload_stall_timeout -- seconds without any of a sample's files being sent before the upload has
+                                    stalled. 0 to never time out uploads
+            min_upload_throughput -- bytes per second a sample's upload must average over upload_stall_timeout
+                                     seconds, slower uploads have stalled. 0 to allow any speed
 
         return ApiCalls object
         """
@@ -41,20 +67,36 @@ class ApiCalls(object):
         self.password = password
         self.max_wait_time = max_wait_time
         self.http_max_retries = http_max_retries
+        self.max_connections = max_connections
+        self.compress_uploads = compress_uploads
+        self.upload_stall_timeout = upload_stall_timeout
+        self.min_upload_throughput = min_upload_throughput
 
-        self._stop_upload = False
+        # runs being uploaded, with the number of their samples being sent, and the runs asked to stop
+        self._upload_lock = threading.Lock()
+        self._active_upload_ids = collections.Counter()
+        self._stopped_upload_ids = set()
 
         self._session_lock = threading.Lock()
         self._session_set_externally = False
+        # timing and bytes of every request, by operation
+        self.http_metrics = http_metrics.HttpMetrics()
         self._create_session()
+        # runs uploaded at the same time share the caches, they are only replaced while holding the lock
+        self._cache_lock = threading.Lock()
         self.cached_projects = None
         self.cached_samples = {}
+        # indexes of the cached projects and samples, so existence checks do not search the lists
+        self._project_id_index = None
+        self._sample_name_index = {}
 
     @property
     def _session(self):
         try:  # Todo: rework this code without the try/catch/finally and odd exception raise
             self._session_lock.acquire()
-            response = self._session_instance.options(self.base_url)
+            with self.http_metrics.time_request("check_session") as record:
+                response = self._session_instance.options(self.base_url)
+                record.bytes_received = len(response.content)
             if response.status_code != HTTPStatus.OK:
                 raise Exception
             else:
@@ -67,13 +109,98 @@ class ApiCalls(object):
 
         return self._session_instance
 
+    def _request(self, operation, method, url, *args, watchdog=None, **kwargs):
+        """
+        Makes a request with the session, timing it and counting its bytes in the stats of the operation
+
+        The session check done before the request is counted as its own operation
+
+        arguments:
+            operation -- name of the logical operation making the request, requests are grouped by it
+            method -- name of the session method to call, e.g. "get"
+            url -- url of the request
+            watchdog -- UploadWatchdog given the progress of a streamed body, the request raises
+                        UploadStalledError when it stalls
+            args, kwargs -- passed to the session method
+
+        returns the response
+        """
+        session = self._session
+        with self.http_metrics.time_request(operation) as record:
+            data = kwargs.get("data")
+            streamed_body = None
+            if data is not None and not isinstance(data, (bytes, str, dict, list, tuple)):
+                streamed_body = data
+                # streamed bodies are counted as they are sent
+                kwargs["data"] = _count_bytes_sent(data, record)
+                if watchdog is not None:
+                    kwargs["data"] = upload_watchdog.watch_body(kwargs["data"], watchdog)
+            try:
+                if watchdog is not None:
+                    # A connection that takes no more of the body is shut down by the request's watch
+                    with upload_watchdog.watching(watchdog):
+                        response = getattr(session, method)(url, *args, **kwargs)
+                else:
+                    response = getattr(session, method)(url, *args, **kwargs)
+            except exceptions.UploadStalledError:
+                record.stalled = True
+                raise
+            except (ConnectionError, Timeout) as e:
+                # a connection shut down while sending the body has stalled too
+                stall_reason = watchdog.get_stall_reason() if watchdog is not None and not watchdog.finished else None
+                if stall_reason is None:
+                    raise
+                record.stalled = True
+                raise exceptions.UploadStalledError("The upload stalled: {}".format(stall_reason)) from e
+            finally:
+                # a body abandoned by a failed request is closed now, so it stops reading its files
+                close_body = getattr(streamed_body, "close", None)
+                if close_body is not None:
+                    close_body()
+            record.bytes_received = len(response.content)
+            # the connection retries failed requests on its own, the retries made are in the response
+            retry_history = getattr(getattr(response.raw, "retries", None), "history", None)
+            if isinstance(retry_history, tuple):
+                record.retry_count = len(retry_history)
+            body = response.request.body
+            if isinstance(body, str):
+                record.bytes_sent = len(body.encode())
+            elif isinstance(body, bytes):
+                record.bytes_sent = len(body)
+        return response
+
+    def check_session(self):
+        """
+        Makes sure the session still works, getting a new access token when the current one has expired
+
+        Used by long running processes to keep the session ready between uploads
+
+        :return: None
+        """
+        self._session
+
+    def warm_up(self):
+        """
+        Makes the requests that every upload starts with, so they can be done ahead of time:
+        the connection to the server is opened, and the project list is fetched and cached
+
+        :return: None
+        """
+        self.get_projects()
+
     def _reinitialize_session(self):
         oauth_service = self._get_oauth_service()
         access_token = self._get_access_token(oauth_service)
         _sess = oauth_service.get_session(access_token)
         # We add a HTTPAdapter with max retries so we don't fail out if one request gets lost
-        _sess.mount('https://', HTTPAdapter(max_retries=self.http_max_retries))
-        _sess.mount('http://', HTTPAdapter(max_retries=self.http_max_retries))
+        # The connection pool blocks when it is full, so max_connections is a budget shared by all threads
+        # The connections of stalled uploads are shut down by the upload's watchdog
+        _sess.mount('https://', upload_watchdog.WatchedHTTPAdapter(max_retries=self.http_max_retries,
+                                                                   pool_maxsize=self.max_connections,
+                                                                   pool_block=True))
+        _sess.mount('http://', upload_watchdog.WatchedHTTPAdapter(max_retries=self.http_max_retries,
+                                                                  pool_maxsize=self.max_connections,
+                                                                  pool_block=True))
         self._session_instance = _sess
 
     def _create_session(self):
@@ -151,8 +278,9 @@ class ApiCalls(object):
         }
 
         try:
-            access_token = oauth_service.get_access_token(
-                decoder=token_decoder, **params)
+            with self.http_metrics.time_request("get_access_token"):
+                access_token = oauth_service.get_access_token(
+                    decoder=token_decoder, **params)
         except ConnectionError as e:
             logging.error("Can not connect to IRIDA")
             raise exceptions.IridaConnectionError("Could not connect to the IRIDA server. URL may be incorrect."
@@ -178,7 +306,7 @@ class ApiCalls(object):
             raises IridaConnectionError otherwise
         """
         try:
-            response = self._session.get(url)
+            response = self._request("validate_url", "get", url)
         except URLError as e:
             logging.error("Could not connect to IRIDA, URL '{}' responded with: {}"
                           "".format(url, str(e)))
@@ -213,7 +341,7 @@ class ApiCalls(object):
         logging.debug("api_calls._get_link: target_url: {}, target_key: {}".format(target_url, target_key))
 
         self._validate_url_existence(target_url)
-        response = self._session.get(target_url)
+        response = self._request("get_link", "get", target_url)
 
         if target_dict:  # we are targeting specific resources in the response
 
@@ -256,10 +384,11 @@ class ApiCalls(object):
 
         logging.info("Loading projects.")
 
-        if self.cached_projects is None:
+        project_list = self.cached_projects
+        if project_list is None:
             logging.debug("Loading projects from IRIDA server.")
             url = self._get_link(self.base_url, "projects")
-            response = self._session.get(url)
+            response = self._request("get_projects", "get", url)
 
             result = response.json()["resource"]["resources"]
 
@@ -280,11 +409,12 @@ class ApiCalls(object):
                               ", ".join(result[0].keys()))
                 raise exceptions.IridaKeyError(msg_arg + " not found. Available keys: " +
                                                ", ".join(result[0].keys()))
-            self.cached_projects = project_list
+            with self._cache_lock:
+                self.cached_projects = project_list
         else:
             logging.debug("Loading projects from cache.")
 
-        return self.cached_projects
+        return project_list
 
     """
     Potential future functionality:
@@ -304,7 +434,8 @@ class ApiCalls(object):
 
         logging.info("Getting samples from project '{}'".format(project_id))
 
-        if project_id not in self.cached_samples:
+        sample_list = self.cached_samples.get(project_id)
+        if sample_list is None:
             try:
                 project_url = self._get_link(self.base_url, "projects")
                 url = self._get_link(project_url, "project/samples",
@@ -317,7 +448,7 @@ class ApiCalls(object):
                 logging.error("The given project ID doesn't exist: ".format(project_id))
                 raise exceptions.IridaResourceError("The given project ID doesn't exist", project_id)
 
-            response = self._session.get(url)
+            response = self._request("get_samples", "get", url)
             result = response.json()["resource"]["resources"]
 
             sample_list = []
@@ -333,9 +464,10 @@ class ApiCalls(object):
                     description=sample_desc,
                     samp_dict=sample_dict
                 ))
-            self.cached_samples[project_id] = sample_list
+            with self._cache_lock:
+                self.cached_samples[project_id] = sample_list
 
-        return self.cached_samples[project_id]
+        return sample_list
 
     def get_sequence_files(self, project_id, sample_name):
         """
@@ -370,7 +502,7 @@ class ApiCalls(object):
                                      "key": "sampleName",
                                      "value": sample_name
                                  })
-            response = self._session.get(url)
+            response = self._request("get_sequence_files", "get", url)
 
         except StopIteration:
             logging.error("The given sample doesn't exist: ".format(sample_name))
@@ -402,7 +534,7 @@ class ApiCalls(object):
         logging.info("Sending project to IRIDA.")
 
         if clear_cache:
-            self.cached_projects = None
+            self.clear_project_cache()
         url = self._get_link(self.base_url, "projects")
         json_obj = json.dumps(project.get_uploadable_dict())
         headers = {
@@ -411,7 +543,7 @@ class ApiCalls(object):
             }
         }
 
-        response = self._session.post(url, json_obj, **headers)
+        response = self._request("send_project", "post", url, json_obj, **headers)
 
         if response.status_code == HTTPStatus.CREATED:  # 201
             json_res = json.loads(response.text)
@@ -433,8 +565,9 @@ class ApiCalls(object):
 
         logging.info("Creating sample '{}' for project '{}' on IRIDA.".format(sample.sample_name, project_id))
 
-        self.cached_samples = {}  # reset the cache, we're updating stuff
-        self.cached_projects = None
+        # reset the project's samples, we're updating them
+        with self._cache_lock:
+            self.cached_samples.pop(project_id, None)
 
         try:
             project_url = self._get_link(self.base_url, "projects")
@@ -455,7 +588,7 @@ class ApiCalls(object):
         }
 
         json_obj = json.dumps(sample.get_uploadable_dict())
-        response = self._session.post(url, json_obj, **headers)
+        response = self._request("send_sample", "post", url, json_obj, **headers)
 
         if response.status_code == HTTPStatus.CREATED:  # 201
             json_res = json.loads(response.text)
@@ -472,17 +605,49 @@ class ApiCalls(object):
 
         return json_res
 
+    def clear_project_cache(self):
+        """
+        Forgets the cached projects, they are loaded from IRIDA again when next needed
+        :return: None
+        """
+        with self._cache_lock:
+            self.cached_projects = None
+
+    def clear_sample_cache(self):
+        """
+        Forgets the cached samples of every project, they are loaded from IRIDA again when next needed
+        :return: None
+        """
+        with self._cache_lock:
+            self.cached_samples = {}
+
     # Todo: Rename to kill_connections(self), to be done when working on threading
-    def _kill_connections(self):
-        """Terminate any currently running uploads.
+    def _kill_connections(self, upload_id=None):
+        """Terminate currently running uploads.
 
-        This method simply sets a flag to instruct any in-progress generators called
+        This method simply sets a flag to instruct the in-progress generators called
         by `_send_sequence_files` below to stop generating data and raise an exception
         that will set the run to an error state on the server.
+
+        Args:
+            upload_id: the run to stop uploading, None to stop every run and close the session.
+                       The session is shared by every run, so it is left open when one run is stopped.
         """
 
-        self._stop_upload = True
-        self._session.close()
+        with self._upload_lock:
+            if upload_id is None:
+                self._stopped_upload_ids.update(self._active_upload_ids)
+            elif upload_id in self._active_upload_ids:
+                self._stopped_upload_ids.add(upload_id)
+        if upload_id is None:
+            self._session.close()
+
+    def _is_upload_stopped(self, upload_id):
+        """
+        :param upload_id: run being uploaded
+        :return: True when the run was asked to stop uploading
+        """
+        return upload_id in self._stopped_upload_ids
 
     def send_sequence_files(self, sequence_file, sample_name, project_id, upload_id):
         """
@@ -496,17 +661,32 @@ class ApiCalls(object):
 
         returns result of post request.
         """
+        with self._upload_lock:
+            self._active_upload_ids[upload_id] += 1
+        try:
+            return self._send_sequence_files(sequence_file, sample_name, project_id, upload_id)
+        finally:
+            with self._upload_lock:
+                self._active_upload_ids[upload_id] -= 1
+                if self._active_upload_ids[upload_id] <= 0:
+                    # the run has stopped, it can be uploaded again later
+                    del self._active_upload_ids[upload_id]
+                    self._stopped_upload_ids.discard(upload_id)
+
+    def _send_sequence_files(self, sequence_file, sample_name, project_id, upload_id):
+        """
+        Sends the sequence files of a sample, see send_sequence_files
+        """
 
         boundary = "B0undary"
         read_size = 32768
-        self._stop_upload = False
 
         def _send_file(filename, parameter_name):
             """This function is a generator that yields a multipart form-data
             entry for the specified file. This function will yield `read_size`
             bytes of the specified file name at a time as the generator is called.
             This function will also terminate generating data when the field
-            `self._stop_upload` is set.
+            run is asked to stop with `_kill_connections`.
 
             Args:
                 filename: the file to read and yield in `read_size` chunks to
@@ -514,38 +694,107 @@ class ApiCalls(object):
                 parameter_name: the form field name to send to the server.
             """
 
+            # Uncompressed files are gzipped on the fly, and named as gzip files so IRIDA decompresses them
+            compress = self.compress_uploads and fastq_compression.needs_compression(filename)
+            upload_name = fastq_compression.compressed_file_name(filename) if compress else filename
+
             # Send the boundary header section for the file
             logging.debug("Sending the boundary header section for {}".format(filename))
             yield (("\r\n--{boundary}\r\n"
                    "Content-Disposition: form-data; name=\"{parameter_name}\"; filename=\"{filename}\"\r\n\r\n").format(
-                boundary=boundary, parameter_name=parameter_name, filename=filename.replace("\\", "/"))).encode()
+                boundary=boundary, parameter_name=parameter_name, filename=upload_name.replace("\\", "/"))).encode()
 
             # Get total file size for progress
-            total_file_size = path.getsize(filename)
+            total_file_size = progress.directory_index.get_directory_index().getsize(filename)
 
             # Send the contents of the file, read_size bytes at a time until
             # we've either read the entire file, or we've been instructed to
             # stop the upload by the UI
-            logging.info("Starting to send file {}".format(filename))
+            if compress:
+                logging.info("Starting to send file {} compressed".format(filename))
+            else:
+                logging.info("Starting to send file {}".format(filename))
+            messaging.send_message(messaging.ApiMessage(messaging.MessageTopics.upload_started_topic,
+                                                        run_id=upload_id,
+                                                        project_id=project_id,
+                                                        sample_name=sample_name,
+                                                        sequence_file_name=filename,
+                                                        total_bytes=total_file_size))
             try:
-                with open(filename, "rb", read_size) as fastq_file:
-                    data = fastq_file.read(read_size)
-                    # Command line progress info printing
-                    # Todo: once message passing is in place, this might find its home in that module
+                with open(filename, "rb", read_size) as fastq_file, \
+                        messaging.tracing.span("send file", "upload", {"file": filename, "sample": sample_name}):
+                    if compress:
+                        chunks = fastq_compression.iter_compressed_blocks(fastq_file)
+                    else:
+                        chunks = _iter_file_chunks(fastq_file)
+                    # Progress is published for every chunk, subscribers render it at their own rate.
+                    # It is counted in bytes read from the file
                     bytes_read = 0
-                    while data and not self._stop_upload:
-                        bytes_read += len(data)
-                        print("Progress: ", round(bytes_read/total_file_size*100, 2),
-                              "% Uploaded     \r", end="")
-                        yield data
-                        data = fastq_file.read(read_size)
-                    print()  # end cap to the dots we printed above
-                    logging.info("Finished sending file {}".format(filename))
-                    if self._stop_upload:
+                    try:
+                        for chunk_length, data in chunks:
+                            if self._is_upload_stopped(upload_id):
+                                break
+                            bytes_read += chunk_length
+                            messaging.send_message(messaging.ApiMessage(
+                                messaging.MessageTopics.upload_progress_topic,
+                                run_id=upload_id,
+                                project_id=project_id,
+                                sample_name=sample_name,
+                                sequence_file_name=filename,
+                                progress=round(bytes_read/total_file_size*100, 2) if total_file_size else 100.0,
+                                bytes_sent=bytes_read,
+                                total_bytes=total_file_size))
+                            yield data
+                    except GeneratorExit:
+                        # the body was abandoned, the connection was lost or the upload stalled
+                        logging.info("Stopped sending file {}".format(filename))
+                        messaging.send_message(messaging.ApiMessage(messaging.MessageTopics.upload_failed_topic,
+                                                                    run_id=upload_id,
+                                                                    project_id=project_id,
+                                                                    sample_name=sample_name,
+                                                                    sequence_file_name=filename,
+                                                                    bytes_sent=bytes_read,
+                                                                    total_bytes=total_file_size))
+                        raise
+                    finally:
+                        chunks.close()
+                    if self._is_upload_stopped(upload_id):
                         logging.info("Halting upload on user request.")
+                        end_topic = messaging.MessageTopics.upload_failed_topic
+                    else:
+                        logging.info("Finished sending file {}".format(filename))
+                        end_topic = messaging.MessageTopics.upload_completed_topic
+                    messaging.send_message(messaging.ApiMessage(end_topic,
+                                                                run_id=upload_id,
+                                                                project_id=project_id,
+                                                                sample_name=sample_name,
+                                                                sequence_file_name=filename,
+                                                                bytes_sent=bytes_read,
+                                                                total_bytes=total_file_size))
             except IOError:
                 logging.error("Could not open file: {}".format(filename))
-                raise exceptions.FileError("Could not open file: {}".format(filename))
+                file_error = exceptions.FileError("Could not open file: {}".format(filename))
+                messaging.send_message(messaging.ApiMessage(messaging.MessageTopics.upload_failed_topic,
+                                                            exception=file_error,
+                                                            run_id=upload_id,
+                                                            project_id=project_id,
+                                                            sample_name=sample_name,
+                                                            sequence_file_name=filename,
+                                                            total_bytes=total_file_size))
+                raise file_error
+
+        def _iter_file_chunks(fastq_file):
+            """This function is a generator that yields the file as it is,
+            `read_size` bytes at a time.
+
+            Args:
+                fastq_file: the open file to read.
+            """
+
+            data = fastq_file.read(read_size)
+            while data:
+                yield len(data), data
+                data = fastq_file.read(read_size)
 
         def _send_parameters(parameter_name, parameters):
             """This function is a generator that yields a multipart form-data
@@ -583,20 +832,18 @@ class ApiCalls(object):
                 # Compose a collection of generators to send both files of a paired-end
                 # file set and the corresponding metadata
                 logging.debug("api_calls._sample_upload_generator: is paired end read")
-                return itertools.chain(
-                    _send_file(filename=sequence_file_up.file_list[0], parameter_name="file1"),
-                    _send_file(filename=sequence_file_up.file_list[1], parameter_name="file2"),
-                    _send_parameters(parameter_name="parameters1", parameters=file_metadata_json),
-                    _send_parameters(parameter_name="parameters2", parameters=file_metadata_json),
-                    _finish_request())
+                yield from _send_file(filename=sequence_file_up.file_list[0], parameter_name="file1")
+                yield from _send_file(filename=sequence_file_up.file_list[1], parameter_name="file2")
+                yield from _send_parameters(parameter_name="parameters1", parameters=file_metadata_json)
+                yield from _send_parameters(parameter_name="parameters2", parameters=file_metadata_json)
+                yield from _finish_request()
             else:
                 # Compose a generator to send the single file from a single-end
                 # file set and the corresponding metadata.
                 logging.debug("api_calls._sample_upload_generator: is single end read")
-                return itertools.chain(
-                    _send_file(filename=sequence_file_up.file_list[0], parameter_name="file"),
-                    _send_parameters(parameter_name="parameters", parameters=file_metadata_json),
-                    _finish_request())
+                yield from _send_file(filename=sequence_file_up.file_list[0], parameter_name="file")
+                yield from _send_parameters(parameter_name="parameters", parameters=file_metadata_json)
+                yield from _finish_request()
 
         try:
             project_url = self._get_link(self.base_url, "projects")
@@ -626,21 +873,44 @@ class ApiCalls(object):
             url = seq_url
 
         logging.debug("Sending files to [{}]".format(url))
-        data_pkg = _sample_upload_generator(sequence_file)
         headers_pkg = {"Content-Type": "multipart/form-data; boundary={}".format(boundary)}
-        logging.debug("data:" + str(data_pkg))
         logging.debug("headers: " + str(headers_pkg))
 
-        response = self._session.post(url, data=data_pkg, headers=headers_pkg)
+        stall_count = 0
+        while True:
+            data_pkg = _sample_upload_generator(sequence_file)
+            logging.debug("data:" + str(data_pkg))
+            watchdog = None
+            if self.upload_stall_timeout:
+                watchdog = upload_watchdog.UploadWatchdog(self.upload_stall_timeout, self.min_upload_throughput)
+            try:
+                response = self._request("send_sequence_files", "post", url, data=data_pkg, headers=headers_pkg,
+                                         watchdog=watchdog)
+                break
+            except exceptions.UploadStalledError as e:
+                if self._is_upload_stopped(upload_id):
+                    raise exceptions.IridaUploadCanceledException("Upload halted on user request.")
+                stall_count += 1
+                if stall_count > UPLOAD_STALL_RETRIES:
+                    logging.error("Upload of sample [{}] stalled {} times, giving up: {}".format(
+                        sample_name, stall_count, e))
+                    raise
+                # Only this request is aborted, and its connection is closed, so it is sent on a new connection
+                logging.warning("Upload of sample [{}] stalled, sending it again ({} of {}): {}".format(
+                    sample_name, stall_count, UPLOAD_STALL_RETRIES, e))
 
         logging.debug("api_calls: send_sequence_files: response: " + response.text)
-        if self._stop_upload:
+        if self._is_upload_stopped(upload_id):
             logging.info("Upload was halted on user request")
             logging.debug("Raising exception so that server upload status is set to error state.")
             raise exceptions.IridaUploadCanceledException("Upload halted on user request.")
 
         if response.status_code == HTTPStatus.CREATED:
             json_res = json.loads(response.text)
+            messaging.send_message(messaging.ApiMessage(messaging.MessageTopics.sample_upload_completed_topic,
+                                                        run_id=upload_id,
+                                                        project_id=project_id,
+                                                        sample_name=sample_name))
         else:
             e = exceptions.IridaConnectionError("Error {status_code}: {err_msg}\n".format(
                                                 status_code=str(response.status_code), err_msg=response.reason))
@@ -660,6 +930,9 @@ class ApiCalls(object):
         currently not accepted/used by the API so they are discarded.
         Everything not in the acceptable_properties list below is discarded.
 
+        If the metadata contains a 'fingerprint', it is appended to the description
+        of the run so it can be found again with get_seq_run_fingerprints
+
         arguments:
             metadata -- SequencingRun's metadata
 
@@ -692,6 +965,11 @@ class ApiCalls(object):
 
         metadata_dict["uploadStatus"] = "UPLOADING"
 
+        if "fingerprint" in metadata_dict:
+            description = metadata_dict.get("description", "")
+            metadata_dict["description"] = "{} {}{}".format(
+                description, FINGERPRINT_DESCRIPTION_TAG, metadata_dict["fingerprint"]).strip()
+
         keys_to_remove = []
         for key in metadata_dict.keys():
             if key not in acceptable_properties:
@@ -702,7 +980,7 @@ class ApiCalls(object):
 
         json_obj = json.dumps(metadata_dict)
 
-        response = self._session.post(url, json_obj, **headers)
+        response = self._request("create_seq_run", "post", url, json_obj, **headers)
         if response.status_code == HTTPStatus.CREATED:  # 201
             json_res = json.loads(response.text)
         else:
@@ -725,12 +1003,40 @@ class ApiCalls(object):
         logging.debug("Getting sequencing runs")
 
         url = self._get_link(self.base_url, "sequencingRuns")
-        response = self._session.get(url)
+        response = self._request("get_seq_runs", "get", url)
 
         json_res_list = response.json()["resource"]["resources"]
 
         return json_res_list
 
+    def get_seq_run_fingerprints(self):
+        """
+        Get the upload fingerprints of all sequencing runs that were created with a fingerprint
+
+        returns dict of fingerprint to a dict with the run's "identifier" and "uploadStatus", and "createdTime"
+        in seconds since the epoch when IRIDA gives the run's creation date
+        """
+        logging.debug("Getting sequencing run fingerprints")
+
+        fingerprint_dict = {}
+        for seq_run in self.get_seq_runs():
+            description = seq_run.get("description") or ""
+            if FINGERPRINT_DESCRIPTION_TAG not in description:
+                continue
+            tagged_text = description.split(FINGERPRINT_DESCRIPTION_TAG, 1)[1].split()
+            if not tagged_text:
+                continue
+            fingerprint_dict[tagged_text[0]] = {
+                "identifier": str(seq_run["identifier"]),
+                "uploadStatus": seq_run.get("uploadStatus")
+            }
+            # IRIDA gives dates in milliseconds since the epoch
+            created_date = seq_run.get("createdDate")
+            if isinstance(created_date, (int, float)):
+                fingerprint_dict[tagged_text[0]]["createdTime"] = created_date / 1000
+
+        return fingerprint_dict
+
     def set_seq_run_complete(self, identifier):
 
         """
@@ -809,7 +1115,7 @@ class ApiCalls(object):
         update_dict = {"uploadStatus": status}
         json_obj = json.dumps(update_dict)
 
-        response = self._session.patch(url, json_obj, **headers)
+        response = self._request("set_seq_run_status", "patch", url, json_obj, **headers)
 
         if response.status_code == HTTPStatus.OK:  # 200
             json_res = json.loads(response.text)
@@ -829,8 +1135,11 @@ class ApiCalls(object):
         """
         logging.debug("project exists: {}".format(project_id))
         project_id = str(project_id)
-        project_list = self.get_projects()
-        return any([p.id == project_id for p in project_list])
+        from_cache = self.cached_projects is not None
+        if project_id not in self._get_project_id_set() and from_cache:
+            # The project may have been created since the projects were cached
+            self.clear_project_cache()
+        return project_id in self._get_project_id_set()
 
     def sample_exists(self, sample_name, project_id):
         """
@@ -841,5 +1150,31 @@ class ApiCalls(object):
         :return: True or False
         """
         logging.debug("sample exists: sample: {}, on project: {}".format(sample_name, project_id))
+        return sample_name.lower() in self._get_sample_name_set(project_id)
+
+    def _get_project_id_set(self):
+        """
+        Gets the ids of the projects on IRIDA, indexed from the cached project list
+
+        :return: set of project ids
+        """
+        project_list = self.get_projects()
+        # the index is rebuilt whenever the cached project list is replaced
+        if self._project_id_index is None or self._project_id_index[0] is not project_list:
+            self._project_id_index = (project_list, {p.id for p in project_list})
+        return self._project_id_index[1]
+
+    def _get_sample_name_set(self, project_id):
+        """
+        Gets the lower case names of the samples on a project, indexed from the cached sample list
+
+        :param project_id: project to get sample names for
+        :return: set of lower case sample names
+        """
         sample_list = self.get_samples(project_id)
-        return any([s.sample_name.lower() == sample_name.lower() for s in sample_list])
+        index = self._sample_name_index.get(project_id)
+        # the index is rebuilt whenever the cached sample list is replaced
+        if index is None or index[0] is not sample_list:
+            index = (sample_list, {s.sample_name.lower() for s in sample_list})
+            self._sample_name_index[project_id] = index
+        return index[1]
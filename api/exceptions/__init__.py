@@ -3,3 +3,4 @@ from .irida_key_error import IridaKeyError
 from .irida_resource_error import IridaResourceError
 from .irida_upload_canceled_exception import IridaUploadCanceledException
 from .file_error import FileError
+from .upload_stalled_error import UploadStalledError
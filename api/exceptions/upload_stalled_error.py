@@ -0,0 +1,10 @@
+from .irida_connection_error import IridaConnectionError
+
+
+class UploadStalledError(IridaConnectionError):
+    """
+    This error is thrown when the files of an upload stop being sent to IRIDA, or are sent too slowly
+
+    The stalled request is aborted, and it is sent again on a new connection until it has stalled too many times
+    """
+    pass
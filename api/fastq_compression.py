@@ -0,0 +1,101 @@
+"""
+This file handles compressing uncompressed sequence files while they are being uploaded
+
+Uncompressed FASTQ files are 3 to 4 times larger than when they are gzipped, so sending them compressed takes
+a fraction of the time on a slow link. Compressing a whole file with a single gzip stream is limited to one core,
+which is slower than most links, so the file is split into blocks that are each compressed into an independent
+gzip member, as pigz does. The blocks are compressed in a thread pool (zlib releases the GIL while it works, so
+the threads run on separate cores) and the members are sent in order. A file made of several gzip members is a
+valid gzip file, and decompresses to the original file.
+
+The compressed size is not known until the whole file is compressed, the upload is sent with chunked encoding
+so the size does not need to be known in advance.
+"""
+
+import os
+import zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of the uncompressed blocks that are compressed independently
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# zlib compression level, the gzip default gives most of the size reduction of level 9 at a much lower cost
+DEFAULT_COMPRESSION_LEVEL = 6
+# Number of blocks waiting to be compressed or sent for each compression thread, limits the memory used
+BLOCKS_IN_FLIGHT_PER_WORKER = 2
+# Window bits that make zlib write a gzip header and trailer
+GZIP_WINDOW_BITS = 16 + zlib.MAX_WBITS
+# File name extensions of uncompressed FASTQ files, files compressed in any format (.gz, .bz2, .xz, ...) are sent as
+# they are
+UNCOMPRESSED_EXTENSIONS = (".fastq", ".fq")
+
+
+def needs_compression(file_name):
+    """
+    :param file_name: name of a sequence file
+    :return: True if the file is an uncompressed FASTQ file
+    """
+    return file_name.lower().endswith(UNCOMPRESSED_EXTENSIONS)
+
+
+def compressed_file_name(file_name):
+    """
+    :param file_name: name of an uncompressed sequence file
+    :return: the name to upload the compressed file as
+    """
+    return file_name + ".gz"
+
+
+def compress_block(block, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Compresses a block of data into a complete gzip member
+
+    :param block: bytes to compress
+    :param compression_level: zlib compression level
+    :return: gzip member as bytes
+    """
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, GZIP_WINDOW_BITS)
+    return compressor.compress(block) + compressor.flush()
+
+
+def iter_compressed_blocks(input_file, block_size=DEFAULT_BLOCK_SIZE, max_workers=None,
+                           compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Reads a file in blocks and compresses the blocks in parallel, yielding the gzip members in file order
+
+    Stopping the generator early stops reading the file, blocks already being compressed are thrown away
+
+    :param input_file: file object opened in binary mode
+    :param block_size: size of the uncompressed blocks
+    :param max_workers: number of blocks compressed at the same time, defaults to the number of cores
+    :param compression_level: zlib compression level
+    :return: generator of (number of uncompressed bytes, gzip member) tuples
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    pending = deque()
+    block_count = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            reached_end = False
+            while True:
+                while not reached_end and len(pending) < max_workers * BLOCKS_IN_FLIGHT_PER_WORKER:
+                    block = input_file.read(block_size)
+                    if not block:
+                        reached_end = True
+                        break
+                    pending.append((len(block), executor.submit(compress_block, block, compression_level)))
+                if not pending:
+                    break
+                block_length, future = pending.popleft()
+                block_count += 1
+                yield block_length, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    if block_count == 0:
+        # an empty file still needs a gzip header and trailer to be a valid gzip file
+        yield 0, compress_block(b"", compression_level)
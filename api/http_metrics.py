@@ -0,0 +1,284 @@
+"""
+This file handles measuring the requests made to IRIDA
+
+Every request made by ApiCalls is timed and its bytes are counted, grouped by the logical operation that made it
+(getting a link, listing samples, sending files...). Latencies are kept in a histogram per operation, so the
+spread of request times can be seen as well as the total, and percentiles can be estimated without keeping
+every request.
+
+Runs can be uploaded at the same time with one ApiCalls instance, so the requests made while working on a run
+(see messaging.run_context) are also counted apart for that run.
+"""
+
+import bisect
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import messaging
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket holds every longer request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float("inf"))
+# Number of runs whose requests are counted apart, the requests of the runs worked on longest ago are forgotten
+MAX_RUNS = 100
+
+
+class OperationStats(object):
+    """
+    Counters and latency histogram of the requests made by one operation
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.error_count = 0
+        self.total_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retry_count = 0
+        # number of requests aborted because their upload stalled
+        self.stall_count = 0
+        # number of requests that took at most LATENCY_BUCKETS[i] seconds, and longer than the previous bucket
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds, bytes_sent=0, bytes_received=0, error=False, retry_count=0, stalled=False):
+        """
+        Adds a request
+
+        :param seconds: time the request took
+        :param bytes_sent: bytes in the request body
+        :param bytes_received: bytes in the response body
+        :param error: True if the request failed without a response
+        :param retry_count: number of times the request was retried by the connection
+        :param stalled: True if the request was aborted because its upload stalled
+        :return: None
+        """
+        self.count += 1
+        if error:
+            self.error_count += 1
+        self.total_seconds += seconds
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.retry_count += retry_count
+        if stalled:
+            self.stall_count += 1
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def copy(self):
+        """
+        :return: OperationStats with the same values
+        """
+        stats = OperationStats()
+        stats.count = self.count
+        stats.error_count = self.error_count
+        stats.total_seconds = self.total_seconds
+        stats.bytes_sent = self.bytes_sent
+        stats.bytes_received = self.bytes_received
+        stats.retry_count = self.retry_count
+        stats.stall_count = self.stall_count
+        stats.bucket_counts = list(self.bucket_counts)
+        return stats
+
+    def subtract(self, earlier):
+        """
+        :param earlier: OperationStats of the same operation taken earlier
+        :return: OperationStats of the requests made since the earlier stats were taken
+        """
+        stats = OperationStats()
+        stats.count = self.count - earlier.count
+        stats.error_count = self.error_count - earlier.error_count
+        stats.total_seconds = self.total_seconds - earlier.total_seconds
+        stats.bytes_sent = self.bytes_sent - earlier.bytes_sent
+        stats.bytes_received = self.bytes_received - earlier.bytes_received
+        stats.retry_count = self.retry_count - earlier.retry_count
+        stats.stall_count = self.stall_count - earlier.stall_count
+        stats.bucket_counts = [a - b for a, b in zip(self.bucket_counts, earlier.bucket_counts)]
+        return stats
+
+    def get_percentile(self, percentile):
+        """
+        Estimates a latency percentile from the histogram
+
+        :param percentile: percentile to estimate, between 0 and 100
+        :return: upper bound of the bucket the percentile falls in, None if there are no requests
+        """
+        if self.count == 0:
+            return None
+        rank = percentile / 100 * self.count
+        seen = 0
+        for upper_bound, bucket_count in zip(LATENCY_BUCKETS, self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return upper_bound
+        return LATENCY_BUCKETS[-1]
+
+    def get_dict(self):
+        """
+        :return: dict of the counters, with the histogram as a dict of bucket upper bound -> count
+        """
+        return {"count": self.count,
+                "error_count": self.error_count,
+                "total_seconds": self.total_seconds,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "retry_count": self.retry_count,
+                "stall_count": self.stall_count,
+                "buckets": dict(zip(LATENCY_BUCKETS, self.bucket_counts))}
+
+
+class RequestRecord(object):
+    """
+    Bytes, retries and stall of one request, filled in while the request is made
+    """
+
+    __slots__ = ('bytes_sent', 'bytes_received', 'retry_count', 'stalled')
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retry_count = 0
+        self.stalled = False
+
+
+class HttpMetrics(object):
+    """
+    Stats of the requests made by an ApiCalls instance, by operation
+
+    Requests can be made from many threads at once
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # operation name -> OperationStats
+        self._stats_dict = {}
+        # run directory -> operation name -> OperationStats, the runs worked on longest ago first
+        self._run_stats_dict = OrderedDict()
+
+    @contextmanager
+    def time_request(self, operation):
+        """
+        Times the request made inside the with block, and adds it to the operation's stats
+
+        A request that raises an exception is counted as an error. The request is counted for the run that the
+        current thread is working on too
+
+        :param operation: name of the operation making the request
+        :return: context manager giving a RequestRecord to fill in the bytes of the request
+        """
+        record = RequestRecord()
+        run_directory = messaging.run_context.get_run_directory()
+        start_time = time.perf_counter()
+        error = False
+        try:
+            yield record
+        except Exception:
+            error = True
+            raise
+        finally:
+            end_time = time.perf_counter()
+            self.observe(operation, end_time - start_time, record.bytes_sent, record.bytes_received, error,
+                         record.retry_count, record.stalled, run_directory)
+            messaging.tracing.add_span(operation, "http", start_time, end_time,
+                                       {"bytes_sent": record.bytes_sent,
+                                        "bytes_received": record.bytes_received,
+                                        "error": error,
+                                        "stalled": record.stalled})
+
+    def observe(self, operation, seconds, bytes_sent=0, bytes_received=0, error=False, retry_count=0,
+                stalled=False, run_directory=None):
+        """
+        Adds a request to the stats of an operation
+
+        :param operation: name of the operation that made the request
+        :param seconds: time the request took
+        :param bytes_sent: bytes in the request body
+        :param bytes_received: bytes in the response body
+        :param error: True if the request failed without a response
+        :param retry_count: number of times the request was retried by the connection
+        :param stalled: True if the request was aborted because its upload stalled
+        :param run_directory: directory of the run the request was made for, None if it was not made for a run
+        :return: None
+        """
+        with self._lock:
+            stats_dict_list = [self._stats_dict]
+            if run_directory is not None:
+                run_stats_dict = self._run_stats_dict.get(run_directory)
+                if run_stats_dict is None:
+                    run_stats_dict = self._run_stats_dict[run_directory] = {}
+                    while len(self._run_stats_dict) > MAX_RUNS:
+                        self._run_stats_dict.popitem(last=False)
+                else:
+                    self._run_stats_dict.move_to_end(run_directory)
+                stats_dict_list.append(run_stats_dict)
+            for stats_dict in stats_dict_list:
+                stats = stats_dict.get(operation)
+                if stats is None:
+                    stats = stats_dict[operation] = OperationStats()
+                stats.observe(seconds, bytes_sent, bytes_received, error, retry_count, stalled)
+
+    def get_snapshot(self):
+        """
+        :return: dict of operation name -> copy of its OperationStats
+        """
+        with self._lock:
+            return {operation: stats.copy() for operation, stats in self._stats_dict.items()}
+
+    def get_stats_since(self, snapshot=None):
+        """
+        :param snapshot: snapshot from get_snapshot, None for every request made
+        :return: dict of operation name -> OperationStats of the requests made since the snapshot
+        """
+        current = self.get_snapshot()
+        if not snapshot:
+            return current
+        stats_dict = {}
+        for operation, stats in current.items():
+            if operation in snapshot:
+                stats = stats.subtract(snapshot[operation])
+            if stats.count > 0:
+                stats_dict[operation] = stats
+        return stats_dict
+
+    def clear_run(self, run_directory):
+        """
+        Forgets the requests made for a run, so a run uploaded again is counted from zero
+
+        :param run_directory: directory of the run
+        :return: None
+        """
+        with self._lock:
+            self._run_stats_dict.pop(run_directory, None)
+
+    def get_run_stats(self, run_directory):
+        """
+        :param run_directory: directory of the run
+        :return: dict of operation name -> copy of the OperationStats of the requests made for the run
+        """
+        with self._lock:
+            return {operation: stats.copy()
+                    for operation, stats in self._run_stats_dict.get(run_directory, {}).items()}
+
+    def log_summary(self, snapshot=None, run_directory=None):
+        """
+        Logs a table of the requests made by each operation
+
+        :param snapshot: snapshot from get_snapshot, to only include the requests made since it was taken
+        :param run_directory: directory of a run, to only include the requests made for it
+        :return: None
+        """
+        if run_directory is not None:
+            stats_dict = self.get_run_stats(run_directory)
+        else:
+            stats_dict = self.get_stats_since(snapshot)
+        if not stats_dict:
+            return
+        logging.info("HTTP requests by operation:")
+        logging.info("{:<22} {:>7} {:>6} {:>9} {:>8} {:>8} {:>14} {:>12}".format(
+            "operation", "count", "errors", "total s", "p50 s", "p95 s", "bytes sent", "bytes recv"))
+        for operation, stats in sorted(stats_dict.items(), key=lambda item: item[1].total_seconds, reverse=True):
+            logging.info("{:<22} {:>7} {:>6} {:>9.2f} {:>8} {:>8} {:>14} {:>12}".format(
+                operation, stats.count, stats.error_count, stats.total_seconds,
+                "<={}".format(stats.get_percentile(50)), "<={}".format(stats.get_percentile(95)),
+                stats.bytes_sent, stats.bytes_received))
@@ -0,0 +1,286 @@
+"""
+This file handles noticing when the upload of sequence files has stalled
+
+The files of a sample are streamed to IRIDA in the body of one request. When the connection stops carrying data,
+for example a half-open TCP connection, the request can hang for hours. The watchdog is told about every chunk of
+the body that is sent, and decides that the request has stalled when nothing has been sent for the stall timeout,
+or when less than the minimum throughput has been sent over the last stall timeout.
+
+A request blocked sending its body to a connection that takes no more data does not ask for the next chunk, so
+while the body is being sent a thread of the request's own checks the watchdog, and shuts down the request's
+connection when it has stalled. Requests are only timed out while their body is being sent, IRIDA can take
+a long time to store the files before it responds.
+"""
+
+import socket
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .exceptions import UploadStalledError
+
+# Longest time in seconds between two checks of a request's watchdog while its body is being sent
+CHECK_INTERVAL = 1
+
+# The request watch of the current thread, set while a request is made inside watching()
+_current = threading.local()
+
+
+class UploadWatchdog(object):
+    """
+    Watches the progress of the body of one streamed request
+    """
+
+    def __init__(self, stall_timeout, min_throughput=0, now=None):
+        """
+        :param stall_timeout: seconds without progress before the request has stalled
+        :param min_throughput: bytes per second the request must send over the last stall_timeout seconds,
+            0 to only check that the request makes progress
+        :param now: time.monotonic() the request starts at, defaults to now
+        """
+        now = time.monotonic() if now is None else now
+        # progress is recorded by the request's thread and checked by the thread watching it
+        self._lock = threading.Lock()
+        self.stall_timeout = stall_timeout
+        self.min_throughput = min_throughput
+        self._start_time = now
+        self._last_progress_time = now
+        self._bytes_sent = 0
+        # (time.monotonic(), bytes sent) points, the first is from before the last stall_timeout seconds
+        self._history = deque([(now, 0)])
+        self._finished = False
+
+    @property
+    def bytes_sent(self):
+        return self._bytes_sent
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def record_progress(self, byte_count, now=None):
+        """
+        :param byte_count: bytes of the body that have just been sent
+        :param now: time.monotonic() they were sent at, defaults to now
+        :return: None
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._bytes_sent += byte_count
+            self._last_progress_time = now
+            self._history.append((now, self._bytes_sent))
+            while len(self._history) > 1 and self._history[1][0] <= now - self.stall_timeout:
+                self._history.popleft()
+
+    def finish(self):
+        """
+        Marks the whole body as sent, the request is waiting for its response
+        :return: None
+        """
+        self._finished = True
+
+    def get_stall_reason(self, now=None):
+        """
+        :param now: time.monotonic() to check at, defaults to now
+        :return: description of why the request has stalled, None if it has not
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle_seconds = now - self._last_progress_time
+            if idle_seconds >= self.stall_timeout:
+                return "nothing was sent for {:.0f} seconds".format(idle_seconds)
+            # The throughput is only checked once the request has been running for a whole stall timeout,
+            # so a slow start is not mistaken for a stall
+            if self.min_throughput and now - self._start_time >= self.stall_timeout:
+                window_start = now - self.stall_timeout
+                start_bytes = self._history[0][1]
+                for point_time, point_bytes in self._history:
+                    if point_time > window_start:
+                        break
+                    start_bytes = point_bytes
+                throughput = (self._bytes_sent - start_bytes) / self.stall_timeout
+                if throughput < self.min_throughput:
+                    return "only {:.0f} bytes per second were sent over the last {} seconds".format(
+                        throughput, self.stall_timeout)
+        return None
+
+    def check(self, now=None):
+        """
+        Raises UploadStalledError when the request has stalled
+
+        :param now: time.monotonic() to check at, defaults to now
+        :return: None
+        """
+        reason = self.get_stall_reason(now)
+        if reason is not None:
+            raise UploadStalledError("The upload stalled: {}".format(reason))
+
+
+def watch_body(data, watchdog):
+    """
+    Passes on the chunks of a streamed request body, telling the watchdog as each chunk is sent
+
+    The request is aborted by raising UploadStalledError from the body when the watchdog finds it has stalled.
+    A request blocked on a connection that takes no more data is aborted by watching() instead
+
+    :param data: iterable of bytes
+    :param watchdog: UploadWatchdog of the request
+    :return: generator of the chunks
+    """
+    for chunk in data:
+        watchdog.check()
+        yield chunk
+        # the next chunk is asked for once this one has been sent
+        watchdog.record_progress(len(chunk))
+    watchdog.finish()
+
+
+class _RequestWatch(object):
+    """
+    The connection of a request being watched, and the thread watching it
+    """
+
+    def __init__(self, watchdog):
+        self.watchdog = watchdog
+        self._lock = threading.Lock()
+        self._pool = None
+        self._connection = None
+        self._released = True
+        self._stop_event = threading.Event()
+
+    def set_connection(self, pool, connection):
+        """
+        :param pool: connection pool the request took its connection from
+        :param connection: connection the request is sent on
+        :return: None
+        """
+        with self._lock:
+            self._pool = pool
+            self._connection = connection
+            self._released = False
+
+    def release_connection(self, pool):
+        """
+        :param pool: connection pool a connection was given back to by the request's thread
+        :return: None
+        """
+        with self._lock:
+            if pool is self._pool:
+                self._released = True
+
+    def release_unreturned_connection(self):
+        """
+        Gives the pool back the place of a connection that was dropped without being given back, as requests
+        does when sending a chunked body fails, so the pool does not run out of connections
+        :return: None
+        """
+        with self._lock:
+            pool = None if self._released else self._pool
+            self._released = True
+        if pool is not None:
+            pool._put_conn(None)
+
+    def run(self):
+        """
+        Checks the watchdog until the body has been sent, shutting down the connection if the request stalls
+        :return: None
+        """
+        interval = min(CHECK_INTERVAL, self.watchdog.stall_timeout / 4)
+        while not self._stop_event.wait(interval):
+            if self.watchdog.finished:
+                return
+            if self.watchdog.get_stall_reason() is not None:
+                self._shutdown_connection()
+                return
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _shutdown_connection(self):
+        with self._lock:
+            sock = getattr(self._connection, "sock", None)
+        if sock is None:
+            return
+        # shutting the socket down wakes the request's thread up from a blocked send, closing it does not
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+@contextmanager
+def watching(watchdog):
+    """
+    Watches the request made inside the with block from a thread of its own, shutting down the request's
+    connection when its body stalls. The request must be sent with a WatchedHTTPAdapter
+
+    :param watchdog: UploadWatchdog of the request
+    :return: context manager
+    """
+    request_watch = _RequestWatch(watchdog)
+    previous_watch = getattr(_current, "request_watch", None)
+    _current.request_watch = request_watch
+    thread = threading.Thread(target=request_watch.run, name="upload-watchdog", daemon=True)
+    thread.start()
+    try:
+        yield
+    except BaseException:
+        request_watch.release_unreturned_connection()
+        raise
+    finally:
+        request_watch.stop()
+        thread.join()
+        _current.request_watch = previous_watch
+
+
+class _WatchedPoolMixin(object):
+    """
+    Tells the watch of the request being made by the current thread which connection it is sent on
+    """
+
+    def _get_conn(self, timeout=None):
+        connection = super()._get_conn(timeout)
+        request_watch = getattr(_current, "request_watch", None)
+        if request_watch is not None:
+            request_watch.set_connection(self, connection)
+        return connection
+
+    def _put_conn(self, conn):
+        request_watch = getattr(_current, "request_watch", None)
+        if request_watch is not None:
+            request_watch.release_connection(self)
+        super()._put_conn(conn)
+
+
+class _WatchedHTTPConnectionPool(_WatchedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _WatchedHTTPSConnectionPool(_WatchedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+# Connection pool classes of a WatchedHTTPAdapter, by url scheme
+_WATCHED_POOL_CLASSES = {"http": _WatchedHTTPConnectionPool, "https": _WatchedHTTPSConnectionPool}
+
+
+class WatchedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections can be shut down by the watch of the request using them, see watching()
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _WATCHED_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS proxies have connection pools of their own
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = _WATCHED_POOL_CLASSES
+        return manager
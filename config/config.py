@@ -83,11 +83,14 @@ def read_config_option(key, expected_type=None, default_value=None):
         expected_type: read the config option as the specified type (if specified)
         default_value: if the key doesn't exist, just return the default value.
             If the default value is not specified, the function will throw whatever
-            error was raised by the configuration parser
+            error was raised by the configuration parser.
+            The default value is also returned when the config has not been set up.
     """
     logging.debug("Reading config option {} with expected type {}".format(key, expected_type))
 
     global conf_parser
+    if conf_parser is None and default_value is not None:
+        return default_value
     try:
         if not expected_type:
             value = conf_parser.get("Settings", key)
@@ -95,8 +98,12 @@ def read_config_option(key, expected_type=None, default_value=None):
             return conf_parser.get("Settings", key)
         elif expected_type is bool:
             return conf_parser.getboolean("Settings", key)
+        elif expected_type is int:
+            return conf_parser.getint("Settings", key)
+        elif expected_type is float:
+            return conf_parser.getfloat("Settings", key)
     except (ValueError, NoOptionError) as e:
-        if default_value:
+        if default_value is not None:
             return default_value
         else:
             raise
@@ -4,18 +4,44 @@ It handles initializing and managing an api instance as well as preparing IRIDA
 """
 
 import logging
+import queue
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import api
 import config
+import messaging
 import model
-from . import model_validator
+import progress
+from . import model_validator, run_cache, run_fingerprint, upload_planner
+
+# Default maximum number of connections open to IRIDA at once
+DEFAULT_MAX_CONNECTIONS = 4
+# Default seconds without progress before the upload of a sample has stalled and is sent again
+DEFAULT_UPLOAD_STALL_TIMEOUT = 300
+# Default number of samples in a run that are uploaded at the same time
+DEFAULT_UPLOAD_THREADS = 1
+# Number of checked samples that can wait for each upload thread when uploading as a pipeline
+PIPELINE_QUEUE_SIZE_PER_THREAD = 2
+# Seconds between checks for a stopped pipeline while waiting on the pipeline queue
+PIPELINE_POLL_INTERVAL = 0.5
 
 # The api instance is a global variable which lets the api behave like a singleton
 # managed within this file
 _api_instance = None
+# Local index of run fingerprints on the IRIDA instance the api is connected to
+_fingerprint_index = None
+# Config values the api instance was created with, so the instance can be reused while they do not change
+_api_config = None
+# Concurrent uploads initialize the api at the same time, so they must not each create a new instance
+_api_lock = threading.Lock()
 
 
-def _initialize_api(client_id, client_secret, base_url, username, password, max_wait_time=20):
+def _initialize_api(client_id, client_secret, base_url, username, password, max_wait_time=20,
+                    max_connections=DEFAULT_MAX_CONNECTIONS, compress_uploads=False,
+                    upload_stall_timeout=DEFAULT_UPLOAD_STALL_TIMEOUT, min_upload_throughput=0):
     """
     Creates the ApiCalls object from the api layer.
     Sets the instance to use the global _api_instance variable so it behaves as a singleton that can be easily re-init
@@ -26,10 +52,21 @@ def _initialize_api(client_id, client_secret, base_url, username, password, max_
     :param username:
     :param password:
     :param max_wait_time:
+    :param max_connections: maximum number of connections open to IRIDA, shared by every upload using the api
+    :param compress_uploads: when True, uncompressed sequence files are gzipped while they are uploaded
+    :param upload_stall_timeout: seconds without progress before the upload of a sample has stalled, 0 to never
+    :param min_upload_throughput: bytes per second below which the upload of a sample has stalled, 0 for any
     :return: The ApiCalls instance
     """
     global _api_instance
-    _api_instance = api.ApiCalls(client_id, client_secret, base_url, username, password, max_wait_time)
+    global _fingerprint_index
+    global _api_config
+    _api_instance = api.ApiCalls(client_id, client_secret, base_url, username, password, max_wait_time,
+                                 max_connections=max_connections, compress_uploads=compress_uploads,
+                                 upload_stall_timeout=upload_stall_timeout,
+                                 min_upload_throughput=min_upload_throughput)
+    _fingerprint_index = None
+    _api_config = None
     return _api_instance
 
 
@@ -48,26 +85,313 @@ def _get_api_instance():
     return _api_instance
 
 
+@messaging.tracing.traced("initialize api", "api")
 def initialize_api_from_config():
     """
     Loads the api parameters from the config file and initializes the api with them
 
+    When the api has already been initialized from the same config, the existing instance is reused so its
+    session and project cache stay warm between uploads. The sample cache is cleared, as samples are likely
+    to have been added since the last upload.
+
     :return: the api instance
     """
+    global _api_config
     client_id = config.read_config_option("client_id")
     client_secret = config.read_config_option("client_secret")
     base_url = config.read_config_option("base_url")
     username = config.read_config_option("username")
     password = config.read_config_option("password")
+    max_connections = config.read_config_option("max_connections", int, DEFAULT_MAX_CONNECTIONS)
+    compress_uploads = config.read_config_option("compress_uploads", bool, False)
+    upload_stall_timeout = config.read_config_option("upload_stall_timeout", int, DEFAULT_UPLOAD_STALL_TIMEOUT)
+    min_upload_throughput = config.read_config_option("min_upload_throughput", int, 0)
+
+    api_config = (client_id, client_secret, base_url, username, password, max_connections, compress_uploads,
+                  upload_stall_timeout, min_upload_throughput)
+    with _api_lock:
+        if _api_instance is not None and _api_config == api_config:
+            logging.debug("Reusing existing api instance")
+            _api_instance.clear_sample_cache()
+            return _api_instance
+
+        api_instance = _initialize_api(client_id=client_id,
+                                       client_secret=client_secret,
+                                       base_url=base_url,
+                                       username=username,
+                                       password=password,
+                                       max_connections=max_connections,
+                                       compress_uploads=compress_uploads,
+                                       upload_stall_timeout=upload_stall_timeout,
+                                       min_upload_throughput=min_upload_throughput)
+        _api_config = api_config
+        return api_instance
+
+
+def keep_api_session_alive():
+    """
+    Checks the session of the api instance, if there is one, so an expired access token is replaced
+    before the next upload needs it
 
-    return _initialize_api(client_id=client_id,
-                           client_secret=client_secret,
-                           base_url=base_url,
-                           username=username,
-                           password=password)
+    :return: None
+    """
+    if _api_instance is None:
+        return
+    try:
+        _api_instance.check_session()
+    except Exception as e:
+        logging.warning("Could not refresh the IRIDA session: {}".format(e))
 
 
-def prepare_and_validate_for_upload(sequencing_run):
+def stop_uploads():
+    """
+    Stops the uploads of every run using the api instance, if there is one. Each run stops at its next chunk of
+    data and is set to error on IRIDA
+
+    :return: None
+    """
+    if _api_instance is None:
+        return
+    try:
+        _api_instance._kill_connections()
+    except Exception as e:
+        logging.warning("Could not stop the uploads to IRIDA: {}".format(e))
+
+
+def clear_run_http_stats(directory):
+    """
+    Forgets the requests made for a run, so the requests of an upload of the run can be summarized
+
+    :param directory: directory of the run
+    :return: None
+    """
+    if _api_instance is None:
+        return
+    _api_instance.http_metrics.clear_run(directory)
+
+
+def get_http_stats_since(snapshot=None):
+    """
+    :param snapshot: snapshot from HttpMetrics.get_snapshot, to only include the requests made since
+    :return: dict of operation name -> OperationStats, empty if the api has not been initialized
+    """
+    if _api_instance is None:
+        return {}
+    return _api_instance.http_metrics.get_stats_since(snapshot)
+
+
+def get_run_http_stats(directory):
+    """
+    :param directory: directory of the run
+    :return: dict of operation name -> OperationStats of the requests made for the run, empty if the api has
+        not been initialized
+    """
+    if _api_instance is None:
+        return {}
+    return _api_instance.http_metrics.get_run_stats(directory)
+
+
+def log_http_metrics(directory=None):
+    """
+    Logs the time and bytes of the requests made to IRIDA by each operation
+
+    :param directory: directory of a run, to only include the requests made for it
+    :return: None
+    """
+    if _api_instance is None:
+        return
+    _api_instance.http_metrics.log_summary(run_directory=directory)
+
+
+class ApiWarmUp:
+    """
+    Connects to IRIDA in a background thread, getting an access token and fetching the project list,
+    so the connection is ready by the time it is needed
+    """
+
+    def __init__(self, timer=None):
+        """
+        :param timer: optional PhaseTimer, the time taken to connect is added to it as background work
+        """
+        self._timer = timer
+        self._thread = threading.Thread(target=messaging.run_context.bind(self._run), name="api-warm-up",
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start_time = time.perf_counter()
+        try:
+            with messaging.tracing.span("connecting to IRIDA", "api"):
+                initialize_api_from_config().warm_up()
+        except Exception as e:
+            # The error is raised again when the api is initialized by the upload
+            logging.debug("Could not connect to IRIDA in the background: {}".format(e))
+        finally:
+            if self._timer is not None:
+                self._timer.add_background("connecting to IRIDA", time.perf_counter() - start_time)
+
+    def join(self):
+        """
+        Waits for the connection to finish
+        :return: None
+        """
+        self._thread.join()
+
+
+def start_api_warm_up(timer=None):
+    """
+    Starts connecting to IRIDA in the background
+
+    :param timer: optional PhaseTimer to add the time taken to connect to
+    :return: ApiWarmUp, join it before the api is used
+    """
+    return ApiWarmUp(timer)
+
+
+def check_api_connection():
+    """
+    Checks if IRIDA can be reached with the config, initializing the api if needed
+
+    :return: True if IRIDA can be reached
+    """
+    try:
+        initialize_api_from_config().check_session()
+    except api.exceptions.IridaConnectionError as e:
+        logging.debug("Could not connect to IRIDA: {}".format(e))
+        return False
+    return True
+
+
+def _get_fingerprint_index():
+    """
+    Returns the run fingerprint index for the IRIDA instance the api is connected to
+
+    :return: RunFingerprintIndex
+    """
+    global _fingerprint_index
+    if _fingerprint_index is None:
+        _fingerprint_index = run_fingerprint.RunFingerprintIndex(_get_api_instance().base_url)
+    return _fingerprint_index
+
+
+def find_duplicate_run(sequencing_run):
+    """
+    Fingerprints the sequencing run and checks if a run with the same fingerprint has already been uploaded,
+    or is currently being uploaded, to IRIDA
+
+    The fingerprint is added to the sequencing run's metadata so it is stored on IRIDA when the run is uploaded
+    The local fingerprint index is refreshed from IRIDA before it is checked, so a run deleted from IRIDA is not
+    a duplicate. When IRIDA cannot be reached, the local index is used as it is.
+
+    :param sequencing_run: SequencingRun object
+    :return: the identifier of the duplicate run on IRIDA, or None if there is no duplicate
+    """
+    fingerprint = run_fingerprint.compute_fingerprint(sequencing_run)
+    sequencing_run.metadata[run_fingerprint.FINGERPRINT_KEY] = fingerprint
+    logging.debug("Sequencing run fingerprint: {}".format(fingerprint))
+
+    fingerprint_index = _get_fingerprint_index()
+    try:
+        fingerprint_index.refresh(_get_api_instance())
+    except (api.exceptions.IridaConnectionError, api.exceptions.IridaKeyError) as e:
+        logging.warning("Could not get sequencing runs from IRIDA to check for duplicate runs: {}".format(e))
+
+    return fingerprint_index.lookup(fingerprint)
+
+
+def _record_run_fingerprint(sequencing_run, run_id, upload_status):
+    """
+    Records the upload status of a fingerprinted sequencing run in the local fingerprint index
+
+    :param sequencing_run: SequencingRun object
+    :param run_id: sequencing run identifier on IRIDA
+    :param upload_status: upload status of the run on IRIDA
+    :return: None
+    """
+    fingerprint = sequencing_run.metadata.get(run_fingerprint.FINGERPRINT_KEY)
+    if fingerprint is None:
+        return
+    fingerprint_index = _get_fingerprint_index()
+    fingerprint_index.record(fingerprint, run_id, upload_status)
+    fingerprint_index.save()
+
+
+def _record_interrupted_run(api_instance, sequencing_run, run_id):
+    """
+    Records a run whose upload was stopped by a lost connection as ERROR in the local fingerprint index, so it is
+    not taken for a duplicate of itself when it is uploaded again, and tries to set it to ERROR on IRIDA
+
+    :param api_instance: ApiCalls instance
+    :param sequencing_run: SequencingRun object
+    :param run_id: sequencing run identifier on IRIDA
+    :return: None
+    """
+    _record_run_fingerprint(sequencing_run, run_id, "ERROR")
+    try:
+        api_instance.set_seq_run_error(run_id)
+    except Exception as e:
+        logging.debug("Could not set sequencing run {} to error on IRIDA: {}".format(run_id, e))
+
+
+def load_upload_plan(directory):
+    """
+    Gets the upload plan stored with the cached run of a directory, for the IRIDA the api is connected to
+
+    :param directory: run directory
+    :return: dict of (project id, sample name) -> bytes to upload, of the samples that are ready on IRIDA,
+        or None if the run cache is off or has no upload plan for the run
+    """
+    if not config.read_config_option("run_cache", bool, False):
+        return None
+    run_cache_instance = run_cache.get_run_cache()
+    if run_cache_instance is None:
+        return None
+    upload_plan = run_cache_instance.load_upload_plan(directory, _get_api_instance().base_url)
+    if upload_plan is not None:
+        logging.info("Run has not changed since its samples were prepared on IRIDA, using the upload plan made "
+                     "last time")
+    return upload_plan
+
+
+def store_upload_plan(directory, sequencing_run):
+    """
+    Stores the upload plan of a run whose samples are all ready on IRIDA with its cached run
+
+    :param directory: run directory
+    :param sequencing_run: SequencingRun object that has passed online validation
+    :return: dict of (project id, sample name) -> bytes to upload, or None if the run cache is off
+    """
+    if not config.read_config_option("run_cache", bool, False):
+        return None
+    run_cache_instance = run_cache.get_run_cache()
+    if run_cache_instance is None:
+        return None
+    upload_plan = {(project.id, sample.sample_name): upload_planner.get_sample_upload_size(sample)
+                   for project in sequencing_run.project_list for sample in project.sample_list}
+    run_cache_instance.store_upload_plan(directory, _get_api_instance().base_url, upload_plan)
+    return upload_plan
+
+
+def _verify_upload_plan(sequencing_run, upload_plan):
+    """
+    Checks that every sample in a cached upload plan is a sample of the sequencing run
+
+    :param sequencing_run: SequencingRun object
+    :param upload_plan: dict of (project id, sample name) -> bytes to upload, from load_upload_plan, or None
+    :return: the upload plan, or None if it is None or does not match the run
+    """
+    if upload_plan is None:
+        return None
+    for project_id, sample_name in upload_plan:
+        project = sequencing_run.get_project(project_id)
+        if project is None or project.get_sample(sample_name) is None:
+            logging.debug("Sample {} on Project {} in the upload plan is not in the run, checking every sample"
+                          "".format(sample_name, project_id))
+            return None
+    return upload_plan
+
+
+def prepare_and_validate_for_upload(sequencing_run, upload_plan=None):
     """
     Prepares IRIDA to accept the sequencing run
     Validates that projects exist,
@@ -76,10 +400,13 @@ def prepare_and_validate_for_upload(sequencing_run):
     Collects all errors during prep/validation in ValidationResult
 
     :param sequencing_run: SequencingRun object
+    :param upload_plan: dict of (project id, sample name) -> bytes to upload, from load_upload_plan,
+        samples in it are already ready on IRIDA and are not checked again
     :return: ValidationResult object with all errors that raised while prepping
     """
     # get api
     api_instance = _get_api_instance()
+    upload_plan = _verify_upload_plan(sequencing_run, upload_plan)
 
     validation_result = model.ValidationResult()
     # Start online validation
@@ -96,29 +423,45 @@ def prepare_and_validate_for_upload(sequencing_run):
 
         logging.debug("Checking existence of samples")
         for sample in project.sample_list:
-            logging.debug("Checking existence of Sample {} on Project {}".format(sample.sample_name, project.id))
-            if api_instance.sample_exists(sample.sample_name, project.id):
-                logging.debug("Sample {} exists on Project {}".format(sample.sample_name, project.id))
-            else:
-                logging.debug("Sample not found, creating new Sample")
-                try:
-                    api_instance.send_sample(sample, project.id)
-                except api.exceptions.IridaResourceError as e:
-                    logging.debug("Sample could not be created")
-                    validation_result.add_error(e)
-                    continue
-                logging.debug("Verifying sample was created")
-                if not api_instance.sample_exists(sample.sample_name, project.id):
-                    logging.debug("Sample was not created")
-                    err = api.exceptions.IridaResourceError("Could not create new Sample on Project {}", project.id)
-                    validation_result.add_error(err)
-                    continue
-                logging.debug("Sample Created")
+            if upload_plan is not None and (project.id, sample.sample_name) in upload_plan:
+                continue
+            err = _prepare_sample(api_instance, sample, project.id)
+            if err is not None:
+                validation_result.add_error(err)
 
     return validation_result
 
 
-def upload_sequencing_run(sequencing_run):
+def _prepare_sample(api_instance, sample, project_id):
+    """
+    Checks that a sample exists on a project in IRIDA, creating the sample if it does not exist yet
+
+    :param api_instance: ApiCalls instance
+    :param sample: Sample object
+    :param project_id: project the sample belongs to
+    :return: None if the sample is ready for upload, otherwise the error that stopped it being created
+    """
+    with messaging.tracing.span("prepare sample", "sample", {"sample": sample.sample_name, "project": project_id}):
+        logging.debug("Checking existence of Sample {} on Project {}".format(sample.sample_name, project_id))
+        if api_instance.sample_exists(sample.sample_name, project_id):
+            logging.debug("Sample {} exists on Project {}".format(sample.sample_name, project_id))
+            return None
+
+        logging.debug("Sample not found, creating new Sample")
+        try:
+            api_instance.send_sample(sample, project_id)
+        except api.exceptions.IridaResourceError as e:
+            logging.debug("Sample could not be created")
+            return e
+        logging.debug("Verifying sample was created")
+        if not api_instance.sample_exists(sample.sample_name, project_id):
+            logging.debug("Sample was not created")
+            return api.exceptions.IridaResourceError("Could not create new Sample on Project {}", project_id)
+        logging.debug("Sample Created")
+        return None
+
+
+def upload_sequencing_run(sequencing_run, upload_plan=None):
     """
     Handles uploading a sequencing run
 
@@ -126,49 +469,301 @@ def upload_sequencing_run(sequencing_run):
     Expects sequencing run to have been validated
     Expects sequencing run to be valid for upload
 
+    Samples are uploaded in the order set by the 'upload_order' config option, and 'upload_threads' samples
+    are uploaded at the same time
+
     :param sequencing_run: run to upload
+    :param upload_plan: dict of (project id, sample name) -> bytes to upload, sizes that are not in it are read
+        from the sequence files
     :return:
     """
     # get api
     api_instance = _get_api_instance()
 
+    # Sequence files can be outside the run directory, their sizes are read fresh for this upload
+    for data_directory in run_cache.get_data_directories(sequencing_run):
+        progress.directory_index.get_directory_index().invalidate(data_directory)
+
+    # plan the upload before creating the run, so a plan that cannot be made does not leave a run on IRIDA
+    upload_order = config.read_config_option("upload_order", default_value=upload_planner.DEFAULT_UPLOAD_ORDER)
+    upload_threads = config.read_config_option("upload_threads", int, DEFAULT_UPLOAD_THREADS)
+    size_dict = upload_plan
+    upload_plan = upload_planner.plan_sample_uploads(sequencing_run, upload_order, size_dict)
+
     # create a seq run
     run_id = api_instance.create_seq_run(sequencing_run.metadata)
     logging.info("Sequencing run id '{}' has been created for upload".format(run_id))
+    _record_run_fingerprint(sequencing_run, run_id, "UPLOADING")
 
     try:
         # set seq run to upload
         api_instance.set_seq_run_uploading(run_id)
+        _publish_run_upload_started(upload_plan, run_id, size_dict)
+
+        _send_planned_samples(api_instance, upload_plan, run_id, upload_threads)
+
+        # set seq run to complete
+        api_instance.set_seq_run_complete(run_id)
+        _record_run_fingerprint(sequencing_run, run_id, "COMPLETE")
+
+        # set seq run to error if there is an error
+    except api.exceptions.IridaConnectionError as e:
+        logging.error("Failed to upload SequencingRun, Could not connect to IRIDA")
+        _record_interrupted_run(api_instance, sequencing_run, run_id)
+        raise e
+    except api.exceptions.IridaResourceError as e:
+        logging.error("Failed to upload SequencingRun, Could not access resources on IRIDA")
+        api_instance.set_seq_run_error(run_id)
+        _record_run_fingerprint(sequencing_run, run_id, "ERROR")
+        raise e
+    except api.exceptions.FileError as e:
+        logging.error("Failed to upload SequencingRun, Could not access files to upload to IRIDA")
+        api_instance.set_seq_run_error(run_id)
+        _record_run_fingerprint(sequencing_run, run_id, "ERROR")
+        raise e
+    finally:
+        _publish_run_upload_finished(run_id)
+    # Todo: once threading is added, the upload canceled error will likely need to be caught/raised here
+
+    return run_id
+
+
+def prepare_and_upload_sequencing_run(sequencing_run, upload_plan=None):
+    """
+    Prepares IRIDA for the sequencing run and uploads it as a pipeline, so each sample starts uploading as soon
+    as it has been confirmed or created on IRIDA, while the following samples are still being checked.
+
+    Projects are all checked before anything is created on IRIDA, and the sequencing run is only created once
+    the first sample is ready, so a run whose first sample cannot be created is not created on IRIDA. When a
+    later sample cannot be created, no more samples are started, the remaining samples are still checked so
+    every error is reported, and the sequencing run is set to error on IRIDA.
+
+    Samples are checked in the order set by the 'upload_order' config option, and 'upload_threads' samples
+    are uploaded at the same time
+
+    :param sequencing_run: SequencingRun object, expected to have been validated offline
+    :param upload_plan: dict of (project id, sample name) -> bytes to upload, from load_upload_plan,
+        samples in it are already ready on IRIDA and are not checked again
+    :return: ValidationResult with all errors that raised while prepping, and the sequencing run id,
+        which is None when the ValidationResult is not valid
+    """
+    api_instance = _get_api_instance()
+
+    upload_order = config.read_config_option("upload_order", default_value=upload_planner.DEFAULT_UPLOAD_ORDER)
+    upload_threads = max(1, config.read_config_option("upload_threads", int, DEFAULT_UPLOAD_THREADS))
 
-        # loop through projects
-        for project in sequencing_run.project_list:
-            # loop through samples
-            for sample in project.sample_list:
+    validation_result = model.ValidationResult()
+    logging.debug("Checking existence of projects")
+    for project in sequencing_run.project_list:
+        if not api_instance.project_exists(project.id):
+            logging.debug("Could not find project: {}".format(project.id))
+            validation_result.add_error(api.exceptions.IridaResourceError("Project does not exist", project.id))
+    if not validation_result.is_valid():
+        return validation_result, None
+
+    # Sequence files can be outside the run directory, their sizes are read fresh for this upload
+    for data_directory in run_cache.get_data_directories(sequencing_run):
+        progress.directory_index.get_directory_index().invalidate(data_directory)
+    size_dict = _verify_upload_plan(sequencing_run, upload_plan)
+    upload_plan = upload_planner.plan_sample_uploads(sequencing_run, upload_order, size_dict)
+    if not upload_plan:
+        # there is no sample to wait for before the sequencing run is created
+        return validation_result, upload_sequencing_run(sequencing_run)
+
+    # Samples ready to upload are handed from the checking stage to the upload stage through a bounded queue,
+    # so checking stays a little ahead of uploading. None marks the end of the samples for one upload thread
+    ready_queue = queue.Queue(maxsize=upload_threads * PIPELINE_QUEUE_SIZE_PER_THREAD)
+    stop_event = threading.Event()
+    error_list = []
+
+    def _hand_off(item):
+        while not stop_event.is_set():
+            try:
+                ready_queue.put(item, timeout=PIPELINE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _take():
+        while not stop_event.is_set():
+            try:
+                return ready_queue.get(timeout=PIPELINE_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def _check_samples():
+        try:
+            for project, sample in upload_plan:
+                if error_list:
+                    return
+                err = None
+                if size_dict is None or (project.id, sample.sample_name) not in size_dict:
+                    err = _prepare_sample(api_instance, sample, project.id)
+                if err is not None:
+                    # keep checking so every error is reported, but stop uploading
+                    validation_result.add_error(err)
+                    stop_event.set()
+                elif validation_result.is_valid():
+                    _hand_off((project, sample))
+        except Exception as e:
+            error_list.append(e)
+            stop_event.set()
+        finally:
+            for _ in range(upload_threads):
+                _hand_off(None)
+
+    def _upload_samples(first_item=None):
+        try:
+            item = first_item if first_item is not None else _take()
+            while item is not None and not stop_event.is_set():
+                project, sample = item
                 logging.info("Uploading to Sample {} on Project {}".format(sample.sample_name, project.id))
-                # upload files
                 api_instance.send_sequence_files(sequence_file=sample.sequence_file,
                                                  sample_name=sample.sample_name,
                                                  project_id=project.id,
                                                  upload_id=run_id)
+                item = _take()
+        except Exception as e:
+            error_list.append(e)
+            stop_event.set()
+
+    logging.debug("Checking existence of samples")
+    check_thread = threading.Thread(target=messaging.run_context.bind(_check_samples), name="prepare-samples")
+    check_thread.start()
+    try:
+        # the sequencing run is created once its first sample is ready
+        first_item = _take()
+        if first_item is None:
+            check_thread.join()
+            if error_list:
+                raise error_list[0]
+            return validation_result, None
+        run_id = api_instance.create_seq_run(sequencing_run.metadata)
+        logging.info("Sequencing run id '{}' has been created for upload".format(run_id))
+        _record_run_fingerprint(sequencing_run, run_id, "UPLOADING")
+    except BaseException:
+        stop_event.set()
+        check_thread.join()
+        raise
+
+    try:
+        api_instance.set_seq_run_uploading(run_id)
+        _publish_run_upload_started(upload_plan, run_id, size_dict)
+
+        upload_thread_list = [threading.Thread(target=messaging.run_context.bind(_upload_samples),
+                                               args=(first_item if i == 0 else None,),
+                                               name="upload-samples-{}".format(i))
+                              for i in range(upload_threads)]
+        for thread in upload_thread_list:
+            thread.start()
+        for thread in upload_thread_list:
+            thread.join()
+        check_thread.join()
+
+        if error_list:
+            raise error_list[0]
+        if not validation_result.is_valid():
+            logging.error("Samples could not be prepared, setting sequencing run {} to error".format(run_id))
+            api_instance.set_seq_run_error(run_id)
+            _record_run_fingerprint(sequencing_run, run_id, "ERROR")
+            return validation_result, None
 
-        # set seq run to complete
         api_instance.set_seq_run_complete(run_id)
+        _record_run_fingerprint(sequencing_run, run_id, "COMPLETE")
 
-        # set seq run to error if there is an error
     except api.exceptions.IridaConnectionError as e:
         logging.error("Failed to upload SequencingRun, Could not connect to IRIDA")
+        _record_interrupted_run(api_instance, sequencing_run, run_id)
         raise e
     except api.exceptions.IridaResourceError as e:
         logging.error("Failed to upload SequencingRun, Could not access resources on IRIDA")
         api_instance.set_seq_run_error(run_id)
+        _record_run_fingerprint(sequencing_run, run_id, "ERROR")
         raise e
     except api.exceptions.FileError as e:
         logging.error("Failed to upload SequencingRun, Could not access files to upload to IRIDA")
         api_instance.set_seq_run_error(run_id)
+        _record_run_fingerprint(sequencing_run, run_id, "ERROR")
         raise e
-    # Todo: once threading is added, the upload canceled error will likely need to be caught/raised here
+    finally:
+        stop_event.set()
+        check_thread.join()
+        _publish_run_upload_finished(run_id)
 
-    return run_id
+    return validation_result, run_id
+
+
+def _publish_run_upload_started(upload_plan, run_id, size_dict=None):
+    """
+    Publishes the start of a run upload, with the number of bytes that will be sent, so the progress of the whole
+    run can be followed
+
+    Progress must never stop an upload, so when the size of the files cannot be read the total is left unknown
+
+    :param upload_plan: list of (project, sample) tuples from upload_planner.plan_sample_uploads
+    :param run_id: sequencing run the samples are uploaded to
+    :param size_dict: dict of (project id, sample name) -> bytes to upload, from a cached upload plan
+    :return: None
+    """
+    try:
+        total_bytes = sum(upload_planner.get_planned_upload_size(project, sample, size_dict)
+                          for project, sample in upload_plan)
+    except Exception as e:
+        logging.debug("Could not get the size of sequencing run {}: {}".format(run_id, e))
+        total_bytes = None
+    messaging.send_message(messaging.ApiMessage(messaging.MessageTopics.run_upload_started_topic,
+                                                run_id=run_id,
+                                                total_bytes=total_bytes,
+                                                sample_count=len(upload_plan)))
+
+
+def _publish_run_upload_finished(run_id):
+    """
+    Publishes the end of a run upload, whether or not it succeeded
+
+    :param run_id: sequencing run the samples were uploaded to
+    :return: None
+    """
+    messaging.send_message(messaging.ApiMessage(messaging.MessageTopics.run_upload_finished_topic, run_id=run_id))
+
+
+def _send_planned_samples(api_instance, upload_plan, run_id, upload_threads):
+    """
+    Uploads the files of each sample in the upload plan
+
+    With more than one upload thread, samples are started in plan order as threads become free
+
+    :param api_instance: ApiCalls instance
+    :param upload_plan: list of (project, sample) tuples from upload_planner.plan_sample_uploads
+    :param run_id: sequencing run to upload the files to
+    :param upload_threads: number of samples to upload at the same time
+    :return: None
+    """
+    def _send_sample(project, sample):
+        logging.info("Uploading to Sample {} on Project {}".format(sample.sample_name, project.id))
+        # upload files
+        api_instance.send_sequence_files(sequence_file=sample.sequence_file,
+                                         sample_name=sample.sample_name,
+                                         project_id=project.id,
+                                         upload_id=run_id)
+
+    if upload_threads <= 1:
+        for project, sample in upload_plan:
+            _send_sample(project, sample)
+        return
+
+    with ThreadPoolExecutor(max_workers=upload_threads) as executor:
+        futures = [executor.submit(messaging.run_context.bind(_send_sample), project, sample)
+                   for project, sample in upload_plan]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except Exception:
+            # Samples that have not started yet are not uploaded once one sample fails
+            for future in futures:
+                future.cancel()
+            raise
 
 
 def send_project(project):
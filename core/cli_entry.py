@@ -1,22 +1,40 @@
 import os
 import logging
+import queue
+import socket
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 from pprint import pformat
 
 import api
+import config
+import messaging
 import parsers
 import global_settings
 import progress
 import os
 from model import DirectoryStatus
 
-from . import api_handler, parsing_handler, logger
+from . import api_handler, integrity_check, parsing_handler, logger, metrics, performance_report, profiling, \
+    run_watcher, timing, upload_planner, upload_queue
 
 EXIT_CODE_ERROR = 1
 EXIT_CODE_SUCCESS = 0
 
+# Default number of runs uploaded at the same time in batch mode
+DEFAULT_BATCH_PARALLEL_RUNS = 2
+# Seconds between checks for new runs in the upload queue
+DEFAULT_QUEUE_POLL_INTERVAL = 10
+# Longest wait between attempts to connect to IRIDA while it cannot be reached
+MAX_CONNECTION_RETRY_DELAY = 300
+# Times a queued run is tried before a lost connection sets it to error instead of giving it back to the queue
+MAX_QUEUE_ATTEMPTS = 5
+
 
-def validate_and_upload_single_entry(directory, force_upload=False):
+@metrics.record_run_result
+def validate_and_upload_single_entry(directory, force_upload=False, retry_connection_errors=False):
     """
     This function acts as a single point of entry for uploading a directory
 
@@ -28,10 +46,20 @@ def validate_and_upload_single_entry(directory, force_upload=False):
 
     :param directory: Directory of the sequencing run to upload
     :param force_upload: When set to true, the upload status file will be ignored and file will attempt to be uploaded
+    :param retry_connection_errors: When set to true, losing the connection to IRIDA raises the IridaConnectionError
+        and leaves the run's status as it is, so the run can be tried again
     :return:
     """
     logging_start_block(directory)
     logging.debug("validate_and_upload_single_entry:Starting {}".format(directory))
+    timer = timing.PhaseTimer()
+    # The api instance can be reused from an earlier upload of this run, only the requests of this upload are
+    # summarized. Requests are counted for the run the thread making them works on, so runs uploaded at the same
+    # time are summarized apart
+    api_handler.clear_run_http_stats(directory)
+
+    # Files in the run may have changed since it was last looked at, so read the directories fresh for this run
+    progress.directory_index.get_directory_index().invalidate(directory)
 
     directory_status = parsing_handler.get_run_status(directory)
     # Check if a run is invalid, an invalid run cannot be uploaded.
@@ -53,12 +81,18 @@ def validate_and_upload_single_entry(directory, force_upload=False):
     # Add progress file to directory
     try:
         directory_status.status = DirectoryStatus.PARTIAL
+        # a message from an earlier attempt no longer applies
+        directory_status.message = None
         progress.write_directory_status(directory_status)
     except progress.exceptions.DirectoryError as e:
         logging.error("ERROR! Error while trying to write status file to directory {} with error message: {}"
                       "".format(e.directory, e.message))
         logging.info("Samples not uploaded!")
         return exit_error()
+    timer.lap("checking run status")
+
+    # Connect to IRIDA in the background while the run is parsed, the connection is waited for below
+    api_warm_up = api_handler.start_api_warm_up(timer)
 
     # Do parsing (Also offline validation)
     try:
@@ -78,69 +112,519 @@ def validate_and_upload_single_entry(directory, force_upload=False):
         directory_status.status = DirectoryStatus.ERROR
         progress.write_directory_status(directory_status)
         return exit_error()
+    timer.lap("parsing and offline validation")
+    profiling.record_run(directory, sequencing_run)
+
+    # Find corrupt sequence files before any of the run is sent to IRIDA
+    if config.read_config_option("check_gzip_integrity", bool, False):
+        logging.info("*** Checking sequence file integrity ***")
+        validation_result = integrity_check.check_sequencing_run(sequencing_run, directory)
+        if not validation_result.is_valid():
+            return _exit_validation_error(directory_status, validation_result)
+        timer.lap("integrity check")
 
     # Initialize the api for first use
     logging.info("*** Connecting to IRIDA ***")
     try:
+        api_warm_up.join()
         api_handler.initialize_api_from_config()
     except api.exceptions.IridaConnectionError as e:
         logging.error("ERROR! Could not initialize irida api.")
         logging.error("Errors: " + pformat(e.args))
         logging.info("Samples not uploaded!")
-        directory_status.status = DirectoryStatus.ERROR
-        progress.write_directory_status(directory_status)
-        return exit_error()
+        return _exit_connection_error(directory_status, e, retry_connection_errors)
     logging.info("*** Connected ***")
+    timer.lap("waiting for connection to IRIDA", waits_for_background=True)
 
-    logging.info("*** Verifying run (online validation) ***")
-    try:
-        validation_result = api_handler.prepare_and_validate_for_upload(sequencing_run)
-    except api.exceptions.IridaConnectionError as e:
-        logging.error("Lost connection to Irida")
-        logging.error("Errors: " + pformat(e.args))
-        directory_status.status = DirectoryStatus.ERROR
-        progress.write_directory_status(directory_status)
-        return exit_error()
+    # Check IRIDA for a run with the same data that has already been uploaded
+    duplicate_run_id = api_handler.find_duplicate_run(sequencing_run)
+    if duplicate_run_id is not None:
+        if not force_upload:
+            logging.error("ERROR! The run in directory {} has already been uploaded to IRIDA as sequencing run {}. "
+                          "You can bypass this error by uploading with the --force argument."
+                          "".format(directory, duplicate_run_id))
+            logging.info("Samples not uploaded!")
+            directory_status.status = DirectoryStatus.ERROR
+            directory_status.message = "Duplicate of sequencing run {}".format(duplicate_run_id)
+            progress.write_directory_status(directory_status)
+            return exit_error()
+        logging.warning("The run in directory {} has already been uploaded to IRIDA as sequencing run {}, "
+                        "uploading again because of the --force argument".format(directory, duplicate_run_id))
+    timer.lap("checking for duplicate runs")
 
-    if not validation_result.is_valid():
-        logging.error("Sequencing run can not be uploaded")
-        logging.error("Sequencing run can not be uploaded. Encountered {} errors"
-                      "".format(validation_result.error_count()))
-        logging.error("Errors: " + pformat(validation_result.error_list))
-        directory_status.status = DirectoryStatus.ERROR
-        progress.write_directory_status(directory_status)
-        return exit_error()
-    logging.info("*** Run Verified ***")
+    # Samples that were made ready on IRIDA the last time this run was uploaded are not checked again
+    upload_plan = api_handler.load_upload_plan(directory)
 
-    # Start upload
-    logging.info("*** Starting Upload ***")
-    try:
-        run_id = api_handler.upload_sequencing_run(sequencing_run)
-    except api.exceptions.IridaConnectionError as e:
-        logging.error("Lost connection to Irida")
-        logging.error("Errors: " + pformat(e.args))
-        directory_status.status = DirectoryStatus.ERROR
-        progress.write_directory_status(directory_status)
-        return exit_error()
+    if config.read_config_option("pipelined_upload", bool, False):
+        # Each sample starts uploading as soon as it is verified, while the following samples are verified
+        logging.info("*** Verifying run (online validation) and Starting Upload ***")
+        try:
+            validation_result, run_id = api_handler.prepare_and_upload_sequencing_run(sequencing_run, upload_plan)
+        except api.exceptions.IridaConnectionError as e:
+            logging.error("Lost connection to Irida")
+            logging.error("Errors: " + pformat(e.args))
+            return _exit_connection_error(directory_status, e, retry_connection_errors)
+        if not validation_result.is_valid():
+            return _exit_validation_error(directory_status, validation_result)
+        logging.info("*** Run Verified ***")
+        if upload_plan is None:
+            api_handler.store_upload_plan(directory, sequencing_run)
+        upload_seconds = timer.lap("online validation and upload")
+    else:
+        logging.info("*** Verifying run (online validation) ***")
+        try:
+            validation_result = api_handler.prepare_and_validate_for_upload(sequencing_run, upload_plan)
+        except api.exceptions.IridaConnectionError as e:
+            logging.error("Lost connection to Irida")
+            logging.error("Errors: " + pformat(e.args))
+            return _exit_connection_error(directory_status, e, retry_connection_errors)
+
+        if not validation_result.is_valid():
+            return _exit_validation_error(directory_status, validation_result)
+        logging.info("*** Run Verified ***")
+        if upload_plan is None:
+            upload_plan = api_handler.store_upload_plan(directory, sequencing_run)
+        timer.lap("online validation")
+
+        # Start upload
+        logging.info("*** Starting Upload ***")
+        try:
+            run_id = api_handler.upload_sequencing_run(sequencing_run, upload_plan)
+        except api.exceptions.IridaConnectionError as e:
+            logging.error("Lost connection to Irida")
+            logging.error("Errors: " + pformat(e.args))
+            return _exit_connection_error(directory_status, e, retry_connection_errors)
+        upload_seconds = timer.lap("upload")
     logging.info("*** Upload Complete ***")
 
+    report = _build_performance_report(directory, sequencing_run, run_id, timer, upload_seconds)
+
     # Set progress file to complete
     try:
         directory_status.status = DirectoryStatus.COMPLETE
-        progress.write_directory_status(directory_status, run_id=run_id)
+        progress.write_directory_status(directory_status, run_id=run_id, performance_report=report)
     except progress.exceptions.DirectoryError as e:
         # this is an exceptionally rare case (successful upload, but fails to write progress)
         logging.ERROR("ERROR! Error while trying to write status file to directory {} with error message: {}"
                       "".format(e.directory, e.message))
         logging.info("Samples were uploaded, but progress file may be incorrect!")
 
+    if report is not None:
+        performance_report.write_report(directory, report)
+
     logging.info("Samples in directory '{}' have finished uploading!".format(directory))
+    timer.log_summary()
+    api_handler.log_http_metrics(directory)
 
     logging_end_block()
 
     return exit_success()
 
 
+def _build_performance_report(directory, sequencing_run, run_id, timer, upload_seconds):
+    """
+    Builds the performance report of an upload that has completed
+
+    The run has been uploaded by the time the report is made, so a report that cannot be made is logged
+    rather than failing the upload
+
+    :param directory: run directory
+    :param sequencing_run: SequencingRun that was uploaded
+    :param run_id: sequencing run id on IRIDA
+    :param timer: PhaseTimer of the upload
+    :param upload_seconds: seconds spent sending the run
+    :return: report dict, None if it could not be made
+    """
+    try:
+        return performance_report.build_report(directory, sequencing_run, run_id, timer, upload_seconds,
+                                               api_handler.get_run_http_stats(directory),
+                                               messaging.get_run_progress(run_id))
+    except Exception as e:
+        logging.warning("Could not make the performance report of the upload: {}".format(e))
+        return None
+
+
+def _exit_validation_error(directory_status, validation_result):
+    """
+    Logs the errors from validating the run, and sets the run to error
+
+    :param directory_status: DirectoryStatus of the run
+    :param validation_result: ValidationResult that is not valid
+    :return: exit code
+    """
+    logging.error("Sequencing run can not be uploaded")
+    logging.error("Sequencing run can not be uploaded. Encountered {} errors"
+                  "".format(validation_result.error_count()))
+    logging.error("Errors: " + pformat(validation_result.error_list))
+    directory_status.status = DirectoryStatus.ERROR
+    progress.write_directory_status(directory_status)
+    return exit_error()
+
+
+def _exit_connection_error(directory_status, error, retry_connection_errors):
+    """
+    Sets the run to error after the connection to IRIDA was lost, unless it will be tried again
+
+    :param directory_status: DirectoryStatus of the run
+    :param error: the IridaConnectionError
+    :param retry_connection_errors: when True the error is raised again and the run's status is left as it is
+    :return: exit code
+    """
+    if retry_connection_errors:
+        logging.info("The run will be uploaded again")
+        logging_end_block()
+        raise error
+    directory_status.status = DirectoryStatus.ERROR
+    progress.write_directory_status(directory_status)
+    return exit_error()
+
+
+def _upload_isolated(directory, force_upload=False, retry_connection_errors=False):
+    """
+    Uploads a run for the modes that upload many runs, so an unexpected error in one run
+    does not stop the following runs from being uploaded
+
+    :param directory: Directory of the sequencing run to upload
+    :param force_upload: passed to validate_and_upload_single_entry
+    :param retry_connection_errors: passed to validate_and_upload_single_entry, an IridaConnectionError is raised
+    :return: exit code
+    """
+    try:
+        return validate_and_upload_single_entry(directory, force_upload, retry_connection_errors)
+    except Exception as e:
+        if retry_connection_errors and isinstance(e, api.exceptions.IridaConnectionError):
+            logger.remove_directory_logger()
+            raise
+        logging.exception("Unexpected error while uploading run in directory {}: {}".format(directory, e))
+        logger.remove_directory_logger()
+        return EXIT_CODE_ERROR
+
+
+def report_run_statuses(directory):
+    """
+    Prints the status of every run directory inside the given directory
+
+    Statuses are answered from the run index, only directories that changed since they were last
+    checked have their status files read
+
+    :param directory: Directory containing sequencing run directories
+    :return: exit code
+    """
+    parser_instance = parsing_handler.get_parser_from_config()
+    try:
+        run_list = parser_instance.find_runs(directory)
+    except parsers.exceptions.DirectoryError as e:
+        logging.error("ERROR! An error occurred with directory '{}', with message: {}".format(e.directory, e.message))
+        return EXIT_CODE_ERROR
+
+    status_counts = {}
+    for run in sorted(run_list, key=lambda r: r.directory):
+        status_counts[run.status] = status_counts.get(run.status, 0) + 1
+        print("{:<9} {:<8} {}{}".format(run.status,
+                                         run.run_id or "-",
+                                         run.directory,
+                                         " ({})".format(run.message) if run.message else ""))
+
+    print("Found {} run directories: {}".format(
+        len(run_list), ", ".join("{} {}".format(count, status) for status, count in sorted(status_counts.items()))))
+    return EXIT_CODE_SUCCESS
+
+
+def report_upload_performance(directory):
+    """
+    Prints the performance of the uploads of every run directory inside the given directory, combined
+    by the site the runs were uploaded from and the parser that read them
+
+    :param directory: a run directory, or a directory containing sequencing run directories
+    :return: exit code
+    """
+    report_list = performance_report.find_reports(directory)
+    if not report_list:
+        print("No performance reports found in {}".format(directory))
+        return EXIT_CODE_ERROR
+    performance_report.print_summary(performance_report.aggregate_reports(report_list))
+    print("Found {} performance reports".format(len(report_list)))
+    return EXIT_CODE_SUCCESS
+
+
+def batch_upload(directory, parallel_runs=None, upload_order=None):
+    """
+    Finds every new run in a directory, and uploads several runs at the same time
+
+    All runs share a single api instance, so the 'max_connections' config option limits the number of
+    connections to IRIDA across every run being uploaded. Runs are started in the order set by the
+    'upload_order' config option. A summary of every run is logged at the end.
+
+    :param directory: Directory containing sequencing run directories
+    :param parallel_runs: number of runs to upload at the same time,
+        defaults to the 'batch_parallel_runs' config option
+    :param upload_order: order to start the runs in, one of upload_planner.UPLOAD_ORDER_LIST,
+        defaults to the 'upload_order' config option
+    :return: exit code, an error if any run failed to upload
+    """
+    if parallel_runs is None:
+        parallel_runs = config.read_config_option("batch_parallel_runs", int, DEFAULT_BATCH_PARALLEL_RUNS)
+    if upload_order is None:
+        upload_order = config.read_config_option("upload_order", default_value=upload_planner.DEFAULT_UPLOAD_ORDER)
+
+    parser_instance = parsing_handler.get_parser_from_config()
+    try:
+        run_list = parser_instance.find_runs(directory)
+    except parsers.exceptions.DirectoryError as e:
+        logging.error("ERROR! An error occurred with directory '{}', with message: {}".format(e.directory, e.message))
+        return EXIT_CODE_ERROR
+
+    new_run_list = sorted(run.directory for run in run_list if run.status_equals(DirectoryStatus.NEW))
+    new_run_list = upload_planner.plan_run_uploads(new_run_list, upload_order)
+    logging.info("Found {} new runs to upload in {}".format(len(new_run_list), directory))
+    if not new_run_list:
+        return EXIT_CODE_SUCCESS
+
+    # Connect once up front, every run reuses this api instance
+    try:
+        api_handler.initialize_api_from_config()
+    except api.exceptions.IridaConnectionError as e:
+        logging.error("ERROR! Could not initialize irida api.")
+        logging.error("Errors: " + pformat(e.args))
+        logging.info("Samples not uploaded!")
+        return EXIT_CODE_ERROR
+
+    def _upload(run_directory):
+        start_time = time.time()
+        exit_code = _upload_isolated(run_directory)
+        return exit_code, time.time() - start_time
+
+    start_time = time.time()
+    result_dict = {}
+    with ThreadPoolExecutor(max_workers=min(parallel_runs, len(new_run_list))) as executor:
+        futures = {executor.submit(_upload, run_directory): run_directory for run_directory in new_run_list}
+        # runs that have not started are queued
+        metrics.get_uploader_metrics().set_queued_runs_function(
+            lambda: len([future for future in futures if not future.running() and not future.done()]))
+        try:
+            for future in as_completed(futures):
+                result_dict[futures[future]] = future.result()
+        finally:
+            metrics.get_uploader_metrics().set_queued_runs_function(None)
+
+    failed_count = len([r for r in result_dict.values() if r[0] != EXIT_CODE_SUCCESS])
+    logging.info("==================================================")
+    logging.info("-------------------BATCH SUMMARY------------------")
+    for run_directory in new_run_list:
+        exit_code, run_time = result_dict[run_directory]
+        logging.info("{:<8} {:>8.1f}s {}".format("UPLOADED" if exit_code == EXIT_CODE_SUCCESS else "FAILED",
+                                                 run_time, run_directory))
+    logging.info("{} of {} runs uploaded in {:.1f}s".format(
+        len(new_run_list) - failed_count, len(new_run_list), time.time() - start_time))
+    logging.info("==================================================")
+
+    if failed_count:
+        return EXIT_CODE_ERROR
+    return EXIT_CODE_SUCCESS
+
+
+def watch_and_upload(directory_list, poll_interval=None, settle_time=None):
+    """
+    Watches directories for new sequencing runs, and uploads each run as soon as it is ready
+
+    Runs are uploaded one at a time from a queue, while the directories keep being watched in the background.
+    The api instance is reused between uploads, and its session is kept alive while waiting for runs.
+    Runs until interrupted.
+
+    :param directory_list: list of directories that sequencing runs are written to
+    :param poll_interval: seconds between scans, defaults to the 'watch_poll_interval' config option
+    :param settle_time: seconds a run must be unchanged before it is uploaded,
+        defaults to the 'watch_settle_time' config option
+    :return: exit code
+    """
+    if poll_interval is None:
+        poll_interval = config.read_config_option("watch_poll_interval", int, run_watcher.DEFAULT_POLL_INTERVAL)
+    if settle_time is None:
+        settle_time = config.read_config_option("watch_settle_time", int, run_watcher.DEFAULT_SETTLE_TIME)
+
+    ready_queue = queue.Queue()
+    watcher = run_watcher.RunWatcher(directory_list=directory_list,
+                                     parser=parsing_handler.get_parser_from_config(),
+                                     upload_queue=ready_queue,
+                                     poll_interval=poll_interval,
+                                     settle_time=settle_time)
+    watcher.start()
+    metrics.get_uploader_metrics().set_queued_runs_function(ready_queue.qsize)
+    try:
+        while True:
+            try:
+                directory = ready_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                api_handler.keep_api_session_alive()
+                continue
+            try:
+                _upload_isolated(directory)
+            finally:
+                watcher.upload_finished(directory)
+    except KeyboardInterrupt:
+        logging.info("Stopped watching for new runs")
+    finally:
+        metrics.get_uploader_metrics().set_queued_runs_function(None)
+        watcher.stop()
+
+    return EXIT_CODE_SUCCESS
+
+
+def enqueue_run(directory, priority_class=upload_queue.DEFAULT_PRIORITY_CLASS):
+    """
+    Parses and validates a run offline, and adds it to the upload queue to be uploaded by a worker
+
+    IRIDA is not contacted, so runs can be queued while IRIDA cannot be reached
+
+    :param directory: Directory of the sequencing run to queue
+    :param priority_class: priority class of the run, one of upload_queue.PRIORITY_CLASSES
+    :return: exit code
+    """
+    directory_status = parsing_handler.get_run_status(directory)
+    if directory_status.status_equals(DirectoryStatus.INVALID):
+        logging.error("ERROR! Run in directory {} is invalid. Returned with message: '{}'"
+                      "".format(directory_status.directory, directory_status.message))
+        return EXIT_CODE_ERROR
+    if not directory_status.status_equals(DirectoryStatus.NEW):
+        logging.error("ERROR! Run in directory {} is not new, it will not be queued.".format(directory))
+        return EXIT_CODE_ERROR
+
+    try:
+        parsing_handler.parse_and_validate(directory)
+    except parsers.exceptions.DirectoryError as e:
+        logging.error("ERROR! An error occurred with directory '{}', with message: {}".format(e.directory, e.message))
+        logging.info("Run not queued!")
+        return EXIT_CODE_ERROR
+    except parsers.exceptions.ValidationError as e:
+        logging.error("ERROR! Errors occurred during validation with message: {}".format(e.message))
+        logging.error("Error list: " + pformat(e.validation_result.error_list))
+        logging.info("Run not queued!")
+        return EXIT_CODE_ERROR
+
+    upload_queue.get_upload_queue().enqueue(directory, priority_class)
+    logging.info("Run in directory {} added to the upload queue with priority '{}'".format(directory, priority_class))
+    return EXIT_CODE_SUCCESS
+
+
+def _upload_queued_run(queued_run):
+    """
+    Uploads a run taken from the upload queue
+
+    A run that is tried again after an outage or a crashed worker has been left in a partial or error state,
+    so it is uploaded with force. A run that was already completed is not uploaded again.
+
+    Until the run has been tried MAX_QUEUE_ATTEMPTS times, losing the connection to IRIDA raises an
+    IridaConnectionError so the run can be given back to the queue.
+
+    :param queued_run: QueuedRun from the upload queue
+    :return: exit code
+    """
+    force_upload = False
+    if queued_run.attempts > 1:
+        directory_status = parsing_handler.get_run_status(queued_run.directory)
+        if directory_status.status_equals(DirectoryStatus.COMPLETE):
+            logging.info("Run in directory {} has already been uploaded".format(queued_run.directory))
+            return EXIT_CODE_SUCCESS
+        force_upload = (directory_status.status_equals(DirectoryStatus.PARTIAL) or
+                        directory_status.status_equals(DirectoryStatus.ERROR))
+    return _upload_isolated(queued_run.directory, force_upload,
+                            retry_connection_errors=queued_run.attempts < MAX_QUEUE_ATTEMPTS)
+
+
+def work_upload_queue(parallel_runs=None, poll_interval=DEFAULT_QUEUE_POLL_INTERVAL, stop_when_empty=False):
+    """
+    Uploads the runs in the upload queue, several runs at a time, until interrupted
+
+    While IRIDA cannot be reached, runs are left in the queue and the connection is checked again with an
+    increasing delay. Once IRIDA can be reached, the queue is drained with every upload slot in use.
+    A run that fails because the connection was lost is given back to the queue to be tried again, up to
+    MAX_QUEUE_ATTEMPTS times. When the worker is stopped, the runs being uploaded are stopped and given back to
+    the queue.
+
+    :param parallel_runs: number of runs to upload at the same time,
+        defaults to the 'batch_parallel_runs' config option
+    :param poll_interval: seconds between checks for new runs in the queue
+    :param stop_when_empty: stop once there are no runs that can be uploaded, instead of waiting for more
+    :return: exit code
+    """
+    if parallel_runs is None:
+        parallel_runs = config.read_config_option("batch_parallel_runs", int, DEFAULT_BATCH_PARALLEL_RUNS)
+
+    queue_instance = upload_queue.get_upload_queue()
+    owner = "{}:{}".format(socket.gethostname(), os.getpid())
+    lease_time = upload_queue.DEFAULT_LEASE_TIME
+    logging.info("Starting upload queue worker {} with {} runs in the queue".format(owner, len(queue_instance)))
+
+    active = {}  # future -> QueuedRun
+    online = False
+    next_connection_check = 0
+    connection_retry_delay = poll_interval
+    executor = ThreadPoolExecutor(max_workers=parallel_runs)
+    # runs being uploaded are still in the queue until they are completed
+    metrics.get_uploader_metrics().set_queued_runs_function(lambda: max(0, len(queue_instance) - len(active)))
+    try:
+        while True:
+            for future in [f for f in active if f.done()]:
+                queued_run = active.pop(future)
+                try:
+                    exit_code = future.result()
+                except api.exceptions.IridaConnectionError:
+                    logging.warning("Lost connection to IRIDA, run in directory {} will be uploaded again "
+                                    "(attempt {} of {})".format(queued_run.directory, queued_run.attempts,
+                                                                MAX_QUEUE_ATTEMPTS))
+                    queue_instance.release(queued_run, error="Could not connect to IRIDA")
+                    online = False
+                    continue
+                if exit_code != EXIT_CODE_SUCCESS:
+                    # The run failed for a reason retrying will not fix, its status file has the details
+                    logging.error("Run in directory {} could not be uploaded".format(queued_run.directory))
+                queue_instance.complete(queued_run)
+
+            # Keep the leases of the runs being uploaded so no other worker takes them
+            for queued_run in active.values():
+                queue_instance.renew(queued_run, lease_time)
+
+            if len(active) < parallel_runs and not online and time.time() >= next_connection_check:
+                online = api_handler.check_api_connection()
+                if online:
+                    logging.info("Connected to IRIDA, uploading queued runs")
+                    connection_retry_delay = poll_interval
+                else:
+                    logging.warning("IRIDA cannot be reached, {} runs are waiting in the queue. Trying again in {}s"
+                                    "".format(len(queue_instance), connection_retry_delay))
+                    next_connection_check = time.time() + connection_retry_delay
+                    connection_retry_delay = min(connection_retry_delay * 2, MAX_CONNECTION_RETRY_DELAY)
+
+            while online and len(active) < parallel_runs:
+                queued_run = queue_instance.lease(owner, lease_time)
+                if queued_run is None:
+                    break
+                logging.info("Uploading queued run in directory {} (priority '{}', attempt {})".format(
+                    queued_run.directory, queued_run.priority_class, queued_run.attempts))
+                active[executor.submit(_upload_queued_run, queued_run)] = queued_run
+
+            if not active:
+                if stop_when_empty:
+                    break
+                time.sleep(poll_interval)
+            else:
+                wait(list(active), timeout=min(poll_interval, lease_time / 3), return_when=FIRST_COMPLETED)
+    except KeyboardInterrupt:
+        logging.info("Stopped upload queue worker")
+    finally:
+        metrics.get_uploader_metrics().set_queued_runs_function(None)
+        if active:
+            # The upload threads would keep the process running, so their uploads are stopped and waited for
+            logging.info("Stopping {} runs that are uploading".format(len(active)))
+            api_handler.stop_uploads()
+        executor.shutdown(wait=True)
+        # Stopped runs are given back to the queue, so the next worker uploads them again
+        for queued_run in active.values():
+            queue_instance.release(queued_run, error="Upload worker stopped")
+
+    return EXIT_CODE_SUCCESS
+
+
 def exit_error():
     """
     Returns an failed run exit code which ends the process when returned
@@ -166,6 +650,8 @@ def logging_start_block(directory):
     """
     if os.access(os.path.join(directory, 'irida-uploader.log'), os.W_OK):
         logger.add_log_to_directory(directory)
+    # the thread works on the run even when the run has no log file, so the run's requests are counted for it
+    messaging.run_context.set_run_directory(directory)
     logging.info("==================================================")
     logging.info("---------------STARTING UPLOAD RUN----------------")
     logging.info("Uploader Version {}".format(global_settings.UPLOADER_VERSION))
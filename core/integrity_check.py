@@ -0,0 +1,135 @@
+"""
+This file handles checking that the compressed sequence files of a run are intact before they are uploaded
+
+A gzip file that was truncated or corrupted while being copied still starts with the gzip magic bytes, so it
+passes the checks done while parsing, and the problem is only found by whoever analyses the file on IRIDA.
+Each .gz file is fully decompressed, which checks the CRC and length stored at the end of every gzip member.
+Decompressing is limited by the CPU, so the files are checked in a process pool sized to the available cores.
+
+The results are kept in the status file of the run, keyed by the size and modification time of each file,
+so a file is never decompressed again while it is unchanged.
+"""
+
+import gzip
+import logging
+import os
+import zlib
+
+from concurrent.futures import ProcessPoolExecutor
+
+import model
+import progress
+from parsers import exceptions
+
+# Bytes decompressed at a time, the decompressed data is thrown away
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def get_worker_count():
+    """
+    :return: number of cores this process is allowed to run on
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on every platform
+        return os.cpu_count() or 1
+
+
+def _check_gzip_file(file_path):
+    """
+    Decompresses a whole gzip file, which checks the CRC and length of every gzip member
+
+    Module level so it can be sent to the process pool
+
+    :param file_path: path of the gzip file
+    :return: None if the file is intact, otherwise a message describing the problem
+    """
+    try:
+        with gzip.open(file_path, "rb") as gzip_file:
+            while gzip_file.read(READ_CHUNK_SIZE):
+                pass
+    except (OSError, EOFError, zlib.error) as e:
+        return str(e) or type(e).__name__
+    return None
+
+
+def _get_file_key(file_path):
+    """
+    :param file_path: path of the file
+    :return: dict of the size and modification time of the file, None if the file cannot be found
+    """
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return None
+    return {"size": file_stat.st_size, "mtime": file_stat.st_mtime_ns}
+
+
+def check_sequencing_run(sequencing_run, directory, max_workers=None):
+    """
+    Checks that every gzip sequence file in a run can be fully decompressed
+
+    Results are read from and written to the status file in the run directory, files with the same
+    size and modification time as when they were last checked are not checked again.
+    Uncompressed files have no checksum to check, so they are skipped.
+
+    :param sequencing_run: SequencingRun to check
+    :param directory: run directory, where the status file is kept
+    :param max_workers: number of files to check at the same time, defaults to the number of available cores
+    :return: ValidationResult with a SequenceFileError for each file that is not intact
+    """
+    if max_workers is None:
+        max_workers = get_worker_count()
+
+    file_list = []
+    file_set = set()
+    for project in sequencing_run.project_list:
+        for sample in project.sample_list:
+            for file_path in sample.sequence_file.file_list:
+                if file_path.endswith(".gz") and file_path not in file_set:
+                    file_set.add(file_path)
+                    file_list.append(file_path)
+
+    checked_files = progress.read_checked_files(directory)
+    result_dict = {}
+    unchecked_list = []
+    # file path -> size and modification time before the file was checked
+    file_key_dict = {}
+    for file_path in file_list:
+        file_key = _get_file_key(file_path)
+        file_key_dict[file_path] = file_key
+        previous = checked_files.get(file_path)
+        if file_key is not None and previous is not None \
+                and previous.get("size") == file_key["size"] and previous.get("mtime") == file_key["mtime"]:
+            result_dict[file_path] = previous.get("error")
+        else:
+            unchecked_list.append(file_path)
+
+    logging.info("Checking {} compressed sequence files, {} were already checked"
+                 "".format(len(unchecked_list), len(file_list) - len(unchecked_list)))
+    if len(unchecked_list) == 1 or max_workers == 1:
+        error_list = [_check_gzip_file(file_path) for file_path in unchecked_list]
+    elif unchecked_list:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(unchecked_list))) as executor:
+            error_list = list(executor.map(_check_gzip_file, unchecked_list))
+    else:
+        error_list = []
+
+    for file_path, error in zip(unchecked_list, error_list):
+        result_dict[file_path] = error
+        # Only keep the result if the file did not change while it was being checked
+        file_key = _get_file_key(file_path)
+        if file_key is not None and file_key == file_key_dict[file_path]:
+            file_key["error"] = error
+            checked_files[file_path] = file_key
+
+    if unchecked_list and not progress.write_checked_files(directory, checked_files):
+        logging.warning("Could not save sequence file integrity results to the status file in {}".format(directory))
+
+    validation_result = model.ValidationResult()
+    for file_path in file_list:
+        error = result_dict[file_path]
+        if error is not None:
+            validation_result.add_error(exceptions.SequenceFileError(
+                "The file {} is corrupt and cannot be uploaded: {}".format(file_path, error)))
+    return validation_result
@@ -3,6 +3,7 @@ import os
 import logging.handlers
 
 import global_settings
+import messaging
 
 
 # Normal base logging directory name
@@ -47,44 +48,65 @@ root_logger.addHandler(console)
 
 global_settings.log_file = user_log_dir(log_directory_name)
 
-# manages the logging directory
-# only one directory can have a logger at a time
-directory_logger = None
+# manages the logging directories
+# each run can have one directory logger at a time, so runs uploaded at the same time each log to their own
+# directory. Maps the run directory to the logging handler
+directory_logger = {}
+
+
+class _RunFilter(logging.Filter):
+    """
+    Only lets through the log records made while working on one run, from any of the run's threads
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        self._directory = directory
+
+    def filter(self, record):
+        # filters are called on the thread that made the record
+        return messaging.run_context.get_run_directory() == self._directory
 
 
 def add_log_to_directory(directory):
     """
     Starts up a logging handler that creates a log file in the directory being uploaded
 
+    The current thread works on the run in the directory from now on, and only messages logged while working on
+    the run are written to the directory, including those from threads started with messaging.run_context.bind()
+
     :param directory: directory to create a logger in
     :return: None
     """
-    global directory_logger
-
-    # If there is already a directory logger in place, throw an exception
-    if directory_logger:
+    # If there is already a directory logger in place for this thread or run, throw an exception
+    if messaging.run_context.get_run_directory() in directory_logger or directory in directory_logger:
         logging.error("A directory logger already exists!")
         raise Exception("ERROR:add_log_to_directory: A directory logger already exists!")
 
     logging.info("Adding log file to {}".format(directory))
     log_file = os.path.join(directory, 'irida-uploader.log')
-    directory_logger = logging.handlers.RotatingFileHandler(
+    handler = logging.handlers.RotatingFileHandler(
         filename=log_file,
         maxBytes=(1024 * 1024 * 1024 * 10),  # 10GB max file size
         backupCount=100,
     )
-    directory_logger.setLevel(logging.INFO)
-    directory_logger.setFormatter(log_format)
-    root_logger.addHandler(directory_logger)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(log_format)
+    handler.addFilter(_RunFilter(directory))
+    messaging.run_context.set_run_directory(directory)
+    directory_logger[directory] = handler
+    root_logger.addHandler(handler)
 
 
 def remove_directory_logger():
     """
-    Deletes the existing directory logger so logging stops
+    Deletes the directory logger of the current thread's run so logging stops
 
     :return: None
     """
-    global directory_logger
-    root_logger.removeHandler(directory_logger)
-    directory_logger = None
+    handler = directory_logger.pop(messaging.run_context.get_run_directory(), None)
+    messaging.run_context.set_run_directory(None)
+    if handler is not None:
+        root_logger.removeHandler(handler)
+        handler.close()
     logging.info("Stopped active logging to run directory")
@@ -0,0 +1,352 @@
+"""
+This file serves metrics about the uploader over HTTP in the Prometheus text format, so a long running uploader
+(--watch, --batch or --worker) can be monitored and alerted on, for example when its throughput drops to zero
+
+The metrics are fed by the points the uploader already reports from: the upload messages published on the
+message bus while runs and files are sent, the result of each run upload, and the request stats kept by the
+api instance. The endpoint is off unless the 'metrics_port' config option is set.
+"""
+
+import functools
+import logging
+import socketserver
+import threading
+import time
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import config
+import messaging
+from api.http_metrics import LATENCY_BUCKETS
+from . import api_handler
+
+# Address the metrics endpoint listens on, only this computer can reach it unless this is changed
+DEFAULT_METRICS_ADDRESS = "127.0.0.1"
+# Seconds over which the current throughput is measured
+THROUGHPUT_WINDOW = 30
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Prefix of every metric name
+METRIC_PREFIX = "irida_uploader_"
+
+_uploader_metrics_instance = None
+_uploader_metrics_lock = threading.Lock()
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_bucket_bound(upper_bound):
+    return "+Inf" if upper_bound == float("inf") else "{:g}".format(upper_bound)
+
+
+class UploaderMetrics(object):
+    """
+    Counts the runs, files and bytes uploaded, from the upload messages and the result of each run
+
+    Used as a message bus subscriber, messages arrive on the subscription's thread while the metrics are read
+    by the HTTP server's threads
+    """
+
+    topic_list = [messaging.MessageTopics.run_upload_started_topic,
+                  messaging.MessageTopics.run_upload_finished_topic,
+                  messaging.MessageTopics.upload_progress_topic,
+                  messaging.MessageTopics.upload_completed_topic,
+                  messaging.MessageTopics.upload_failed_topic]
+
+    def __init__(self, now=None):
+        """
+        :param now: time.monotonic() the metrics start from, defaults to now
+        """
+        self._lock = threading.Lock()
+        self._active_run_set = set()
+        # result ('complete' or 'error') -> number of runs
+        self._run_result_dict = {"complete": 0, "error": 0}
+        # result ('completed' or 'failed') -> number of files
+        self._file_result_dict = {"completed": 0, "failed": 0}
+        self._bytes_uploaded = 0
+        # (run id, project id, sample name, file name) -> bytes of the file sent so far, for the files being sent
+        self._file_bytes_dict = {}
+        # (time.monotonic(), bytes uploaded) points, the first is from before the throughput window
+        self._byte_history = deque([(time.monotonic() if now is None else now, 0)])
+        self._queued_runs_function = None
+
+    @property
+    def bytes_uploaded(self):
+        return self._bytes_uploaded
+
+    def __call__(self, message, now=None):
+        now = time.monotonic() if now is None else now
+        topic = message.topic
+        file_key = (message.run_id, message.project_id, message.sample_name, message.sequence_file_name)
+        with self._lock:
+            if topic == messaging.MessageTopics.run_upload_started_topic:
+                self._active_run_set.add(message.run_id)
+            elif topic == messaging.MessageTopics.run_upload_finished_topic:
+                self._active_run_set.discard(message.run_id)
+            elif topic == messaging.MessageTopics.upload_progress_topic:
+                # progress is the bytes of the file sent so far, a file that is sent again starts from zero
+                bytes_sent = message.bytes_sent or 0
+                previous_bytes = self._file_bytes_dict.get(file_key, 0)
+                new_bytes = bytes_sent - previous_bytes if bytes_sent >= previous_bytes else bytes_sent
+                self._file_bytes_dict[file_key] = bytes_sent
+                if new_bytes:
+                    self._bytes_uploaded += new_bytes
+                    self._byte_history.append((now, self._bytes_uploaded))
+                    self._trim_history(now)
+            else:
+                self._file_bytes_dict.pop(file_key, None)
+                if topic == messaging.MessageTopics.upload_completed_topic:
+                    self._file_result_dict["completed"] += 1
+                else:
+                    self._file_result_dict["failed"] += 1
+
+    def _trim_history(self, now):
+        """
+        Drops the byte history from before the throughput window, keeping the last point from before it,
+        must be called with the lock held
+
+        :param now: time.monotonic()
+        :return: None
+        """
+        while len(self._byte_history) > 1 and self._byte_history[1][0] <= now - THROUGHPUT_WINDOW:
+            self._byte_history.popleft()
+
+    def get_throughput(self, now=None):
+        """
+        :param now: time.monotonic() to measure the throughput to, defaults to now
+        :return: bytes per second uploaded over the last THROUGHPUT_WINDOW seconds, 0 while nothing is sent
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._trim_history(now)
+            start_time, start_bytes = self._byte_history[0]
+            elapsed = min(THROUGHPUT_WINDOW, now - start_time)
+            if elapsed <= 0:
+                return 0.0
+            return (self._bytes_uploaded - start_bytes) / elapsed
+
+    def record_run_result(self, succeeded):
+        """
+        :param succeeded: True if a run was uploaded, False if it could not be
+        :return: None
+        """
+        with self._lock:
+            self._run_result_dict["complete" if succeeded else "error"] += 1
+
+    def set_queued_runs_function(self, queued_runs_function):
+        """
+        :param queued_runs_function: function returning the number of runs waiting to be uploaded,
+            None when no runs are being queued
+        :return: None
+        """
+        self._queued_runs_function = queued_runs_function
+
+    def _get_queued_runs(self):
+        queued_runs_function = self._queued_runs_function
+        if queued_runs_function is None:
+            return 0
+        try:
+            return queued_runs_function()
+        except Exception as e:
+            logging.debug("Could not count the queued runs: {}".format(e))
+            return 0
+
+    def render(self, request_stats=None, now=None):
+        """
+        :param request_stats: dict of operation -> OperationStats of the requests made to IRIDA
+        :param now: time.monotonic() to measure the throughput to, defaults to now
+        :return: the metrics in the Prometheus text format
+        """
+        throughput = self.get_throughput(now)
+        queued_runs = self._get_queued_runs()
+        with self._lock:
+            active_runs = len(self._active_run_set)
+            run_result_dict = dict(self._run_result_dict)
+            file_result_dict = dict(self._file_result_dict)
+            bytes_uploaded = self._bytes_uploaded
+
+        line_list = []
+
+        def _add_metric(name, metric_type, help_text, sample_list):
+            line_list.append("# HELP {}{} {}".format(METRIC_PREFIX, name, help_text))
+            line_list.append("# TYPE {}{} {}".format(METRIC_PREFIX, name, metric_type))
+            for suffix, label_dict, value in sample_list:
+                labels = ",".join("{}=\"{}\"".format(key, _escape_label_value(label_value))
+                                  for key, label_value in label_dict.items())
+                line_list.append("{}{}{}{} {}".format(METRIC_PREFIX, name, suffix,
+                                                      "{" + labels + "}" if labels else "", value))
+
+        _add_metric("runs_queued", "gauge", "Runs waiting to be uploaded.", [("", {}, queued_runs)])
+        _add_metric("runs_active", "gauge", "Runs whose files are being sent.", [("", {}, active_runs)])
+        _add_metric("runs_total", "counter", "Runs the uploader has finished with, by result.",
+                    [("", {"result": result}, count) for result, count in sorted(run_result_dict.items())])
+        _add_metric("files_total", "counter", "Sequence files the uploader has finished sending, by result.",
+                    [("", {"result": result}, count) for result, count in sorted(file_result_dict.items())])
+        _add_metric("uploaded_bytes_total", "counter", "Bytes of sequence files sent to IRIDA.",
+                    [("", {}, bytes_uploaded)])
+        _add_metric("upload_throughput_bytes_per_second", "gauge",
+                    "Bytes per second sent over the last {} seconds.".format(THROUGHPUT_WINDOW),
+                    [("", {}, round(throughput, 3))])
+
+        request_stats = request_stats or {}
+        histogram_sample_list = []
+        for operation, stats in sorted(request_stats.items()):
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                cumulative_count += bucket_count
+                histogram_sample_list.append(("_bucket", {"operation": operation,
+                                                          "le": _format_bucket_bound(upper_bound)}, cumulative_count))
+            histogram_sample_list.append(("_sum", {"operation": operation}, round(stats.total_seconds, 6)))
+            histogram_sample_list.append(("_count", {"operation": operation}, stats.count))
+        _add_metric("http_request_duration_seconds", "histogram", "Time taken by the requests made to IRIDA.",
+                    histogram_sample_list)
+        _add_metric("http_request_errors_total", "counter", "Requests to IRIDA that failed without a response.",
+                    [("", {"operation": operation}, stats.error_count)
+                     for operation, stats in sorted(request_stats.items())])
+        _add_metric("http_request_retries_total", "counter", "Requests to IRIDA retried by the connection.",
+                    [("", {"operation": operation}, stats.retry_count)
+                     for operation, stats in sorted(request_stats.items())])
+        _add_metric("http_request_stalls_total", "counter",
+                    "Uploads to IRIDA aborted because no data, or too little, was sent for too long.",
+                    [("", {"operation": operation}, stats.stall_count)
+                     for operation, stats in sorted(request_stats.items())])
+        token_stats = request_stats.get("get_access_token")
+        _add_metric("token_refreshes_total", "counter", "Access tokens requested from IRIDA.",
+                    [("", {}, token_stats.count if token_stats is not None else 0)])
+        return "\n".join(line_list) + "\n"
+
+
+def get_uploader_metrics():
+    """
+    Returns the shared UploaderMetrics, creating it the first time it is used
+
+    :return: UploaderMetrics
+    """
+    global _uploader_metrics_instance
+    with _uploader_metrics_lock:
+        if _uploader_metrics_instance is None:
+            _uploader_metrics_instance = UploaderMetrics()
+        return _uploader_metrics_instance
+
+
+def set_uploader_metrics(uploader_metrics):
+    """
+    Replaces the shared UploaderMetrics
+
+    :param uploader_metrics: UploaderMetrics object, or None to create new metrics when they are next requested
+    :return: None
+    """
+    global _uploader_metrics_instance
+    with _uploader_metrics_lock:
+        _uploader_metrics_instance = uploader_metrics
+
+
+def record_run_result(function):
+    """
+    Decorator that counts the result of each run uploaded by a function returning an exit code of 0 on success
+
+    :param function: function uploading a run
+    :return: decorated function
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        exit_code = None
+        try:
+            exit_code = function(*args, **kwargs)
+            return exit_code
+        finally:
+            get_uploader_metrics().record_run_result(exit_code == 0)
+    return wrapper
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /metrics with the metrics of the server's UploaderMetrics
+    """
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.uploader_metrics.render(api_handler.get_http_stats_since()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics request from {}: {}".format(self.address_string(), format % args))
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Answers each request on a thread of its own, http.server.ThreadingHTTPServer needs Python 3.7
+    """
+
+    daemon_threads = True
+
+
+class MetricsServer(object):
+    """
+    Serves the metrics from a thread of its own, while receiving the upload messages from the message bus
+    """
+
+    def __init__(self, port, address=DEFAULT_METRICS_ADDRESS, uploader_metrics=None):
+        """
+        :param port: port to listen on, 0 for any free port
+        :param address: address to listen on
+        :param uploader_metrics: UploaderMetrics to serve, defaults to the shared metrics
+        """
+        self.uploader_metrics = uploader_metrics or get_uploader_metrics()
+        self._server = _ThreadingHTTPServer((address, port), _MetricsRequestHandler)
+        self._server.uploader_metrics = self.uploader_metrics
+        self._thread = None
+        self._subscription = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        """
+        Starts serving the metrics
+        :return: None
+        """
+        self._subscription = messaging.get_message_bus().subscribe(UploaderMetrics.topic_list,
+                                                                   self.uploader_metrics)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops serving the metrics
+        :return: None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._subscription is not None:
+            messaging.get_message_bus().unsubscribe(self._subscription)
+
+
+def start_metrics_server_from_config():
+    """
+    Starts serving the metrics when the 'metrics_port' config option is set
+
+    :return: MetricsServer, None if the metrics are not served
+    """
+    port = config.read_config_option("metrics_port", int, 0)
+    if not port:
+        return None
+    address = config.read_config_option("metrics_address", default_value=DEFAULT_METRICS_ADDRESS)
+    try:
+        metrics_server = MetricsServer(port, address)
+    except OSError as e:
+        logging.error("Could not serve metrics on {}:{}: {}".format(address, port, e))
+        return None
+    metrics_server.start()
+    logging.info("Serving metrics on http://{}:{}/metrics".format(address, metrics_server.port))
+    return metrics_server
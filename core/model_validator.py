@@ -3,7 +3,7 @@ from cerberus import Validator
 import model
 
 
-def validate_sequencing_run(sequencing_run):
+def validate_sequencing_run(sequencing_run, use_fast_path=True):
     """
     Validate a SequencingRun object for upload to irida
 
@@ -11,35 +11,36 @@ def validate_sequencing_run(sequencing_run):
     a ValidationResult with a list of errors. This function should be used when building a model
     from scratch, building a new parser, and as a final redundancy on parsers.
 
+    Each object is first checked against its uploadable_schema with plain attribute checks, and only objects
+    that do not pass are validated with cerberus, which decides if they are valid and gives the error messages.
+
     :param sequencing_run: SequencingRun object to validate
+    :param use_fast_path: when False, every object is validated with cerberus
     :return: ValidationResult object with list of errors if any
     """
     validation_result = model.ValidationResult()
 
-    # Validation objects
-    v_sequencing_run = Validator(model.SequencingRun.uploadable_schema, allow_unknown=True)
-    v_project = Validator(model.Project.uploadable_schema, allow_unknown=True)
-    v_sample = Validator(model.Sample.uploadable_schema, allow_unknown=True)
-    v_sequence_file = Validator(model.SequenceFile.uploadable_schema, allow_unknown=True)
+    # Validation objects are only made when an object fails its fast check
+    validators = _ModelValidator(use_fast_path)
 
     # validation is nested so we can catch multiple levels of project/sample/file errors
 
     # Validate base SequencingRun Object
     try:
-        _validate_object(v_sequencing_run, sequencing_run)
+        validators.validate(model.SequencingRun, sequencing_run)
 
         # Validate projects in sequencing run
         for p in sequencing_run.project_list:
             try:
-                _validate_object(v_project, p)
+                validators.validate(model.Project, p)
 
                 # Validate samples in project
                 for s in p.sample_list:
                     try:
-                        _validate_object(v_sample, s)
+                        validators.validate(model.Sample, s)
 
                         # Validate SequenceFile on Sample
-                        _validate_object(v_sequence_file, s.sequence_file)
+                        validators.validate(model.SequenceFile, s.sequence_file)
 
                         # Validate tricky sequence_file rule
                         _validate_sequence_file_names(s.sequence_file)
@@ -56,6 +57,82 @@ def validate_sequencing_run(sequencing_run):
     return validation_result
 
 
+class _ModelValidator:
+    """
+    Validates model objects, with a fast check first when use_fast_path is set.
+    A cerberus Validator for a model class is only made the first time an object needs it.
+    """
+
+    def __init__(self, use_fast_path):
+        self._use_fast_path = use_fast_path
+        self._validator_dict = {}
+
+    def validate(self, model_class, o):
+        """
+        :param model_class: class of o, its uploadable_schema is used
+        :param o: object to validate
+        :return: raises a ModelValidationError when o is invalid
+        """
+        if self._use_fast_path and _FAST_CHECKS[model_class](o):
+            return
+        if model_class not in self._validator_dict:
+            self._validator_dict[model_class] = Validator(model_class.uploadable_schema, allow_unknown=True)
+        _validate_object(self._validator_dict[model_class], o)
+
+
+# The fast checks below follow the uploadable_schema of each model.
+# They only return True for objects that cerberus would also find valid, anything else is passed to cerberus.
+
+def _is_string_or_none(value):
+    return value is None or type(value) is str
+
+
+def _is_valid_sequencing_run(sequencing_run):
+    project_list = sequencing_run.project_list
+    metadata = sequencing_run.metadata
+    return (type(project_list) is list
+            and len(project_list) > 0
+            and all(isinstance(p, model.Project) for p in project_list)
+            and type(metadata) is dict
+            and metadata.get("layoutType") in ("PAIRED_END", "SINGLE_END"))
+
+
+def _is_valid_project(project):
+    sample_list = project.sample_list
+    return (type(sample_list) is list
+            and len(sample_list) > 0
+            and all(isinstance(s, model.Sample) for s in sample_list)
+            and _is_string_or_none(project.name)
+            and _is_string_or_none(project.description)
+            and type(project.id) is str)
+
+
+def _is_valid_sample(sample):
+    sample_name = sample.sample_name
+    return (isinstance(sample.sequence_file, model.SequenceFile)
+            and type(sample_name) is str
+            and len(sample_name) >= 3
+            and _is_string_or_none(sample.description)
+            and (_is_string_or_none(sample.sample_number) or type(sample.sample_number) is int))
+
+
+def _is_valid_sequence_file(sequence_file):
+    file_list = sequence_file.file_list
+    return (type(file_list) is list
+            and len(file_list) > 0
+            and all(type(f) is str for f in file_list)
+            and type(sequence_file.properties_dict) is dict)
+
+
+# model class -> fast check of its uploadable_schema
+_FAST_CHECKS = {
+    model.SequencingRun: _is_valid_sequencing_run,
+    model.Project: _is_valid_project,
+    model.Sample: _is_valid_sample,
+    model.SequenceFile: _is_valid_sequence_file,
+}
+
+
 def validate_send_project(project):
     """
     Validates a project object when using the send_project api call
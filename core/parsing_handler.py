@@ -4,8 +4,9 @@ This file handles selecting a parser, and parsing/validation with it
 import logging
 
 import config
+import messaging
 import parsers
-from . import model_validator
+from . import model_validator, run_cache
 
 
 def get_parser_from_config():
@@ -34,23 +35,47 @@ def parse_and_validate(directory):
         logging.debug("parsing_handler:Exception while getting sample sheet from directory")
         raise e
 
-    try:
-        sequencing_run = parser_instance.get_sequencing_run(sample_sheet)
-    except parsers.exceptions.ValidationError as e:
-        logging.debug("parsing_handler:Exception while getting sequencing run with sample_sheet")
-        raise e
+    # Reuse the run from the last time this directory was parsed, if nothing has changed since
+    run_cache_instance = None
+    sample_sheet_hash = None
+    parser_name = type(parser_instance).__module__
+    if config.read_config_option("run_cache", bool, False):
+        sample_sheet_hash = run_cache.get_file_hash(sample_sheet)
+        if sample_sheet_hash is not None:
+            run_cache_instance = run_cache.get_run_cache()
+    sequencing_run = None
+    if run_cache_instance is not None:
+        sequencing_run = run_cache_instance.load(directory, sample_sheet_hash, parser_name)
+        if sequencing_run is not None:
+            logging.info("Sample sheet and sequence files have not changed, using the run parsed last time")
+    from_cache = sequencing_run is not None
+
+    if not from_cache:
+        try:
+            with messaging.tracing.span("parse sample sheet", "parse"):
+                sequencing_run = parser_instance.get_sequencing_run(sample_sheet)
+        except parsers.exceptions.ValidationError as e:
+            logging.debug("parsing_handler:Exception while getting sequencing run with sample_sheet")
+            raise e
+
+    # A cached run was validated before it was stored, by the same uploader version, so it is not validated again
+    if not from_cache:
+        logging.info("Validating sequencing run")
+        with messaging.tracing.span("offline validation", "validation"):
+            validation_result = model_validator.validate_sequencing_run(sequencing_run)
+        if not validation_result.is_valid():
+            logging.info("parsing_handler:Exception while validating Sequencing Run")
+            raise parsers.exceptions.ValidationError("Sequencing Run is not valid", validation_result)
 
-    logging.info("Validating sequencing run")
-    validation_result = model_validator.validate_sequencing_run(sequencing_run)
-    if not validation_result.is_valid():
-        logging.info("parsing_handler:Exception while validating Sequencing Run")
-        raise parsers.exceptions.ValidationError("Sequencing Run is not valid", validation_result)
+        if run_cache_instance is not None:
+            run_cache_instance.store(directory, sample_sheet, sample_sheet_hash, parser_name, sequencing_run)
 
     logging.info("*** Parsing Done ***")
 
     return sequencing_run
 
 
+@messaging.tracing.traced("check run status", "status")
 def get_run_status(directory):
     """
     Given a run directory, returns a DirectoryStatus object created by the parser
@@ -0,0 +1,194 @@
+"""
+This file handles the performance report of an upload, describing how long each phase of the upload took, how
+fast the files were sent, the requests made to IRIDA, and the concurrency that was used
+
+The report of a run is written to the status file and to its own file in the run directory, so the reports
+of many runs can be gathered to plan how long uploads will take (for example, how long a NovaSeq run takes to
+upload from each site).
+"""
+
+import json
+import logging
+import os
+import socket
+import statistics
+import time
+
+import config
+import progress
+from messaging.run_progress import format_bytes, format_duration
+from . import api_handler, upload_planner
+
+# File name of the performance report in the run directory
+REPORT_FILE_NAME = "irida_uploader_report.json"
+# Version of the report format, increased when fields are changed or removed
+REPORT_VERSION = 1
+
+
+def _get_sample_list(sequencing_run):
+    return [sample for project in sequencing_run.project_list for sample in project.sample_list]
+
+
+def build_report(directory, sequencing_run, run_id, timer, upload_seconds, request_stats=None, run_progress=None):
+    """
+    Builds the performance report of an upload
+
+    :param directory: run directory
+    :param sequencing_run: SequencingRun that was uploaded
+    :param run_id: sequencing run id on IRIDA
+    :param timer: PhaseTimer of the upload
+    :param upload_seconds: seconds spent sending the run
+    :param request_stats: dict of operation -> OperationStats of the requests made for the run
+    :param run_progress: RunProgress of the run, for the peak throughput
+    :return: dict that can be written as JSON
+    """
+    sample_list = _get_sample_list(sequencing_run)
+    total_bytes = sum(upload_planner.get_sample_upload_size(sample) for sample in sample_list)
+    finish_time = time.time()
+    request_stats = request_stats or {}
+    peak_rate = run_progress.peak_rate if run_progress is not None else None
+
+    return {"version": REPORT_VERSION,
+            "run_id": run_id,
+            "directory": directory,
+            "parser": config.read_config_option("parser"),
+            "irida_instance": config.read_config_option("base_url"),
+            "site": socket.gethostname(),
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finish_time - timer.total())),
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finish_time)),
+            "sample_count": len(sample_list),
+            "file_count": sum(len(sample.sequence_file.file_list) for sample in sample_list),
+            "total_bytes": total_bytes,
+            "total_seconds": round(timer.total(), 3),
+            "upload_seconds": round(upload_seconds, 3),
+            "average_bytes_per_second": round(total_bytes / upload_seconds) if upload_seconds > 0 else None,
+            "peak_bytes_per_second": round(peak_rate) if peak_rate is not None else None,
+            "phases": [{"name": name, "seconds": round(seconds, 3), "waits_for_background": waits}
+                       for name, seconds, waits in timer.phase_list],
+            "background": [{"name": name, "seconds": round(seconds, 3)} for name, seconds in timer.background_list],
+            "requests": {"count": sum(stats.count for stats in request_stats.values()),
+                         "error_count": sum(stats.error_count for stats in request_stats.values()),
+                         "retry_count": sum(stats.retry_count for stats in request_stats.values()),
+                         "stall_count": sum(stats.stall_count for stats in request_stats.values()),
+                         "operations": {operation: {"count": stats.count,
+                                                    "error_count": stats.error_count,
+                                                    "retry_count": stats.retry_count,
+                                                    "stall_count": stats.stall_count,
+                                                    "total_seconds": round(stats.total_seconds, 3),
+                                                    "bytes_sent": stats.bytes_sent,
+                                                    "bytes_received": stats.bytes_received}
+                                        for operation, stats in sorted(request_stats.items())}},
+            "concurrency": {"upload_threads": config.read_config_option("upload_threads", int,
+                                                                        api_handler.DEFAULT_UPLOAD_THREADS),
+                            "max_connections": config.read_config_option("max_connections", int,
+                                                                         api_handler.DEFAULT_MAX_CONNECTIONS),
+                            "pipelined_upload": config.read_config_option("pipelined_upload", bool, False),
+                            "compress_uploads": config.read_config_option("compress_uploads", bool, False)}}
+
+
+def write_report(directory, report):
+    """
+    Writes the performance report to its file in the run directory
+
+    :param directory: run directory
+    :param report: dict from build_report
+    :return: True if the report was written
+    """
+    report_file = os.path.join(directory, REPORT_FILE_NAME)
+    try:
+        with open(report_file, "w") as json_file:
+            json.dump(report, json_file, indent=4, sort_keys=True)
+            json_file.write("\n")
+    except OSError as e:
+        logging.warning("Could not write the performance report to {}: {}".format(report_file, e))
+        return False
+    return True
+
+
+def read_report(directory):
+    """
+    :param directory: run directory
+    :return: the performance report of the run, None if it has none
+    """
+    try:
+        with open(os.path.join(directory, REPORT_FILE_NAME), "rb") as reader:
+            report = json.loads(reader.read().decode())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(report, dict):
+        return None
+    return report
+
+
+def find_reports(directory):
+    """
+    Reads the performance reports of the run directory, or of every run directory inside it
+
+    :param directory: a run directory, or a directory of run directories
+    :return: list of reports
+    """
+    report_list = []
+    for run_directory in [directory] + sorted(progress.list_sub_directories(directory)):
+        report = read_report(run_directory)
+        if report is not None:
+            report_list.append(report)
+    return report_list
+
+
+def aggregate_reports(report_list):
+    """
+    Combines the reports of uploads from the same site with the same parser
+
+    :param report_list: list of reports
+    :return: list of dicts, one for each site and parser, sorted by site and parser
+    """
+    group_dict = {}
+    for report in report_list:
+        key = (str(report.get("site")), str(report.get("parser")))
+        group_dict.setdefault(key, []).append(report)
+
+    summary_list = []
+    for (site, parser), group in sorted(group_dict.items()):
+        total_bytes = sum(report.get("total_bytes") or 0 for report in group)
+        upload_seconds = sum(report.get("upload_seconds") or 0 for report in group)
+        peak_list = [report["peak_bytes_per_second"] for report in group if report.get("peak_bytes_per_second")]
+        summary_list.append({
+            "site": site,
+            "parser": parser,
+            "run_count": len(group),
+            "sample_count": sum(report.get("sample_count") or 0 for report in group),
+            "total_bytes": total_bytes,
+            "median_bytes_per_run": statistics.median(report.get("total_bytes") or 0 for report in group),
+            "median_total_seconds": statistics.median(report.get("total_seconds") or 0 for report in group),
+            "median_upload_seconds": statistics.median(report.get("upload_seconds") or 0 for report in group),
+            "average_bytes_per_second": round(total_bytes / upload_seconds) if upload_seconds > 0 else None,
+            "peak_bytes_per_second": max(peak_list) if peak_list else None,
+            "request_count": sum(report.get("requests", {}).get("count", 0) for report in group),
+            "retry_count": sum(report.get("requests", {}).get("retry_count", 0) for report in group),
+        })
+    return summary_list
+
+
+def print_summary(summary_list):
+    """
+    Prints the combined reports as a table, with the median run size and times of each site and parser
+
+    :param summary_list: list from aggregate_reports
+    :return: None
+    """
+    print("{:<20} {:<12} {:>5} {:>8} {:>11} {:>11} {:>11} {:>11} {:>11} {:>8}".format(
+        "site", "parser", "runs", "samples", "run size", "total time", "upload time", "avg/s", "peak/s",
+        "retries"))
+    for summary in summary_list:
+        print("{:<20} {:<12} {:>5} {:>8} {:>11} {:>11} {:>11} {:>11} {:>11} {:>8}".format(
+            summary["site"], summary["parser"], summary["run_count"], summary["sample_count"],
+            format_bytes(summary["median_bytes_per_run"]),
+            format_duration(summary["median_total_seconds"]),
+            format_duration(summary["median_upload_seconds"]),
+            _format_rate(summary["average_bytes_per_second"]),
+            _format_rate(summary["peak_bytes_per_second"]),
+            summary["retry_count"]))
+
+
+def _format_rate(bytes_per_second):
+    return "-" if bytes_per_second is None else format_bytes(bytes_per_second) + "/s"
@@ -0,0 +1,292 @@
+"""
+This file handles profiling the uploader, so a slow upload can be looked at after the fact
+
+The main thread is profiled with cProfile, which counts every function call and is written as a pstats file.
+Uploads do much of their work on other threads, so a sampling thread also takes the stack of every thread
+SAMPLE_INTERVAL times a second. The samples are written as collapsed stacks, one line per distinct stack with the
+number of times it was seen, which flame graph tools (flamegraph.pl, speedscope, ...) can draw. Samples are taken
+whether a thread is working or waiting, so the stacks show where the wall clock time of the upload went.
+
+The files are written to the run directory, next to irida-uploader.log, and are named with the parser and the
+size of the run so profiles of different runs can be told apart.
+"""
+
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+
+from collections import Counter
+
+import config
+import global_settings
+from messaging.run_progress import format_bytes
+from . import upload_planner
+
+# Seconds between the stack samples of every thread
+SAMPLE_INTERVAL = 0.01
+# Start of the name of the profile files
+PROFILE_FILE_PREFIX = "irida-uploader-profile"
+
+_profiler_instance = None
+_profiler_lock = threading.Lock()
+
+
+def _get_frame_label(frame):
+    """
+    :param frame: stack frame
+    :return: label of the frame's function in a collapsed stack
+    """
+    code = frame.f_code
+    return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler(object):
+    """
+    Samples the stacks of every thread from a thread of its own
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        """
+        :param interval: seconds between samples
+        """
+        self._interval = interval
+        self._lock = threading.Lock()
+        # collapsed stack -> number of samples
+        self._stack_counter = Counter()
+        self._sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def sample_count(self):
+        return self._sample_count
+
+    def start(self):
+        """
+        Starts taking samples
+        :return: None
+        """
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops taking samples, and waits for the sampling thread to finish
+        :return: None
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            self.take_sample()
+
+    def take_sample(self):
+        """
+        Adds the current stack of every thread, other than the sampling thread, to the samples
+        :return: None
+        """
+        thread_name_dict = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_thread_id = threading.get_ident()
+        stack_list = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            label_list = []
+            while frame is not None:
+                label_list.append(_get_frame_label(frame))
+                frame = frame.f_back
+            label_list.append(thread_name_dict.get(thread_id, str(thread_id)))
+            stack_list.append(";".join(reversed(label_list)))
+        with self._lock:
+            self._stack_counter.update(stack_list)
+            self._sample_count += 1
+
+    def get_collapsed_stacks(self):
+        """
+        :return: list of lines of the collapsed stacks, each 'thread;outer function;...;inner function count'
+        """
+        with self._lock:
+            return ["{} {}".format(stack, count) for stack, count in sorted(self._stack_counter.items())]
+
+    def write(self, file_path):
+        """
+        Writes the collapsed stacks to a file
+
+        :param file_path: file to write to
+        :return: None
+        """
+        with open(file_path, "w") as collapsed_file:
+            for line in self.get_collapsed_stacks():
+                collapsed_file.write(line + "\n")
+
+
+class UploadProfiler(object):
+    """
+    Profiles the uploader with cProfile on the main thread, and a StackSampler for every thread
+    """
+
+    def __init__(self, output_directory=None, sample_interval=SAMPLE_INTERVAL):
+        """
+        :param output_directory: directory to write the profile to when no run has been recorded,
+            defaults to the log directory
+        :param sample_interval: seconds between stack samples
+        """
+        self._output_directory = output_directory
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(sample_interval)
+        self._start_time = None
+        self._lock = threading.Lock()
+        # list of (directory, parser name, sample count, total bytes) of the runs uploaded while profiling
+        self._run_list = []
+
+    def start(self):
+        """
+        Starts profiling, must be called from the main thread
+        :return: None
+        """
+        self._start_time = time.localtime()
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self):
+        """
+        Stops profiling, must be called from the thread that started it
+        :return: None
+        """
+        self._profile.disable()
+        self._sampler.stop()
+
+    def record_run(self, directory, parser_name, sample_count, total_bytes):
+        """
+        Records a run uploaded while profiling, to name the profile files and find where to write them
+
+        :param directory: run directory
+        :param parser_name: parser the run was read with
+        :param sample_count: number of samples in the run
+        :param total_bytes: size of the sequence files of the run
+        :return: None
+        """
+        with self._lock:
+            self._run_list.append((directory, parser_name, sample_count, total_bytes))
+
+    def get_output_directory(self):
+        """
+        :return: the run directory when one run was recorded, otherwise the output directory
+        """
+        with self._lock:
+            run_list = list(self._run_list)
+        if len(run_list) == 1:
+            return run_list[0][0]
+        return self._output_directory or global_settings.log_file
+
+    def get_file_tag(self):
+        """
+        :return: part of the profile file names describing the runs that were profiled
+        """
+        with self._lock:
+            run_list = list(self._run_list)
+        if not run_list:
+            return "no-run"
+        parser_list = sorted(set(str(parser_name) for directory, parser_name, sample_count, total_bytes in run_list))
+        sample_count = sum(run[2] for run in run_list)
+        total_bytes = sum(run[3] for run in run_list)
+        part_list = ["+".join(parser_list)]
+        if len(run_list) > 1:
+            part_list.append("{}runs".format(len(run_list)))
+        part_list.append("{}samples".format(sample_count))
+        part_list.append(format_bytes(total_bytes).replace(" ", ""))
+        return "-".join(part_list)
+
+    def write(self):
+        """
+        Writes the pstats and collapsed stacks files
+
+        The output directory is used if the run directory cannot be written to, and the log directory
+        if neither can
+
+        :return: list of the files written
+        """
+        file_name = "{}-{}-{}".format(PROFILE_FILE_PREFIX,
+                                      time.strftime("%Y%m%d-%H%M%S", self._start_time or time.localtime()),
+                                      self.get_file_tag())
+        directory_list = [self.get_output_directory(), self._output_directory, global_settings.log_file]
+        for directory in directory_list:
+            if directory and os.access(directory, os.W_OK):
+                break
+        else:
+            logging.error("Could not write the profile, none of {} can be written to".format(directory_list))
+            return []
+
+        stats_path = os.path.join(directory, file_name + ".pstats")
+        collapsed_path = os.path.join(directory, file_name + ".collapsed")
+        self._profile.dump_stats(stats_path)
+        self._sampler.write(collapsed_path)
+        if directory != directory_list[0]:
+            # e.g. a BaseMount run directory is read only, the profile is not where it would be looked for
+            logging.warning("Could not write the profile to {}, it was written to {} and {} instead"
+                            "".format(directory_list[0], stats_path, collapsed_path))
+        else:
+            logging.info("Profile written to {} and {}".format(stats_path, collapsed_path))
+        return [stats_path, collapsed_path]
+
+
+def start_profiling(output_directory=None):
+    """
+    Starts profiling the uploader, must be called from the main thread
+
+    :param output_directory: directory to write the profile to when it does not cover a single run
+    :return: UploadProfiler
+    """
+    global _profiler_instance
+    with _profiler_lock:
+        _profiler_instance = UploadProfiler(output_directory)
+    _profiler_instance.start()
+    return _profiler_instance
+
+
+def stop_profiling():
+    """
+    Stops profiling and writes the profile files
+
+    :return: list of the files written, empty if profiling was off
+    """
+    global _profiler_instance
+    with _profiler_lock:
+        profiler = _profiler_instance
+        _profiler_instance = None
+    if profiler is None:
+        return []
+    profiler.stop()
+    return profiler.write()
+
+
+def get_profiler():
+    """
+    :return: the UploadProfiler that is running, None if profiling is off
+    """
+    return _profiler_instance
+
+
+def record_run(directory, sequencing_run):
+    """
+    Records a run for the profile, when profiling is on
+
+    :param directory: run directory
+    :param sequencing_run: parsed SequencingRun
+    :return: None
+    """
+    profiler = _profiler_instance
+    if profiler is None:
+        return
+    sample_list = [sample for project in sequencing_run.project_list for sample in project.sample_list]
+    try:
+        total_bytes = sum(upload_planner.get_sample_upload_size(sample) for sample in sample_list)
+    except Exception as e:
+        logging.debug("Could not get the size of run {} for the profile: {}".format(directory, e))
+        total_bytes = 0
+    profiler.record_run(directory, config.read_config_option("parser"), len(sample_list), total_bytes)
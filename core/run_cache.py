@@ -0,0 +1,350 @@
+"""
+This file manages a cache of parsed and validated sequencing runs
+
+When a run is uploaded again (with --force, after an error, or by a queue worker retrying it), parsing the
+sample sheet, finding the sequence files and validating the run gives the same result as last time unless
+the sample sheet or the sequence files have changed. The parsed run is stored in the users cache directory
+with the hash of the sample sheet and a fingerprint of the directories its sequence files are in, and is
+reused while both still match. Runs are only stored once they have been validated, and a cached run is only
+reused by the uploader version that stored it, so a reused run is not validated again.
+
+Once the samples of a run have been found or created on IRIDA, the upload plan (the samples that are ready on
+IRIDA, with the size of their files) is stored with the run, so an upload of the same run to the same IRIDA
+does not check its samples again. It is thrown away with the run when the run changes.
+
+The cache is only used when the run_cache config option is set.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from appdirs import user_cache_dir
+
+import global_settings
+import progress
+from model import SequencingRun, Project, Sample, SequenceFile
+
+# Directory in the cache directory that parsed runs are stored in
+RUN_CACHE_DIRECTORY_NAME = "run_cache"
+# Increase when the format of the cache files changes, so old cache files are ignored
+RUN_CACHE_VERSION = 2
+# Files that the uploader writes to run directories, they do not change the parsed run
+IGNORED_FILE_NAMES = ["irida_uploader_status.info", "irida-uploader.log", "irida_uploader_report.json"]
+# Start of the names of the profiles the uploader writes to run directories
+IGNORED_FILE_PREFIX = "irida-uploader-profile"
+
+# Normal base cache directory name
+cache_directory_name = "irida-uploader"
+# When running tests, the Makefile creates an environment variable IRIDA_UPLOADER_TEST to 'True'
+# If it exists then we are running a test and should be using the test cache directory
+if os.environ.get('IRIDA_UPLOADER_TEST'):
+    cache_directory_name = "irida-uploader-test"
+
+_run_cache_instance = None
+_run_cache_lock = threading.Lock()
+
+
+def get_file_hash(file_path):
+    """
+    Hashes the contents of a file
+
+    :param file_path: file to hash
+    :return: hex digest, or None if the file could not be read
+    """
+    file_hash = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+    except (OSError, TypeError):
+        return None
+    return file_hash.hexdigest()
+
+
+def get_directory_fingerprint(directory_list):
+    """
+    Makes a fingerprint of the files in directories, from their names, sizes and modification times
+
+    The directories are read through the shared DirectoryIndex, so directories that were just parsed are not
+    listed again
+
+    :param directory_list: list of directories, sub directories are not included
+    :return: hex digest, or None if a directory could not be listed
+    """
+    directory_index = progress.directory_index.get_directory_index()
+    fingerprint = hashlib.sha256()
+    for directory in sorted(directory_list):
+        try:
+            name_list = sorted(name for name in directory_index.list_files(directory)
+                               if name not in IGNORED_FILE_NAMES and not name.startswith(IGNORED_FILE_PREFIX))
+        except OSError:
+            return None
+        fingerprint.update(directory.encode())
+        for name in name_list:
+            stat = directory_index.stat(os.path.join(directory, name))
+            if stat is None:
+                return None
+            fingerprint.update("\0{}\0{}\0{}".format(name, stat.st_size, stat.st_mtime_ns).encode())
+    return fingerprint.hexdigest()
+
+
+def get_data_directories(sequencing_run):
+    """
+    :param sequencing_run: SequencingRun object
+    :return: sorted list of the directories the run's sequence files are in
+    """
+    return sorted({os.path.dirname(os.path.abspath(file_name))
+                   for project in sequencing_run.project_list
+                   for sample in project.sample_list
+                   for file_name in sample.sequence_file.file_list})
+
+
+def sequencing_run_to_dict(sequencing_run):
+    """
+    :param sequencing_run: SequencingRun object
+    :return: dict that can be written as json, and read with sequencing_run_from_dict
+    """
+    project_list = []
+    for project in sequencing_run.project_list:
+        sample_list = []
+        for sample in project.sample_list:
+            sample_list.append({
+                "sample_name": sample.sample_name,
+                "description": sample.description,
+                "sample_number": sample.sample_number,
+                "sample_dict": sample.get_dict()["_sample_dict"],
+                "file_list": sample.sequence_file.file_list,
+                "properties_dict": sample.sequence_file.properties_dict,
+            })
+        project_list.append({
+            "id": project.id,
+            "name": project.name,
+            "description": project.description,
+            "sample_list": sample_list,
+        })
+    return {"metadata": sequencing_run.metadata, "project_list": project_list}
+
+
+def sequencing_run_from_dict(run_dict):
+    """
+    :param run_dict: dict from sequencing_run_to_dict
+    :return: SequencingRun object
+    """
+    project_list = []
+    for project_dict in run_dict["project_list"]:
+        project = Project(name=project_dict["name"], description=project_dict["description"],
+                          id=project_dict["id"])
+        for sample_dict in project_dict["sample_list"]:
+            sample = Sample(sample_dict["sample_name"], sample_dict["description"],
+                            sample_dict["sample_number"], sample_dict["sample_dict"])
+            sample.sequence_file = SequenceFile(sample_dict["file_list"], sample_dict["properties_dict"])
+            project.add_sample(sample)
+        project_list.append(project)
+    return SequencingRun(run_dict["metadata"], project_list)
+
+
+class RunCache:
+    """
+    Stores parsed sequencing runs as json files, one file for each run directory
+    """
+
+    def __init__(self, cache_directory):
+        """
+        :param cache_directory: directory to write cache files to, created if it does not exist
+        """
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory)
+        self._cache_directory = cache_directory
+
+    @property
+    def cache_directory(self):
+        return self._cache_directory
+
+    def _get_cache_file(self, directory):
+        directory_hash = hashlib.sha256(os.path.abspath(directory).encode()).hexdigest()
+        return os.path.join(self._cache_directory, directory_hash + ".json")
+
+    def _load_entry(self, directory, sample_sheet_hash=None):
+        """
+        Reads the cache entry of a run directory, if the run has not changed since it was stored
+
+        :param directory: run directory
+        :param sample_sheet_hash: hash of the run's sample sheet, read from the sample sheet in the entry if None
+        :return: entry dict, or None if the run is not cached or has changed
+        """
+        try:
+            with open(self._get_cache_file(directory)) as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            if sample_sheet_hash is None:
+                sample_sheet_hash = get_file_hash(entry["sample_sheet"])
+            if (entry.get("version") != RUN_CACHE_VERSION
+                    or entry.get("uploader_version") != global_settings.UPLOADER_VERSION
+                    or entry["directory"] != os.path.abspath(directory)
+                    or entry["sample_sheet_hash"] != sample_sheet_hash):
+                return None
+            fingerprint = get_directory_fingerprint(entry["data_directories"])
+            if fingerprint is None or fingerprint != entry["fingerprint"]:
+                logging.debug("Files in run directory {} have changed since it was cached".format(directory))
+                return None
+        except (KeyError, TypeError) as e:
+            logging.debug("Could not read cached run for directory {}: {}".format(directory, e))
+            return None
+        return entry
+
+    def _write_entry(self, directory, entry):
+        """
+        Writes the cache entry of a run directory
+
+        :param directory: run directory
+        :param entry: entry dict
+        :return: None
+        """
+        # Write to a temporary file first, so a run being uploaded by another process never reads half a file
+        cache_file = self._get_cache_file(directory)
+        temp_file = "{}.{}.{}.tmp".format(cache_file, os.getpid(), threading.get_ident())
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_file, cache_file)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning("Could not cache parsed run for directory {}: {}".format(directory, e))
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def load(self, directory, sample_sheet_hash, parser_name):
+        """
+        Gets the parsed run for a run directory, if the sample sheet and sequence file directories have not changed
+
+        :param directory: run directory
+        :param sample_sheet_hash: hash of the run's sample sheet, from get_file_hash
+        :param parser_name: name of the parser used to parse the run
+        :return: SequencingRun that has passed validation, or None if the run is not cached or has changed
+        """
+        entry = self._load_entry(directory, sample_sheet_hash)
+        if entry is None or entry.get("parser") != parser_name:
+            return None
+
+        try:
+            return sequencing_run_from_dict(entry["sequencing_run"])
+        except (KeyError, TypeError) as e:
+            logging.debug("Could not read cached run for directory {}: {}".format(directory, e))
+            return None
+
+    def store(self, directory, sample_sheet, sample_sheet_hash, parser_name, sequencing_run):
+        """
+        Stores a parsed and validated run for a run directory, replacing its upload plan
+
+        :param directory: run directory
+        :param sample_sheet: path of the run's sample sheet
+        :param sample_sheet_hash: hash of the run's sample sheet, from get_file_hash
+        :param parser_name: name of the parser used to parse the run
+        :param sequencing_run: SequencingRun that has passed validation
+        :return: None
+        """
+        data_directories = get_data_directories(sequencing_run)
+        entry = {
+            "version": RUN_CACHE_VERSION,
+            "uploader_version": global_settings.UPLOADER_VERSION,
+            "directory": os.path.abspath(directory),
+            "sample_sheet": os.path.abspath(sample_sheet),
+            "sample_sheet_hash": sample_sheet_hash,
+            "parser": parser_name,
+            "data_directories": data_directories,
+            "fingerprint": get_directory_fingerprint(data_directories),
+            "sequencing_run": sequencing_run_to_dict(sequencing_run),
+        }
+        if entry["fingerprint"] is None:
+            return
+        self._write_entry(directory, entry)
+
+    def load_upload_plan(self, directory, base_url):
+        """
+        Gets the upload plan of a run directory, if the run has not changed since it was stored
+
+        :param directory: run directory
+        :param base_url: url of the IRIDA the run is uploaded to
+        :return: dict of (project id, sample name) -> bytes to upload, of the samples that are ready on IRIDA,
+            or None if there is no upload plan for the run on this IRIDA
+        """
+        entry = self._load_entry(directory)
+        if entry is None:
+            return None
+        upload_plan = entry.get("upload_plan")
+        if not upload_plan or upload_plan.get("base_url") != base_url:
+            return None
+        try:
+            return {(project_id, sample_name): upload_size
+                    for project_id, sample_name, upload_size in upload_plan["sample_list"]}
+        except (KeyError, TypeError, ValueError) as e:
+            logging.debug("Could not read cached upload plan for directory {}: {}".format(directory, e))
+            return None
+
+    def store_upload_plan(self, directory, base_url, upload_plan):
+        """
+        Stores the upload plan of a run directory with its cached run, if the run has not changed since it was
+        stored
+
+        :param directory: run directory
+        :param base_url: url of the IRIDA the run is uploaded to
+        :param upload_plan: dict of (project id, sample name) -> bytes to upload, of the samples that are ready
+            on IRIDA
+        :return: None
+        """
+        entry = self._load_entry(directory)
+        if entry is None:
+            return
+        entry["upload_plan"] = {
+            "base_url": base_url,
+            "sample_list": [[project_id, sample_name, upload_size]
+                            for (project_id, sample_name), upload_size in upload_plan.items()],
+        }
+        self._write_entry(directory, entry)
+
+    def remove(self, directory):
+        """
+        Removes the cached run for a run directory
+
+        :param directory: run directory
+        :return: None
+        """
+        try:
+            os.remove(self._get_cache_file(directory))
+        except FileNotFoundError:
+            pass
+
+
+def get_run_cache():
+    """
+    Returns the shared RunCache, creating it in the users cache directory the first time it is used
+
+    :return: RunCache, or None if the cache directory could not be created
+    """
+    global _run_cache_instance
+    with _run_cache_lock:
+        if _run_cache_instance is None:
+            cache_directory = os.path.join(user_cache_dir(cache_directory_name), RUN_CACHE_DIRECTORY_NAME)
+            try:
+                _run_cache_instance = RunCache(cache_directory)
+            except OSError as e:
+                logging.warning("Could not open run cache {}: {}".format(cache_directory, e))
+                return None
+        return _run_cache_instance
+
+
+def set_run_cache(run_cache):
+    """
+    Replaces the shared RunCache, used to point the cache at a different directory
+
+    :param run_cache: RunCache object, or None to reopen the default cache when it is next requested
+    :return: None
+    """
+    global _run_cache_instance
+    with _run_cache_lock:
+        _run_cache_instance = run_cache
@@ -0,0 +1,179 @@
+"""
+This file handles fingerprinting sequencing runs so duplicate uploads can be detected
+
+A fingerprint is a hash of the sample layout of a run (projects, sample names, file names) and the sizes of the
+files being uploaded. The fingerprint is stored on IRIDA when the sequencing run is created, and a local index of
+the fingerprints found on the IRIDA server is kept so a run copied to another directory or another host is
+recognised before it is uploaded a second time.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from appdirs import user_cache_dir
+
+import progress
+
+# Key used to store the fingerprint in a SequencingRun's metadata
+FINGERPRINT_KEY = "fingerprint"
+
+# Upload statuses on IRIDA that mean a run with a matching fingerprint should not be uploaded again
+DUPLICATE_UPLOAD_STATUS_LIST = ["COMPLETE", "UPLOADING"]
+# Seconds after which a run that is still UPLOADING has been abandoned, longer than any upload takes
+UPLOADING_EXPIRY = 2 * 24 * 60 * 60
+
+# File name of the local index of server runs
+INDEX_FILE_NAME = "run_fingerprints.json"
+
+
+def compute_fingerprint(sequencing_run):
+    """
+    Creates a fingerprint for a sequencing run from the project ids, sample names, file names and file sizes
+
+    The full file path is not used, only the file name, so a run that has been copied to a new location
+    will have the same fingerprint as the original run.
+
+    :param sequencing_run: SequencingRun object to fingerprint
+    :return: hex digest string
+    """
+    digest = hashlib.sha256()
+    directory_index = progress.directory_index.get_directory_index()
+    for project in sequencing_run.project_list:
+        for sample in project.sample_list:
+            digest.update("{}\t{}\n".format(project.id, sample.sample_name).encode())
+            for file_name in sample.sequence_file.file_list:
+                digest.update("{}\t{}\n".format(os.path.basename(file_name),
+                                                directory_index.getsize(file_name)).encode())
+    return digest.hexdigest()
+
+
+class RunFingerprintIndex:
+    """
+    Local index of the sequencing run fingerprints found on an IRIDA instance
+
+    The index is stored as a json file, with a section for each IRIDA instance (base_url)
+    Each section maps a fingerprint to the run identifier, upload status on IRIDA, and the time the status was
+    first seen
+    """
+
+    def __init__(self, base_url, index_file=None):
+        """
+        :param base_url: url of the IRIDA instance the fingerprints belong to
+        :param index_file: optional, path to the index file. Defaults to the users cache directory
+        """
+        if index_file is None:
+            index_file = os.path.join(user_cache_dir("irida-uploader"), INDEX_FILE_NAME)
+        self._base_url = base_url
+        self._index_file = index_file
+        self._lock = threading.Lock()
+        self._runs = self._load()
+
+    def _load(self):
+        """
+        Reads this IRIDA instance's section from the index file
+
+        :return: dict of fingerprint to run info
+        """
+        if not os.path.exists(self._index_file):
+            return {}
+        try:
+            with open(self._index_file, "r") as reader:
+                return json.load(reader).get(self._base_url, {})
+        except (IOError, ValueError) as e:
+            logging.warning("Could not read run fingerprint index {}: {}".format(self._index_file, e))
+            return {}
+
+    def save(self):
+        """
+        Writes this IRIDA instance's section to the index file, keeping the sections of other instances
+
+        :return: None
+        """
+        with self._lock:
+            index = {}
+            if os.path.exists(self._index_file):
+                try:
+                    with open(self._index_file, "r") as reader:
+                        index = json.load(reader)
+                except (IOError, ValueError):
+                    logging.warning("Run fingerprint index {} is not valid, overwriting it".format(self._index_file))
+            index[self._base_url] = self._runs
+
+            if not os.path.exists(os.path.dirname(self._index_file)):
+                os.makedirs(os.path.dirname(self._index_file))
+            try:
+                with open(self._index_file, "w") as writer:
+                    json.dump(index, writer, indent=4, sort_keys=True)
+            except IOError as e:
+                logging.warning("Could not write run fingerprint index {}: {}".format(self._index_file, e))
+
+    def lookup(self, fingerprint, now=None):
+        """
+        Finds a run with the given fingerprint that has been, or is being, uploaded
+
+        A run that has been UPLOADING for longer than UPLOADING_EXPIRY was abandoned, and is not a duplicate
+
+        :param fingerprint: fingerprint to look for
+        :param now: time.time() to check the age of the run against, defaults to now
+        :return: run identifier, or None when no duplicate run is known
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            run = self._runs.get(fingerprint)
+        if not run or run["uploadStatus"] not in DUPLICATE_UPLOAD_STATUS_LIST:
+            return None
+        if run["uploadStatus"] == "UPLOADING" and now - run.get("updated", now) > UPLOADING_EXPIRY:
+            logging.debug("Sequencing run {} has been uploading since {}, it was abandoned".format(
+                run["identifier"], time.ctime(run["updated"])))
+            return None
+        return run["identifier"]
+
+    def record(self, fingerprint, identifier, upload_status, now=None):
+        """
+        Adds or updates a run in the index
+
+        :param fingerprint: fingerprint of the run
+        :param identifier: sequencing run identifier on IRIDA
+        :param upload_status: upload status of the run on IRIDA
+        :param now: time.time() the status was seen, defaults to now
+        :return: None
+        """
+        with self._lock:
+            self._runs[fingerprint] = {"identifier": str(identifier), "uploadStatus": upload_status,
+                                       "updated": time.time() if now is None else now}
+
+    def refresh(self, api_instance, now=None):
+        """
+        Replaces the index with the fingerprinted runs currently on the IRIDA server
+
+        Runs deleted from IRIDA are dropped. A run that this uploader recorded as ERROR stays ERROR while IRIDA
+        still has it UPLOADING, as the upload was stopped without IRIDA being told, for example by a lost
+        connection.
+
+        :param api_instance: ApiCalls instance to fetch the sequencing runs with
+        :param now: time.time() the runs were seen, defaults to now
+        :return: None
+        """
+        logging.debug("Refreshing run fingerprint index from IRIDA")
+        now = time.time() if now is None else now
+        server_runs = api_instance.get_seq_run_fingerprints()
+        with self._lock:
+            runs = {}
+            for fingerprint, server_run in server_runs.items():
+                run = {"identifier": str(server_run["identifier"]), "uploadStatus": server_run.get("uploadStatus")}
+                local_run = self._runs.get(fingerprint)
+                same_run = local_run is not None and local_run["identifier"] == run["identifier"]
+                if same_run and local_run["uploadStatus"] == "ERROR" and run["uploadStatus"] == "UPLOADING":
+                    run = local_run
+                elif same_run and local_run["uploadStatus"] == run["uploadStatus"] and "updated" in local_run:
+                    # the time the status was first seen is kept, so abandoned uploads expire
+                    run["updated"] = local_run["updated"]
+                else:
+                    run["updated"] = server_run.get("createdTime") or now
+                runs[fingerprint] = run
+            self._runs = runs
+        self.save()
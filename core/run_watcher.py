@@ -0,0 +1,322 @@
+"""
+This file handles watching directories for new sequencing runs so they can be uploaded as soon as they are finished
+
+Run directories are found with the parser, so a run is only considered once it has all the files the parser
+requires (e.g. CompletedJobInfo.xml for a MiSeq run). A run is then only queued for upload once its files
+have stopped changing for a settle time, so runs that are still being copied are not uploaded early. Only the
+sample sheet and the directories the sequence files are in are checked for changes once the run can be parsed,
+and directories are read through the shared DirectoryIndex, so unchanged directories are not listed again.
+
+When the optional inotify_simple package is installed, the watched directories are woken up by file system
+events. Otherwise, or when inotify is not available, the directories are polled.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import parsers
+import progress
+from model import DirectoryStatus
+from . import run_cache
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+# Seconds between scans when no file system events are received
+DEFAULT_POLL_INTERVAL = 30
+# Seconds the files of a run must stay unchanged before it is queued for upload
+DEFAULT_SETTLE_TIME = 60
+# Seconds to wait after a file system event so a burst of events causes a single scan
+EVENT_COALESCE_TIME = 1
+
+
+def _get_run_file_list(directory, parser, directory_index):
+    """
+    Lists the sample sheet of a run and the files in the directories its sequence files are in
+
+    :param directory: run directory
+    :param parser: parser used to find the sample sheet and sequence files of the run
+    :param directory_index: DirectoryIndex to list directories with
+    :return: list of file paths, or None if the run cannot be parsed yet
+    """
+    try:
+        sample_sheet = parser.get_sample_sheet(directory)
+        sequencing_run = parser.get_sequencing_run(sample_sheet)
+        file_list = [sample_sheet]
+        for data_directory in run_cache.get_data_directories(sequencing_run):
+            file_list.extend(os.path.join(data_directory, name) for name in directory_index.list_files(data_directory))
+    except (parsers.exceptions.DirectoryError, parsers.exceptions.ValidationError,
+            parsers.exceptions.SampleSheetError, parsers.exceptions.SequenceFileError, OSError) as e:
+        logging.debug("Could not parse the run in directory {}, checking all of its files: {}".format(directory, e))
+        return None
+    return file_list
+
+
+def _get_tree_file_list(directory, directory_index):
+    """
+    Lists every file in a directory and its sub directories, symlinked directories are not followed
+
+    :param directory: directory to list
+    :param directory_index: DirectoryIndex to list directories with
+    :return: list of file paths
+    """
+    file_list = []
+    directory_list = [directory]
+    while directory_list:
+        current_directory = directory_list.pop()
+        try:
+            file_list.extend(os.path.join(current_directory, name)
+                             for name in directory_index.list_files(current_directory))
+            for name in directory_index.list_directories(current_directory):
+                sub_directory = os.path.join(current_directory, name)
+                if not os.path.islink(sub_directory):
+                    directory_list.append(sub_directory)
+        except OSError:  # directory was removed while scanning
+            continue
+    return file_list
+
+
+def get_directory_snapshot(directory, parser=None):
+    """
+    Gets a snapshot of the files of a run, used to tell if files are still being written
+
+    When the run can be parsed, only its sample sheet and the directories its sequence files are in are looked at,
+    otherwise every file in the run directory is
+
+    :param directory: run directory to snapshot
+    :param parser: parser used to find the sample sheet and sequence files of the run, or None to look at every file
+    :return: tuple of (file count, total size, newest modification time)
+    """
+    directory_index = progress.directory_index.get_directory_index()
+    file_list = None
+    if parser is not None:
+        file_list = _get_run_file_list(directory, parser, directory_index)
+    if file_list is None:
+        file_list = _get_tree_file_list(directory, directory_index)
+
+    file_count = 0
+    total_size = 0
+    newest_mtime = 0
+    for file_path in file_list:
+        stat = directory_index.stat(file_path)
+        if stat is None:  # file was removed while scanning
+            continue
+        file_count += 1
+        total_size += stat.st_size
+        newest_mtime = max(newest_mtime, stat.st_mtime_ns)
+    return file_count, total_size, newest_mtime
+
+
+class _InotifyWaiter:
+    """
+    Waits for file system events in the watched directories and the run directories inside them
+    """
+
+    def __init__(self):
+        flags = inotify_simple.flags
+        self._mask = (flags.CREATE | flags.MOVED_TO | flags.CLOSE_WRITE | flags.DELETE | flags.ATTRIB)
+        self._inotify = inotify_simple.INotify()
+        self._watched = set()
+
+    def watch(self, directory):
+        """
+        Adds a directory to be watched, if it is not already
+
+        :param directory: directory to watch
+        :return: None
+        """
+        if directory in self._watched:
+            return
+        try:
+            self._inotify.add_watch(directory, self._mask)
+            self._watched.add(directory)
+        except OSError as e:  # the watch limit can be reached on hosts with many runs
+            logging.debug("Could not add inotify watch to {}: {}".format(directory, e))
+
+    def wait(self, timeout):
+        """
+        Waits until a file system event is received or the timeout runs out
+
+        :param timeout: seconds to wait
+        :return: True if events were received
+        """
+        return len(self._inotify.read(timeout=int(timeout * 1000))) > 0
+
+    def drain(self):
+        """
+        Discards events that have been received
+        :return: None
+        """
+        self._inotify.read(timeout=0)
+
+    def close(self):
+        self._inotify.close()
+
+
+class RunWatcher:
+    """
+    Watches directories for new run directories, and puts each run directory on the upload queue once
+    its files have stopped changing
+    """
+
+    def __init__(self, directory_list, parser, upload_queue,
+                 poll_interval=DEFAULT_POLL_INTERVAL, settle_time=DEFAULT_SETTLE_TIME, use_inotify=True):
+        """
+        :param directory_list: list of directories that sequencing runs are written to
+        :param parser: parser used to find run directories
+        :param upload_queue: queue.Queue that run directories are put on when they are ready to upload
+        :param poll_interval: seconds between scans when no file system events are received
+        :param settle_time: seconds the files of a run must stay unchanged before it is queued
+        :param use_inotify: when False, the directories are always polled
+        """
+        self._directory_list = directory_list
+        self._parser = parser
+        self._upload_queue = upload_queue
+        self._poll_interval = poll_interval
+        self._settle_time = settle_time
+
+        # run directory -> (snapshot, time the snapshot was first seen)
+        self._pending = {}
+        # run directories that are on the queue or being uploaded
+        self._queued = set()
+        # run directory -> snapshot when its upload finished, so a run is not uploaded again unless it changes
+        self._finished = {}
+        self._queued_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._waiter = None
+        if use_inotify and inotify_simple is not None:
+            try:
+                self._waiter = _InotifyWaiter()
+            except OSError as e:
+                logging.warning("Could not start inotify, falling back to polling: {}".format(e))
+
+    @property
+    def uses_inotify(self):
+        return self._waiter is not None
+
+    def scan(self):
+        """
+        Finds new runs in the watched directories, and queues the runs that are ready to upload
+
+        :return: list of run directories that were queued
+        """
+        now = time.monotonic()
+        seen = set()
+        queued_list = []
+        for directory in self._directory_list:
+            if self._waiter:
+                self._waiter.watch(directory)
+            try:
+                run_list = list(self._parser.iter_runs(directory))
+            except (parsers.exceptions.DirectoryError, OSError) as e:
+                logging.warning("Could not look for runs in directory {}: {}".format(directory, e))
+                continue
+
+            for run in run_list:
+                if self._waiter:
+                    # Runs are not valid until their required files exist, so watch them to see the files appear
+                    self._waiter.watch(run.directory)
+                with self._queued_lock:
+                    if run.directory in self._queued:
+                        continue
+                if not run.status_equals(DirectoryStatus.NEW):
+                    continue
+
+                seen.add(run.directory)
+                snapshot = get_directory_snapshot(run.directory, self._parser)
+                if self._finished.get(run.directory) == snapshot:
+                    # The status file could not be written to the run directory, so the run still looks new
+                    continue
+                previous = self._pending.get(run.directory)
+                if previous is None or previous[0] != snapshot:
+                    logging.debug("Run in directory {} is still changing".format(run.directory))
+                    self._pending[run.directory] = (snapshot, now)
+                    continue
+                if now - previous[1] < self._settle_time:
+                    continue
+
+                logging.info("Run in directory {} is ready to upload".format(run.directory))
+                del self._pending[run.directory]
+                with self._queued_lock:
+                    self._queued.add(run.directory)
+                self._upload_queue.put(run.directory)
+                queued_list.append(run.directory)
+
+        # forget runs that have disappeared or are no longer new
+        for directory in list(self._pending):
+            if directory not in seen:
+                del self._pending[directory]
+
+        return queued_list
+
+    def upload_finished(self, directory):
+        """
+        Lets the watcher consider a run directory again once its upload has finished.
+        The run will only be queued again if its status is still new and its files have changed.
+
+        :param directory: run directory that was taken from the upload queue
+        :return: None
+        """
+        snapshot = get_directory_snapshot(directory, self._parser)
+        with self._queued_lock:
+            self._finished[directory] = snapshot
+            self._queued.discard(directory)
+
+    def _wait(self):
+        """
+        Waits until the next scan should happen
+        :return: None
+        """
+        timeout = self._poll_interval
+        if self._pending:
+            # wake up in time to queue pending runs once they settle
+            timeout = min(timeout, max(self._settle_time, EVENT_COALESCE_TIME))
+
+        if self._waiter is None:
+            self._stop_event.wait(timeout)
+            return
+
+        if self._waiter.wait(timeout):
+            # Files are often written in bursts, wait a moment so the whole burst causes a single scan
+            self._stop_event.wait(EVENT_COALESCE_TIME)
+            self._waiter.drain()
+
+    def run(self):
+        """
+        Scans the watched directories until stop() is called
+        :return: None
+        """
+        logging.info("Watching for new runs in: {} ({})".format(
+            ", ".join(self._directory_list), "inotify" if self.uses_inotify else "polling"))
+        while not self._stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                # A watcher that stops silently would leave runs un-uploaded, so keep going
+                logging.exception("Error while looking for new runs: {}".format(e))
+            self._wait()
+        if self._waiter:
+            self._waiter.close()
+
+    def start(self):
+        """
+        Starts scanning in a background thread
+        :return: None
+        """
+        self._thread = threading.Thread(target=self.run, name="run-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background scanning thread
+        :return: None
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self._poll_interval + EVENT_COALESCE_TIME)
@@ -0,0 +1,96 @@
+"""
+This file handles timing the phases of an upload, so the time spent in each phase can be logged
+"""
+
+import logging
+import threading
+import time
+
+import messaging
+
+
+class PhaseTimer:
+    """
+    Times the phases of an upload
+
+    Phases on the main thread are timed with lap(), which ends the current phase and starts the next one.
+    Work done in a background thread is added with add_background(), and phases that wait for background
+    work are marked so the time saved by running the work in the background can be shown.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_time = time.perf_counter()
+        self._lap_time = self._start_time
+        # list of (name, seconds, waits_for_background)
+        self._phase_list = []
+        # list of (name, seconds)
+        self._background_list = []
+
+    def lap(self, name, waits_for_background=False):
+        """
+        Ends the current phase
+
+        :param name: name of the phase that just ended
+        :param waits_for_background: True if the phase was spent waiting for background work to finish
+        :return: seconds spent in the phase
+        """
+        now = time.perf_counter()
+        messaging.tracing.add_span(name, "phase", self._lap_time, now)
+        seconds = now - self._lap_time
+        self._lap_time = now
+        with self._lock:
+            self._phase_list.append((name, seconds, waits_for_background))
+        return seconds
+
+    def add_background(self, name, seconds):
+        """
+        Adds work that was done in a background thread
+
+        :param name: name of the work
+        :param seconds: seconds the work took
+        :return: None
+        """
+        with self._lock:
+            self._background_list.append((name, seconds))
+
+    @property
+    def phase_list(self):
+        with self._lock:
+            return list(self._phase_list)
+
+    @property
+    def background_list(self):
+        with self._lock:
+            return list(self._background_list)
+
+    def total(self):
+        """
+        :return: seconds from when the timer was created until the end of the last phase
+        """
+        return self._lap_time - self._start_time
+
+    def saved(self):
+        """
+        Time saved by doing work in the background, the background work time less the time spent waiting for it
+
+        :return: seconds
+        """
+        with self._lock:
+            background_time = sum(seconds for name, seconds in self._background_list)
+            wait_time = sum(seconds for name, seconds, waits in self._phase_list if waits)
+        return max(0.0, background_time - wait_time)
+
+    def log_summary(self):
+        """
+        Logs the time spent in each phase
+        :return: None
+        """
+        logging.info("Timing breakdown:")
+        for name, seconds, waits in self.phase_list:
+            logging.info("  {:<40} {:>9.2f}s".format(name, seconds))
+        for name, seconds in self.background_list:
+            logging.info("  {:<40} {:>9.2f}s".format(name + " (background)", seconds))
+        logging.info("  {:<40} {:>9.2f}s".format("total", self.total()))
+        if self.background_list:
+            logging.info("  {:<40} {:>9.2f}s".format("saved by background work", self.saved()))
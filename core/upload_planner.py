@@ -0,0 +1,138 @@
+"""
+This file handles planning the order that samples and runs are uploaded in
+
+When several uploads run at the same time, the order they are started in decides how long the whole upload
+takes. Starting the largest uploads first (longest processing time first) avoids a large upload being started
+last and running alone after everything else has finished. Starting the smallest uploads first instead gets
+the most samples onto IRIDA quickly, and sheet order keeps the order of the sample sheet.
+"""
+
+import heapq
+import logging
+
+import parsers
+import progress
+from . import parsing_handler
+
+# Upload order policies
+SHEET_ORDER = "sheet"
+LARGEST_FIRST = "largest_first"
+SMALLEST_FIRST = "smallest_first"
+UPLOAD_ORDER_LIST = [SHEET_ORDER, LARGEST_FIRST, SMALLEST_FIRST]
+DEFAULT_UPLOAD_ORDER = SHEET_ORDER
+
+
+def _check_upload_order(upload_order):
+    if upload_order not in UPLOAD_ORDER_LIST:
+        raise ValueError("Unknown upload order '{}', must be one of: {}".format(
+            upload_order, ", ".join(UPLOAD_ORDER_LIST)))
+
+
+def order_by_size(item_list, size_list, upload_order):
+    """
+    Orders items by their size with the upload order policy.
+    Items with the same size keep their original order.
+
+    :param item_list: list of items to order
+    :param size_list: size of each item
+    :param upload_order: one of UPLOAD_ORDER_LIST
+    :return: ordered list of items
+    """
+    _check_upload_order(upload_order)
+    if upload_order == SHEET_ORDER:
+        return list(item_list)
+    index_list = sorted(range(len(item_list)), key=lambda i: size_list[i], reverse=(upload_order == LARGEST_FIRST))
+    return [item_list[i] for i in index_list]
+
+
+def get_sample_upload_size(sample):
+    """
+    Gets the number of bytes that will be uploaded for a sample
+
+    :param sample: Sample object
+    :return: total size of the sample's sequence files
+    """
+    directory_index = progress.directory_index.get_directory_index()
+    return sum(directory_index.getsize(file_name) for file_name in sample.sequence_file.file_list)
+
+
+def get_run_upload_size(directory):
+    """
+    Gets the number of bytes that will be uploaded for a run, from the sequence files in its sample sheet
+
+    Only the files that will be sent are looked at, so other files in the run directory do not count towards its size
+
+    :param directory: run directory
+    :return: total size of the run's sequence files, 0 if the run cannot be parsed
+    """
+    parser_instance = parsing_handler.get_parser_from_config()
+    try:
+        sequencing_run = parser_instance.get_sequencing_run(parser_instance.get_sample_sheet(directory))
+        return sum(get_sample_upload_size(sample)
+                   for project in sequencing_run.project_list for sample in project.sample_list)
+    except (parsers.exceptions.DirectoryError, parsers.exceptions.ValidationError, OSError) as e:
+        # the run will fail when it is uploaded, where the error is reported
+        logging.debug("Could not get the size of the run in directory {}: {}".format(directory, e))
+        return 0
+
+
+def get_planned_upload_size(project, sample, size_dict=None):
+    """
+    Gets the number of bytes that will be uploaded for a sample, from an upload plan if it has the sample
+
+    :param project: Project the sample is uploaded to
+    :param sample: Sample object
+    :param size_dict: dict of (project id, sample name) -> bytes to upload, from a cached upload plan
+    :return: total size of the sample's sequence files
+    """
+    if size_dict is not None and (project.id, sample.sample_name) in size_dict:
+        return size_dict[(project.id, sample.sample_name)]
+    return get_sample_upload_size(sample)
+
+
+def plan_sample_uploads(sequencing_run, upload_order=DEFAULT_UPLOAD_ORDER, size_dict=None):
+    """
+    Orders every sample in a sequencing run for upload, across all of the run's projects
+
+    :param sequencing_run: SequencingRun object
+    :param upload_order: one of UPLOAD_ORDER_LIST
+    :param size_dict: dict of (project id, sample name) -> bytes to upload, sizes that are not in it are read
+        from the sequence files
+    :return: list of (project, sample) tuples in the order they should be uploaded
+    """
+    _check_upload_order(upload_order)
+    plan = [(project, sample) for project in sequencing_run.project_list for sample in project.sample_list]
+    if upload_order == SHEET_ORDER:
+        return plan
+    return order_by_size(plan, [get_planned_upload_size(project, sample, size_dict) for project, sample in plan],
+                         upload_order)
+
+
+def plan_run_uploads(directory_list, upload_order=DEFAULT_UPLOAD_ORDER):
+    """
+    Orders run directories for upload by the size of the sequence files in each run's sample sheet
+
+    :param directory_list: list of run directories
+    :param upload_order: one of UPLOAD_ORDER_LIST, sheet order keeps the order of directory_list
+    :return: list of run directories in the order they should be uploaded
+    """
+    _check_upload_order(upload_order)
+    if upload_order == SHEET_ORDER:
+        return list(directory_list)
+    return order_by_size(directory_list, [get_run_upload_size(d) for d in directory_list], upload_order)
+
+
+def simulate_makespan(size_list, workers):
+    """
+    Simulates uploading items in the given order, where each item starts on the first worker that is free
+
+    Used to compare upload orders, the time to upload an item is taken as its size
+
+    :param size_list: list of item sizes, in the order they are started
+    :param workers: number of items that are uploaded at the same time
+    :return: time until every item has been uploaded
+    """
+    worker_finish_list = [0] * max(1, workers)
+    for size in size_list:
+        heapq.heapreplace(worker_finish_list, worker_finish_list[0] + size)
+    return max(worker_finish_list)
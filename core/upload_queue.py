@@ -0,0 +1,277 @@
+"""
+This file manages a durable queue of run directories waiting to be uploaded
+
+The queue is stored in a SQLite database in the users cache directory, so runs stay queued when the uploader
+is stopped or crashes, and several processes can add to and work on the same queue.
+
+Runs are taken from the queue in order of their priority class, and first in first out within a class.
+A worker takes a run by leasing it. The lease must be renewed while the run is uploading, and a run with an
+expired lease (e.g. the worker crashed) is given to the next worker that asks for a run.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from appdirs import user_cache_dir
+
+# File name of the queue database
+QUEUE_FILE_NAME = "upload_queue.sqlite"
+
+# Priority classes, runs in a class with a lower number are uploaded first
+PRIORITY_CLASSES = {
+    "outbreak": 0,
+    "clinical": 1,
+    "routine": 2,
+    "research": 3,
+}
+DEFAULT_PRIORITY_CLASS = "routine"
+
+# Seconds a leased run is held for a worker before another worker can take it
+DEFAULT_LEASE_TIME = 300
+
+# Normal base cache directory name
+cache_directory_name = "irida-uploader"
+# When running tests, the Makefile creates an environment variable IRIDA_UPLOADER_TEST to 'True'
+# If it exists then we are running a test and should be using the test cache directory
+if os.environ.get('IRIDA_UPLOADER_TEST'):
+    cache_directory_name = "irida-uploader-test"
+
+_upload_queue_instance = None
+_upload_queue_lock = threading.Lock()
+
+
+class QueuedRun:
+    """
+    A run directory taken from the upload queue
+    """
+
+    def __init__(self, job_id, directory, priority_class, attempts, lease_owner):
+        self._job_id = job_id
+        self._directory = directory
+        self._priority_class = priority_class
+        self._attempts = attempts
+        self._lease_owner = lease_owner
+
+    @property
+    def job_id(self):
+        return self._job_id
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def priority_class(self):
+        return self._priority_class
+
+    @property
+    def attempts(self):
+        """
+        Number of times the run has been leased, including the current lease
+        """
+        return self._attempts
+
+    @property
+    def lease_owner(self):
+        return self._lease_owner
+
+
+class UploadQueue:
+    """
+    SQLite backed priority queue of run directories
+    """
+
+    def __init__(self, queue_file):
+        """
+        :param queue_file: path to the SQLite database file, created if it does not exist
+        """
+        if not os.path.exists(os.path.dirname(queue_file)):
+            os.makedirs(os.path.dirname(queue_file))
+        self._queue_file = queue_file
+        self._lock = threading.Lock()
+        # Transactions are started explicitly, so a lease can lock the database before reading the next run
+        self._connection = sqlite3.connect(queue_file, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                                 "job_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                 "directory TEXT UNIQUE, "
+                                 "priority INTEGER, "
+                                 "priority_class TEXT, "
+                                 "enqueued_at REAL, "
+                                 "available_at REAL, "
+                                 "attempts INTEGER DEFAULT 0, "
+                                 "lease_owner TEXT, "
+                                 "lease_expires REAL, "
+                                 "last_error TEXT)")
+
+    @property
+    def queue_file(self):
+        return self._queue_file
+
+    def _transaction(self, statement_list):
+        """
+        Runs statements in a single write transaction
+
+        :param statement_list: list of (sql, parameters) tuples
+        :return: cursor of the last statement
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = None
+                for sql, parameters in statement_list:
+                    cursor = self._connection.execute(sql, parameters)
+                self._connection.execute("COMMIT")
+                return cursor
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, directory, priority_class=DEFAULT_PRIORITY_CLASS):
+        """
+        Adds a run directory to the queue
+
+        A run that is already queued keeps its place, but is moved to the given priority class if it is higher
+
+        :param directory: run directory
+        :param priority_class: one of PRIORITY_CLASSES
+        :return: None
+        """
+        if priority_class not in PRIORITY_CLASSES:
+            raise ValueError("Unknown priority class '{}', must be one of: {}".format(
+                priority_class, ", ".join(PRIORITY_CLASSES)))
+        priority = PRIORITY_CLASSES[priority_class]
+        now = time.time()
+        self._transaction([
+            ("INSERT OR IGNORE INTO jobs (directory, priority, priority_class, enqueued_at, available_at) "
+             "VALUES (?, ?, ?, ?, ?)", (os.path.abspath(directory), priority, priority_class, now, now)),
+            ("UPDATE jobs SET priority = ?, priority_class = ? WHERE directory = ? AND priority > ?",
+             (priority, priority_class, os.path.abspath(directory), priority)),
+        ])
+
+    def lease(self, owner, lease_time=DEFAULT_LEASE_TIME):
+        """
+        Takes the next run from the queue, which is held for the owner until the lease expires
+
+        :param owner: name of the worker taking the run
+        :param lease_time: seconds until the lease expires
+        :return: QueuedRun, or None if no run is available
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT job_id, directory, priority_class, attempts FROM jobs "
+                    "WHERE available_at <= ? AND (lease_owner IS NULL OR lease_expires < ?) "
+                    "ORDER BY priority, enqueued_at, job_id LIMIT 1", (now, now)).fetchone()
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE jobs SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                        "WHERE job_id = ?", (owner, now + lease_time, row[0]))
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, directory, priority_class, attempts = row
+        return QueuedRun(job_id, directory, priority_class, attempts + 1, owner)
+
+    def renew(self, queued_run, lease_time=DEFAULT_LEASE_TIME):
+        """
+        Extends the lease on a run
+
+        :param queued_run: QueuedRun from lease()
+        :param lease_time: seconds from now until the lease expires
+        :return: True if the lease is still held by the owner
+        """
+        cursor = self._transaction([
+            ("UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND lease_owner = ?",
+             (time.time() + lease_time, queued_run.job_id, queued_run.lease_owner)),
+        ])
+        return cursor.rowcount == 1
+
+    def complete(self, queued_run):
+        """
+        Removes a run from the queue once it has been uploaded, or has failed in a way retrying will not fix
+
+        :param queued_run: QueuedRun from lease()
+        :return: None
+        """
+        self._transaction([
+            ("DELETE FROM jobs WHERE job_id = ? AND lease_owner = ?", (queued_run.job_id, queued_run.lease_owner)),
+        ])
+
+    def release(self, queued_run, error=None, retry_delay=0):
+        """
+        Gives a leased run back to the queue so it is tried again, keeping its place in the queue
+
+        :param queued_run: QueuedRun from lease()
+        :param error: optional message of why the run could not be uploaded
+        :param retry_delay: seconds before the run can be leased again
+        :return: None
+        """
+        self._transaction([
+            ("UPDATE jobs SET lease_owner = NULL, lease_expires = NULL, available_at = ?, last_error = ? "
+             "WHERE job_id = ? AND lease_owner = ?",
+             (time.time() + retry_delay, error, queued_run.job_id, queued_run.lease_owner)),
+        ])
+
+    def remove(self, directory):
+        """
+        Removes a run directory from the queue, whether it is leased or not
+
+        :param directory: run directory
+        :return: None
+        """
+        self._transaction([
+            ("DELETE FROM jobs WHERE directory = ?", (os.path.abspath(directory),)),
+        ])
+
+    def list_jobs(self):
+        """
+        Lists the runs in the queue, in the order they will be uploaded
+
+        :return: list of dicts with the keys directory, priority_class, attempts, leased, last_error
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT directory, priority_class, attempts, lease_owner IS NOT NULL AND lease_expires >= ?, "
+                "last_error FROM jobs ORDER BY priority, enqueued_at, job_id", (now,)).fetchall()
+        return [{"directory": r[0], "priority_class": r[1], "attempts": r[2], "leased": bool(r[3]),
+                 "last_error": r[4]} for r in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+def get_upload_queue():
+    """
+    Returns the shared UploadQueue, creating it in the users cache directory the first time it is used
+
+    :return: UploadQueue
+    """
+    global _upload_queue_instance
+    with _upload_queue_lock:
+        if _upload_queue_instance is None:
+            queue_file = os.path.join(user_cache_dir(cache_directory_name), QUEUE_FILE_NAME)
+            logging.debug("Using upload queue {}".format(queue_file))
+            _upload_queue_instance = UploadQueue(queue_file)
+        return _upload_queue_instance
+
+
+def set_upload_queue(upload_queue):
+    """
+    Replaces the shared UploadQueue, used to point the queue at a different database file
+
+    :param upload_queue: UploadQueue object, or None to reopen the default queue when it is next requested
+    :return: None
+    """
+    global _upload_queue_instance
+    with _upload_queue_lock:
+        _upload_queue_instance = upload_queue
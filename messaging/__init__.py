@@ -0,0 +1,4 @@
+from .pubsub import MessageTopics, ApiMessage, MessageBus, get_message_bus, set_message_bus, send_message
+from .run_progress import RunProgress, RunProgressSubscriber
+from .subscribers import start_default_subscribers, get_run_progress
+from . import run_context, tracing
@@ -1,67 +1,355 @@
 """
-This will eventually handle the message passing from the api layer
-Right now it is just a dummy function that prints
+This file handles passing messages from the api layer to anything that wants to observe an upload
+
+Publishers (like the loop sending a file) hand a message to the bus and carry on, they never wait for a subscriber.
+Each subscriber has its own bounded queue and thread, and receives messages at its own pace. Progress messages
+for the same file replace each other while they wait in a queue, so a subscriber that renders at a fixed rate
+only sees the latest progress of each file, no matter how often progress is published.
 """
-def send_message(message):
-    print(message)
-    return
 
+import logging
+import threading
 
-"""
-Below is work in progress (non working) code of how the code could flow
-to be redone once the UI is implemented
-"""
+from collections import deque
+
+# Messages that can wait for a subscriber, new messages are dropped while a subscriber's queue is full
+DEFAULT_QUEUE_SIZE = 1000
+# Seconds to wait for subscribers to receive their messages when the bus is closed
+DEFAULT_CLOSE_TIMEOUT = 5
+
+_message_bus_instance = None
+_message_bus_lock = threading.Lock()
+
+
+class MessageTopics(object):
+    upload_started_topic = "upload_started"
+    upload_progress_topic = "upload_progress"
+    upload_completed_topic = "upload_completed"
+    upload_failed_topic = "upload_failed"
+    sample_upload_completed_topic = "sample_upload_completed"
+    run_upload_started_topic = "run_upload_started"
+    run_upload_finished_topic = "run_upload_finished"
+
+    # Topics where only the latest waiting message for each file is kept
+    coalesced_topic_list = [upload_progress_topic]
+
+
+class ApiMessage(object):
+
+    __slots__ = ('_topic', '_exception', '_run_id', '_project_id', '_sample_name', '_sequence_file_name',
+                 '_progress', '_bytes_sent', '_total_bytes', '_sample_count')
+
+    def __init__(self,
+                 topic,
+                 exception=None,
+                 run_id=None,
+                 project_id=None,
+                 sample_name=None,
+                 sequence_file_name=None,
+                 progress=None,
+                 bytes_sent=None,
+                 total_bytes=None,
+                 sample_count=None):
+        """
+        :param topic: one of the MessageTopics
+        :param exception: exception that caused an upload to fail
+        :param run_id: sequencing run the files are uploaded to
+        :param project_id: project the file is uploaded to
+        :param sample_name: sample the file is uploaded to
+        :param sequence_file_name: file being uploaded
+        :param progress: percent of the file uploaded
+        :param bytes_sent: bytes of the file uploaded so far
+        :param total_bytes: size of the file, or of the whole run for run messages
+        :param sample_count: number of samples in the run, for run messages
+        """
+        self._topic = topic
+        self._exception = exception
+        self._run_id = run_id
+        self._project_id = project_id
+        self._sample_name = sample_name
+        self._sequence_file_name = sequence_file_name
+        self._progress = progress
+        self._bytes_sent = bytes_sent
+        self._total_bytes = total_bytes
+        self._sample_count = sample_count
+
+    @property
+    def topic(self):
+        return self._topic
+
+    @property
+    def exception(self):
+        return self._exception
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    @property
+    def project_id(self):
+        return self._project_id
+
+    @property
+    def sample_name(self):
+        return self._sample_name
+
+    @property
+    def sequence_file_name(self):
+        return self._sequence_file_name
+
+    @property
+    def progress(self):
+        return self._progress
+
+    @property
+    def bytes_sent(self):
+        return self._bytes_sent
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    @property
+    def sample_count(self):
+        return self._sample_count
+
+    def get_coalesce_key(self):
+        """
+        :return: key shared by the messages that replace each other while waiting, None if nothing replaces this one
+        """
+        if self._topic not in MessageTopics.coalesced_topic_list:
+            return None
+        return self._topic, self._run_id, self._project_id, self._sample_name, self._sequence_file_name
+
+    def __str__(self):
+        return "topic: " + str(self._topic) + \
+               ", run_id: " + str(self._run_id) + \
+               ", project_id: " + str(self._project_id) + \
+               ", sample_name: " + str(self._sample_name) + \
+               ", sequence_file_name: " + str(self._sequence_file_name)
+
+
+class Subscription(object):
+    """
+    Receives the messages of some topics on its own thread
+    """
+
+    def __init__(self, topic_list, callback, interval=None, max_queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param topic_list: topics to receive messages from
+        :param callback: function called with each message, on the subscription's thread
+        :param interval: when set, messages are given to the callback at most once every interval seconds,
+            so progress is rendered at a fixed rate
+        :param max_queue_size: messages that can wait before new messages are dropped
+        """
+        self._topic_set = frozenset(topic_list)
+        self._callback = callback
+        self._interval = interval
+        self._max_queue_size = max_queue_size
+        self._condition = threading.Condition()
+        # messages, and coalesce keys of messages in _coalesced_dict, in the order they were published
+        self._queue = deque()
+        # coalesce key -> latest message with the key
+        self._coalesced_dict = {}
+        self._dropped_count = 0
+        self._delivering = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="subscription", daemon=True)
+        self._thread.start()
+
+    @property
+    def topic_set(self):
+        return self._topic_set
+
+    @property
+    def dropped_count(self):
+        return self._dropped_count
+
+    def offer(self, message):
+        """
+        Adds a message to the queue without waiting
+
+        :param message: ApiMessage
+        :return: False if the queue was full and the message was dropped
+        """
+        coalesce_key = message.get_coalesce_key()
+        with self._condition:
+            if coalesce_key is not None and coalesce_key in self._coalesced_dict:
+                self._coalesced_dict[coalesce_key] = message
+                return True
+            if len(self._queue) >= self._max_queue_size:
+                self._dropped_count += 1
+                return False
+            if coalesce_key is None:
+                self._queue.append(message)
+            else:
+                self._coalesced_dict[coalesce_key] = message
+                self._queue.append(coalesce_key)
+            self._condition.notify_all()
+        return True
+
+    def _take_messages(self):
+        """
+        Empties the queue, must be called with the condition held
+
+        :return: list of messages in the order they were published
+        """
+        message_list = []
+        while self._queue:
+            entry = self._queue.popleft()
+            if isinstance(entry, tuple):
+                entry = self._coalesced_dict.pop(entry)
+            message_list.append(entry)
+        return message_list
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopped)
+                if not self._queue:
+                    return
+                message_list = self._take_messages()
+                self._delivering = True
+            for message in message_list:
+                try:
+                    self._callback(message)
+                except Exception as e:
+                    logging.debug("Subscriber could not handle message '{}': {}".format(message, e))
+            with self._condition:
+                self._delivering = False
+                self._condition.notify_all()
+                if self._interval:
+                    self._condition.wait_for(lambda: self._stopped, timeout=self._interval)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every waiting message has been given to the callback
+
+        :param timeout: seconds to wait, None to wait until done
+        :return: True if every message was given to the callback
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._delivering, timeout=timeout)
+
+    def stop(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """
+        Stops the subscription once the waiting messages have been given to the callback
+
+        :param timeout: seconds to wait for the waiting messages
+        :return: None
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+
+class MessageBus(object):
+    """
+    Passes published messages to every subscription of the message's topic
+    """
+
+    def __init__(self):
+        # Replaced rather than changed, so publishing can read it without a lock
+        self._subscription_list = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic_list, callback, interval=None, max_queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Starts giving the messages of some topics to a callback
+
+        :param topic_list: topics to receive messages from
+        :param callback: function called with each message, on a thread of its own
+        :param interval: when set, messages are given to the callback at most once every interval seconds
+        :param max_queue_size: messages that can wait before new messages are dropped
+        :return: Subscription
+        """
+        subscription = Subscription(topic_list, callback, interval, max_queue_size)
+        with self._lock:
+            self._subscription_list = self._subscription_list + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stops a subscription, after the messages waiting for it have been given to its callback
+
+        :param subscription: Subscription returned by subscribe
+        :return: None
+        """
+        with self._lock:
+            self._subscription_list = tuple(s for s in self._subscription_list if s is not subscription)
+        subscription.stop()
+
+    def publish(self, message):
+        """
+        Gives a message to every subscription of its topic, without waiting for any subscriber
+
+        :param message: ApiMessage
+        :return: None
+        """
+        for subscription in self._subscription_list:
+            if message.topic in subscription.topic_set:
+                subscription.offer(message)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every subscription has been given its waiting messages
+
+        :param timeout: seconds to wait for each subscription, None to wait until done
+        :return: None
+        """
+        for subscription in self._subscription_list:
+            subscription.flush(timeout)
+
+    def close(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """
+        Stops every subscription, after their waiting messages have been given to their callbacks
+
+        :param timeout: seconds to wait for each subscription
+        :return: None
+        """
+        with self._lock:
+            subscription_list = self._subscription_list
+            self._subscription_list = ()
+        for subscription in subscription_list:
+            subscription.stop(timeout)
+
+
+def get_message_bus():
+    """
+    Returns the shared MessageBus, creating it the first time it is used
+
+    :return: MessageBus
+    """
+    global _message_bus_instance
+    with _message_bus_lock:
+        if _message_bus_instance is None:
+            _message_bus_instance = MessageBus()
+        return _message_bus_instance
+
+
+def set_message_bus(message_bus):
+    """
+    Replaces the shared MessageBus
+
+    :param message_bus: MessageBus object, or None to create a new bus when it is next requested
+    :return: None
+    """
+    global _message_bus_instance
+    with _message_bus_lock:
+        _message_bus_instance = message_bus
+
+
+def send_message(message):
+    """
+    Publishes a message on the shared MessageBus
 
-#
-# class MessageTopics(object):
-#     upload_progress_topic = "finished_run_scan"
-#     upload_started_topic = "run_discovered"
-#     upload_completed_topic = "garbled_sample_sheet"
-#     upload_failed_topic = "missing_files"
-#
-#
-# class ApiMessage(object):
-#     # todo: add run_id to this too?
-#     def __init__(self,
-#                  topic,
-#                  exception=None,
-#                  project_id=None,
-#                  sample_name=None,
-#                  sequence_file_name=None,
-#                  progress=None):
-#         self._topic = topic
-#         self._exception = exception
-#         self._project_id = project_id
-#         self._sample_name = sample_name
-#         self._sequence_file_name = sequence_file_name
-#         self._progress = progress
-#
-#     @property
-#     def property(self):
-#         return self._topic
-#
-#     @property
-#     def exception(self):
-#         return self._exception
-#
-#     @property
-#     def project_id(self):
-#         return self._project_id
-#
-#     @property
-#     def sample_name(self):
-#         return self._sample_name
-#
-#     @property
-#     def sequence_file_name(self):
-#         return self._sequence_file_name
-#
-#     @property
-#     def progress(self):
-#         return self._progress
-#
-#     def __str__(self):
-#         return "topic: " + self._topic + \
-#                ", project_id: " + self.project_id + \
-#                ", sample_name: " + self._sample_name + \
-#                ", sequence_file_name: " + self._sequence_file_name
+    :param message: ApiMessage
+    :return: None
+    """
+    # Read without the lock once the bus exists, this is called for every chunk of every file sent
+    message_bus = _message_bus_instance
+    if message_bus is None:
+        message_bus = get_message_bus()
+    message_bus.publish(message)
@@ -0,0 +1,50 @@
+"""
+This file handles knowing which run the current thread is working on
+
+Runs uploaded at the same time each log to their own run directory. A run does its work on more than one thread
+(connecting to IRIDA, checking files, uploading samples), so the run is kept in a thread local that the threads
+started for a run are given with bind().
+"""
+
+import functools
+import threading
+
+_run_context = threading.local()
+
+
+def get_run_directory():
+    """
+    :return: directory of the run the current thread is working on, None when it is not working on a run
+    """
+    return getattr(_run_context, "directory", None)
+
+
+def set_run_directory(directory):
+    """
+    Sets the run the current thread is working on
+
+    :param directory: directory of the run, None when the thread has finished working on a run
+    :return: None
+    """
+    _run_context.directory = directory
+
+
+def bind(function):
+    """
+    Wraps a function that is run on another thread so it works on the run of the thread that called bind()
+
+    :param function: function to wrap
+    :return: wrapped function
+    """
+    directory = get_run_directory()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous_directory = get_run_directory()
+        set_run_directory(directory)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # pool threads are reused for other runs
+            set_run_directory(previous_directory)
+    return wrapper
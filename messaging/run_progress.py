@@ -0,0 +1,324 @@
+"""
+This file aggregates the progress of every file being sent into the progress of each sequencing run
+
+The bytes sent are tracked per file, sample and run. The upload rate of a run is an exponentially weighted moving
+average, so it follows changes in the speed of the link without jumping around with every chunk, and the time
+left is estimated from it. The progress of the runs being uploaded is shown on a single status line that is
+rewritten at most every RENDER_INTERVAL seconds, or as JSON lines every JSON_RENDER_INTERVAL seconds when the
+output is not a terminal (for example when the uploader is started by cron and the output goes to a file).
+"""
+
+import json
+import math
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+
+from .pubsub import MessageTopics
+
+# Seconds over which the upload rate is averaged, a rate counts for about a third as much after this long
+RATE_TIME_CONSTANT = 20
+# Seconds between updates of the status line on a terminal
+RENDER_INTERVAL = 1
+# Seconds between JSON lines when the output is not a terminal
+JSON_RENDER_INTERVAL = 30
+# Finished runs whose progress is kept, so it can be read after the run has been uploaded
+FINISHED_RUNS_KEPT = 100
+
+
+def format_bytes(byte_count):
+    """
+    :param byte_count: number of bytes
+    :return: the number of bytes in the largest unit that keeps it above 1, for example '1.5 GiB'
+    """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if abs(byte_count) < 1024:
+            return "{:.1f} {}".format(byte_count, unit)
+        byte_count /= 1024
+    return "{:.1f} TiB".format(byte_count)
+
+
+def format_duration(seconds):
+    """
+    :param seconds: number of seconds
+    :return: the duration as H:MM:SS
+    """
+    seconds = int(round(seconds))
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class RunProgress(object):
+    """
+    The progress of one sequencing run
+    """
+
+    def __init__(self, run_id, total_bytes=None, sample_count=None, start_time=None):
+        """
+        :param run_id: sequencing run id on IRIDA
+        :param total_bytes: bytes that will be sent for the run, None if not known
+        :param sample_count: number of samples in the run, None if not known
+        :param start_time: time.monotonic() when the upload started, defaults to now
+        """
+        self.run_id = run_id
+        self.total_bytes = total_bytes
+        self.sample_count = sample_count
+        self.start_time = time.monotonic() if start_time is None else start_time
+        # (project id, sample name) -> {file name -> bytes sent}
+        self._sample_dict = {}
+        self._completed_sample_set = set()
+        self._bytes_sent = 0
+        self._rate = None
+        # moving average started from zero, _rate is this corrected for the pull towards zero
+        self._rate_sum = 0.0
+        self._peak_rate = None
+        self._rate_time = self.start_time
+        self._rate_bytes = 0
+        self.finish_time = None
+
+    @property
+    def bytes_sent(self):
+        return self._bytes_sent
+
+    @property
+    def rate(self):
+        """
+        :return: average upload rate in bytes per second, None until it has been measured
+        """
+        return self._rate
+
+    @property
+    def peak_rate(self):
+        """
+        Highest average upload rate, once the rate has been averaged over RATE_TIME_CONSTANT seconds, so the
+        rate of the first few chunks does not count
+
+        :return: bytes per second, None until the upload has run for RATE_TIME_CONSTANT seconds
+        """
+        return self._peak_rate
+
+    @property
+    def samples_completed(self):
+        return len(self._completed_sample_set)
+
+    def get_sample_bytes_sent(self, project_id, sample_name):
+        """
+        :param project_id: project of the sample
+        :param sample_name: name of the sample
+        :return: bytes sent for the sample
+        """
+        return sum(self._sample_dict.get((project_id, sample_name), {}).values())
+
+    def update_file(self, project_id, sample_name, file_name, bytes_sent, now=None):
+        """
+        Records the bytes sent of a file so far
+
+        A file that is sent again starts from its new byte count, so retries are not counted twice
+
+        :param project_id: project of the sample
+        :param sample_name: sample the file belongs to
+        :param file_name: file being sent
+        :param bytes_sent: bytes of the file sent so far
+        :param now: time.monotonic() of the update, defaults to now
+        :return: None
+        """
+        file_dict = self._sample_dict.setdefault((project_id, sample_name), {})
+        self._bytes_sent += bytes_sent - file_dict.get(file_name, 0)
+        file_dict[file_name] = bytes_sent
+        self._update_rate(time.monotonic() if now is None else now)
+
+    def complete_sample(self, project_id, sample_name):
+        """
+        :param project_id: project of the sample
+        :param sample_name: sample that has finished uploading
+        :return: None
+        """
+        self._completed_sample_set.add((project_id, sample_name))
+
+    def _update_rate(self, now):
+        """
+        Folds the bytes sent since the rate was last updated into the moving average
+
+        :param now: time.monotonic() of the update
+        :return: None
+        """
+        elapsed = now - self._rate_time
+        if elapsed <= 0:
+            return
+        current_rate = max(0, self._bytes_sent - self._rate_bytes) / elapsed
+        weight = 1 - math.exp(-elapsed / RATE_TIME_CONSTANT)
+        self._rate_sum += weight * (current_rate - self._rate_sum)
+        # divide by the total weight given so far, so the first rates are not given more weight than later ones
+        self._rate = self._rate_sum / (1 - math.exp(-(now - self.start_time) / RATE_TIME_CONSTANT))
+        if now - self.start_time >= RATE_TIME_CONSTANT and (self._peak_rate is None or self._rate > self._peak_rate):
+            self._peak_rate = self._rate
+        self._rate_time = now
+        self._rate_bytes = self._bytes_sent
+
+    def finish(self, now=None):
+        """
+        :param now: time.monotonic() when the run finished uploading, defaults to now
+        :return: None
+        """
+        self.finish_time = time.monotonic() if now is None else now
+
+    def get_eta(self):
+        """
+        :return: estimated seconds until the run has been sent, None if it cannot be estimated
+        """
+        if self.total_bytes is None or not self._rate:
+            return None
+        return max(0, self.total_bytes - self._bytes_sent) / self._rate
+
+    def get_status_dict(self, now=None):
+        """
+        :param now: time.monotonic() to measure the elapsed time to, defaults to now
+        :return: dict of the progress of the run
+        """
+        now = time.monotonic() if now is None else now
+        percent = None
+        if self.total_bytes:
+            percent = round(min(100.0, self._bytes_sent / self.total_bytes * 100), 2)
+        eta = self.get_eta()
+        return {"run_id": self.run_id,
+                "bytes_sent": self._bytes_sent,
+                "total_bytes": self.total_bytes,
+                "percent": percent,
+                "samples_completed": self.samples_completed,
+                "sample_count": self.sample_count,
+                "bytes_per_second": None if self._rate is None else round(self._rate),
+                "elapsed_seconds": round(now - self.start_time, 1),
+                "eta_seconds": None if eta is None else round(eta)}
+
+    def get_status_line(self):
+        """
+        :return: one line describing the progress of the run
+        """
+        part_list = ["Run {}".format(self.run_id)]
+        if self.total_bytes:
+            part_list.append("{} of {} ({:.1f} %)".format(format_bytes(self._bytes_sent),
+                                                         format_bytes(self.total_bytes),
+                                                         min(100.0, self._bytes_sent / self.total_bytes * 100)))
+        else:
+            part_list.append(format_bytes(self._bytes_sent))
+        if self.sample_count is not None:
+            part_list.append("{} of {} samples".format(self.samples_completed, self.sample_count))
+        if self._rate is not None:
+            part_list.append("{}/s".format(format_bytes(self._rate)))
+        eta = self.get_eta()
+        if eta is not None:
+            part_list.append("ETA {}".format(format_duration(eta)))
+        return ", ".join(part_list)
+
+
+class RunProgressSubscriber(object):
+    """
+    Aggregates upload messages into the progress of each run, and shows it
+
+    Messages can arrive from any thread, the progress is kept behind a lock so it can also be read while
+    it is being updated
+    """
+
+    topic_list = [MessageTopics.run_upload_started_topic,
+                  MessageTopics.upload_progress_topic,
+                  MessageTopics.sample_upload_completed_topic,
+                  MessageTopics.run_upload_finished_topic]
+
+    def __init__(self, stream=None, json_lines=None):
+        """
+        :param stream: stream to write to, defaults to stdout
+        :param json_lines: True to write JSON lines, False for a status line,
+            defaults to JSON lines when the stream is not a terminal
+        """
+        self._stream = stream
+        self._json_lines = json_lines
+        self._lock = threading.Lock()
+        # run id -> RunProgress, for the runs being uploaded
+        self._run_dict = {}
+        self._last_render_time = None
+        self._line_length = 0
+        # run id -> RunProgress, for the last FINISHED_RUNS_KEPT runs that finished
+        self._finished_run_dict = OrderedDict()
+
+    def _get_stream(self):
+        return self._stream or sys.stdout
+
+    def _use_json_lines(self):
+        if self._json_lines is None:
+            stream = self._get_stream()
+            return not (hasattr(stream, "isatty") and stream.isatty())
+        return self._json_lines
+
+    def get_run_progress(self, run_id):
+        """
+        :param run_id: sequencing run id
+        :return: RunProgress of the run, None if the run is not being uploaded and has not finished recently
+        """
+        with self._lock:
+            run = self._run_dict.get(run_id)
+            if run is None:
+                run = self._finished_run_dict.get(run_id)
+            return run
+
+    def __call__(self, message):
+        now = time.monotonic()
+        finished_run = None
+        with self._lock:
+            if message.topic == MessageTopics.run_upload_started_topic:
+                self._run_dict[message.run_id] = RunProgress(message.run_id, message.total_bytes,
+                                                             message.sample_count, now)
+            else:
+                run = self._run_dict.get(message.run_id)
+                if run is None:
+                    # files sent without a run upload, for example by the api module used on its own
+                    if message.topic != MessageTopics.upload_progress_topic:
+                        return
+                    run = self._run_dict[message.run_id] = RunProgress(message.run_id, start_time=now)
+                if message.topic == MessageTopics.upload_progress_topic:
+                    run.update_file(message.project_id, message.sample_name, message.sequence_file_name,
+                                    message.bytes_sent, now)
+                elif message.topic == MessageTopics.sample_upload_completed_topic:
+                    run.complete_sample(message.project_id, message.sample_name)
+                else:
+                    finished_run = self._run_dict.pop(message.run_id)
+                    finished_run.finish(now)
+                    self._finished_run_dict[message.run_id] = finished_run
+                    while len(self._finished_run_dict) > FINISHED_RUNS_KEPT:
+                        self._finished_run_dict.popitem(last=False)
+
+        if finished_run is not None:
+            self._render([finished_run], now, finished=True)
+        elif self._last_render_time is None or now - self._last_render_time >= self._get_render_interval():
+            with self._lock:
+                run_list = list(self._run_dict.values())
+            self._render(run_list, now)
+
+    def _get_render_interval(self):
+        return JSON_RENDER_INTERVAL if self._use_json_lines() else RENDER_INTERVAL
+
+    def _render(self, run_list, now, finished=False):
+        """
+        Shows the progress of runs
+
+        :param run_list: list of RunProgress to show
+        :param now: time.monotonic() of the render
+        :param finished: True when the runs have finished uploading
+        :return: None
+        """
+        self._last_render_time = now
+        if not run_list:
+            return
+        stream = self._get_stream()
+        if self._use_json_lines():
+            for run in run_list:
+                status_dict = run.get_status_dict(now)
+                status_dict["finished"] = finished
+                stream.write(json.dumps(status_dict) + "\n")
+        else:
+            line = " | ".join(run.get_status_line() for run in run_list)
+            # pad with spaces to cover the end of a longer previous line
+            stream.write("\r" + line.ljust(self._line_length) + ("\n" if finished else ""))
+            self._line_length = 0 if finished else len(line)
+        stream.flush()
+
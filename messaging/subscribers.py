@@ -0,0 +1,63 @@
+"""
+This file has the subscribers that show the progress of uploads to the user
+
+Progress is published for every chunk of a file that is sent, the subscribers render it at a fixed rate.
+The progress of each run is shown on the console by the RunProgressSubscriber in run_progress.py
+"""
+
+import logging
+
+from .pubsub import DEFAULT_CLOSE_TIMEOUT, MessageTopics, get_message_bus
+from .run_progress import RunProgressSubscriber
+
+# Seconds between progress lines in the log file
+LOG_RENDER_INTERVAL = 30
+
+# (RunProgressSubscriber, Subscription) started by start_default_subscribers
+_run_progress_subscription = None
+
+
+class LogProgressSubscriber(object):
+    """
+    Writes the progress of the files being sent to the log file
+    """
+
+    topic_list = [MessageTopics.upload_progress_topic]
+
+    def __call__(self, message):
+        logging.debug("Progress of {}: {} % ({} of {} bytes)".format(
+            message.sequence_file_name, message.progress, message.bytes_sent, message.total_bytes))
+
+
+def start_default_subscribers(message_bus=None):
+    """
+    Subscribes the run progress and log progress subscribers
+
+    :param message_bus: MessageBus to subscribe to, defaults to the shared bus
+    :return: list of Subscription
+    """
+    global _run_progress_subscription
+    if message_bus is None:
+        message_bus = get_message_bus()
+    run_progress_subscriber = RunProgressSubscriber()
+    subscription = message_bus.subscribe(RunProgressSubscriber.topic_list, run_progress_subscriber)
+    _run_progress_subscription = (run_progress_subscriber, subscription)
+    return [subscription,
+            message_bus.subscribe(LogProgressSubscriber.topic_list, LogProgressSubscriber(),
+                                  interval=LOG_RENDER_INTERVAL)]
+
+
+def get_run_progress(run_id, timeout=DEFAULT_CLOSE_TIMEOUT):
+    """
+    Gets the progress of a run from the run progress subscriber, once it has been given the messages
+    published so far
+
+    :param run_id: sequencing run id
+    :param timeout: seconds to wait for the subscriber to catch up
+    :return: RunProgress, None if the default subscribers were not started or the run was not seen
+    """
+    if _run_progress_subscription is None:
+        return None
+    run_progress_subscriber, subscription = _run_progress_subscription
+    subscription.flush(timeout)
+    return run_progress_subscriber.get_run_progress(run_id)
@@ -0,0 +1,196 @@
+"""
+This file handles recording a trace of an upload, in the Chrome trace event format
+
+A span is recorded for each phase of the upload, each status file written, each sample created, each file sent and
+each request made to IRIDA, on the thread that did the work. The trace can be opened in chrome://tracing or
+https://ui.perfetto.dev to see on a timeline where the time of an upload goes, and where the work waits.
+
+Tracing is off unless start_tracing() is called, and recording a span does nothing while it is off.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+_tracer_instance = None
+_tracer_lock = threading.Lock()
+
+
+class Tracer(object):
+    """
+    Collects spans from any thread
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # time.perf_counter() that the timestamps in the trace count from
+        self._start_time = time.perf_counter()
+        self._event_list = []
+        # thread id -> thread name
+        self._thread_name_dict = {}
+
+    def add_span(self, name, category, start_time, end_time, args=None):
+        """
+        Records a span of work done by the current thread
+
+        :param name: name of the span
+        :param category: kind of work, for example 'phase' or 'http'
+        :param start_time: time.perf_counter() when the work started
+        :param end_time: time.perf_counter() when the work ended
+        :param args: optional dict of details shown with the span
+        :return: None
+        """
+        thread = threading.current_thread()
+        event = {"name": name,
+                 "cat": category,
+                 "ph": "X",
+                 "ts": round((start_time - self._start_time) * 1e6, 3),
+                 "dur": round((end_time - start_time) * 1e6, 3),
+                 "pid": os.getpid(),
+                 "tid": thread.ident}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._event_list.append(event)
+            self._thread_name_dict[thread.ident] = thread.name
+
+    @contextmanager
+    def span(self, name, category, args=None):
+        """
+        Records the work done inside the with block as a span
+
+        :param name: name of the span
+        :param category: kind of work
+        :param args: optional dict of details shown with the span
+        :return: context manager
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start_time, time.perf_counter(), args)
+
+    def get_trace_dict(self):
+        """
+        :return: dict in the Chrome trace event format, with the spans ordered by start time
+        """
+        with self._lock:
+            event_list = sorted(self._event_list, key=lambda event: event["ts"])
+            thread_name_dict = dict(self._thread_name_dict)
+        pid = os.getpid()
+        metadata_list = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "irida-uploader"}}]
+        for tid, thread_name in thread_name_dict.items():
+            metadata_list.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                                  "args": {"name": thread_name}})
+        return {"traceEvents": metadata_list + event_list, "displayTimeUnit": "ms"}
+
+    def write(self, file_path):
+        """
+        Writes the trace to a file
+
+        :param file_path: file to write the trace to, it is replaced if it exists
+        :return: None
+        """
+        with open(file_path, "w") as trace_file:
+            json.dump(self.get_trace_dict(), trace_file)
+
+
+def start_tracing():
+    """
+    Starts recording spans in a new Tracer
+
+    :return: Tracer
+    """
+    global _tracer_instance
+    with _tracer_lock:
+        _tracer_instance = Tracer()
+        return _tracer_instance
+
+
+def stop_tracing(file_path=None):
+    """
+    Stops recording spans
+
+    :param file_path: optional file to write the trace to
+    :return: the Tracer that was recording, None if tracing was off
+    """
+    global _tracer_instance
+    with _tracer_lock:
+        tracer = _tracer_instance
+        _tracer_instance = None
+    if tracer is not None and file_path is not None:
+        try:
+            tracer.write(file_path)
+            logging.info("Trace written to {}".format(file_path))
+        except OSError as e:
+            logging.error("Could not write trace to {}: {}".format(file_path, e))
+    return tracer
+
+
+def get_tracer():
+    """
+    :return: the Tracer that is recording, None if tracing is off
+    """
+    return _tracer_instance
+
+
+def span(name, category, args=None):
+    """
+    Records the work done inside the with block as a span, when tracing is on
+
+    :param name: name of the span
+    :param category: kind of work
+    :param args: optional dict of details shown with the span
+    :return: context manager
+    """
+    # Read without the lock, this is called for every request and every file sent
+    tracer = _tracer_instance
+    if tracer is None:
+        return _no_span()
+    return tracer.span(name, category, args)
+
+
+@contextmanager
+def _no_span():
+    """
+    Does nothing, the span used when tracing is off
+    """
+    yield
+
+
+def add_span(name, category, start_time, end_time, args=None):
+    """
+    Records a span of work done by the current thread, when tracing is on
+
+    :param name: name of the span
+    :param category: kind of work
+    :param start_time: time.perf_counter() when the work started
+    :param end_time: time.perf_counter() when the work ended
+    :param args: optional dict of details shown with the span
+    :return: None
+    """
+    tracer = _tracer_instance
+    if tracer is not None:
+        tracer.add_span(name, category, start_time, end_time, args)
+
+
+def traced(name, category):
+    """
+    Decorator that records each call of a function as a span, when tracing is on
+
+    :param name: name of the span
+    :param category: kind of work
+    :return: decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
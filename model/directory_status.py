@@ -31,10 +31,14 @@ class DirectoryStatus:
         :param directory: Directory of a potential run
         status: status of the directory: 'new', 'partial', 'complete', 'invalid'
         message: Used when run is invalid,
+        run_id: id of the sequencing run on IRIDA, when the run has been uploaded
+        irida_instance: url of the IRIDA instance the run has been uploaded to
         """
         self._directory = directory
         self._status = None
         self._message = None
+        self._run_id = None
+        self._irida_instance = None
 
     @property
     def directory(self):
@@ -78,3 +82,19 @@ class DirectoryStatus:
     @message.setter
     def message(self, message):
         self._message = message
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    @run_id.setter
+    def run_id(self, run_id):
+        self._run_id = run_id
+
+    @property
+    def irida_instance(self):
+        return self._irida_instance
+
+    @irida_instance.setter
+    def irida_instance(self, irida_instance):
+        self._irida_instance = irida_instance
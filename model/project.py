@@ -5,6 +5,11 @@ from .sample import Sample
 
 class Project:
 
+    # Slots holding the project's data, these are the slots returned by get_dict
+    _data_slots = ('_name', '_sample_list', '_description', '_id')
+    # _sample_index is built from _sample_list the first time a sample is looked up
+    __slots__ = _data_slots + ('_sample_index',)
+
     # Define Sample as a type for validation
     _sample_type = TypeDefinition('sample', (Sample,), ())
     Validator.types_mapping['sample'] = _sample_type
@@ -52,6 +57,7 @@ class Project:
         self._sample_list = sample_list
         self._description = str(description)
         self._id = str(id)
+        self._sample_index = None
 
     @property
     def id(self):
@@ -68,6 +74,29 @@ class Project:
     def add_sample(self, sample):
         self._sample_list.append(sample)
 
+    def get_sample(self, sample_name):
+        """
+        Finds a sample on the project by name. Names are matched ignoring case, as they are on IRIDA
+
+        The index is built again when the sample list is replaced or changes length, and a sample found in
+        the index is checked against the sample list, so the index never returns a sample that is not on the project
+
+        :param sample_name: name of the sample to find
+        :return: the first Sample with the name, or None if there is no sample with the name
+        """
+        key = sample_name.lower()
+        sample_list = self._sample_list
+        if (self._sample_index is None or self._sample_index[0] is not sample_list
+                or self._sample_index[1] != len(sample_list)
+                or not _is_indexed(sample_list, self._sample_index[2].get(key), key)):
+            # lower case sample name -> position of the first sample with the name
+            position_dict = {}
+            for position, sample in enumerate(sample_list):
+                position_dict.setdefault(sample.sample_name.lower(), position)
+            self._sample_index = (sample_list, len(sample_list), position_dict)
+        position = self._sample_index[2].get(key)
+        return None if position is None else sample_list[position]
+
     @property
     def description(self):
         return self._description
@@ -80,4 +109,9 @@ class Project:
         return "ID:" + self._id + " Name: " + self._name + " Description: " + self._description
 
     def get_dict(self):
-        return self.__dict__
+        return {key: getattr(self, key) for key in self._data_slots}
+
+
+def _is_indexed(sample_list, position, key):
+    # a sample name missing from the index is only looked for again once the sample list changes length
+    return position is None or sample_list[position].sample_name.lower() == key
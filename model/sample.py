@@ -6,13 +6,14 @@ Keys from a sequencer include: 'sampleName','description'
 Keys from Irida will include these AND many others
 """
 from cerberus import Validator, TypeDefinition
-from copy import deepcopy
 
 from .sequence_file import SequenceFile
 
 
 class Sample:
 
+    __slots__ = ('_sample_name', '_description', '_sample_number', '_sample_dict', '_sequence_file')
+
     # Define SequenceFile as a type for validation
     _sample_type = TypeDefinition('sequence_file', (SequenceFile,), ())
     Validator.types_mapping['sequence_file'] = _sample_type
@@ -75,7 +76,8 @@ class Sample:
             return None
 
     def get_uploadable_dict(self):  # formatting for sending to irida when creating a project
-        uploadable_dict = deepcopy(self._sample_dict)
+        # only top level keys are set, so a shallow copy leaves the sample dict unchanged
+        uploadable_dict = dict(self._sample_dict)
         uploadable_dict['sampleName'] = self.sample_name
         uploadable_dict['description'] = self.description
         return uploadable_dict
@@ -92,4 +94,4 @@ class Sample:
         return str(self.get_uploadable_dict) + str(self.sequence_file)
 
     def get_dict(self):
-        return self.__dict__
+        return {key: getattr(self, key) for key in self.__slots__}
@@ -12,6 +12,8 @@ etc.
 
 class SequenceFile:
 
+    __slots__ = ('_properties_dict', '_file_list')
+
     uploadable_schema = {'_file_list': {
                             'type': 'list',
                             'empty': False,  # must have at least 1 file
@@ -49,4 +51,4 @@ class SequenceFile:
         return str(self._properties_dict) + str(self._file_list)
 
     def get_dict(self):
-        return self.__dict__
+        return {key: getattr(self, key) for key in self.__slots__}
@@ -5,6 +5,11 @@ from .project import Project
 
 class SequencingRun:
 
+    # Slots holding the run's data, these are the slots returned by get_dict
+    _data_slots = ('_project_list', '_metadata')
+    # _project_index is built from _project_list the first time a project is looked up
+    __slots__ = _data_slots + ('_project_index',)
+
     # Define Project as a type for validation
     _project_type = TypeDefinition('project', (Project,), ())
     Validator.types_mapping['project'] = _project_type
@@ -24,6 +29,7 @@ class SequencingRun:
     def __init__(self, metadata, project_list):
         self._project_list = project_list
         self._metadata = metadata
+        self._project_index = None
 
     @property
     def metadata(self):
@@ -41,5 +47,33 @@ class SequencingRun:
     def project_list(self, p_list):
         self._project_list = p_list
 
+    def get_project(self, project_id):
+        """
+        Finds a project in the run by id
+
+        The index is built again when the project list is replaced or changes length, and a project found in
+        the index is checked against the project list, so the index never returns a project that is not in the run
+
+        :param project_id: id of the project to find
+        :return: the first Project with the id, or None if there is no project with the id
+        """
+        key = str(project_id)
+        project_list = self._project_list
+        if (self._project_index is None or self._project_index[0] is not project_list
+                or self._project_index[1] != len(project_list)
+                or not _is_indexed(project_list, self._project_index[2].get(key), key)):
+            # project id -> position of the first project with the id
+            position_dict = {}
+            for position, project in enumerate(project_list):
+                position_dict.setdefault(project.id, position)
+            self._project_index = (project_list, len(project_list), position_dict)
+        position = self._project_index[2].get(key)
+        return None if position is None else project_list[position]
+
     def get_dict(self):
-        return self.__dict__
+        return {key: getattr(self, key) for key in self._data_slots}
+
+
+def _is_indexed(project_list, position, key):
+    # a project id missing from the index is only looked for again once the project list changes length
+    return position is None or project_list[position].id == key
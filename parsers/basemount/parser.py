@@ -11,8 +11,18 @@ from core.api_handler import initialize_api_from_config, _get_api_instance
 
 class Parser:
 
+    SAMPLE_SHEET_FILE_NAME = 'SampleList.csv'
+
     sample_file = None
 
+    @staticmethod
+    def get_required_file_list():
+        """
+        Returns a list of files that are required for a run directory to be considered valid
+        :return: [files_names]
+        """
+        return [Parser.SAMPLE_SHEET_FILE_NAME]
+
     @staticmethod
     def _find_directory_list(directory):
         """Find and return all directories in the specified directory.
@@ -29,28 +39,30 @@ class Parser:
                                             "can not upload samples from this directory {}".format(directory),
                                             directory)
 
-        dir_list = next(os.walk(directory))[1]  # Gets the list of directories in the directory
-        full_dir_list = []
-        for d in dir_list:
-            full_dir_list.append(os.path.join(directory, d))
-        return full_dir_list
+        return progress.list_sub_directories(directory)
 
     @staticmethod
-    def find_runs(directory):
+    def iter_runs(directory):
         """
-        find a list of run directories in the directory given
+        find run directories in the directory given, yielding each one as soon as its status is known
 
         :param directory:
-        :return: list of DirectoryStatus objects
+        :return: generator of DirectoryStatus objects
         """
         logging.info("looking for runs in {}".format(directory))
 
-        runs = []
         directory_list = Parser._find_directory_list(directory)
-        for d in directory_list:
-            runs.append(progress.get_directory_status(d, 'SampleList.csv'))
+        return progress.iter_directory_statuses(directory_list, Parser.get_required_file_list())
 
-        return runs
+    @staticmethod
+    def find_runs(directory):
+        """
+        find a list of run directories in the directory given
+
+        :param directory:
+        :return: list of DirectoryStatus objects
+        """
+        return list(Parser.iter_runs(directory))
 
     @staticmethod
     def find_single_run(directory):
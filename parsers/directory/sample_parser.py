@@ -1,10 +1,10 @@
-from os import path, walk
+from os import path
 from csv import reader
 from collections import OrderedDict
-from copy import deepcopy
 import logging
 
 import model
+import progress
 from .. import exceptions
 
 
@@ -20,7 +20,8 @@ def build_sequencing_run_from_samples(sample_sheet_file):
     logging.debug("Building SequencingRun from parsed data")
 
     # create list of projects and add samples to appropriate project
-    project_list = []
+    # project id -> Project, in the order the projects are first seen
+    project_dict = OrderedDict()
     for sample_number, sample in enumerate(sample_list):
         # get data from data dict
         sample_name = sample['Sample_Name']
@@ -28,15 +29,12 @@ def build_sequencing_run_from_samples(sample_sheet_file):
         file_f = sample['File_Forward']
         file_r = sample['File_Reverse']
 
-        project = None
         # see if project exists
-        for p in project_list:
-            if project_id == p.id:
-                project = p
-        # create project if it doesn't exitt yet
+        project = project_dict.get(project_id)
+        # create project if it doesn't exist yet
         if project is None:
             project = model.Project(id=project_id)
-            project_list.append(project)
+            project_dict[project_id] = project
 
         # create sequence file
         if len(file_r) > 0:
@@ -50,11 +48,13 @@ def build_sequencing_run_from_samples(sample_sheet_file):
         sample_obj = model.Sample(sample_name=sample_name, sample_number=sample_number+1)
 
         # add sequence file to sample
-        sample_obj.sequence_file = deepcopy(sq)
+        sample_obj.sequence_file = sq
 
         # add sample to project
         project.add_sample(sample_obj)
 
+    project_list = list(project_dict.values())
+
     # add the layout type to the sequencing run so we know if it is paired or single end
     if project_list[0].sample_list[0].sequence_file.is_paired_end():
         metadata = {'layoutType': 'PAIRED_END'}
@@ -77,7 +77,8 @@ def _parse_sample_list(sample_sheet_file):
     sample_dict_list = _parse_samples(sample_sheet_file)
 
     data_dir = path.dirname(sample_sheet_file)
-    data_dir_file_list = next(walk(data_dir))[2]  # Create a file list of the data directory, only hit the os once
+    # Create a file set of the data directory, shared with the other steps of the upload
+    data_dir_file_set = set(progress.directory_index.get_directory_index().list_files(data_dir))
 
     has_paired_end_read = False
     has_single_end_read = False
@@ -94,13 +95,13 @@ def _parse_sample_list(sample_sheet_file):
             has_single_end_read = True
 
         # Check if file names are in the files we found in the directory
-        if sample_dict['File_Forward'] not in data_dir_file_list:
+        if sample_dict['File_Forward'] not in data_dir_file_set:
             raise exceptions.SampleSheetError(
                 ("Your sample sheet is malformed. {} Does not match any file in the directory {}"
                  "".format(sample_dict['File_Forward'], data_dir)),
                 sample_sheet_file
             )
-        if paired_end_read and sample_dict['File_Reverse'] not in data_dir_file_list:
+        if paired_end_read and sample_dict['File_Reverse'] not in data_dir_file_set:
             raise exceptions.SampleSheetError(
                 ("Your sample sheet is malformed. {} Does not match any file in the directory {}"
                  "".format(sample_dict['File_Reverse'], data_dir)),
@@ -197,7 +198,7 @@ def _parse_samples(sample_sheet_file):
 
             sample_dict[key] = value
 
-        sample_dict_list.append(deepcopy(sample_dict))
+        sample_dict_list.append(sample_dict.copy())
 
     return sample_dict_list
 
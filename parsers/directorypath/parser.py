@@ -9,6 +9,16 @@ from . import sample_parser, validation
 
 class Parser:
 
+    SAMPLE_SHEET_FILE_NAME = 'SampleList.csv'
+
+    @staticmethod
+    def get_required_file_list():
+        """
+        Returns a list of files that are required for a run directory to be considered valid
+        :return: [files_names]
+        """
+        return [Parser.SAMPLE_SHEET_FILE_NAME]
+
     @staticmethod
     def _find_directory_list(directory):
         """Find and return all directories in the specified directory.
@@ -25,28 +35,30 @@ class Parser:
                                             "can not upload samples from this directory {}".format(directory),
                                             directory)
 
-        dir_list = next(os.walk(directory))[1]  # Gets the list of directories in the directory
-        full_dir_list = []
-        for d in dir_list:
-            full_dir_list.append(os.path.join(directory, d))
-        return full_dir_list
+        return progress.list_sub_directories(directory)
 
     @staticmethod
-    def find_runs(directory):
+    def iter_runs(directory):
         """
-        find a list of run directories in the directory given
+        find run directories in the directory given, yielding each one as soon as its status is known
 
         :param directory:
-        :return: list of DirectoryStatus objects
+        :return: generator of DirectoryStatus objects
         """
         logging.info("looking for runs in {}".format(directory))
 
-        runs = []
         directory_list = Parser._find_directory_list(directory)
-        for d in directory_list:
-            runs.append(progress.get_directory_status(d, 'SampleList.csv'))
+        return progress.iter_directory_statuses(directory_list, Parser.get_required_file_list())
 
-        return runs
+    @staticmethod
+    def find_runs(directory):
+        """
+        find a list of run directories in the directory given
+
+        :param directory:
+        :return: list of DirectoryStatus objects
+        """
+        return list(Parser.iter_runs(directory))
 
     @staticmethod
     def find_single_run(directory):
@@ -58,7 +70,7 @@ class Parser:
         """
         logging.info("looking for run in {}".format(directory))
 
-        return progress.get_directory_status(directory, 'SampleList.csv')
+        return progress.get_directory_status(directory, Parser.get_required_file_list())
 
     @staticmethod
     def get_sample_sheet(directory):
@@ -78,8 +90,9 @@ class Parser:
                                             "can not parse samples from this directory {}".format(directory),
                                             directory)
 
-        sample_sheet_file_name = 'SampleList.csv'
-        file_list = next(os.walk(directory))[2]  # Gets the list of files in the directory
+        sample_sheet_file_name = Parser.SAMPLE_SHEET_FILE_NAME
+        # Gets the list of files in the directory
+        file_list = progress.directory_index.get_directory_index().list_files(directory)
         if sample_sheet_file_name not in file_list:
             logging.error("No sample sheet file in the Directory Upload format found")
             raise exceptions.DirectoryError("The directory {} has no sample sheet file in the Directory Upload format "
@@ -91,7 +104,7 @@ class Parser:
 
     @staticmethod
     def get_sample_sheet_file_name():
-        return 'SampleList.csv' 
+        return Parser.SAMPLE_SHEET_FILE_NAME
 
     @staticmethod
     def get_sequencing_run(sample_sheet):
@@ -0,0 +1,74 @@
+"""
+This file handles checking the sequence files listed in a sample sheet before a run is built
+
+The files in a directorypath sample sheet can be spread over many directories, often on network shares where
+every stat is a round trip to the server. The files are checked concurrently in a thread pool, and every
+problem found is reported at once so they can all be fixed before the next attempt.
+"""
+
+import os
+import stat
+
+from concurrent.futures import ThreadPoolExecutor
+
+import messaging
+import model
+import progress
+
+from .. import exceptions
+
+# Number of files to check at the same time
+DEFAULT_PREFLIGHT_WORKERS = 16
+
+# The first bytes of every gzip file
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def check_sequence_file(file_path):
+    """
+    Checks that a sequence file can be uploaded: it exists, is a readable non empty file, and if its name ends
+    with .gz it is a gzip file
+
+    :param file_path: path of the sequence file
+    :return: None if the file is ok, otherwise a SequenceFileError describing the problem
+    """
+    file_stat = progress.directory_index.get_directory_index().stat(file_path)
+    if file_stat is None:
+        return exceptions.SequenceFileError("The file {} does not exist".format(file_path))
+    if not stat.S_ISREG(file_stat.st_mode):
+        return exceptions.SequenceFileError("The path {} is not a file".format(file_path))
+    if file_stat.st_size == 0:
+        return exceptions.SequenceFileError("The file {} is empty".format(file_path))
+
+    if file_path.endswith(".gz"):
+        # reading the start of the file also checks it can be read
+        try:
+            with open(file_path, "rb") as sequence_file:
+                magic = sequence_file.read(len(GZIP_MAGIC))
+        except OSError as e:
+            return exceptions.SequenceFileError("The file {} cannot be read: {}".format(file_path, e.strerror))
+        if magic != GZIP_MAGIC:
+            return exceptions.SequenceFileError("The file {} ends with .gz but is not a gzip file".format(file_path))
+    elif not os.access(file_path, os.R_OK):
+        return exceptions.SequenceFileError("The file {} cannot be read".format(file_path))
+
+    return None
+
+
+def check_sequence_files(file_list, max_workers=DEFAULT_PREFLIGHT_WORKERS):
+    """
+    Checks sequence files concurrently with check_sequence_file
+
+    :param file_list: list of sequence file paths
+    :param max_workers: maximum number of files to check at the same time
+    :return: ValidationResult with a SequenceFileError for each file that cannot be uploaded, in file_list order
+    """
+    validation_result = model.ValidationResult()
+    if not file_list:
+        return validation_result
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_list))) as executor:
+        for error in executor.map(messaging.run_context.bind(check_sequence_file), file_list):
+            if error is not None:
+                validation_result.add_error(error)
+    return validation_result
@@ -1,11 +1,11 @@
-from os import path, walk
+from os import path
 from csv import reader
 from collections import OrderedDict
-from copy import deepcopy
 import logging
 
 import model
 from .. import exceptions
+from . import preflight
 
 
 def build_sequencing_run_from_samples(sample_sheet_file):
@@ -20,7 +20,8 @@ def build_sequencing_run_from_samples(sample_sheet_file):
     logging.debug("Building SequencingRun from parsed data")
 
     # create list of projects and add samples to appropriate project
-    project_list = []
+    # project id -> Project, in the order the projects are first seen
+    project_dict = OrderedDict()
     for sample_number, sample in enumerate(sample_list):
         # get data from data dict
         sample_name = sample['Sample_Name']
@@ -28,15 +29,12 @@ def build_sequencing_run_from_samples(sample_sheet_file):
         file_f = sample['File_Forward']
         file_r = sample['File_Reverse']
 
-        project = None
         # see if project exists
-        for p in project_list:
-            if project_id == p.id:
-                project = p
-        # create project if it doesn't exitt yet
+        project = project_dict.get(project_id)
+        # create project if it doesn't exist yet
         if project is None:
             project = model.Project(id=project_id)
-            project_list.append(project)
+            project_dict[project_id] = project
 
         # create sequence file
         if len(file_r) > 0:
@@ -50,11 +48,13 @@ def build_sequencing_run_from_samples(sample_sheet_file):
         sample_obj = model.Sample(sample_name=sample_name, sample_number=sample_number+1)
 
         # add sequence file to sample
-        sample_obj.sequence_file = deepcopy(sq)
+        sample_obj.sequence_file = sq
 
         # add sample to project
         project.add_sample(sample_obj)
 
+    project_list = list(project_dict.values())
+
     # add the layout type to the sequencing run so we know if it is paired or single end
     if project_list[0].sample_list[0].sequence_file.is_paired_end():
         metadata = {'layoutType': 'PAIRED_END'}
@@ -76,11 +76,9 @@ def _parse_sample_list(sample_sheet_file):
     """
     sample_dict_list = _parse_samples(sample_sheet_file)
 
-    data_dir = path.dirname(sample_sheet_file)
-    data_dir_file_list = next(walk(data_dir))[2]  # Create a file list of the data directory, only hit the os once
-
     has_paired_end_read = False
     has_single_end_read = False
+    file_list = []
 
     logging.info("Verifying data parsed from sample sheet {}".format(sample_sheet_file))
 
@@ -90,22 +88,17 @@ def _parse_sample_list(sample_sheet_file):
         # keep track if we have both paired and single end reads
         if paired_end_read:
             has_paired_end_read = True
+            file_list.extend([sample_dict['File_Forward'], sample_dict['File_Reverse']])
         else:
             has_single_end_read = True
+            file_list.append(sample_dict['File_Forward'])
 
-        # Check if file names are in the files we found in the directory
-        if not path.exists(sample_dict['File_Forward']):
-            raise exceptions.SampleSheetError(
-                ("Your sample sheet is malformed. {} Does not match any file in the directory {}"
-                 "".format(sample_dict['File_Forward'], data_dir)),
-                sample_sheet_file
-            )
-        if paired_end_read and not path.exists(sample_dict['File_Reverse']):
-            raise exceptions.SampleSheetError(
-                ("Your sample sheet is malformed. {} Does not match any file in the directory {}"
-                 "".format(sample_dict['File_Reverse'], data_dir)),
-                sample_sheet_file
-            )
+    # Check every file at once, the files can be spread over many directories
+    validation_result = preflight.check_sequence_files(file_list)
+    if not validation_result.is_valid():
+        logging.error("{} sequence files in sample sheet {} cannot be uploaded"
+                      "".format(validation_result.error_count(), sample_sheet_file))
+        raise exceptions.ValidationError("Sequence files in the sample sheet cannot be uploaded", validation_result)
 
     # Verify we don't have both single end and paired end reads
     if has_single_end_read and has_paired_end_read:
@@ -192,7 +185,7 @@ def _parse_samples(sample_sheet_file):
 
             sample_dict[key] = value
 
-        sample_dict_list.append(deepcopy(sample_dict))
+        sample_dict_list.append(sample_dict.copy())
 
     return sample_dict_list
 
@@ -1,11 +1,11 @@
 import re
-from os import path, walk
+from os import path
 from csv import reader
 from collections import OrderedDict
-from copy import deepcopy
 import logging
 
 import model
+import progress
 from .. import exceptions
 
 
@@ -99,19 +99,18 @@ def build_sequencing_run_from_samples(sample_sheet_file, metadata):
     logging.debug("Building SequencingRun from parsed data")
 
     # create list of projects and add samples to appropriate project
-    project_list = []
+    # project id -> Project, in the order the projects are first seen
+    project_dict = OrderedDict()
     for sample in sample_list:
-        project = None
-        for p in project_list:
-            if sample.get('sample_project') == p.id:
-                project = p
+        project_id = sample.get('sample_project')
+        project = project_dict.get(project_id)
         if project is None:
-            project = model.Project(id=sample.get('sample_project'))
-            project_list.append(project)
+            project = model.Project(id=project_id)
+            project_dict[project_id] = project
 
         project.add_sample(sample)
 
-    sequence_run = model.SequencingRun(metadata, project_list)
+    sequence_run = model.SequencingRun(metadata, list(project_dict.values()))
     logging.debug("SequencingRun built")
     return sequence_run
 
@@ -126,9 +125,11 @@ def _parse_sample_list(sample_sheet_file):
     sample_list = _parse_samples(sample_sheet_file)
     sample_sheet_dir = path.dirname(sample_sheet_file)
     partial_data_dir = path.join(sample_sheet_dir, "Alignment_1")
-    # get the directories [1] get the first directory [0]
-    data_dir = path.join(partial_data_dir, next(walk(partial_data_dir))[1][0], "Fastq")
-    data_dir_file_list = next(walk(data_dir))[2]  # Create a file list of the data directory, only hit the os once
+    # get the first directory in Alignment_1
+    directory_index = progress.directory_index.get_directory_index()
+    data_dir = path.join(partial_data_dir, directory_index.list_directories(partial_data_dir)[0], "Fastq")
+    # Create a file list of the data directory, shared with the other steps of the upload
+    data_dir_file_list = directory_index.list_files(data_dir)
 
     for sample in sample_list:
         properties_dict = _parse_out_sequence_file(sample)
@@ -173,7 +174,7 @@ def _parse_sample_list(sample_sheet_file):
             pf_list[i] = path.join(data_dir, pf_list[i])
 
         sq = model.SequenceFile(file_list=pf_list, properties_dict=properties_dict)
-        sample.sequence_file = deepcopy(sq)
+        sample.sequence_file = sq
 
     return sample_list
 
@@ -285,13 +286,13 @@ def _parse_samples(sample_sheet_file):
         for index, key in enumerate(sample_dict.keys()):
             sample_dict[key] = line[index].strip()  # assumes values are never empty
 
-        new_sample_dict = deepcopy(sample_dict)
-        new_sample_name = new_sample_dict['sampleName']
+        new_sample_name = sample_dict['sampleName']
 
+        # the Sample keeps its own copy of sample_dict
         sample = model.Sample(
                             sample_name=new_sample_name,
                             sample_number=sample_number + 1,
-                            samp_dict=new_sample_dict)
+                            samp_dict=sample_dict)
         sample_list.append(sample)
 
     return sample_list
@@ -40,28 +40,30 @@ class Parser:
                                             "can not upload samples from this directory {}".format(directory),
                                             directory)
 
-        dir_list = next(os.walk(directory))[1]  # Gets the list of directories in the directory
-        full_dir_list = []
-        for d in dir_list:
-            full_dir_list.append(os.path.join(directory, d))
-        return full_dir_list
+        return progress.list_sub_directories(directory)
 
     @staticmethod
-    def find_runs(directory):
+    def iter_runs(directory):
         """
-        find a list of run directories in the directory given
+        find run directories in the directory given, yielding each one as soon as its status is known
 
         :param directory:
-        :return: list of DirectoryStatus objects
+        :return: generator of DirectoryStatus objects
         """
         logging.info("looking for runs in {}".format(directory))
 
-        runs = []
         directory_list = Parser._find_directory_list(directory)
-        for d in directory_list:
-            runs.append(progress.get_directory_status(d, Parser.get_required_file_list()))
+        return progress.iter_directory_statuses(directory_list, Parser.get_required_file_list())
 
-        return runs
+    @staticmethod
+    def find_runs(directory):
+        """
+        find a list of run directories in the directory given
+
+        :param directory:
+        :return: list of DirectoryStatus objects
+        """
+        return list(Parser.iter_runs(directory))
 
     @staticmethod
     def find_single_run(directory):
@@ -93,7 +95,8 @@ class Parser:
                                             "can not parse samples from this directory {}".format(directory), directory)
 
         sample_sheet_file_name = Parser.SAMPLE_SHEET_FILE_NAME
-        file_list = next(os.walk(directory))[2]  # Gets the list of files in the directory
+        # Gets the list of files in the directory
+        file_list = progress.directory_index.get_directory_index().list_files(directory)
         if sample_sheet_file_name not in file_list:
             logging.error("No sample sheet file in the MiSeq format found")
             raise exceptions.DirectoryError("The directory {} has no sample sheet file in the MiSeq format"
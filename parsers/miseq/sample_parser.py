@@ -1,11 +1,11 @@
 import re
-from os import path, walk
+from os import path
 from csv import reader
 from collections import OrderedDict
-from copy import deepcopy
 import logging
 
 import model
+import progress
 from .. import exceptions
 
 
@@ -103,19 +103,18 @@ def build_sequencing_run_from_samples(sample_sheet_file, metadata):
     logging.debug("Building SequencingRun from parsed data")
 
     # create list of projects and add samples to appropriate project
-    project_list = []
+    # project id -> Project, in the order the projects are first seen
+    project_dict = OrderedDict()
     for sample in sample_list:
-        project = None
-        for p in project_list:
-            if sample.get('sample_project') == p.id:
-                project = p
+        project_id = sample.get('sample_project')
+        project = project_dict.get(project_id)
         if project is None:
-            project = model.Project(id=sample.get('sample_project'))
-            project_list.append(project)
+            project = model.Project(id=project_id)
+            project_dict[project_id] = project
 
         project.add_sample(sample)
 
-    sequence_run = model.SequencingRun(metadata, project_list)
+    sequence_run = model.SequencingRun(metadata, list(project_dict.values()))
     logging.debug("SequencingRun built")
     return sequence_run
 
@@ -130,7 +129,8 @@ def _parse_sample_list(sample_sheet_file):
     sample_list = _parse_samples(sample_sheet_file)
     sample_sheet_dir = path.dirname(sample_sheet_file)
     data_dir = path.join(sample_sheet_dir, "Data", "Intensities", "BaseCalls")
-    data_dir_file_list = next(walk(data_dir))[2]  # Create a file list of the data directory, only hit the os once
+    # Create a file list of the data directory, shared with the other steps of the upload
+    data_dir_file_list = progress.directory_index.get_directory_index().list_files(data_dir)
 
     for sample in sample_list:
         properties_dict = _parse_out_sequence_file(sample)
@@ -175,7 +175,7 @@ def _parse_sample_list(sample_sheet_file):
             pf_list[i] = path.join(data_dir, pf_list[i])
 
         sq = model.SequenceFile(file_list=pf_list, properties_dict=properties_dict)
-        sample.sequence_file = deepcopy(sq)
+        sample.sequence_file = sq
 
     return sample_list
 
@@ -287,7 +287,7 @@ def _parse_samples(sample_sheet_file):
         for index, key in enumerate(sample_dict.keys()):
             sample_dict[key] = line[index].strip()  # assumes values are never empty
 
-        new_sample_dict = deepcopy(sample_dict)
+        new_sample_dict = sample_dict.copy()
         new_sample_name = new_sample_dict['sampleName']
         new_sample_desc = new_sample_dict['description']
         del new_sample_dict['sampleName']
@@ -9,8 +9,10 @@ class Parser:
     When creating a new parser, the parser type can be added here to enable it's usage.
 
     Like the miseq and directory parser, a new parser class needs the following static methods
+        get_required_file_list()
         find_single_run(directory)
         find_runs(directory)
+        iter_runs(directory)
         get_sample_sheet(directory)
         get_sequencing_run(sample_sheet)
 
@@ -1,2 +1,6 @@
-from .upload_status import get_directory_status, write_directory_status
+from .upload_status import get_directory_status, get_directory_signature, write_directory_status
+from .upload_status import read_checked_files, write_checked_files
+from .directory_scanner import list_sub_directories, iter_directory_statuses, scan_directory_statuses
+from . import run_index
+from . import directory_index
 from . import exceptions
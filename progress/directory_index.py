@@ -0,0 +1,208 @@
+"""
+This file manages a shared cache of directory listings and file stats
+
+During one upload the same directories are listed and the same files are stat'ed by several layers: finding the
+sample sheet, checking the run status, parsing the sample sheet, planning the upload and sending the files.
+On network file systems each of these is a round trip to the server, so the listing of a directory is read once
+with os.scandir and kept, along with the stat of each file once it has been asked for.
+
+A listing is thrown away when the modification time of its directory changes (a file was added, removed or
+renamed). The directory's modification time is checked again at most every REVALIDATE_INTERVAL seconds, and a
+file is stat'ed again when its stat is older than that, as a file that is still being written does not change
+its directory. Each upload invalidates the listings of its run directory when it starts, and of every directory
+its sequence files are in before its samples are sent, so file sizes are read fresh for every run.
+
+At most MAX_LISTINGS directories are kept, the least recently used listing is thrown away first.
+"""
+
+import os
+import stat
+import threading
+import time
+
+from collections import OrderedDict
+
+# Seconds a directory listing or file stat is trusted before it is checked again
+REVALIDATE_INTERVAL = 2
+# Number of directory listings kept
+MAX_LISTINGS = 1000
+
+_directory_index_instance = None
+_directory_index_lock = threading.Lock()
+
+
+class _Listing:
+    """
+    The entries of one directory, and the stats of the entries that have been asked for
+    """
+
+    def __init__(self, directory):
+        self.directory_mtime = os.stat(directory).st_mtime_ns
+        self.checked_time = time.monotonic()
+        # name -> True if the entry is a directory
+        self.entry_dict = {}
+        # name -> (os.stat_result, time.monotonic() it was read at), filled in as stats are asked for
+        self.stat_dict = {}
+        for entry in os.scandir(directory):
+            try:
+                self.entry_dict[entry.name] = entry.is_dir()
+            except OSError:  # entry was removed while listing
+                continue
+
+
+class DirectoryIndex:
+    """
+    Cache of directory listings and file stats
+    """
+
+    def __init__(self, revalidate_interval=REVALIDATE_INTERVAL, max_listings=MAX_LISTINGS):
+        """
+        :param revalidate_interval: seconds a listing is trusted before its directory is checked for changes,
+            and a file stat is trusted before the file is stat'ed again
+        :param max_listings: number of directory listings kept
+        """
+        self._revalidate_interval = revalidate_interval
+        self._max_listings = max_listings
+        self._lock = threading.Lock()
+        # absolute directory path -> _Listing, least recently used first
+        self._listing_dict = OrderedDict()
+
+    def _get_listing(self, directory):
+        """
+        :param directory: directory to list
+        :return: _Listing of the directory, raises OSError if the directory cannot be listed
+        """
+        directory = os.path.abspath(directory)
+        with self._lock:
+            listing = self._listing_dict.get(directory)
+            if listing is not None:
+                self._listing_dict.move_to_end(directory)
+        if listing is not None:
+            if time.monotonic() - listing.checked_time < self._revalidate_interval:
+                return listing
+            try:
+                if os.stat(directory).st_mtime_ns == listing.directory_mtime:
+                    listing.checked_time = time.monotonic()
+                    return listing
+            except OSError:
+                with self._lock:
+                    self._listing_dict.pop(directory, None)
+                raise
+
+        listing = _Listing(directory)
+        with self._lock:
+            self._listing_dict[directory] = listing
+            self._listing_dict.move_to_end(directory)
+            while len(self._listing_dict) > self._max_listings:
+                self._listing_dict.popitem(last=False)
+        return listing
+
+    def list_files(self, directory):
+        """
+        Lists the files in a directory, like next(os.walk(directory))[2]
+
+        :param directory: directory to list
+        :return: list of file names, raises OSError if the directory cannot be listed
+        """
+        return [name for name, is_dir in self._get_listing(directory).entry_dict.items() if not is_dir]
+
+    def list_directories(self, directory):
+        """
+        Lists the sub directories of a directory, like next(os.walk(directory))[1]
+
+        :param directory: directory to list
+        :return: list of directory names, raises OSError if the directory cannot be listed
+        """
+        return [name for name, is_dir in self._get_listing(directory).entry_dict.items() if is_dir]
+
+    def stat(self, file_path):
+        """
+        Gets the stat of a file, following symlinks
+
+        :param file_path: path of the file
+        :return: os.stat_result, or None if the file does not exist
+        """
+        directory, name = os.path.split(os.path.abspath(file_path))
+        try:
+            listing = self._get_listing(directory)
+        except OSError:
+            return None
+        if name not in listing.entry_dict:
+            return None
+        cached_stat = listing.stat_dict.get(name)
+        if cached_stat is not None and time.monotonic() - cached_stat[1] < self._revalidate_interval:
+            return cached_stat[0]
+        try:
+            file_stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            listing.stat_dict.pop(name, None)
+            return None
+        listing.stat_dict[name] = (file_stat, time.monotonic())
+        return file_stat
+
+    def exists(self, file_path):
+        """
+        :param file_path: path to check
+        :return: True if the path exists, like os.path.exists, which is False for a broken symlink
+        """
+        directory, name = os.path.split(os.path.abspath(file_path))
+        if not name:  # the root directory
+            return os.path.exists(file_path)
+        return self.stat(file_path) is not None
+
+    def isfile(self, file_path):
+        """
+        :param file_path: path to check
+        :return: True if the path is a regular file, like os.path.isfile
+        """
+        file_stat = self.stat(file_path)
+        return file_stat is not None and stat.S_ISREG(file_stat.st_mode)
+
+    def getsize(self, file_path):
+        """
+        :param file_path: path of the file
+        :return: size of the file in bytes, raises OSError if the file does not exist, like os.path.getsize
+        """
+        file_stat = self.stat(file_path)
+        if file_stat is None:
+            raise FileNotFoundError("No such file: '{}'".format(file_path))
+        return file_stat.st_size
+
+    def invalidate(self, directory):
+        """
+        Throws away the listings of a directory and every directory inside it
+
+        :param directory: directory to invalidate
+        :return: None
+        """
+        directory = os.path.abspath(directory)
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            for listed_directory in list(self._listing_dict):
+                if listed_directory == directory or listed_directory.startswith(prefix):
+                    del self._listing_dict[listed_directory]
+
+
+def get_directory_index():
+    """
+    Returns the shared DirectoryIndex, creating it the first time it is used
+
+    :return: DirectoryIndex
+    """
+    global _directory_index_instance
+    with _directory_index_lock:
+        if _directory_index_instance is None:
+            _directory_index_instance = DirectoryIndex()
+        return _directory_index_instance
+
+
+def set_directory_index(directory_index):
+    """
+    Replaces the shared DirectoryIndex
+
+    :param directory_index: DirectoryIndex object, or None to create a new index when it is next requested
+    :return: None
+    """
+    global _directory_index_instance
+    with _directory_index_lock:
+        _directory_index_instance = directory_index
@@ -0,0 +1,121 @@
+"""
+This file handles finding the status of many run directories at once
+
+Checking a run directory is mostly waiting on the file system (especially on network shares), so the
+directories are checked concurrently in a thread pool and the results are given back as they complete.
+
+Statuses are answered from the run index when a directory has not changed since it was last checked.
+"""
+
+import logging
+import os
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import messaging
+from model.directory_status import DirectoryStatus
+from . import directory_index, run_index
+from .upload_status import get_directory_status, get_directory_signature
+
+# Number of directories to check at the same time
+DEFAULT_SCAN_WORKERS = 16
+
+
+def list_sub_directories(directory):
+    """
+    Lists the directories inside the given directory from the shared directory index,
+    which lists directories with os.scandir to avoid a stat call for each entry on most file systems
+
+    :param directory: directory to list
+    :return: list of full paths to the directories found
+    """
+    return [os.path.join(directory, name)
+            for name in directory_index.get_directory_index().list_directories(directory)]
+
+
+def get_indexed_directory_status(directory, required_file_list, index=None):
+    """
+    Gets the status of a directory from the run index, only checking the directory itself when it has changed
+    since it was indexed. Directories that are checked are (re)added to the index.
+
+    :param directory: the directory to search for a run
+    :param required_file_list: a list of required files that are required for that run to be considered valid
+    :param index: RunIndex to use, when None the directory is checked without an index
+    :return: DirectoryStatus
+    """
+    if type(required_file_list) == str:
+        required_file_list = [required_file_list]
+    if index is None:
+        return get_directory_status(directory, required_file_list)
+
+    signature = get_directory_signature(directory)
+    try:
+        row = index.get(directory)
+    except sqlite3.Error as e:
+        logging.warning("Could not read run index for {}: {}".format(directory, e))
+        return get_directory_status(directory, required_file_list)
+
+    if signature is not None and index.is_current(row, signature, required_file_list):
+        result = DirectoryStatus(directory)
+        result.status = row["status"]
+        result.message = row["message"]
+        result.run_id = row["run_id"]
+        result.irida_instance = row["irida_instance"]
+        return result
+
+    if row is not None:
+        # The directory has changed since it was indexed, so its cached listing may be out of date too
+        directory_index.get_directory_index().invalidate(directory)
+    result = get_directory_status(directory, required_file_list)
+    try:
+        index.store(directory=directory,
+                    signature=signature,
+                    status=result.status,
+                    required_files=required_file_list,
+                    message=result.message,
+                    run_id=result.run_id,
+                    irida_instance=result.irida_instance)
+    except sqlite3.Error as e:
+        logging.warning("Could not update run index for {}: {}".format(directory, e))
+    return result
+
+
+def iter_directory_statuses(directory_list, required_file_list, max_workers=DEFAULT_SCAN_WORKERS):
+    """
+    Checks the status of each directory in a thread pool, yielding each DirectoryStatus as soon as it is found
+
+    Results are not in the same order as directory_list
+
+    :param directory_list: list of directories to check
+    :param required_file_list: list of files that are required for a run directory to be considered valid
+    :param max_workers: maximum number of directories to check at the same time
+    :return: generator of DirectoryStatus objects
+    """
+    if not directory_list:
+        return
+
+    index = run_index.get_run_index()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(directory_list)))
+    futures = [executor.submit(messaging.run_context.bind(get_indexed_directory_status), d, required_file_list, index)
+               for d in directory_list]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # A caller that stops iterating early should not wait for the directories it no longer needs
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def scan_directory_statuses(directory_list, required_file_list, max_workers=DEFAULT_SCAN_WORKERS):
+    """
+    Checks the status of each directory in a thread pool
+
+    :param directory_list: list of directories to check
+    :param required_file_list: list of files that are required for a run directory to be considered valid
+    :param max_workers: maximum number of directories to check at the same time
+    :return: list of DirectoryStatus objects
+    """
+    return list(iter_directory_statuses(directory_list, required_file_list, max_workers))
@@ -0,0 +1,184 @@
+"""
+This file manages a local SQLite index of run directories and their upload status
+
+Each run directory is stored with a signature made from modification times, so when the run directories are
+checked again only the directories that changed since the last check need their status files read.
+The index is kept up to date by write_directory_status, which updates the index every time a status is written.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+from appdirs import user_cache_dir
+
+# File name of the index database
+INDEX_FILE_NAME = "run_index.sqlite"
+
+# Normal base cache directory name
+cache_directory_name = "irida-uploader"
+# When running tests, the Makefile creates an environment variable IRIDA_UPLOADER_TEST to 'True'
+# If it exists then we are running a test and should be using the test cache directory
+if os.environ.get('IRIDA_UPLOADER_TEST'):
+    cache_directory_name = "irida-uploader-test"
+
+# The run index instance is a global variable so every scan and status write shares one database connection
+_run_index_instance = None
+_run_index_lock = threading.Lock()
+
+
+class RunIndex:
+    """
+    SQLite backed index of run directories
+
+    Rows are dicts with the keys:
+        directory, signature, required_files, status, message, run_id, irida_instance
+    """
+
+    _COLUMNS = ["directory", "signature", "required_files", "status", "message", "run_id", "irida_instance"]
+
+    def __init__(self, index_file):
+        """
+        :param index_file: path to the SQLite database file, created if it does not exist
+        """
+        if not os.path.exists(os.path.dirname(index_file)):
+            os.makedirs(os.path.dirname(index_file))
+        self._index_file = index_file
+        self._lock = threading.Lock()
+        # The connection is shared between the scanning threads, access is serialized with self._lock
+        self._connection = sqlite3.connect(index_file, timeout=30, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS runs ("
+                                     "directory TEXT PRIMARY KEY, "
+                                     "signature TEXT, "
+                                     "required_files TEXT, "
+                                     "status TEXT, "
+                                     "message TEXT, "
+                                     "run_id TEXT, "
+                                     "irida_instance TEXT)")
+
+    @property
+    def index_file(self):
+        return self._index_file
+
+    @staticmethod
+    def _key(directory):
+        """
+        Directories are stored as absolute paths so the same run is found however it was given
+        """
+        return os.path.abspath(directory)
+
+    def get(self, directory):
+        """
+        Gets the indexed entry of a directory
+
+        :param directory: run directory
+        :return: dict of the row, or None if the directory is not indexed
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT {} FROM runs WHERE directory = ?".format(", ".join(self._COLUMNS)),
+                (self._key(directory),)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(self._COLUMNS, row))
+
+    def list_runs(self, parent_directory=None):
+        """
+        Lists the indexed run directories
+
+        :param parent_directory: optional, only list the runs directly inside this directory
+        :return: list of row dicts, sorted by directory
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT {} FROM runs ORDER BY directory".format(", ".join(self._COLUMNS))).fetchall()
+        row_list = [dict(zip(self._COLUMNS, row)) for row in rows]
+        if parent_directory is not None:
+            parent_directory = self._key(parent_directory)
+            row_list = [r for r in row_list if os.path.dirname(r["directory"]) == parent_directory]
+        return row_list
+
+    def store(self, directory, signature, status, required_files=None, message=None,
+              run_id=None, irida_instance=None):
+        """
+        Adds or replaces the entry of a directory
+
+        When required_files is None, the required files of an existing entry are kept
+
+        :param directory: run directory
+        :param signature: signature of the directory when the status was found
+        :param status: status of the directory
+        :param required_files: the required file list the status was found with
+        :param message: status message
+        :param run_id: sequencing run id on IRIDA
+        :param irida_instance: url of the IRIDA instance the run was uploaded to
+        :return: None
+        """
+        directory = self._key(directory)
+        if required_files is not None:
+            required_files = ",".join(required_files)
+        with self._lock, self._connection:
+            if required_files is None:
+                row = self._connection.execute("SELECT required_files FROM runs WHERE directory = ?",
+                                               (directory,)).fetchone()
+                if row is not None:
+                    required_files = row[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO runs ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(", ".join(self._COLUMNS)),
+                (directory, signature, required_files, status, message,
+                 None if run_id is None else str(run_id), irida_instance))
+
+    def remove(self, directory):
+        """
+        Removes a directory from the index
+
+        :param directory: run directory
+        :return: None
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM runs WHERE directory = ?", (self._key(directory),))
+
+    def is_current(self, row, signature, required_file_list):
+        """
+        Checks if an indexed entry still describes the directory
+
+        :param row: row dict from get()
+        :param signature: current signature of the directory
+        :param required_file_list: required file list the status is wanted for
+        :return: True if the entry can be used without checking the directory again
+        """
+        return (row is not None and
+                row["signature"] == signature and
+                row["required_files"] == ",".join(required_file_list))
+
+
+def get_run_index():
+    """
+    Returns the shared RunIndex, creating it in the users cache directory the first time it is used
+
+    :return: RunIndex, or None if the index could not be opened
+    """
+    global _run_index_instance
+    with _run_index_lock:
+        if _run_index_instance is None:
+            index_file = os.path.join(user_cache_dir(cache_directory_name), INDEX_FILE_NAME)
+            try:
+                _run_index_instance = RunIndex(index_file)
+            except (sqlite3.Error, OSError) as e:
+                logging.warning("Could not open run index {}: {}".format(index_file, e))
+                return None
+        return _run_index_instance
+
+
+def set_run_index(run_index):
+    """
+    Replaces the shared RunIndex, used to point the index at a different database file
+
+    :param run_index: RunIndex object, or None to reopen the default index when it is next requested
+    :return: None
+    """
+    global _run_index_instance
+    with _run_index_lock:
+        _run_index_instance = run_index
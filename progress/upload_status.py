@@ -1,9 +1,13 @@
 import json
+import logging
+import sqlite3
 import time
 import os
 
 import config
+import messaging
 from model.directory_status import DirectoryStatus
+from . import directory_index, run_index
 
 try:
     from . import exceptions
@@ -22,6 +26,12 @@ STATUS_FIELD = "Upload Status"
 DATE_TIME_FIELD = "Date Time"
 RUN_ID_FIELD = "Run ID"
 IRIDA_INSTANCE_FIELD = "IRIDA Instance"
+# Why the run has its status, for example the run it duplicates
+MESSAGE_FIELD = "Message"
+# Results of the sequence file integrity check, kept between writes of the status
+CHECKED_FILES_FIELD = "Checked Files"
+# Durations, throughput and requests of a completed upload
+PERFORMANCE_REPORT_FIELD = "Performance Report"
 
 
 def get_directory_status(directory, required_file_list):
@@ -40,35 +50,87 @@ def get_directory_status(directory, required_file_list):
         result.message = 'Directory cannot be accessed. Please check permissions'
         return result
 
-    file_list = next(os.walk(directory))[2]
     if type(required_file_list) == str:
         required_file_list = [required_file_list]
-    # Gets the list of files in the directory
+    # The directory listing is shared with the parser, which lists the run directory to find the sample sheet
     for file_name in required_file_list:
-        if file_name not in file_list:
+        if not directory_index.get_directory_index().isfile(os.path.join(directory, file_name)):
             result.status = DirectoryStatus.INVALID
             result.message = 'Directory is missing required file with filename {}'.format(file_name)
             return result
 
-    if STATUS_FILE_NAME not in file_list:  # no irida_uploader_status.info file yet, has not been uploaded
-        result.status = DirectoryStatus.NEW
-        return result
-
     # Must check status of upload to determine if upload is completed
     uploader_info_file = os.path.join(directory, STATUS_FILE_NAME)
-    with open(uploader_info_file, "rb") as reader:
-        data = reader.read().decode()
+    try:
+        with open(uploader_info_file, "rb") as reader:
+            data = reader.read().decode()
+    except FileNotFoundError:  # no irida_uploader_status.info file yet, has not been uploaded
+        result.status = DirectoryStatus.NEW
+        return result
     info_file = json.loads(data)
     status = info_file[STATUS_FIELD]
     if status in DirectoryStatus.VALID_STATUS_LIST:
         result.status = status
     else:  # the status found in the file is not in the defined list
         raise exceptions.DirectoryError("Invalid Status in status file", directory)
+    result.run_id = info_file.get(RUN_ID_FIELD)
+    result.message = info_file.get(MESSAGE_FIELD)
+    result.irida_instance = info_file.get(IRIDA_INSTANCE_FIELD)
 
     return result
 
 
-def write_directory_status(directory_status, run_id=None):
+def get_directory_signature(directory):
+    """
+    Gets a signature of a run directory that changes whenever its status could have changed
+
+    Files being added/removed/renamed changes the directory mtime, permission changes change the
+    directory ctime, and the status file being rewritten in place changes the status file mtime
+
+    :param directory: the run directory
+    :return: signature string, or None if the directory cannot be accessed
+    """
+    try:
+        dir_stat = os.stat(directory)
+    except OSError:
+        return None
+    try:
+        status_file_mtime = os.stat(os.path.join(directory, STATUS_FILE_NAME)).st_mtime_ns
+    except OSError:
+        status_file_mtime = 0
+    return "{}:{}:{}".format(dir_stat.st_mtime_ns, dir_stat.st_ctime_ns, status_file_mtime)
+
+
+def _update_run_index(directory_status, written_to_directory, run_id=None, irida_instance=None):
+    """
+    Keeps the run index consistent with a status that was just written
+
+    :param directory_status: DirectoryStatus object that was written
+    :param written_to_directory: False when the status file could not be written to the run directory,
+        in which case the directory is removed from the index so it is checked again on the next scan
+    :param run_id: run id that was written, if any
+    :param irida_instance: IRIDA instance that was written, if any
+    :return: None
+    """
+    index = run_index.get_run_index()
+    if index is None:
+        return
+    try:
+        if not written_to_directory:
+            index.remove(directory_status.directory)
+            return
+        index.store(directory=directory_status.directory,
+                    signature=get_directory_signature(directory_status.directory),
+                    status=directory_status.status,
+                    message=directory_status.message,
+                    run_id=run_id,
+                    irida_instance=irida_instance)
+    except sqlite3.Error as e:
+        logging.warning("Could not update run index for {}: {}".format(directory_status.directory, e))
+
+
+@messaging.tracing.traced("write status file", "status")
+def write_directory_status(directory_status, run_id=None, performance_report=None):
     """
     Writes a status to the status file:
     Overwrites anything that is in the file
@@ -78,6 +140,7 @@ def write_directory_status(directory_status, run_id=None):
     :param directory_status: DirectoryStatus object containing status to write to directory
     :param run_id: optional, when used, the run id will be included in the status file,
         along with the irida instance the run is uploaded to.
+    :param performance_report: optional dict describing how the upload performed, included in the status file
     :return: None
     """
 
@@ -85,21 +148,96 @@ def write_directory_status(directory_status, run_id=None):
         raise exceptions.DirectoryError("Cannot access directory", directory_status.directory)
 
     uploader_info_file = os.path.join(directory_status.directory, STATUS_FILE_NAME)
-    if not os.access(uploader_info_file, os.W_OK):  # Cannot access upload directory
+    written_to_directory = True
+    # A status file that does not exist yet is created in the run directory, which was checked above
+    if os.path.exists(uploader_info_file) and not os.access(uploader_info_file, os.W_OK):
         uploader_info_file = os.path.join('/tmp/', STATUS_FILE_NAME)
+        written_to_directory = False
+    irida_instance = None
     if run_id:
+        irida_instance = config.read_config_option('base_url')
         json_data = {STATUS_FIELD: directory_status.status,
                      DATE_TIME_FIELD: _get_date_time_field(),
                      RUN_ID_FIELD: run_id,
-                     IRIDA_INSTANCE_FIELD: config.read_config_option('base_url')}
+                     IRIDA_INSTANCE_FIELD: irida_instance}
     else:
         json_data = {STATUS_FIELD: directory_status.status,
                      DATE_TIME_FIELD: _get_date_time_field()}
 
+    if directory_status.message:
+        json_data[MESSAGE_FIELD] = directory_status.message
+
+    if written_to_directory:
+        # The integrity check results stay valid while the sequence files are unchanged
+        checked_files = read_checked_files(directory_status.directory)
+        if checked_files:
+            json_data[CHECKED_FILES_FIELD] = checked_files
+    if performance_report:
+        json_data[PERFORMANCE_REPORT_FIELD] = performance_report
+
+    with open(uploader_info_file, "w") as json_file:
+        json.dump(json_data, json_file, indent=4, sort_keys=True)
+        json_file.write("\n")
+
+    _update_run_index(directory_status, written_to_directory, run_id, irida_instance)
+
+
+def read_checked_files(directory):
+    """
+    Reads the results of the sequence file integrity check from the status file
+
+    :param directory: the run directory
+    :return: dict of file path -> {"size", "mtime", "error"}, empty when nothing has been checked
+    """
+    uploader_info_file = os.path.join(directory, STATUS_FILE_NAME)
+    try:
+        with open(uploader_info_file, "rb") as reader:
+            info_file = json.loads(reader.read().decode())
+    except (OSError, ValueError):
+        return {}
+    checked_files = info_file.get(CHECKED_FILES_FIELD)
+    if not isinstance(checked_files, dict):
+        return {}
+    return checked_files
+
+
+def write_checked_files(directory, checked_files):
+    """
+    Writes the results of the sequence file integrity check to the status file, keeping the rest of the status
+
+    When the run has no status file yet, one is created with the new status, so the results of a run's first
+    check are kept. Nothing is written when the status file in the run directory cannot be written to
+
+    :param directory: the run directory
+    :param checked_files: dict of file path -> {"size", "mtime", "error"}
+    :return: True if the results were written
+    """
+    uploader_info_file = os.path.join(directory, STATUS_FILE_NAME)
+    if not os.path.exists(uploader_info_file):
+        if not os.access(directory, os.W_OK):
+            return False
+        json_data = {STATUS_FIELD: DirectoryStatus.NEW,
+                     DATE_TIME_FIELD: _get_date_time_field()}
+    elif not os.access(uploader_info_file, os.W_OK):
+        return False
+    else:
+        try:
+            with open(uploader_info_file, "rb") as reader:
+                json_data = json.loads(reader.read().decode())
+        except ValueError:
+            return False
+    json_data[CHECKED_FILES_FIELD] = checked_files
+
     with open(uploader_info_file, "w") as json_file:
         json.dump(json_data, json_file, indent=4, sort_keys=True)
         json_file.write("\n")
 
+    # the status file changed, so the run index needs its new signature
+    directory_status = DirectoryStatus(directory)
+    directory_status.status = json_data.get(STATUS_FIELD)
+    _update_run_index(directory_status, True, json_data.get(RUN_ID_FIELD), json_data.get(IRIDA_INSTANCE_FIELD))
+    return True
+
 
 def _get_date_time_field():
     """
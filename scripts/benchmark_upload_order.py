@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Simulates uploading sequencing runs with each upload order policy, and prints the time taken by each.
+
+Sample sizes are generated to look like a typical run: most samples are a few hundred MB, with a few large
+samples (e.g. deeply sequenced isolates) in random places in the sample sheet.
+The time to upload a sample is taken as its size, so the results are in GB uploaded per upload slot.
+
+Usage: python scripts/benchmark_upload_order.py [--runs N] [--samples N] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import upload_planner  # noqa: E402
+
+
+def make_run(rng, sample_count):
+    """
+    Makes a list of sample sizes in GB, in sample sheet order
+    """
+    size_list = [rng.lognormvariate(-1.2, 0.5) for _ in range(sample_count)]
+    for i in rng.sample(range(sample_count), max(1, sample_count // 30)):
+        size_list[i] = rng.uniform(2, 4)
+    return size_list
+
+
+def order_sizes(size_list, upload_order):
+    return upload_planner.order_by_size(size_list, size_list, upload_order)
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    argument_parser.add_argument('--runs', type=int, default=200, help='number of runs to simulate')
+    argument_parser.add_argument('--samples', type=int, default=48, help='number of samples in each run')
+    argument_parser.add_argument('--seed', type=int, default=1, help='random seed')
+    args = argument_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    run_list = [make_run(rng, args.samples) for _ in range(args.runs)]
+
+    print("{} simulated runs of {} samples".format(args.runs, args.samples))
+    print("{:>8} {:>10} {:>14} {:>15} {:>12} {:>12}".format(
+        "workers", "sheet", "largest_first", "smallest_first", "lower bound", "improvement"))
+    for workers in [1, 2, 4, 8]:
+        total = {upload_order: 0 for upload_order in upload_planner.UPLOAD_ORDER_LIST}
+        lower_bound = 0
+        for size_list in run_list:
+            for upload_order in upload_planner.UPLOAD_ORDER_LIST:
+                total[upload_order] += upload_planner.simulate_makespan(order_sizes(size_list, upload_order), workers)
+            # no order can finish before the largest sample, or before the work is split evenly
+            lower_bound += max(max(size_list), sum(size_list) / workers)
+
+        sheet = total[upload_planner.SHEET_ORDER] / args.runs
+        largest = total[upload_planner.LARGEST_FIRST] / args.runs
+        print("{:>8} {:>10.2f} {:>14.2f} {:>15.2f} {:>12.2f} {:>11.1f}%".format(
+            workers, sheet, largest, total[upload_planner.SMALLEST_FIRST] / args.runs, lower_bound / args.runs,
+            (sheet - largest) / sheet * 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Times validating large synthetic sequencing runs with the fast validation path, and with cerberus only.
+
+Usage: python scripts/benchmark_validation.py [--samples N] [--projects N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import model_validator  # noqa: E402
+from model import Project, Sample, SequenceFile, SequencingRun  # noqa: E402
+
+
+def make_run(sample_count, project_count):
+    """
+    Makes a paired end run with samples split evenly between projects
+    """
+    project_list = [Project(name="project {}".format(i), id=str(i + 1)) for i in range(project_count)]
+    for i in range(sample_count):
+        sample_name = "sample-{:06d}".format(i)
+        sample = Sample(sample_name, "synthetic sample", i + 1, {"sampleProject": str(i % project_count + 1)})
+        sample.sequence_file = SequenceFile(["/data/{}_S{}_L001_R1_001.fastq.gz".format(sample_name, i + 1),
+                                             "/data/{}_S{}_L001_R2_001.fastq.gz".format(sample_name, i + 1)])
+        project_list[i % project_count].add_sample(sample)
+    return SequencingRun({"layoutType": "PAIRED_END"}, project_list)
+
+
+def time_validation(sequencing_run, use_fast_path, repeat):
+    """
+    :return: best time in seconds of repeat validations
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = model_validator.validate_sequencing_run(sequencing_run, use_fast_path=use_fast_path)
+        elapsed = time.perf_counter() - start
+        assert result.is_valid()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    argument_parser.add_argument('--samples', type=int, default=10000, help='number of samples in the largest run')
+    argument_parser.add_argument('--projects', type=int, default=10, help='number of projects in each run')
+    argument_parser.add_argument('--repeat', type=int, default=3, help='number of times to validate each run')
+    args = argument_parser.parse_args()
+
+    print("{:>8} {:>12} {:>12} {:>10}".format("samples", "cerberus", "fast path", "speedup"))
+    sample_count = 100
+    while True:
+        sample_count = min(sample_count, args.samples)
+        sequencing_run = make_run(sample_count, min(args.projects, sample_count))
+        cerberus_time = time_validation(sequencing_run, False, args.repeat)
+        fast_time = time_validation(sequencing_run, True, args.repeat)
+        print("{:>8} {:>11.3f}s {:>11.3f}s {:>9.1f}x".format(
+            sample_count, cerberus_time, fast_time, cerberus_time / fast_time))
+        if sample_count == args.samples:
+            break
+        sample_count *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import unittest
+
+from http import HTTPStatus
+from unittest.mock import MagicMock, patch
+
+from api import ApiCalls
+from model import Sample
+
+
+class TestSampleCache(unittest.TestCase):
+    """
+    Tests the caching of samples by api.ApiCalls
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        with patch.object(ApiCalls, "_create_session"):
+            self.api_instance = ApiCalls("id", "secret", "http://irida/api/", "user", "pass")
+
+    @patch.object(ApiCalls, "_get_link")
+    @patch.object(ApiCalls, "_request")
+    def test_send_sample_only_resets_its_project(self, mock_request, mock_get_link):
+        mock_request.return_value.status_code = HTTPStatus.CREATED
+        mock_request.return_value.text = "{}"
+        project_list = [MagicMock()]
+        other_sample_list = [Sample("other")]
+        self.api_instance.cached_projects = project_list
+        self.api_instance.cached_samples = {"1": [], "2": other_sample_list}
+
+        self.api_instance.send_sample(Sample("sample1"), "1")
+
+        # runs uploading to other projects keep using the cache
+        self.assertEqual(self.api_instance.cached_samples, {"2": other_sample_list})
+        self.assertIs(self.api_instance.cached_projects, project_list)
+
+    @patch.object(ApiCalls, "_request")
+    def test_cleared_cache_does_not_affect_loaded_samples(self, mock_request):
+        self.api_instance.cached_samples = {"1": [Sample("sample1")]}
+
+        sample_list = self.api_instance.get_samples("1")
+        self.api_instance.clear_sample_cache()
+
+        self.assertEqual([s.sample_name for s in sample_list], ["sample1"])
+        self.assertEqual(self.api_instance.cached_samples, {})
+        mock_request.assert_not_called()
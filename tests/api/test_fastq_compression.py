@@ -0,0 +1,62 @@
+import unittest
+import gzip
+import io
+import os
+
+from api import fastq_compression
+
+
+class TestIterCompressedBlocks(unittest.TestCase):
+    """
+    Tests the api.fastq_compression.iter_compressed_blocks function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.data = b"".join(b"@read%d\nACGTACGTTTGA\n+\nIIIIIIIIIIII\n" % i for i in range(5000))
+
+    def test_decompresses_to_original(self):
+        chunk_list = list(fastq_compression.iter_compressed_blocks(io.BytesIO(self.data), block_size=4096,
+                                                                   max_workers=4))
+
+        self.assertGreater(len(chunk_list), 1)
+        self.assertEqual(sum(length for length, _ in chunk_list), len(self.data))
+        compressed = b"".join(member for _, member in chunk_list)
+        self.assertEqual(gzip.decompress(compressed), self.data)
+        self.assertLess(len(compressed), len(self.data))
+
+    def test_empty_file(self):
+        chunk_list = list(fastq_compression.iter_compressed_blocks(io.BytesIO(b""), max_workers=2))
+
+        self.assertEqual(len(chunk_list), 1)
+        self.assertEqual(gzip.decompress(chunk_list[0][1]), b"")
+
+    def test_stop_early(self):
+        input_file = io.BytesIO(self.data)
+        chunks = fastq_compression.iter_compressed_blocks(input_file, block_size=1024, max_workers=1)
+
+        next(chunks)
+        chunks.close()
+
+        # only the blocks in flight were read
+        self.assertLess(input_file.tell(), len(self.data))
+
+
+class TestNeedsCompression(unittest.TestCase):
+    """
+    Tests the api.fastq_compression.needs_compression function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_needs_compression(self):
+        self.assertTrue(fastq_compression.needs_compression(os.path.join("run", "sample_R1.fastq")))
+        self.assertFalse(fastq_compression.needs_compression(os.path.join("run", "sample_R1.fastq.gz")))
+        self.assertTrue(fastq_compression.needs_compression(os.path.join("run", "sample_R1.fq")))
+        self.assertEqual(fastq_compression.compressed_file_name("sample_R1.fastq"), "sample_R1.fastq.gz")
+
+    def test_other_compression_not_compressed_again(self):
+        self.assertFalse(fastq_compression.needs_compression(os.path.join("run", "sample_R1.fastq.bz2")))
+        self.assertFalse(fastq_compression.needs_compression(os.path.join("run", "sample_R1.fastq.xz")))
+        self.assertFalse(fastq_compression.needs_compression(os.path.join("run", "sample_R1.fq.zst")))
@@ -0,0 +1,145 @@
+import threading
+import unittest
+
+from http import HTTPStatus
+from unittest.mock import MagicMock, patch
+
+from api import ApiCalls
+from api.http_metrics import HttpMetrics, OperationStats
+from messaging import run_context
+
+
+class TestHttpMetrics(unittest.TestCase):
+    """
+    Tests the api.http_metrics.HttpMetrics class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.metrics = HttpMetrics()
+
+    def test_requests_grouped_by_operation(self):
+        self.metrics.observe("get_link", 0.02, bytes_received=100)
+        self.metrics.observe("get_link", 0.2, bytes_received=50)
+        self.metrics.observe("send_sequence_files", 40, bytes_sent=1000)
+
+        stats_dict = self.metrics.get_stats_since()
+
+        self.assertEqual(stats_dict["get_link"].count, 2)
+        self.assertEqual(stats_dict["get_link"].bytes_received, 150)
+        self.assertAlmostEqual(stats_dict["get_link"].total_seconds, 0.22)
+        self.assertEqual(stats_dict["send_sequence_files"].bytes_sent, 1000)
+
+    def test_time_request_counts_errors(self):
+        with self.assertRaises(ConnectionError):
+            with self.metrics.time_request("get_projects"):
+                raise ConnectionError()
+
+        stats = self.metrics.get_stats_since()["get_projects"]
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(stats.error_count, 1)
+
+    def test_stats_since_snapshot(self):
+        self.metrics.observe("get_link", 0.02)
+        self.metrics.observe("get_samples", 0.02)
+        snapshot = self.metrics.get_snapshot()
+        self.metrics.observe("get_link", 0.3)
+
+        stats_dict = self.metrics.get_stats_since(snapshot)
+
+        self.assertEqual(list(stats_dict), ["get_link"])
+        self.assertEqual(stats_dict["get_link"].count, 1)
+        self.assertEqual(stats_dict["get_link"].get_percentile(50), 0.5)
+
+    def test_requests_counted_by_run(self):
+        def _upload(directory, operation):
+            run_context.set_run_directory(directory)
+            with self.metrics.time_request(operation):
+                pass
+
+        thread_list = [threading.Thread(target=_upload, args=("run1", "get_samples")),
+                       threading.Thread(target=_upload, args=("run2", "send_sequence_files"))]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+
+        self.assertEqual(list(self.metrics.get_run_stats("run1")), ["get_samples"])
+        self.assertEqual(list(self.metrics.get_run_stats("run2")), ["send_sequence_files"])
+        self.assertEqual(sorted(self.metrics.get_stats_since()), ["get_samples", "send_sequence_files"])
+
+        self.metrics.clear_run("run1")
+        self.assertEqual(self.metrics.get_run_stats("run1"), {})
+
+    @patch("api.http_metrics.MAX_RUNS", 1)
+    def test_runs_bounded(self):
+        self.metrics.observe("get_samples", 0.02, run_directory="run1")
+        self.metrics.observe("get_samples", 0.02, run_directory="run2")
+
+        self.assertEqual(self.metrics.get_run_stats("run1"), {})
+        self.assertEqual(self.metrics.get_run_stats("run2")["get_samples"].count, 1)
+
+    def test_percentiles(self):
+        stats = OperationStats()
+        for _ in range(90):
+            stats.observe(0.003)
+        for _ in range(10):
+            stats.observe(3)
+
+        self.assertEqual(stats.get_percentile(50), 0.005)
+        self.assertEqual(stats.get_percentile(95), 5)
+        self.assertIsNone(OperationStats().get_percentile(50))
+
+
+class TestApiCallsRequest(unittest.TestCase):
+    """
+    Tests that the requests made by api.ApiCalls are measured
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        with patch.object(ApiCalls, "_create_session"):
+            self.api_instance = ApiCalls("id", "secret", "http://irida/api/", "user", "pass")
+        self.session = MagicMock()
+        self.session.options.return_value.status_code = HTTPStatus.OK
+        self.session.options.return_value.content = b""
+        self.api_instance._session_instance = self.session
+
+    def test_request_measured(self):
+        self.session.get.return_value.content = b"response"
+        self.session.get.return_value.request.body = None
+
+        self.api_instance._request("get_projects", "get", "http://irida/api/projects")
+
+        stats_dict = self.api_instance.http_metrics.get_stats_since()
+        self.assertEqual(stats_dict["get_projects"].count, 1)
+        self.assertEqual(stats_dict["get_projects"].bytes_received, len(b"response"))
+        # the session is checked before the request, and counted separately
+        self.assertEqual(stats_dict["check_session"].count, 1)
+
+    def test_retries_counted(self):
+        self.session.get.return_value.content = b"response"
+        self.session.get.return_value.request.body = None
+        self.session.get.return_value.raw.retries.history = ("first attempt", "second attempt")
+
+        self.api_instance._request("get_projects", "get", "http://irida/api/projects")
+
+        stats_dict = self.api_instance.http_metrics.get_stats_since()
+        self.assertEqual(stats_dict["get_projects"].retry_count, 2)
+        self.assertEqual(stats_dict["get_projects"].get_dict()["retry_count"], 2)
+
+    def test_streamed_body_counted(self):
+        def fake_post(url, data=None, headers=None):
+            for _ in data:
+                pass
+            response = MagicMock()
+            response.content = b""
+            response.request.body = data
+            return response
+
+        self.session.post.side_effect = fake_post
+
+        self.api_instance._request("send_sequence_files", "post", "http://irida/api/files",
+                                   data=(chunk for chunk in [b"abc", b"defg"]), headers={})
+
+        self.assertEqual(self.api_instance.http_metrics.get_stats_since()["send_sequence_files"].bytes_sent, 7)
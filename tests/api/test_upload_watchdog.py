@@ -0,0 +1,262 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from http import HTTPStatus
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from requests import ConnectionError
+
+from api import ApiCalls
+from api.exceptions import IridaUploadCanceledException, UploadStalledError
+from api.upload_watchdog import UploadWatchdog, WatchedHTTPAdapter, watch_body, watching
+from messaging import MessageTopics
+from model import SequenceFile
+
+
+class TestUploadWatchdog(unittest.TestCase):
+    """
+    Tests the api.upload_watchdog.UploadWatchdog class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_no_progress(self):
+        watchdog = UploadWatchdog(60, now=0)
+        watchdog.record_progress(1000, now=30)
+
+        self.assertIsNone(watchdog.get_stall_reason(now=89))
+        self.assertIsNotNone(watchdog.get_stall_reason(now=90))
+        with self.assertRaises(UploadStalledError):
+            watchdog.check(now=90)
+
+    def test_min_throughput(self):
+        watchdog = UploadWatchdog(60, min_throughput=100, now=0)
+        # a slow start is not a stall
+        self.assertIsNone(watchdog.get_stall_reason(now=30))
+
+        # 200 bytes per second for the first minute, then 50
+        stall_reason_list = []
+        for second in range(1, 121):
+            watchdog.record_progress(200 if second <= 60 else 50, now=second)
+            stall_reason_list.append(watchdog.get_stall_reason(now=second))
+
+        self.assertEqual(stall_reason_list[:90], [None] * 90)
+        self.assertIsNotNone(stall_reason_list[-1])
+
+    def test_watch_body(self):
+        watchdog = UploadWatchdog(60)
+
+        self.assertEqual(list(watch_body([b"abc", b"de"], watchdog)), [b"abc", b"de"])
+        self.assertEqual(watchdog.bytes_sent, 5)
+        self.assertTrue(watchdog.finished)
+
+    def test_watch_body_stalled(self):
+        watchdog = UploadWatchdog(60, now=0)
+        body = watch_body([b"abc", b"de"], watchdog)
+
+        with self.assertRaises(UploadStalledError):
+            next(body)
+        self.assertFalse(watchdog.finished)
+
+
+class TestWatching(unittest.TestCase):
+    """
+    Tests that api.upload_watchdog.watching aborts requests blocked on a real connection
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.server = socket.socket()
+        self.addCleanup(self.server.close)
+        # a small receive buffer, so the connection soon stops taking the body when it is not read
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.url = "http://127.0.0.1:{}/files".format(self.server.getsockname()[1])
+        self.adapter = WatchedHTTPAdapter(pool_maxsize=1, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.addCleanup(self.session.close)
+
+    def _endless_body(self):
+        chunk = b"@read\n" * 10000
+        while True:
+            yield chunk
+
+    def test_blocked_connection_shut_down(self):
+        # the connection is accepted, but none of the body is ever read
+        watchdog = UploadWatchdog(0.5)
+        start_time = time.monotonic()
+
+        with self.assertRaises(ConnectionError):
+            with watching(watchdog):
+                self.session.post(self.url, data=watch_body(self._endless_body(), watchdog))
+
+        self.assertLess(time.monotonic() - start_time, 10)
+        self.assertIsNotNone(watchdog.get_stall_reason())
+        # the connection's place in the pool is given back
+        pool = self.adapter.poolmanager.connection_from_url(self.url)
+        self.assertEqual(pool.pool.qsize(), 1)
+
+    def test_slow_response_not_timed_out(self):
+        def respond_slowly():
+            connection, _ = self.server.accept()
+            with connection:
+                request = b""
+                while not request.endswith(b"0\r\n\r\n"):
+                    request += connection.recv(65536)
+                # IRIDA takes longer than the stall timeout to store the files
+                time.sleep(1.5)
+                connection.sendall(b"HTTP/1.1 201 Created\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
+        server_thread = threading.Thread(target=respond_slowly)
+        server_thread.start()
+        self.addCleanup(server_thread.join)
+        watchdog = UploadWatchdog(0.5)
+
+        with watching(watchdog):
+            response = self.session.post(self.url, data=watch_body(iter([b"abc", b"de"]), watchdog))
+
+        self.assertEqual(response.status_code, 201)
+
+
+class TestSendSequenceFilesStalled(unittest.TestCase):
+    """
+    Tests that api.ApiCalls aborts and sends again uploads that stall
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        with patch.object(ApiCalls, "_create_session"):
+            self.api_instance = ApiCalls("id", "secret", "http://irida/api/", "user", "pass",
+                                         upload_stall_timeout=60)
+        self.session = MagicMock()
+        self.session.options.return_value.status_code = HTTPStatus.OK
+        self.session.options.return_value.content = b""
+        self.api_instance._session_instance = self.session
+        self.sequence_file = SequenceFile(["sample1_R1.fastq.gz"])
+
+    @patch("api.upload_watchdog.time.monotonic")
+    def test_connection_shut_down_is_stall(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+
+        def stalled_post(url, data=None, headers=None):
+            next(iter(data))
+            # the request's watch shuts the connection down once nothing more of the body is sent
+            mock_monotonic.return_value = 60
+            raise ConnectionError("connection shut down")
+
+        self.session.post.side_effect = stalled_post
+        watchdog = UploadWatchdog(60)
+
+        with self.assertRaises(UploadStalledError) as context:
+            self.api_instance._request("send_sequence_files", "post", "http://irida/api/files",
+                                       data=(chunk for chunk in [b"abc", b"defg"]), headers={}, watchdog=watchdog)
+
+        self.assertIsInstance(context.exception.__cause__, ConnectionError)
+        stats = self.api_instance.http_metrics.get_stats_since()["send_sequence_files"]
+        self.assertEqual(stats.stall_count, 1)
+        self.assertEqual(stats.error_count, 1)
+
+    def test_connection_error_is_not_stall(self):
+        self.session.post.side_effect = ConnectionError("refused")
+
+        with self.assertRaises(ConnectionError):
+            self.api_instance._request("send_sequence_files", "post", "http://irida/api/files",
+                                       data=(chunk for chunk in [b"abc"]), headers={}, watchdog=UploadWatchdog(60))
+
+        self.assertEqual(self.api_instance.http_metrics.get_stats_since()["send_sequence_files"].stall_count, 0)
+
+    @patch.object(ApiCalls, "_get_link")
+    @patch.object(ApiCalls, "_request")
+    def test_stalled_upload_sent_again(self, mock_request, mock_get_link):
+        response = MagicMock()
+        response.status_code = HTTPStatus.CREATED
+        response.text = "{}"
+        mock_request.side_effect = [UploadStalledError("stalled"), response]
+
+        self.api_instance.send_sequence_files(self.sequence_file, "sample1", "1", 55)
+
+        self.assertEqual(mock_request.call_count, 2)
+        # each attempt has its own body and watchdog
+        first_call, second_call = mock_request.call_args_list
+        self.assertIsNot(first_call[1]["data"], second_call[1]["data"])
+        self.assertIsNot(first_call[1]["watchdog"], second_call[1]["watchdog"])
+
+    @patch.object(ApiCalls, "_get_link")
+    @patch.object(ApiCalls, "_request")
+    def test_upload_stalls_too_often(self, mock_request, mock_get_link):
+        mock_request.side_effect = UploadStalledError("stalled")
+
+        with self.assertRaises(UploadStalledError):
+            self.api_instance.send_sequence_files(self.sequence_file, "sample1", "1", 55)
+
+        self.assertEqual(mock_request.call_count, 4)
+
+    @patch.object(ApiCalls, "_get_link")
+    @patch.object(ApiCalls, "_request")
+    def test_canceled_upload_not_sent_again(self, mock_request, mock_get_link):
+        def stalled_request(*args, **kwargs):
+            self.api_instance._kill_connections(55)
+            raise UploadStalledError("stalled")
+
+        mock_request.side_effect = stalled_request
+
+        with self.assertRaises(IridaUploadCanceledException):
+            self.api_instance.send_sequence_files(self.sequence_file, "sample1", "1", 55)
+
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch.object(ApiCalls, "_get_link")
+    @patch.object(ApiCalls, "_request")
+    def test_canceling_other_run_does_not_stop_upload(self, mock_request, mock_get_link):
+        response = MagicMock()
+        response.status_code = HTTPStatus.CREATED
+        response.text = "{}"
+
+        def stalled_request(*args, **kwargs):
+            # another run uploading with the same api instance is canceled
+            self.api_instance._kill_connections(56)
+            if mock_request.call_count == 1:
+                raise UploadStalledError("stalled")
+            return response
+
+        mock_request.side_effect = stalled_request
+
+        self.api_instance.send_sequence_files(self.sequence_file, "sample1", "1", 55)
+
+        self.assertEqual(mock_request.call_count, 2)
+
+    @patch("api.api_calls.messaging.send_message")
+    @patch.object(ApiCalls, "_get_link")
+    def test_abandoned_upload_failed(self, mock_get_link, mock_send_message):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_name = os.path.join(directory, "sample1_R1.fastq.gz")
+        with open(file_name, "wb") as f:
+            f.write(b"@read1")
+
+        def lost_post(url, data=None, **kwargs):
+            # the connection is lost once the file has started to be sent
+            body = iter(data)
+            next(body)
+            next(body)
+            raise ConnectionError("reset")
+
+        self.session.post.side_effect = lost_post
+
+        with self.assertRaises(ConnectionError):
+            self.api_instance.send_sequence_files(SequenceFile([file_name]), "sample1", "1", 55)
+
+        topic_list = [call[0][0].topic for call in mock_send_message.call_args_list]
+        self.assertEqual(topic_list[0], MessageTopics.upload_started_topic)
+        self.assertEqual(topic_list[-1], MessageTopics.upload_failed_topic)
+        self.assertNotIn(MessageTopics.upload_completed_topic, topic_list)
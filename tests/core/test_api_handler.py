@@ -1,11 +1,15 @@
 import unittest
 from unittest.mock import patch
 from os import path
+import shutil
+import tempfile
+import threading
 
-from core import api_handler
+import model
+from core import api_handler, run_fingerprint, timing
 
 from parsers.miseq.parser import Parser
-from api.exceptions import IridaResourceError
+from api.exceptions import IridaConnectionError, IridaResourceError
 from model.exceptions import ModelValidationError
 
 path_to_module = path.abspath(path.dirname(__file__))
@@ -142,6 +146,93 @@ class TestPrepareAndValidateForUpload(unittest.TestCase):
         self.assertEqual(res.error_count(), 1)
         self.assertEqual(type(res.error_list[0]), IridaResourceError)
 
+    @patch("core.api_handler._get_api_instance")
+    def test_planned_samples_not_checked(self, mock_api_instance):
+        """
+        Samples in a cached upload plan are already ready on IRIDA and are not checked again
+        :return:
+        """
+        global sequencing_run
+
+        stub_api_instance = unittest.mock.MagicMock()
+        stub_api_instance.project_exists.side_effect = [True]
+        stub_api_instance.sample_exists.side_effect = [True]
+
+        mock_api_instance.side_effect = [stub_api_instance]
+
+        res = api_handler.prepare_and_validate_for_upload(sequencing_run, {("6", "01-1111"): 10, ("6", "02-2222"): 20})
+
+        stub_api_instance.project_exists.assert_called_once_with("6")
+        stub_api_instance.sample_exists.assert_called_once_with('03-3333', '6')
+        self.assertTrue(res.is_valid())
+
+    @patch("core.api_handler._get_api_instance")
+    def test_upload_plan_for_other_run_not_used(self, mock_api_instance):
+        """
+        An upload plan with a sample that is not in the run is not used, and every sample is checked
+        :return:
+        """
+        global sequencing_run
+
+        stub_api_instance = unittest.mock.MagicMock()
+        stub_api_instance.project_exists.side_effect = [True]
+        stub_api_instance.sample_exists.side_effect = [True, True, True]
+
+        mock_api_instance.side_effect = [stub_api_instance]
+
+        res = api_handler.prepare_and_validate_for_upload(sequencing_run, {("6", "01-1111"): 10, ("7", "04-4444"): 20})
+
+        self.assertEqual(stub_api_instance.sample_exists.call_count, 3)
+        self.assertTrue(res.is_valid())
+
+
+class TestUploadPlan(unittest.TestCase):
+    """
+    Tests the core.api_handler.load_upload_plan and store_upload_plan functions
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    @patch("core.api_handler.run_cache.get_run_cache")
+    @patch("core.api_handler.config.read_config_option")
+    def test_run_cache_off(self, mock_read_config_option, mock_get_run_cache):
+        mock_read_config_option.side_effect = lambda key, expected_type=None, default_value=None: default_value
+
+        self.assertIsNone(api_handler.load_upload_plan("run_directory"))
+        self.assertIsNone(api_handler.store_upload_plan("run_directory", "sequencing_run"))
+        mock_get_run_cache.assert_not_called()
+
+    @patch("core.api_handler._get_api_instance")
+    @patch("core.api_handler.run_cache.get_run_cache")
+    @patch("core.api_handler.config.read_config_option")
+    def test_load(self, mock_read_config_option, mock_get_run_cache, mock_api_instance):
+        mock_read_config_option.side_effect = [True]
+        mock_api_instance.return_value.base_url = "http://irida/api/"
+        mock_get_run_cache.return_value.load_upload_plan.side_effect = [{("6", "01-1111"): 10}]
+
+        self.assertEqual(api_handler.load_upload_plan("run_directory"), {("6", "01-1111"): 10})
+        mock_get_run_cache.return_value.load_upload_plan.assert_called_once_with("run_directory",
+                                                                                 "http://irida/api/")
+
+    @patch("core.api_handler.upload_planner.get_sample_upload_size")
+    @patch("core.api_handler._get_api_instance")
+    @patch("core.api_handler.run_cache.get_run_cache")
+    @patch("core.api_handler.config.read_config_option")
+    def test_store(self, mock_read_config_option, mock_get_run_cache, mock_api_instance,
+                   mock_get_sample_upload_size):
+        mock_read_config_option.side_effect = [True]
+        mock_api_instance.return_value.base_url = "http://irida/api/"
+        mock_get_sample_upload_size.side_effect = [10, 20]
+        sample_list = [model.Sample("01-1111", "", 1), model.Sample("02-2222", "", 2)]
+        sequencing_run = model.SequencingRun({}, [model.Project(id="6", sample_list=sample_list)])
+
+        upload_plan = api_handler.store_upload_plan("run_directory", sequencing_run)
+
+        self.assertEqual(upload_plan, {("6", "01-1111"): 10, ("6", "02-2222"): 20})
+        mock_get_run_cache.return_value.store_upload_plan.assert_called_once_with(
+            "run_directory", "http://irida/api/", upload_plan)
+
 
 class TestUploadSequencingRun(unittest.TestCase):
     """
@@ -162,14 +253,19 @@ class TestUploadSequencingRun(unittest.TestCase):
         global sequencing_run
         sequencing_run = None
 
+    @patch("core.api_handler.run_cache.get_data_directories")
+    @patch("core.api_handler.config.read_config_option")
     @patch("core.api_handler._get_api_instance")
-    def test_valid_all_functions_called(self, mock_api_instance):
+    def test_valid_all_functions_called(self, mock_api_instance, mock_read_config_option, mock_get_data_directories):
         """
         Makes sure that all functions are called when a valid sequencing run in given
         :return:
         """
         global sequencing_run
 
+        # upload in sheet order, one sample at a time
+        mock_read_config_option.side_effect = ["sheet", 1]
+
         # set up all the mock data for a fake upload
         for samp in sequencing_run.project_list[0].sample_list:
             samp.sequence_file = "mock_sample"
@@ -182,6 +278,7 @@ class TestUploadSequencingRun(unittest.TestCase):
         stub_api_instance.send_sequence_files.side_effect = [True, True, True]
         stub_api_instance.set_seq_run_complete.side_effect = [True]
 
+        mock_get_data_directories.return_value = []
         mock_api_instance.side_effect = [stub_api_instance]
 
         api_handler.upload_sequencing_run(sequencing_run)
@@ -196,14 +293,18 @@ class TestUploadSequencingRun(unittest.TestCase):
         ])
         stub_api_instance.set_seq_run_complete.assert_called_once_with(mock_sequence_run_id)
 
+    @patch("core.api_handler.run_cache.get_data_directories")
+    @patch("core.api_handler.config.read_config_option")
     @patch("core.api_handler._get_api_instance")
-    def test_invalid_error_raised(self, mock_api_instance):
+    def test_invalid_error_raised(self, mock_api_instance, mock_read_config_option, mock_get_data_directories):
         """
         Makes sure that the sequencing run is set to error when an exception is thrown
         :return:
         """
         global sequencing_run
 
+        mock_read_config_option.side_effect = ["sheet", 1]
+
         # create mock data for our invalid sequencing run
         for samp in sequencing_run.project_list[0].sample_list:
             samp.sequence_file = "mock_sample"
@@ -215,6 +316,7 @@ class TestUploadSequencingRun(unittest.TestCase):
         stub_api_instance.set_seq_run_uploading.side_effect = IridaResourceError("Boom")
         stub_api_instance.set_seq_run_error.side_effect = [True]
 
+        mock_get_data_directories.return_value = []
         mock_api_instance.side_effect = [stub_api_instance]
 
         # make sure the IridaResourceError was thrown correctly
@@ -226,6 +328,71 @@ class TestUploadSequencingRun(unittest.TestCase):
         stub_api_instance.set_seq_run_uploading.assert_called_once_with(mock_sequence_run_id)
         stub_api_instance.set_seq_run_error.assert_called_once_with(mock_sequence_run_id)
 
+    @patch("core.api_handler.progress.directory_index.get_directory_index")
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_data_directories_invalidated(self, mock_api_instance, mock_read_config_option,
+                                          mock_get_directory_index):
+        """
+        Makes sure the sizes of sequence files outside the run directory are read fresh for the upload
+        :return:
+        """
+        global sequencing_run
+
+        mock_read_config_option.side_effect = ["sheet", 1]
+        data_directory = path.join(path_to_module, "fake_ngs_data", "Data", "Intensities", "BaseCalls")
+        stub_api_instance = unittest.mock.MagicMock()
+        stub_api_instance.create_seq_run.side_effect = [55]
+        mock_api_instance.side_effect = [stub_api_instance]
+
+        api_handler.upload_sequencing_run(sequencing_run)
+
+        mock_get_directory_index.return_value.invalidate.assert_called_once_with(data_directory)
+
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_samples_uploaded_in_parallel(self, mock_api_instance, mock_read_config_option):
+        """
+        Makes sure every sample is uploaded when several samples are uploaded at the same time
+        :return:
+        """
+        global sequencing_run
+
+        mock_read_config_option.side_effect = ["largest_first", 3]
+
+        stub_api_instance = unittest.mock.MagicMock()
+        stub_api_instance.create_seq_run.side_effect = [55]
+        mock_api_instance.side_effect = [stub_api_instance]
+
+        api_handler.upload_sequencing_run(sequencing_run)
+
+        self.assertEqual(sorted(c[1]["sample_name"] for c in stub_api_instance.send_sequence_files.call_args_list),
+                         ['01-1111', '02-2222', '03-3333'])
+        stub_api_instance.set_seq_run_complete.assert_called_once_with(55)
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_parallel_upload_error_raised(self, mock_api_instance, mock_read_config_option):
+        """
+        Makes sure an error uploading one sample sets the run to error when samples are uploaded in parallel
+        :return:
+        """
+        global sequencing_run
+
+        mock_read_config_option.side_effect = ["sheet", 2]
+
+        stub_api_instance = unittest.mock.MagicMock()
+        stub_api_instance.create_seq_run.side_effect = [55]
+        stub_api_instance.send_sequence_files.side_effect = IridaResourceError("Boom")
+        mock_api_instance.side_effect = [stub_api_instance]
+
+        with self.assertRaises(IridaResourceError):
+            api_handler.upload_sequencing_run(sequencing_run)
+
+        stub_api_instance.set_seq_run_error.assert_called_once_with(55)
+        stub_api_instance.set_seq_run_complete.assert_not_called()
+
 
 class TestSendProject(unittest.TestCase):
     """
@@ -301,3 +468,233 @@ class TestSendProject(unittest.TestCase):
 
         with self.assertRaises(IridaResourceError):
             api_handler.send_project(mock_project)
+
+
+class TestFindDuplicateRun(unittest.TestCase):
+    """
+    Tests the core.api_handler.find_duplicate_run function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.index_dir = tempfile.mkdtemp()
+        self.sequencing_run = Parser.get_sequencing_run(path.join(path_to_module, "fake_ngs_data",
+                                                                  "SampleSheet.csv"))
+        fingerprint = run_fingerprint.compute_fingerprint(self.sequencing_run)
+        api_handler._fingerprint_index = run_fingerprint.RunFingerprintIndex(
+            "http://irida/api/", index_file=path.join(self.index_dir, "index.json"))
+        api_handler._fingerprint_index.record(fingerprint, 12, "COMPLETE")
+
+    def tearDown(self):
+        api_handler._fingerprint_index = None
+        shutil.rmtree(self.index_dir)
+
+    @patch("core.api_handler._get_api_instance")
+    def test_deleted_run_not_duplicate(self, mock_api_instance):
+        mock_api_instance.return_value.get_seq_run_fingerprints.return_value = {}
+
+        self.assertIsNone(api_handler.find_duplicate_run(self.sequencing_run))
+
+    @patch("core.api_handler._get_api_instance")
+    def test_local_index_used_without_connection(self, mock_api_instance):
+        mock_api_instance.return_value.get_seq_run_fingerprints.side_effect = IridaConnectionError("down")
+
+        self.assertEqual(api_handler.find_duplicate_run(self.sequencing_run), "12")
+
+
+class TestInitializeApiFromConfig(unittest.TestCase):
+    """
+    Tests the core.api_handler.initialize_api_from_config function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def tearDown(self):
+        api_handler._api_instance = None
+        api_handler._api_config = None
+
+    @patch("core.api_handler.api.ApiCalls")
+    @patch("core.api_handler.config.read_config_option")
+    def test_instance_reused_for_same_config(self, mock_read_config_option, mock_api_calls):
+        mock_read_config_option.side_effect = ["id", "secret", "http://irida/api/", "user", "pass", 4, False,
+                                               300, 0] * 2
+
+        first_instance = api_handler.initialize_api_from_config()
+        second_instance = api_handler.initialize_api_from_config()
+
+        self.assertIs(first_instance, second_instance)
+        second_instance.clear_sample_cache.assert_called_once_with()
+        mock_api_calls.assert_called_once_with("id", "secret", "http://irida/api/", "user", "pass", 20,
+                                               max_connections=4, compress_uploads=False,
+                                               upload_stall_timeout=300, min_upload_throughput=0)
+
+    @patch("core.api_handler.api.ApiCalls")
+    @patch("core.api_handler.config.read_config_option")
+    def test_new_instance_for_new_config(self, mock_read_config_option, mock_api_calls):
+        mock_read_config_option.side_effect = ["id", "secret", "http://irida/api/", "user", "pass", 4, False, 300, 0,
+                                               "id", "secret", "http://other/api/", "user", "pass", 4, False, 300, 0]
+
+        api_handler.initialize_api_from_config()
+        api_handler.initialize_api_from_config()
+
+        self.assertEqual(mock_api_calls.call_count, 2)
+
+
+class TestStartApiWarmUp(unittest.TestCase):
+    """
+    Tests the core.api_handler.start_api_warm_up function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    @patch("core.api_handler.initialize_api_from_config")
+    def test_warm_up(self, mock_initialize_api_from_config):
+        timer = timing.PhaseTimer()
+
+        api_warm_up = api_handler.start_api_warm_up(timer)
+        api_warm_up.join()
+
+        mock_initialize_api_from_config.return_value.warm_up.assert_called_once_with()
+        self.assertEqual([name for name, seconds in timer.background_list], ["connecting to IRIDA"])
+
+    @patch("core.api_handler.initialize_api_from_config")
+    def test_warm_up_connection_error(self, mock_initialize_api_from_config):
+        mock_initialize_api_from_config.side_effect = IridaConnectionError("Could not connect")
+
+        # The error is not raised by the warm up, it is raised when the upload initializes the api
+        api_warm_up = api_handler.start_api_warm_up()
+        api_warm_up.join()
+
+        mock_initialize_api_from_config.assert_called_once_with()
+
+
+class TestPrepareAndUploadSequencingRun(unittest.TestCase):
+    """
+    Tests the core.api_handler.prepare_and_upload_sequencing_run function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        sheet_file = path.join(path_to_module, "fake_ngs_data", "SampleSheet.csv")
+        self.sequencing_run = Parser.get_sequencing_run(sheet_file)
+        self.stub_api_instance = unittest.mock.MagicMock()
+        self.stub_api_instance.create_seq_run.side_effect = [55]
+        self.stub_api_instance.project_exists.return_value = True
+        self.stub_api_instance.sample_exists.return_value = True
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_valid_all_samples_uploaded(self, mock_api_instance, mock_read_config_option):
+        mock_read_config_option.side_effect = ["sheet", 1]
+        mock_api_instance.return_value = self.stub_api_instance
+
+        validation_result, run_id = api_handler.prepare_and_upload_sequencing_run(self.sequencing_run)
+
+        self.assertTrue(validation_result.is_valid())
+        self.assertEqual(run_id, 55)
+        self.assertEqual([c[1]["sample_name"] for c in self.stub_api_instance.send_sequence_files.call_args_list],
+                         ['01-1111', '02-2222', '03-3333'])
+        self.stub_api_instance.set_seq_run_complete.assert_called_once_with(55)
+
+    @patch("core.api_handler._prepare_sample")
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_upload_starts_while_samples_checked(self, mock_api_instance, mock_read_config_option,
+                                                 mock_prepare_sample):
+        mock_read_config_option.side_effect = ["sheet", 1]
+        mock_api_instance.return_value = self.stub_api_instance
+        sent = threading.Event()
+        event_list = []
+
+        def _prepare_sample(api_instance, sample, project_id):
+            if sample.sample_name == '03-3333':
+                # the last sample is still being checked when the first is sent
+                sent.wait(5)
+            event_list.append("prepared " + sample.sample_name)
+            return None
+
+        def _send_sequence_files(sequence_file, sample_name, project_id, upload_id):
+            event_list.append("sent " + sample_name)
+            sent.set()
+
+        mock_prepare_sample.side_effect = _prepare_sample
+        self.stub_api_instance.send_sequence_files.side_effect = _send_sequence_files
+
+        validation_result, run_id = api_handler.prepare_and_upload_sequencing_run(self.sequencing_run)
+
+        self.assertTrue(validation_result.is_valid())
+        self.assertLess(event_list.index("sent 01-1111"), event_list.index("prepared 03-3333"))
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_missing_project_not_created(self, mock_api_instance, mock_read_config_option):
+        mock_read_config_option.side_effect = ["sheet", 1]
+        mock_api_instance.return_value = self.stub_api_instance
+        self.stub_api_instance.project_exists.return_value = False
+
+        validation_result, run_id = api_handler.prepare_and_upload_sequencing_run(self.sequencing_run)
+
+        self.assertFalse(validation_result.is_valid())
+        self.assertIsNone(run_id)
+        self.stub_api_instance.create_seq_run.assert_not_called()
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_first_sample_error_run_not_created(self, mock_api_instance, mock_read_config_option):
+        mock_read_config_option.side_effect = ["sheet", 2]
+        mock_api_instance.return_value = self.stub_api_instance
+        self.stub_api_instance.sample_exists.side_effect = lambda sample_name, project_id: sample_name != '01-1111'
+        self.stub_api_instance.send_sample.side_effect = IridaResourceError("Boom")
+
+        validation_result, run_id = api_handler.prepare_and_upload_sequencing_run(self.sequencing_run)
+
+        self.assertEqual(validation_result.error_count(), 1)
+        self.assertIsNone(run_id)
+        # the run is not created or partly uploaded on IRIDA
+        self.stub_api_instance.create_seq_run.assert_not_called()
+        self.stub_api_instance.send_sequence_files.assert_not_called()
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_later_sample_error_run_set_to_error(self, mock_api_instance, mock_read_config_option):
+        mock_read_config_option.side_effect = ["sheet", 1]
+        mock_api_instance.return_value = self.stub_api_instance
+        created = threading.Event()
+
+        def _create_seq_run(metadata):
+            created.set()
+            return 55
+
+        def _sample_exists(sample_name, project_id):
+            if sample_name != '03-3333':
+                return True
+            # the last sample fails once the run has been created for the first
+            created.wait(5)
+            return False
+
+        self.stub_api_instance.create_seq_run.side_effect = _create_seq_run
+        self.stub_api_instance.sample_exists.side_effect = _sample_exists
+        self.stub_api_instance.send_sample.side_effect = IridaResourceError("Boom")
+
+        validation_result, run_id = api_handler.prepare_and_upload_sequencing_run(self.sequencing_run)
+
+        self.assertEqual(validation_result.error_count(), 1)
+        self.assertIsNone(run_id)
+        self.stub_api_instance.set_seq_run_error.assert_called_once_with(55)
+        self.stub_api_instance.set_seq_run_complete.assert_not_called()
+        self.assertNotIn('03-3333',
+                         [c[1]["sample_name"] for c in self.stub_api_instance.send_sequence_files.call_args_list])
+
+    @patch("core.api_handler.config.read_config_option")
+    @patch("core.api_handler._get_api_instance")
+    def test_upload_error_raised(self, mock_api_instance, mock_read_config_option):
+        mock_read_config_option.side_effect = ["sheet", 2]
+        mock_api_instance.return_value = self.stub_api_instance
+        self.stub_api_instance.send_sequence_files.side_effect = IridaResourceError("Boom")
+
+        with self.assertRaises(IridaResourceError):
+            api_handler.prepare_and_upload_sequencing_run(self.sequencing_run)
+
+        self.stub_api_instance.set_seq_run_error.assert_called_once_with(55)
@@ -2,8 +2,12 @@ import unittest
 from unittest.mock import patch, MagicMock, Mock
 from os import path
 import os
+import shutil
+import tempfile
+import threading
 
-from core import cli_entry, logger
+from core import cli_entry, logger, upload_queue
+from api.exceptions import IridaConnectionError
 from model import DirectoryStatus
 from parsers.exceptions import DirectoryError
 
@@ -59,6 +63,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
         mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
         mock_progress.write_directory_status.side_effect = [None, None]
@@ -68,15 +73,19 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         cli_entry.validate_and_upload_single_entry(directory, force_upload=False)
 
         # Make sure directory status is init
-        mock_progress.write_directory_status.assert_called_with(StubDirectoryStatus, run_id=None)
+        # the stub run cannot be measured, so the status is written without a performance report
+        mock_progress.write_directory_status.assert_called_with(StubDirectoryStatus, run_id=None,
+                                                                performance_report=None)
         # Make sure parsing and validation is done
         mock_parsing_handler.parse_and_validate.assert_called_with(directory)
         # api must be initialized
         mock_api_handler.initialize_api_from_config.assert_called_with()
         # api must prep for upload
-        mock_api_handler.prepare_and_validate_for_upload.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.prepare_and_validate_for_upload.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
         # api should try to upload
-        mock_api_handler.upload_sequencing_run.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.upload_sequencing_run.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
 
     @patch("core.cli_entry.progress")
     @patch("core.cli_entry.api_handler")
@@ -135,6 +144,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
         mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
 
@@ -143,7 +153,8 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         cli_entry.validate_and_upload_single_entry(directory)
 
         # Make sure the validation is tried
-        mock_api_handler.prepare_and_validate_for_upload.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.prepare_and_validate_for_upload.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
         # make sure the upload is NOT done, as validation is invalid
         mock_api_handler.upload_sequencing_run.assert_not_called()
 
@@ -169,6 +180,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
         mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [None]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
 
@@ -206,6 +218,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
         mock_parsing_handler.parse_and_validate.side_effect = [DirectoryError("", "")]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [None]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
 
@@ -247,6 +260,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
         # mock_parsing_handler.run_is_new.side_effect = [None]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
 
@@ -263,9 +277,11 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         # api must be initialized
         mock_api_handler.initialize_api_from_config.assert_called_with()
         # api must prep for upload
-        mock_api_handler.prepare_and_validate_for_upload.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.prepare_and_validate_for_upload.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
         # api should try to upload
-        mock_api_handler.upload_sequencing_run.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.upload_sequencing_run.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
 
     @patch("core.cli_entry.progress")
     @patch("core.cli_entry.api_handler")
@@ -292,6 +308,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.get_run_status.side_effect = [mock_stub_directory_status]
         mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
 
@@ -308,9 +325,11 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         # api must be initialized
         mock_api_handler.initialize_api_from_config.assert_called_with()
         # api must prep for upload
-        mock_api_handler.prepare_and_validate_for_upload.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.prepare_and_validate_for_upload.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
         # api should try to upload
-        mock_api_handler.upload_sequencing_run.assert_called_with("Fake Sequencing Run")
+        mock_api_handler.upload_sequencing_run.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
 
     @patch("core.cli_entry.progress")
     @patch("core.cli_entry.api_handler")
@@ -338,6 +357,7 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.get_run_status.side_effect = [mock_stub_directory_status]
         mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
         mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
         mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
         mock_api_handler.upload_sequencing_run.side_effect = [None]
 
@@ -353,3 +373,357 @@ class TestValidateAndUploadSingleEntry(unittest.TestCase):
         mock_parsing_handler.parse_and_validate.assert_not_called()
         # make sure the upload is NOT done, as validation is invalid
         mock_api_handler.upload_sequencing_run.assert_not_called()
+
+    @patch("core.cli_entry.progress")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_duplicate_run_not_uploaded(self, mock_parsing_handler, mock_api_handler, mock_progress):
+        """
+        Makes sure a run that has already been uploaded to IRIDA is not uploaded again
+        :return:
+        """
+        class StubDirectoryStatus:
+            directory = path.join(path_to_module, "fake_ngs_data")
+            status = DirectoryStatus.NEW
+            message = None
+
+            @staticmethod
+            def status_equals(status):
+                return status == DirectoryStatus.NEW
+
+        mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
+        mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
+        mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = ["12"]
+
+        directory = path.join(path_to_module, "fake_ngs_data")
+
+        res = cli_entry.validate_and_upload_single_entry(directory, False)
+
+        self.assertEqual(res, cli_entry.EXIT_CODE_ERROR)
+        mock_api_handler.find_duplicate_run.assert_called_with("Fake Sequencing Run")
+        # online validation and upload should not happen for a duplicate run
+        mock_api_handler.prepare_and_validate_for_upload.assert_not_called()
+        mock_api_handler.upload_sequencing_run.assert_not_called()
+        self.assertEqual(StubDirectoryStatus.status, DirectoryStatus.ERROR)
+
+    @patch("core.cli_entry.progress")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_duplicate_run_force_upload(self, mock_parsing_handler, mock_api_handler, mock_progress):
+        """
+        Makes sure a run that has already been uploaded to IRIDA is uploaded again when using force
+        :return:
+        """
+        class StubValidationResult:
+            @staticmethod
+            def is_valid():
+                return True
+
+        class StubDirectoryStatus:
+            directory = path.join(path_to_module, "fake_ngs_data")
+            status = DirectoryStatus.COMPLETE
+
+            @staticmethod
+            def status_equals(status):
+                return status == DirectoryStatus.COMPLETE
+
+        mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
+        mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
+        mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = ["12"]
+        mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
+        mock_api_handler.upload_sequencing_run.side_effect = [None]
+
+        directory = path.join(path_to_module, "fake_ngs_data")
+
+        cli_entry.validate_and_upload_single_entry(directory, True)
+
+        mock_api_handler.upload_sequencing_run.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
+
+    @patch("core.cli_entry.progress")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_connection_lost_left_for_retry(self, mock_parsing_handler, mock_api_handler, mock_progress):
+        """
+        Makes sure a run that will be tried again is not set to error when the connection to IRIDA is lost
+        :return:
+        """
+        class StubValidationResult:
+            @staticmethod
+            def is_valid():
+                return True
+
+        class StubDirectoryStatus:
+            directory = path.join(path_to_module, "fake_ngs_data")
+            status = DirectoryStatus.NEW
+            message = None
+
+            @staticmethod
+            def status_equals(status):
+                return status == DirectoryStatus.NEW
+
+        mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
+        mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
+        mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
+        mock_api_handler.prepare_and_validate_for_upload.side_effect = [StubValidationResult]
+        mock_api_handler.upload_sequencing_run.side_effect = IridaConnectionError("Lost connection")
+
+        directory = path.join(path_to_module, "fake_ngs_data")
+
+        with self.assertRaises(IridaConnectionError):
+            cli_entry.validate_and_upload_single_entry(directory, False, retry_connection_errors=True)
+
+        self.assertEqual(StubDirectoryStatus.status, DirectoryStatus.PARTIAL)
+        self.assertEqual(mock_progress.write_directory_status.call_count, 1)
+
+    @patch("core.cli_entry.config.read_config_option")
+    @patch("core.cli_entry.progress")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_pipelined_upload(self, mock_parsing_handler, mock_api_handler, mock_progress, mock_read_config_option):
+        """
+        Makes sure online validation and upload are done together when pipelined_upload is set
+        :return:
+        """
+        class StubValidationResult:
+            @staticmethod
+            def is_valid():
+                return True
+
+        class StubDirectoryStatus:
+            directory = path.join(path_to_module, "fake_ngs_data")
+            status = DirectoryStatus.NEW
+
+            @staticmethod
+            def status_equals(status):
+                return status == DirectoryStatus.NEW
+
+        # check_gzip_integrity, then pipelined_upload
+        mock_read_config_option.side_effect = [False, True]
+        mock_parsing_handler.get_run_status.side_effect = [StubDirectoryStatus]
+        mock_parsing_handler.parse_and_validate.side_effect = ["Fake Sequencing Run"]
+        mock_api_handler.initialize_api_from_config.side_effect = [None]
+        mock_api_handler.find_duplicate_run.side_effect = [None]
+        mock_api_handler.prepare_and_upload_sequencing_run.side_effect = [(StubValidationResult, 55)]
+
+        directory = path.join(path_to_module, "fake_ngs_data")
+
+        res = cli_entry.validate_and_upload_single_entry(directory, False)
+
+        self.assertEqual(res, cli_entry.EXIT_CODE_SUCCESS)
+        mock_api_handler.prepare_and_upload_sequencing_run.assert_called_with(
+            "Fake Sequencing Run", mock_api_handler.load_upload_plan.return_value)
+        mock_api_handler.prepare_and_validate_for_upload.assert_not_called()
+        mock_api_handler.upload_sequencing_run.assert_not_called()
+        # the stub run cannot be measured, so the status is written without a performance report
+        mock_progress.write_directory_status.assert_called_with(StubDirectoryStatus, run_id=55,
+                                                                performance_report=None)
+        self.assertEqual(StubDirectoryStatus.status, DirectoryStatus.COMPLETE)
+
+
+class TestBatchUpload(unittest.TestCase):
+    """
+    Tests the core.cli_entry.batch_upload function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    @staticmethod
+    def _make_status(directory, status):
+        directory_status = DirectoryStatus(directory)
+        directory_status.status = status
+        return directory_status
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_only_new_runs_uploaded(self, mock_parsing_handler, mock_api_handler, mock_upload):
+        """
+        Makes sure every new run is uploaded, and runs in other statuses are skipped
+        :return:
+        """
+        mock_parsing_handler.get_parser_from_config.return_value.find_runs.return_value = [
+            self._make_status("/runs/a", DirectoryStatus.NEW),
+            self._make_status("/runs/b", DirectoryStatus.COMPLETE),
+            self._make_status("/runs/c", DirectoryStatus.NEW),
+            self._make_status("/runs/d", DirectoryStatus.INVALID),
+        ]
+        mock_upload.return_value = cli_entry.EXIT_CODE_SUCCESS
+
+        res = cli_entry.batch_upload("/runs", parallel_runs=2, upload_order="sheet")
+
+        self.assertEqual(res, cli_entry.EXIT_CODE_SUCCESS)
+        mock_api_handler.initialize_api_from_config.assert_called_once_with()
+        self.assertEqual(sorted(c[0][0] for c in mock_upload.call_args_list), ["/runs/a", "/runs/c"])
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_failed_run_returns_error(self, mock_parsing_handler, mock_api_handler, mock_upload):
+        """
+        Makes sure a failing run does not stop the other runs, and the batch returns an error
+        :return:
+        """
+        mock_parsing_handler.get_parser_from_config.return_value.find_runs.return_value = [
+            self._make_status("/runs/a", DirectoryStatus.NEW),
+            self._make_status("/runs/b", DirectoryStatus.NEW),
+        ]
+        mock_upload.side_effect = lambda directory: (cli_entry.EXIT_CODE_ERROR if directory == "/runs/a"
+                                                     else cli_entry.EXIT_CODE_SUCCESS)
+
+        res = cli_entry.batch_upload("/runs", parallel_runs=2, upload_order="sheet")
+
+        self.assertEqual(res, cli_entry.EXIT_CODE_ERROR)
+        self.assertEqual(mock_upload.call_count, 2)
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    @patch("core.cli_entry.parsing_handler")
+    def test_no_new_runs(self, mock_parsing_handler, mock_api_handler, mock_upload):
+        """
+        Makes sure nothing is done when there are no new runs
+        :return:
+        """
+        mock_parsing_handler.get_parser_from_config.return_value.find_runs.return_value = [
+            self._make_status("/runs/a", DirectoryStatus.COMPLETE),
+        ]
+
+        res = cli_entry.batch_upload("/runs", parallel_runs=2, upload_order="sheet")
+
+        self.assertEqual(res, cli_entry.EXIT_CODE_SUCCESS)
+        mock_api_handler.initialize_api_from_config.assert_not_called()
+        mock_upload.assert_not_called()
+
+
+class TestWorkUploadQueue(unittest.TestCase):
+    """
+    Tests the core.cli_entry.work_upload_queue function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue = upload_queue.UploadQueue(path.join(self.temp_dir, "queue.sqlite"))
+        upload_queue.set_upload_queue(self.queue)
+
+    def tearDown(self):
+        upload_queue.set_upload_queue(None)
+        shutil.rmtree(self.temp_dir)
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    def test_queue_drained(self, mock_api_handler, mock_upload):
+        """
+        Makes sure every queued run is uploaded in priority order, and removed from the queue
+        :return:
+        """
+        self.queue.enqueue("/runs/a", "research")
+        self.queue.enqueue("/runs/b", "clinical")
+        mock_api_handler.check_api_connection.return_value = True
+        mock_upload.return_value = cli_entry.EXIT_CODE_SUCCESS
+
+        cli_entry.work_upload_queue(parallel_runs=1, poll_interval=0, stop_when_empty=True)
+
+        self.assertEqual([c[0][0] for c in mock_upload.call_args_list], ["/runs/b", "/runs/a"])
+        self.assertEqual(len(self.queue), 0)
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    def test_runs_wait_while_offline(self, mock_api_handler, mock_upload):
+        """
+        Makes sure runs are kept in the queue while IRIDA cannot be reached
+        :return:
+        """
+        self.queue.enqueue("/runs/a")
+        mock_api_handler.check_api_connection.return_value = False
+
+        cli_entry.work_upload_queue(parallel_runs=1, poll_interval=0, stop_when_empty=True)
+
+        mock_upload.assert_not_called()
+        self.assertEqual(len(self.queue), 1)
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    def test_run_released_when_connection_lost(self, mock_api_handler, mock_upload):
+        """
+        Makes sure a run that fails because IRIDA went down is given back to the queue
+        :return:
+        """
+        self.queue.enqueue("/runs/a")
+        mock_api_handler.check_api_connection.side_effect = [True, False]
+        mock_upload.side_effect = IridaConnectionError("Lost connection")
+
+        cli_entry.work_upload_queue(parallel_runs=1, poll_interval=0, stop_when_empty=True)
+
+        self.assertEqual(mock_upload.call_count, 1)
+        mock_upload.assert_called_with("/runs/a", False, True)
+        self.assertEqual(self.queue.list_jobs()[0]["last_error"], "Could not connect to IRIDA")
+
+    @patch("core.cli_entry.parsing_handler.get_run_status")
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    def test_last_attempt_not_released(self, mock_api_handler, mock_upload, mock_get_run_status):
+        """
+        Makes sure a run is not tried again once it has been tried MAX_QUEUE_ATTEMPTS times
+        :return:
+        """
+        self.queue.enqueue("/runs/a")
+        mock_api_handler.check_api_connection.return_value = True
+        mock_get_run_status.return_value.status_equals.side_effect = lambda s: s == DirectoryStatus.PARTIAL
+        mock_upload.side_effect = [IridaConnectionError("Lost connection")] * (cli_entry.MAX_QUEUE_ATTEMPTS - 1) + \
+            [cli_entry.EXIT_CODE_ERROR]
+
+        cli_entry.work_upload_queue(parallel_runs=1, poll_interval=0, stop_when_empty=True)
+
+        self.assertEqual(mock_upload.call_count, cli_entry.MAX_QUEUE_ATTEMPTS)
+        # the last attempt sets the run to error itself when the connection is lost
+        mock_upload.assert_called_with("/runs/a", True, False)
+        self.assertEqual(len(self.queue), 0)
+
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    def test_failed_run_removed_when_online(self, mock_api_handler, mock_upload):
+        """
+        Makes sure a run that fails for a reason other than the connection is not tried again
+        :return:
+        """
+        self.queue.enqueue("/runs/a")
+        # IRIDA going down after the run failed does not change why it failed
+        mock_api_handler.check_api_connection.side_effect = [True, False]
+        mock_upload.return_value = cli_entry.EXIT_CODE_ERROR
+
+        cli_entry.work_upload_queue(parallel_runs=1, poll_interval=0, stop_when_empty=True)
+
+        self.assertEqual(mock_upload.call_count, 1)
+        self.assertEqual(len(self.queue), 0)
+
+    @patch("core.cli_entry.wait")
+    @patch("core.cli_entry.validate_and_upload_single_entry")
+    @patch("core.cli_entry.api_handler")
+    def test_uploads_stopped_with_worker(self, mock_api_handler, mock_upload, mock_wait):
+        """
+        Makes sure stopping the worker stops the runs being uploaded, and gives them back to the queue
+        :return:
+        """
+        self.queue.enqueue("/runs/a")
+        mock_api_handler.check_api_connection.return_value = True
+        stopped_event = threading.Event()
+        mock_api_handler.stop_uploads.side_effect = stopped_event.set
+
+        def _upload(directory, force_upload, retry_connection_errors):
+            stopped_event.wait(10)
+            return cli_entry.EXIT_CODE_ERROR
+
+        mock_upload.side_effect = _upload
+        mock_wait.side_effect = KeyboardInterrupt
+
+        cli_entry.work_upload_queue(parallel_runs=1, poll_interval=0)
+
+        self.assertTrue(stopped_event.is_set())
+        job = self.queue.list_jobs()[0]
+        self.assertFalse(job["leased"])
+        self.assertEqual(job["last_error"], "Upload worker stopped")
@@ -0,0 +1,103 @@
+import unittest
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from unittest.mock import patch
+
+import progress
+from core import integrity_check
+from model import Project, Sample, SequenceFile, SequencingRun
+
+
+class TestCheckSequencingRun(unittest.TestCase):
+    """
+    Tests the core.integrity_check.check_sequencing_run function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.run_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.run_dir, progress.upload_status.STATUS_FILE_NAME), "w") as f:
+            json.dump({progress.upload_status.STATUS_FIELD: "partial"}, f)
+
+        self.file_list = []
+        for file_name in ["sample1_R1.fastq.gz", "sample1_R2.fastq.gz"]:
+            self.file_list.append(os.path.join(self.run_dir, file_name))
+            with gzip.open(self.file_list[-1], "wb") as f:
+                f.write(b"@read\nACGT\n+\nIIII\n" * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    def _make_run(self):
+        sample = Sample("sample1", "a description", 1)
+        sample.sequence_file = SequenceFile(list(self.file_list))
+        return SequencingRun({"layoutType": "PAIRED_END"}, [Project(id="5", sample_list=[sample])])
+
+    def _truncate(self, file_path):
+        with open(file_path, "rb") as f:
+            data = f.read()
+        with open(file_path, "wb") as f:
+            f.write(data[:len(data) // 2])
+
+    def test_valid_files(self):
+        result = integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=2)
+
+        self.assertTrue(result.is_valid())
+
+    def test_truncated_file(self):
+        self._truncate(self.file_list[1])
+
+        result = integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=2)
+
+        self.assertEqual(result.error_count(), 1)
+        self.assertIn(self.file_list[1], str(result.error_list[0]))
+
+    def test_results_saved_in_status_file(self):
+        integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+
+        checked_files = progress.read_checked_files(self.run_dir)
+        self.assertEqual(set(checked_files), set(self.file_list))
+        self.assertIsNone(checked_files[self.file_list[0]]["error"])
+        self.assertEqual(checked_files[self.file_list[0]]["size"], os.path.getsize(self.file_list[0]))
+
+    def test_results_saved_without_status_file(self):
+        os.remove(os.path.join(self.run_dir, progress.upload_status.STATUS_FILE_NAME))
+
+        integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+
+        self.assertEqual(set(progress.read_checked_files(self.run_dir)), set(self.file_list))
+        # the run has not been uploaded, so it is still new
+        self.assertEqual(progress.get_directory_status(self.run_dir, []).status, "new")
+
+    @patch("core.integrity_check._check_gzip_file")
+    def test_unchanged_files_not_checked_again(self, mock_check):
+        mock_check.return_value = None
+        integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+        self.assertEqual(mock_check.call_count, 2)
+
+        mock_check.reset_mock()
+        result = integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+
+        mock_check.assert_not_called()
+        self.assertTrue(result.is_valid())
+
+    def test_changed_file_checked_again(self):
+        integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+        self._truncate(self.file_list[0])
+
+        result = integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+
+        self.assertEqual(result.error_count(), 1)
+
+    def test_results_kept_when_status_written(self):
+        integrity_check.check_sequencing_run(self._make_run(), self.run_dir, max_workers=1)
+        directory_status = progress.get_directory_status(self.run_dir, [])
+        directory_status.status = "error"
+
+        progress.write_directory_status(directory_status)
+
+        self.assertEqual(set(progress.read_checked_files(self.run_dir)), set(self.file_list))
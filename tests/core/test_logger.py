@@ -0,0 +1,74 @@
+import unittest
+from os import path
+import logging
+import shutil
+import tempfile
+import threading
+
+from core import logger
+from messaging import run_context
+
+
+class TestDirectoryLogger(unittest.TestCase):
+    """
+    Tests that each run can log to its own run directory
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if logger.directory_logger:
+            logger.remove_directory_logger()
+        shutil.rmtree(self.temp_dir)
+
+    def _read_log(self, directory):
+        with open(path.join(directory, "irida-uploader.log")) as reader:
+            return reader.read()
+
+    def test_second_logger_in_same_thread_raises(self):
+        logger.add_log_to_directory(self.temp_dir)
+
+        with self.assertRaises(Exception):
+            logger.add_log_to_directory(self.temp_dir)
+
+    def test_threads_log_to_own_directory(self):
+        directory_list = [tempfile.mkdtemp(dir=self.temp_dir) for _ in range(2)]
+        barrier = threading.Barrier(2)
+
+        def _log(directory):
+            logger.add_log_to_directory(directory)
+            barrier.wait()
+            logging.info("message for {}".format(directory))
+            barrier.wait()
+            logger.remove_directory_logger()
+
+        thread_list = [threading.Thread(target=_log, args=(d,)) for d in directory_list]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+
+        self.assertEqual(logger.directory_logger, {})
+        for directory in directory_list:
+            log_text = self._read_log(directory)
+            self.assertIn("message for {}".format(directory), log_text)
+            other_directory = [d for d in directory_list if d != directory][0]
+            self.assertNotIn("message for {}".format(other_directory), log_text)
+
+    def test_threads_started_for_run_log_to_its_directory(self):
+        logger.add_log_to_directory(self.temp_dir)
+
+        worker = threading.Thread(target=run_context.bind(lambda: logging.info("message from worker")))
+        worker.start()
+        worker.join()
+        other = threading.Thread(target=lambda: logging.info("message from other thread"))
+        other.start()
+        other.join()
+        logger.remove_directory_logger()
+
+        log_text = self._read_log(self.temp_dir)
+        self.assertIn("message from worker", log_text)
+        self.assertNotIn("message from other thread", log_text)
+        self.assertIsNone(run_context.get_run_directory())
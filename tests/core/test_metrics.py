@@ -0,0 +1,160 @@
+import unittest
+import urllib.error
+import urllib.request
+
+from unittest.mock import patch
+
+from api.http_metrics import OperationStats
+from core import metrics
+from messaging import ApiMessage, MessageTopics
+
+
+def _progress(bytes_sent, file_name="R1.fastq.gz", run_id=7):
+    return ApiMessage(MessageTopics.upload_progress_topic, run_id=run_id, project_id="5", sample_name="sample1",
+                      sequence_file_name=file_name, bytes_sent=bytes_sent, total_bytes=1000)
+
+
+class TestUploaderMetrics(unittest.TestCase):
+    """
+    Tests the core.metrics.UploaderMetrics class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.uploader_metrics = metrics.UploaderMetrics(now=0)
+
+    def _get_sample(self, text, name):
+        for line in text.splitlines():
+            if line.startswith(metrics.METRIC_PREFIX + name + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return None
+
+    def test_runs_and_files_counted(self):
+        self.uploader_metrics(ApiMessage(MessageTopics.run_upload_started_topic, run_id=7), now=1)
+        self.uploader_metrics(_progress(500), now=2)
+        self.uploader_metrics(ApiMessage(MessageTopics.upload_completed_topic, run_id=7, project_id="5",
+                                         sample_name="sample1", sequence_file_name="R1.fastq.gz"), now=3)
+        self.uploader_metrics.record_run_result(True)
+        self.uploader_metrics.record_run_result(False)
+
+        text = self.uploader_metrics.render(now=3)
+
+        self.assertEqual(self._get_sample(text, "runs_active"), 1)
+        self.assertIn('irida_uploader_runs_total{result="complete"} 1', text)
+        self.assertIn('irida_uploader_runs_total{result="error"} 1', text)
+        self.assertIn('irida_uploader_files_total{result="completed"} 1', text)
+        self.assertEqual(self._get_sample(text, "uploaded_bytes_total"), 500)
+
+        self.uploader_metrics(ApiMessage(MessageTopics.run_upload_finished_topic, run_id=7), now=4)
+        self.assertEqual(self._get_sample(self.uploader_metrics.render(now=4), "runs_active"), 0)
+
+    def test_file_sent_again_counted_from_zero(self):
+        self.uploader_metrics(_progress(600), now=1)
+        self.uploader_metrics(_progress(100), now=2)
+        self.uploader_metrics(_progress(700), now=3)
+
+        # the bytes sent again are sent over the network again
+        self.assertEqual(self.uploader_metrics.bytes_uploaded, 1300)
+
+    def test_throughput_drops_to_zero_when_stalled(self):
+        for second in range(1, 61):
+            self.uploader_metrics(_progress(second * 100), now=second)
+
+        self.assertAlmostEqual(self.uploader_metrics.get_throughput(now=60), 100)
+        self.assertAlmostEqual(self.uploader_metrics.get_throughput(now=75), 50)
+        self.assertEqual(self.uploader_metrics.get_throughput(now=60 + metrics.THROUGHPUT_WINDOW), 0)
+
+    def test_queued_runs(self):
+        self.uploader_metrics.set_queued_runs_function(lambda: 3)
+        self.assertEqual(self._get_sample(self.uploader_metrics.render(now=1), "runs_queued"), 3)
+
+        self.uploader_metrics.set_queued_runs_function(None)
+        self.assertEqual(self._get_sample(self.uploader_metrics.render(now=1), "runs_queued"), 0)
+
+    def test_request_metrics(self):
+        stats = OperationStats()
+        stats.observe(0.02, retry_count=1)
+        stats.observe(2.0, error=True, stalled=True)
+        token_stats = OperationStats()
+        token_stats.observe(0.1)
+
+        text = self.uploader_metrics.render({"get_samples": stats, "get_access_token": token_stats}, now=1)
+
+        self.assertIn('irida_uploader_http_request_duration_seconds_bucket{operation="get_samples",le="0.01"} 0', text)
+        self.assertIn('irida_uploader_http_request_duration_seconds_bucket{operation="get_samples",le="0.025"} 1',
+                      text)
+        self.assertIn('irida_uploader_http_request_duration_seconds_bucket{operation="get_samples",le="+Inf"} 2', text)
+        self.assertIn('irida_uploader_http_request_duration_seconds_count{operation="get_samples"} 2', text)
+        self.assertIn('irida_uploader_http_request_errors_total{operation="get_samples"} 1', text)
+        self.assertIn('irida_uploader_http_request_retries_total{operation="get_samples"} 1', text)
+        self.assertIn('irida_uploader_http_request_stalls_total{operation="get_samples"} 1', text)
+        self.assertEqual(self._get_sample(text, "token_refreshes_total"), 1)
+        self.assertIn("# TYPE irida_uploader_http_request_duration_seconds histogram", text)
+
+
+class TestRecordRunResult(unittest.TestCase):
+    """
+    Tests the core.metrics.record_run_result decorator
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.uploader_metrics = metrics.UploaderMetrics()
+        metrics.set_uploader_metrics(self.uploader_metrics)
+
+    def tearDown(self):
+        metrics.set_uploader_metrics(None)
+
+    def test_results_counted(self):
+        @metrics.record_run_result
+        def _upload(exit_code):
+            if exit_code is None:
+                raise ValueError("upload failed")
+            return exit_code
+
+        self.assertEqual(_upload(0), 0)
+        self.assertEqual(_upload(1), 1)
+        with self.assertRaises(ValueError):
+            _upload(None)
+
+        text = self.uploader_metrics.render()
+        self.assertIn('irida_uploader_runs_total{result="complete"} 1', text)
+        self.assertIn('irida_uploader_runs_total{result="error"} 2', text)
+
+
+class TestMetricsServer(unittest.TestCase):
+    """
+    Tests the core.metrics.MetricsServer class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.metrics_server = metrics.MetricsServer(0, uploader_metrics=metrics.UploaderMetrics())
+        self.metrics_server.start()
+
+    def tearDown(self):
+        self.metrics_server.stop()
+
+    @patch("core.metrics.api_handler.get_http_stats_since")
+    def test_metrics_served(self, mock_get_http_stats):
+        mock_get_http_stats.return_value = {}
+        url = "http://127.0.0.1:{}/metrics".format(self.metrics_server.port)
+
+        with urllib.request.urlopen(url, timeout=5) as response:
+            self.assertEqual(response.headers["Content-Type"], metrics.CONTENT_TYPE)
+            text = response.read().decode()
+
+        self.assertIn("irida_uploader_upload_throughput_bytes_per_second", text)
+
+    def test_other_paths_not_found(self):
+        url = "http://127.0.0.1:{}/other".format(self.metrics_server.port)
+
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(url, timeout=5)
+        self.assertEqual(context.exception.code, 404)
+        context.exception.close()
+
+    @patch("core.metrics.config.read_config_option")
+    def test_off_by_default(self, mock_read_config):
+        mock_read_config.return_value = 0
+        self.assertIsNone(metrics.start_metrics_server_from_config())
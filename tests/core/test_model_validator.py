@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+
+from core import model_validator
+from model import Project, Sample, SequenceFile, SequencingRun
+
+
+def _make_run(sample_name="sample1", sample_number=1, file_list=None, project_id="1", layout_type="PAIRED_END"):
+    if file_list is None:
+        file_list = ["sample1_R1.fastq.gz", "sample1_R2.fastq.gz"]
+    sample = Sample(sample_name, "description", sample_number)
+    sample.sequence_file = SequenceFile(file_list)
+    project = Project(sample_list=[sample], id=project_id)
+    return SequencingRun({"layoutType": layout_type}, [project])
+
+
+class TestValidateSequencingRun(unittest.TestCase):
+    """
+    Tests the core.model_validator.validate_sequencing_run function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def _assert_same_result(self, sequencing_run):
+        """
+        Validates with and without the fast path, and checks both give the same errors
+        :return: ValidationResult from the fast path
+        """
+        fast_result = model_validator.validate_sequencing_run(sequencing_run)
+        cerberus_result = model_validator.validate_sequencing_run(sequencing_run, use_fast_path=False)
+        self.assertEqual([str(e) for e in fast_result.error_list], [str(e) for e in cerberus_result.error_list])
+        return fast_result
+
+    @patch("core.model_validator.Validator")
+    def test_valid_run_skips_cerberus(self, mock_validator):
+        result = model_validator.validate_sequencing_run(_make_run())
+
+        self.assertTrue(result.is_valid())
+        mock_validator.assert_not_called()
+
+    def test_valid_run(self):
+        self.assertTrue(self._assert_same_result(_make_run()).is_valid())
+
+    def test_valid_single_end(self):
+        run = _make_run(file_list=["sample1.fastq.gz"], layout_type="SINGLE_END", sample_number="S1")
+        self.assertTrue(self._assert_same_result(run).is_valid())
+
+    def test_short_sample_name(self):
+        self.assertEqual(self._assert_same_result(_make_run(sample_name="s1")).error_count(), 1)
+
+    def test_invalid_layout_type(self):
+        self.assertEqual(self._assert_same_result(_make_run(layout_type="MATE_PAIR")).error_count(), 1)
+
+    def test_empty_file_list(self):
+        self.assertEqual(self._assert_same_result(_make_run(file_list=[])).error_count(), 1)
+
+    def test_invalid_sample_number(self):
+        self.assertEqual(self._assert_same_result(_make_run(sample_number=1.5)).error_count(), 1)
+
+    def test_bool_sample_number(self):
+        # not passed by the fast check, cerberus decides
+        self._assert_same_result(_make_run(sample_number=True))
+
+    def test_missing_sequence_file(self):
+        run = _make_run()
+        run.project_list[0].sample_list[0].sequence_file = None
+        self.assertEqual(self._assert_same_result(run).error_count(), 1)
+
+    def test_invalid_file_names(self):
+        run = _make_run(file_list=["sample1_A.fastq.gz", "sample1_B.fastq.gz"])
+        self.assertEqual(self._assert_same_result(run).error_count(), 1)
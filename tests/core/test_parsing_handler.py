@@ -94,3 +94,80 @@ class TestParseAndValidate(unittest.TestCase):
         # make sure the invalid sequencing run raises a ValidationError
         with self.assertRaises(parsers.exceptions.ValidationError):
             parsing_handler.parse_and_validate("mock_directory")
+
+    @patch("core.parsing_handler.run_cache.get_run_cache")
+    @patch("core.parsing_handler.config.read_config_option")
+    @patch("core.parsing_handler.model_validator.validate_sequencing_run")
+    @patch("core.parsing_handler.get_parser_from_config")
+    def test_run_cache_off_by_default(self, mock_get_parser, mock_validate, mock_read_config_option,
+                                      mock_get_run_cache):
+        """
+        The run cache is only used when the run_cache config option is set
+        :return:
+        """
+        mock_parser_instance = unittest.mock.MagicMock()
+        mock_parser_instance.get_sample_sheet.side_effect = ["mock_sample_sheet"]
+        mock_parser_instance.get_sequencing_run.side_effect = ["mock_sequencing_run"]
+        mock_get_parser.side_effect = [mock_parser_instance]
+        mock_read_config_option.side_effect = lambda key, expected_type=None, default_value=None: default_value
+        mock_validate.return_value.is_valid.side_effect = [True]
+
+        res = parsing_handler.parse_and_validate("mock_directory")
+
+        self.assertEqual(res, "mock_sequencing_run")
+        mock_get_run_cache.assert_not_called()
+
+    @patch("core.parsing_handler.run_cache.get_run_cache")
+    @patch("core.parsing_handler.run_cache.get_file_hash")
+    @patch("core.parsing_handler.config.read_config_option")
+    @patch("core.parsing_handler.model_validator.validate_sequencing_run")
+    @patch("core.parsing_handler.get_parser_from_config")
+    def test_cached_run(self, mock_get_parser, mock_validate, mock_read_config_option, mock_get_file_hash,
+                        mock_get_run_cache):
+        """
+        A run that has not changed since it was last parsed is taken from the cache without parsing or
+        validating it again
+        :return:
+        """
+        mock_parser_instance = unittest.mock.MagicMock()
+        mock_parser_instance.get_sample_sheet.side_effect = ["mock_sample_sheet"]
+        mock_get_parser.side_effect = [mock_parser_instance]
+        mock_read_config_option.side_effect = [True]
+        mock_get_file_hash.side_effect = ["mock_hash"]
+        mock_get_run_cache.return_value.load.side_effect = ["cached_sequencing_run"]
+
+        res = parsing_handler.parse_and_validate("mock_directory")
+
+        mock_get_file_hash.assert_called_once_with("mock_sample_sheet")
+        mock_parser_instance.get_sequencing_run.assert_not_called()
+        mock_validate.assert_not_called()
+        mock_get_run_cache.return_value.store.assert_not_called()
+        self.assertEqual(res, "cached_sequencing_run")
+
+    @patch("core.parsing_handler.run_cache.get_run_cache")
+    @patch("core.parsing_handler.run_cache.get_file_hash")
+    @patch("core.parsing_handler.config.read_config_option")
+    @patch("core.parsing_handler.model_validator.validate_sequencing_run")
+    @patch("core.parsing_handler.get_parser_from_config")
+    def test_run_stored_in_cache(self, mock_get_parser, mock_validate, mock_read_config_option, mock_get_file_hash,
+                                 mock_get_run_cache):
+        """
+        A run that is not in the cache is parsed, validated and then stored in the cache
+        :return:
+        """
+        mock_read_config_option.side_effect = [True]
+        mock_parser_instance = unittest.mock.MagicMock()
+        mock_parser_instance.get_sample_sheet.side_effect = ["mock_sample_sheet"]
+        mock_parser_instance.get_sequencing_run.side_effect = ["mock_sequencing_run"]
+        mock_get_parser.side_effect = [mock_parser_instance]
+        mock_get_file_hash.side_effect = ["mock_hash"]
+        mock_run_cache = mock_get_run_cache.return_value
+        mock_run_cache.load.side_effect = [None]
+        mock_validate.return_value.is_valid.side_effect = [True]
+
+        res = parsing_handler.parse_and_validate("mock_directory")
+
+        self.assertEqual(res, "mock_sequencing_run")
+        mock_run_cache.store.assert_called_once_with(
+            "mock_directory", "mock_sample_sheet", "mock_hash", type(mock_parser_instance).__module__,
+            "mock_sequencing_run")
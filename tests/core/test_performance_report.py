@@ -0,0 +1,152 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+import progress
+from api.http_metrics import OperationStats
+from core import performance_report
+from core.timing import PhaseTimer
+from messaging.run_progress import RunProgress
+from model import DirectoryStatus, Project, Sample, SequenceFile, SequencingRun
+
+
+def _report(site, parser, total_bytes, upload_seconds, peak=None):
+    return {"site": site, "parser": parser, "sample_count": 2, "total_bytes": total_bytes,
+            "total_seconds": upload_seconds + 10, "upload_seconds": upload_seconds,
+            "peak_bytes_per_second": peak, "requests": {"count": 5, "retry_count": 1}}
+
+
+class TestBuildReport(unittest.TestCase):
+    """
+    Tests the core.performance_report.build_report function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.run_dir = tempfile.mkdtemp()
+        sample_list = []
+        for sample_name in ["sample1", "sample2"]:
+            file_list = []
+            for read in ["R1", "R2"]:
+                file_list.append(os.path.join(self.run_dir, "{}_{}.fastq.gz".format(sample_name, read)))
+                with open(file_list[-1], "wb") as f:
+                    f.write(b"x" * 250)
+            sample = Sample(sample_name)
+            sample.sequence_file = SequenceFile(file_list)
+            sample_list.append(sample)
+        self.sequencing_run = SequencingRun({}, [Project(sample_list=sample_list, id=1)])
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    @patch("core.performance_report.config.read_config_option")
+    def test_report(self, mock_read_config):
+        mock_read_config.side_effect = ["miseq", "http://irida/api/", 4, 8, True, False]
+        timer = PhaseTimer()
+        timer.lap("parsing and offline validation")
+        timer.add_background("connecting to IRIDA", 2.0)
+        stats = OperationStats()
+        stats.observe(1.5, bytes_sent=1000, retry_count=2)
+        stats.observe(0.5, bytes_sent=0, error=True)
+        run_progress = RunProgress(55, start_time=0)
+        run_progress._peak_rate = 123.4
+
+        report = performance_report.build_report(self.run_dir, self.sequencing_run, 55, timer, 10.0,
+                                                 {"send_sequence_files": stats}, run_progress)
+
+        self.assertEqual(report["run_id"], 55)
+        self.assertEqual(report["parser"], "miseq")
+        self.assertEqual(report["sample_count"], 2)
+        self.assertEqual(report["file_count"], 4)
+        self.assertEqual(report["total_bytes"], 1000)
+        self.assertEqual(report["average_bytes_per_second"], 100)
+        self.assertEqual(report["peak_bytes_per_second"], 123)
+        self.assertEqual([phase["name"] for phase in report["phases"]], ["parsing and offline validation"])
+        self.assertEqual(report["background"], [{"name": "connecting to IRIDA", "seconds": 2.0}])
+        self.assertEqual(report["requests"]["count"], 2)
+        self.assertEqual(report["requests"]["error_count"], 1)
+        self.assertEqual(report["requests"]["retry_count"], 2)
+        self.assertEqual(report["requests"]["operations"]["send_sequence_files"]["bytes_sent"], 1000)
+        self.assertEqual(report["concurrency"], {"upload_threads": 4, "max_connections": 8,
+                                                 "pipelined_upload": True, "compress_uploads": False})
+        # the report can be written as JSON
+        json.dumps(report)
+
+    def test_report_in_status_file(self):
+        report = {"run_id": 55, "total_bytes": 1000}
+        status_file = os.path.join(self.run_dir, progress.upload_status.STATUS_FILE_NAME)
+        with open(status_file, "w") as f:
+            json.dump({progress.upload_status.STATUS_FIELD: DirectoryStatus.PARTIAL}, f)
+        directory_status = DirectoryStatus(self.run_dir)
+        directory_status.status = DirectoryStatus.COMPLETE
+
+        progress.write_directory_status(directory_status, performance_report=report)
+
+        with open(status_file) as f:
+            status_dict = json.load(f)
+        self.assertEqual(status_dict[progress.upload_status.PERFORMANCE_REPORT_FIELD], report)
+
+
+class TestAggregateReports(unittest.TestCase):
+    """
+    Tests finding and combining performance reports
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_find(self):
+        for run_name, report in [("run1", _report("lab-a", "miseq", 100, 10)),
+                                 ("run2", _report("lab-a", "nextseq", 300, 10))]:
+            os.mkdir(os.path.join(self.directory, run_name))
+            self.assertTrue(performance_report.write_report(os.path.join(self.directory, run_name), report))
+        # a run without a report, and a report that cannot be read
+        os.mkdir(os.path.join(self.directory, "run3"))
+        os.mkdir(os.path.join(self.directory, "run4"))
+        with open(os.path.join(self.directory, "run4", performance_report.REPORT_FILE_NAME), "w") as f:
+            f.write("not json")
+        progress.directory_index.get_directory_index().invalidate(self.directory)
+
+        report_list = performance_report.find_reports(self.directory)
+
+        self.assertEqual([report["parser"] for report in report_list], ["miseq", "nextseq"])
+
+    def test_aggregate(self):
+        report_list = [_report("lab-a", "nextseq", 1000, 10, peak=150),
+                       _report("lab-a", "nextseq", 3000, 10, peak=400),
+                       _report("lab-a", "nextseq", 2000, 20),
+                       _report("lab-b", "nextseq", 500, 5)]
+
+        summary_list = performance_report.aggregate_reports(report_list)
+
+        self.assertEqual([(summary["site"], summary["parser"]) for summary in summary_list],
+                         [("lab-a", "nextseq"), ("lab-b", "nextseq")])
+        lab_a = summary_list[0]
+        self.assertEqual(lab_a["run_count"], 3)
+        self.assertEqual(lab_a["sample_count"], 6)
+        self.assertEqual(lab_a["median_bytes_per_run"], 2000)
+        self.assertEqual(lab_a["median_upload_seconds"], 10)
+        self.assertEqual(lab_a["average_bytes_per_second"], 150)
+        self.assertEqual(lab_a["peak_bytes_per_second"], 400)
+        self.assertEqual(lab_a["retry_count"], 3)
+        self.assertIsNone(summary_list[1]["peak_bytes_per_second"])
+
+    def test_print_summary(self):
+        output = io.StringIO()
+        summary_list = performance_report.aggregate_reports([_report("lab-a", "miseq", 100, 10)])
+        with redirect_stdout(output):
+            performance_report.print_summary(summary_list)
+
+        line_list = output.getvalue().splitlines()
+        self.assertEqual(len(line_list), 2)
+        self.assertTrue(line_list[1].startswith("lab-a"))
@@ -0,0 +1,155 @@
+import unittest
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+
+from unittest.mock import patch
+
+from core import profiling
+from model import Project, Sample, SequenceFile, SequencingRun
+
+
+class TestStackSampler(unittest.TestCase):
+    """
+    Tests the core.profiling.StackSampler class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_sample_has_thread_and_functions(self):
+        sampler = profiling.StackSampler()
+        waiting = threading.Event()
+        done = threading.Event()
+
+        def _wait_for_upload():
+            waiting.set()
+            done.wait()
+        thread = threading.Thread(target=_wait_for_upload, name="upload-samples-0")
+        thread.start()
+        waiting.wait()
+        try:
+            sampler.take_sample()
+        finally:
+            done.set()
+            thread.join()
+
+        line_list = sampler.get_collapsed_stacks()
+        upload_line = next(line for line in line_list if line.startswith("upload-samples-0;"))
+        stack, count = upload_line.rsplit(" ", 1)
+        self.assertEqual(count, "1")
+        self.assertIn("_wait_for_upload (test_profiling.py:", stack)
+        self.assertEqual(sampler.sample_count, 1)
+
+    def test_same_stack_counted(self):
+        sampler = profiling.StackSampler()
+        with patch("sys._current_frames", return_value={}):
+            sampler.take_sample()
+        sampler._stack_counter.update(["MainThread;main (upload_run.py:1)"] * 3)
+
+        self.assertEqual(sampler.get_collapsed_stacks(), ["MainThread;main (upload_run.py:1) 3"])
+
+    def test_start_stop(self):
+        sampler = profiling.StackSampler(interval=0.001)
+        sampler.start()
+        while sampler.sample_count < 2:
+            threading.Event().wait(0.001)
+        sampler.stop()
+
+        self.assertTrue(any(line.startswith("MainThread;") for line in sampler.get_collapsed_stacks()))
+
+
+class TestUploadProfiler(unittest.TestCase):
+    """
+    Tests the core.profiling.UploadProfiler class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.run_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+        shutil.rmtree(self.output_dir)
+
+    def _profile(self, profiler):
+        profiler.start()
+        sorted(range(1000))
+        profiler.stop()
+
+    def test_written_to_run_directory(self):
+        profiler = profiling.UploadProfiler(self.output_dir)
+        self._profile(profiler)
+        profiler.record_run(self.run_dir, "miseq", 24, 3 * 1024 * 1024 * 1024)
+
+        file_list = profiler.write()
+
+        self.assertEqual(len(file_list), 2)
+        for file_path in file_list:
+            self.assertEqual(os.path.dirname(file_path), self.run_dir)
+            self.assertIn("-miseq-24samples-3.0GiB.", os.path.basename(file_path))
+        stats_path, collapsed_path = file_list
+        self.assertTrue(stats_path.endswith(".pstats"))
+        self.assertTrue(collapsed_path.endswith(".collapsed"))
+        self.assertGreater(pstats.Stats(stats_path).total_calls, 0)
+
+    def test_many_runs_written_to_output_directory(self):
+        profiler = profiling.UploadProfiler(self.output_dir)
+        self._profile(profiler)
+        profiler.record_run(self.run_dir, "miseq", 24, 1024)
+        profiler.record_run(self.run_dir, "nextseq", 8, 1024)
+
+        file_list = profiler.write()
+
+        self.assertEqual(os.path.dirname(file_list[0]), self.output_dir)
+        self.assertIn("-miseq+nextseq-2runs-32samples-2.0KiB.", os.path.basename(file_list[0]))
+
+    def test_unwritable_run_directory(self):
+        profiler = profiling.UploadProfiler(self.output_dir)
+        self._profile(profiler)
+        profiler.record_run(os.path.join(self.run_dir, "missing"), "miseq", 1, 10)
+
+        with self.assertLogs(level="WARNING") as log:
+            file_list = profiler.write()
+
+        self.assertEqual(os.path.dirname(file_list[0]), self.output_dir)
+        self.assertIn(file_list[0], log.output[0])
+
+    def test_written_to_log_directory(self):
+        profiler = profiling.UploadProfiler()
+        self._profile(profiler)
+        profiler.record_run(os.path.join(self.run_dir, "missing"), "miseq", 1, 10)
+
+        with patch("core.profiling.global_settings.log_file", self.output_dir):
+            with self.assertLogs(level="WARNING") as log:
+                file_list = profiler.write()
+
+        self.assertEqual(os.path.dirname(file_list[0]), self.output_dir)
+        self.assertIn(file_list[0], log.output[0])
+
+    @patch("core.profiling.config.read_config_option")
+    def test_record_run(self, mock_read_config):
+        mock_read_config.return_value = "miseq"
+        file_path = os.path.join(self.run_dir, "sample1_R1.fastq.gz")
+        with open(file_path, "wb") as f:
+            f.write(b"x" * 100)
+        sample = Sample("sample1")
+        sample.sequence_file = SequenceFile([file_path])
+        sequencing_run = SequencingRun({}, [Project(sample_list=[sample], id=1)])
+
+        profiler = profiling.start_profiling(self.output_dir)
+        try:
+            profiling.record_run(self.run_dir, sequencing_run)
+        finally:
+            file_list = profiling.stop_profiling()
+
+        self.assertIsNone(profiling.get_profiler())
+        self.assertIn("-miseq-1samples-100.0B.", os.path.basename(file_list[0]))
+        self.assertEqual(profiler.get_output_directory(), self.run_dir)
+
+    def test_off(self):
+        profiling.record_run(self.run_dir, None)
+        self.assertEqual(profiling.stop_profiling(), [])
@@ -0,0 +1,165 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from unittest.mock import patch
+
+import progress
+from core import run_cache
+from model import Project, Sample, SequenceFile, SequencingRun
+
+
+class TestRunCache(unittest.TestCase):
+    """
+    Tests the core.run_cache.RunCache class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+        self.run_dir = os.path.join(self.temp_dir, "run")
+        os.makedirs(self.run_dir)
+        self.run_cache = run_cache.RunCache(os.path.join(self.temp_dir, "cache"))
+        # files are changed straight after they are read, so the directory listings are never trusted
+        progress.directory_index.set_directory_index(progress.directory_index.DirectoryIndex(revalidate_interval=0))
+
+        self.file_list = []
+        for file_name in ["sample1_R1.fastq.gz", "sample1_R2.fastq.gz"]:
+            self.file_list.append(os.path.join(self.run_dir, file_name))
+            with open(self.file_list[-1], "w") as f:
+                f.write("data")
+        self.sample_sheet = os.path.join(self.run_dir, "SampleSheet.csv")
+        with open(self.sample_sheet, "w") as f:
+            f.write("Sample_ID,Sample_Name\n")
+        self.sheet_hash = run_cache.get_file_hash(self.sample_sheet)
+
+    def tearDown(self):
+        progress.directory_index.set_directory_index(None)
+        shutil.rmtree(self.temp_dir)
+
+    def _make_run(self):
+        sample = Sample("sample1", "a description", 1, {"sampleProject": "5"})
+        sample.sequence_file = SequenceFile(list(self.file_list), {"run_number": "7"})
+        project = Project(id="5", sample_list=[sample])
+        return SequencingRun({"layoutType": "PAIRED_END"}, [project])
+
+    def test_round_trip(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+
+        sequencing_run = self.run_cache.load(self.run_dir, self.sheet_hash, "parser")
+
+        self.assertEqual(sequencing_run.metadata, {"layoutType": "PAIRED_END"})
+        self.assertEqual(len(sequencing_run.project_list), 1)
+        project = sequencing_run.project_list[0]
+        self.assertEqual(project.id, "5")
+        sample = project.sample_list[0]
+        self.assertEqual(sample.sample_name, "sample1")
+        self.assertEqual(sample.description, "a description")
+        self.assertEqual(sample.sample_number, 1)
+        self.assertEqual(sample.get("sampleProject"), "5")
+        self.assertEqual(sample.sequence_file.file_list, self.file_list)
+        self.assertEqual(sample.sequence_file.properties_dict, {"run_number": "7"})
+
+    def test_not_cached(self):
+        self.assertIsNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+    def test_sample_sheet_changed(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+
+        self.assertIsNone(self.run_cache.load(self.run_dir, "other hash", "parser"))
+
+    def test_parser_changed(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+
+        self.assertIsNone(self.run_cache.load(self.run_dir, self.sheet_hash, "other parser"))
+
+    def test_file_added(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        with open(os.path.join(self.run_dir, "sample2_R1.fastq.gz"), "w") as f:
+            f.write("data")
+
+        self.assertIsNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+    def test_file_changed(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        with open(self.file_list[0], "w") as f:
+            f.write("more data")
+
+        self.assertIsNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+    def test_uploader_files_ignored(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        # the uploader writes these files to the run directory during the upload
+        for file_name in run_cache.IGNORED_FILE_NAMES:
+            with open(os.path.join(self.run_dir, file_name), "w") as f:
+                f.write("written by the uploader")
+
+        self.assertIsNotNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+    def test_uploader_version_changed(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+
+        # a run validated by another version of the uploader may not pass this version's validation
+        with patch("core.run_cache.global_settings.UPLOADER_VERSION", "another version"):
+            self.assertIsNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+    def test_upload_plan_round_trip(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        self.run_cache.store_upload_plan(self.run_dir, "http://irida/api/", {("5", "sample1"): 8})
+
+        self.assertEqual(self.run_cache.load_upload_plan(self.run_dir, "http://irida/api/"), {("5", "sample1"): 8})
+        # the run is still cached with its upload plan
+        self.assertIsNotNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+    def test_upload_plan_other_irida(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        self.run_cache.store_upload_plan(self.run_dir, "http://irida/api/", {("5", "sample1"): 8})
+
+        self.assertIsNone(self.run_cache.load_upload_plan(self.run_dir, "http://other-irida/api/"))
+
+    def test_upload_plan_run_changed(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        self.run_cache.store_upload_plan(self.run_dir, "http://irida/api/", {("5", "sample1"): 8})
+        with open(self.sample_sheet, "a") as f:
+            f.write("sample2,sample2\n")
+
+        self.assertIsNone(self.run_cache.load_upload_plan(self.run_dir, "http://irida/api/"))
+
+    def test_upload_plan_replaced_when_run_stored(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        self.run_cache.store_upload_plan(self.run_dir, "http://irida/api/", {("5", "sample1"): 8})
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+
+        self.assertIsNone(self.run_cache.load_upload_plan(self.run_dir, "http://irida/api/"))
+
+    def test_upload_plan_not_cached(self):
+        self.run_cache.store_upload_plan(self.run_dir, "http://irida/api/", {("5", "sample1"): 8})
+
+        self.assertIsNone(self.run_cache.load_upload_plan(self.run_dir, "http://irida/api/"))
+
+    def test_remove(self):
+        self.run_cache.store(self.run_dir, self.sample_sheet, self.sheet_hash, "parser", self._make_run())
+        self.run_cache.remove(self.run_dir)
+
+        self.assertIsNone(self.run_cache.load(self.run_dir, self.sheet_hash, "parser"))
+
+
+class TestGetFileHash(unittest.TestCase):
+    """
+    Tests the core.run_cache.get_file_hash function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_missing_file(self):
+        self.assertIsNone(run_cache.get_file_hash("/not/a/real/file"))
+
+    def test_same_contents(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for file_name in ["a", "b"]:
+                with open(os.path.join(temp_dir, file_name), "w") as f:
+                    f.write("Sample_ID,Sample_Name\n")
+            self.assertEqual(run_cache.get_file_hash(os.path.join(temp_dir, "a")),
+                             run_cache.get_file_hash(os.path.join(temp_dir, "b")))
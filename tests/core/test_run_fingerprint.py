@@ -0,0 +1,140 @@
+import unittest
+from unittest.mock import MagicMock
+from os import path
+import os
+import tempfile
+
+from core import run_fingerprint
+from parsers.miseq.parser import Parser
+
+path_to_module = path.abspath(path.dirname(__file__))
+if len(path_to_module) == 0:
+    path_to_module = '.'
+
+
+class TestComputeFingerprint(unittest.TestCase):
+    """
+    Tests the core.run_fingerprint.compute_fingerprint function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_same_run_same_fingerprint(self):
+        """
+        Parsing the same run twice gives the same fingerprint
+        :return:
+        """
+        sheet_file = path.join(path_to_module, "fake_ngs_data", "SampleSheet.csv")
+        run_a = Parser.get_sequencing_run(sheet_file)
+        run_b = Parser.get_sequencing_run(sheet_file)
+
+        self.assertEqual(run_fingerprint.compute_fingerprint(run_a), run_fingerprint.compute_fingerprint(run_b))
+
+    def test_different_sample_different_fingerprint(self):
+        """
+        Changing a sample name changes the fingerprint
+        :return:
+        """
+        sheet_file = path.join(path_to_module, "fake_ngs_data", "SampleSheet.csv")
+        run_a = Parser.get_sequencing_run(sheet_file)
+        run_b = Parser.get_sequencing_run(sheet_file)
+        run_b.project_list[0].sample_list[0]._sample_name = "renamed"
+
+        self.assertNotEqual(run_fingerprint.compute_fingerprint(run_a), run_fingerprint.compute_fingerprint(run_b))
+
+
+class TestRunFingerprintIndex(unittest.TestCase):
+    """
+    Tests the core.run_fingerprint.RunFingerprintIndex class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.index_dir = tempfile.mkdtemp()
+        self.index_file = path.join(self.index_dir, "index.json")
+
+    def tearDown(self):
+        if path.exists(self.index_file):
+            os.remove(self.index_file)
+        os.rmdir(self.index_dir)
+
+    def test_lookup_only_uploaded_runs(self):
+        """
+        Only COMPLETE and UPLOADING runs are duplicates
+        :return:
+        """
+        index = run_fingerprint.RunFingerprintIndex("http://irida/api/", index_file=self.index_file)
+        index.record("aaa", 1, "COMPLETE")
+        index.record("bbb", 2, "UPLOADING")
+        index.record("ccc", 3, "ERROR")
+
+        self.assertEqual(index.lookup("aaa"), "1")
+        self.assertEqual(index.lookup("bbb"), "2")
+        self.assertIsNone(index.lookup("ccc"))
+        self.assertIsNone(index.lookup("ddd"))
+
+    def test_save_and_load(self):
+        """
+        Saved index is loaded per IRIDA instance
+        :return:
+        """
+        index = run_fingerprint.RunFingerprintIndex("http://irida/api/", index_file=self.index_file)
+        index.record("aaa", 1, "COMPLETE")
+        index.save()
+
+        same_instance = run_fingerprint.RunFingerprintIndex("http://irida/api/", index_file=self.index_file)
+        other_instance = run_fingerprint.RunFingerprintIndex("http://other/api/", index_file=self.index_file)
+
+        self.assertEqual(same_instance.lookup("aaa"), "1")
+        self.assertIsNone(other_instance.lookup("aaa"))
+
+    def test_refresh(self):
+        """
+        Refreshing replaces the index with the runs on the server
+        :return:
+        """
+        stub_api_instance = MagicMock()
+        stub_api_instance.get_seq_run_fingerprints.side_effect = [
+            {"bbb": {"identifier": "2", "uploadStatus": "COMPLETE"}}]
+
+        index = run_fingerprint.RunFingerprintIndex("http://irida/api/", index_file=self.index_file)
+        index.record("aaa", 1, "COMPLETE")
+        index.refresh(stub_api_instance)
+
+        self.assertIsNone(index.lookup("aaa"))
+        self.assertEqual(index.lookup("bbb"), "2")
+
+    def test_abandoned_upload_expires(self):
+        """
+        A run that has been UPLOADING for too long is not a duplicate
+        :return:
+        """
+        index = run_fingerprint.RunFingerprintIndex("http://irida/api/", index_file=self.index_file)
+        index.record("aaa", 1, "UPLOADING", now=1000)
+        index.record("bbb", 2, "COMPLETE", now=1000)
+
+        self.assertEqual(index.lookup("aaa", now=1000 + run_fingerprint.UPLOADING_EXPIRY), "1")
+        self.assertIsNone(index.lookup("aaa", now=1001 + run_fingerprint.UPLOADING_EXPIRY))
+        self.assertEqual(index.lookup("bbb", now=1001 + run_fingerprint.UPLOADING_EXPIRY), "2")
+
+    def test_refresh_keeps_interrupted_uploads(self):
+        """
+        A run recorded as ERROR stays ERROR while IRIDA still has it UPLOADING, and the time a status was first
+        seen is kept when the index is refreshed
+        :return:
+        """
+        stub_api_instance = MagicMock()
+        stub_api_instance.get_seq_run_fingerprints.return_value = {
+            "aaa": {"identifier": "1", "uploadStatus": "UPLOADING"},
+            "bbb": {"identifier": "2", "uploadStatus": "UPLOADING"},
+            "ccc": {"identifier": "3", "uploadStatus": "UPLOADING", "createdTime": 500}}
+
+        index = run_fingerprint.RunFingerprintIndex("http://irida/api/", index_file=self.index_file)
+        index.record("aaa", 1, "ERROR")
+        index.record("bbb", 2, "UPLOADING", now=1000)
+        index.refresh(stub_api_instance, now=2000)
+
+        self.assertIsNone(index.lookup("aaa"))
+        self.assertIsNone(index.lookup("bbb", now=1001 + run_fingerprint.UPLOADING_EXPIRY))
+        self.assertIsNone(index.lookup("ccc", now=501 + run_fingerprint.UPLOADING_EXPIRY))
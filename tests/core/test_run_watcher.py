@@ -0,0 +1,157 @@
+import unittest
+from os import path
+import os
+import queue
+import shutil
+import tempfile
+
+from core import run_watcher
+from parsers.directory.parser import Parser
+from progress import directory_index, run_index
+
+path_to_module = path.abspath(path.dirname(__file__))
+if len(path_to_module) == 0:
+    path_to_module = '.'
+
+
+class TestRunWatcher(unittest.TestCase):
+    """
+    Tests that the run watcher only queues runs once they are complete and their files have stopped changing
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+        self.watch_dir = path.join(self.temp_dir, "runs")
+        os.mkdir(self.watch_dir)
+        run_index.set_run_index(run_index.RunIndex(path.join(self.temp_dir, "index.sqlite")))
+        # files are changed straight after they are read, so the directory listings are never trusted
+        directory_index.set_directory_index(directory_index.DirectoryIndex(revalidate_interval=0))
+        self.upload_queue = queue.Queue()
+        self.watcher = run_watcher.RunWatcher([self.watch_dir], Parser, self.upload_queue,
+                                              settle_time=0, use_inotify=False)
+
+    def tearDown(self):
+        run_index.set_run_index(None)
+        directory_index.set_directory_index(None)
+        shutil.rmtree(self.temp_dir)
+
+    def _make_run(self, name, with_sample_list=True):
+        run_dir = path.join(self.watch_dir, name)
+        os.mkdir(run_dir)
+        with open(path.join(run_dir, "reads_1.fastq.gz"), "w") as writer:
+            writer.write("reads")
+        if with_sample_list:
+            open(path.join(run_dir, Parser.SAMPLE_SHEET_FILE_NAME), "w").close()
+        return run_dir
+
+    def test_run_queued_when_settled(self):
+        run_dir = self._make_run("run1")
+
+        # first sighting only records the files
+        self.assertEqual(self.watcher.scan(), [])
+        self.assertEqual(self.watcher.scan(), [run_dir])
+        self.assertEqual(self.upload_queue.get_nowait(), run_dir)
+        # a queued run is not queued again
+        self.assertEqual(self.watcher.scan(), [])
+
+    def test_changing_run_not_queued(self):
+        run_dir = self._make_run("run1")
+
+        self.watcher.scan()
+        with open(path.join(run_dir, "reads_2.fastq.gz"), "w") as writer:
+            writer.write("more reads")
+
+        self.assertEqual(self.watcher.scan(), [])
+        self.assertEqual(self.watcher.scan(), [run_dir])
+
+    def test_incomplete_run_not_queued(self):
+        self._make_run("run1", with_sample_list=False)
+
+        self.watcher.scan()
+
+        self.assertEqual(self.watcher.scan(), [])
+        self.assertTrue(self.upload_queue.empty())
+
+    def test_finished_run_not_queued_again(self):
+        run_dir = self._make_run("run1")
+        self.watcher.scan()
+        self.watcher.scan()
+        self.upload_queue.get_nowait()
+
+        # status could not be written to the run directory, so it is still new
+        self.watcher.upload_finished(run_dir)
+        self.assertEqual(self.watcher.scan(), [])
+        self.assertEqual(self.watcher.scan(), [])
+
+        # the run changed after it was uploaded
+        os.remove(path.join(run_dir, "reads_1.fastq.gz"))
+        self.watcher.scan()
+        self.assertEqual(self.watcher.scan(), [run_dir])
+
+    def test_settle_time(self):
+        watcher = run_watcher.RunWatcher([self.watch_dir], Parser, self.upload_queue,
+                                         settle_time=3600, use_inotify=False)
+        self._make_run("run1")
+
+        watcher.scan()
+
+        self.assertEqual(watcher.scan(), [])
+
+
+class TestGetDirectorySnapshot(unittest.TestCase):
+    """
+    Tests core.run_watcher.get_directory_snapshot
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+        directory_index.set_directory_index(directory_index.DirectoryIndex(revalidate_interval=0))
+
+    def tearDown(self):
+        directory_index.set_directory_index(None)
+        shutil.rmtree(self.temp_dir)
+
+    def test_counts_nested_files(self):
+        os.makedirs(path.join(self.temp_dir, "Data", "BaseCalls"))
+        with open(path.join(self.temp_dir, "a.txt"), "w") as writer:
+            writer.write("12345")
+        with open(path.join(self.temp_dir, "Data", "BaseCalls", "b.txt"), "w") as writer:
+            writer.write("123")
+
+        file_count, total_size, newest_mtime = run_watcher.get_directory_snapshot(self.temp_dir)
+
+        self.assertEqual(file_count, 2)
+        self.assertEqual(total_size, 8)
+        self.assertGreater(newest_mtime, 0)
+
+    def test_symlinked_directory_not_followed(self):
+        os.makedirs(path.join(self.temp_dir, "run", "Data"))
+        with open(path.join(self.temp_dir, "run", "Data", "b.txt"), "w") as writer:
+            writer.write("123")
+        os.symlink(path.join(self.temp_dir, "run"), path.join(self.temp_dir, "run", "Data", "loop"))
+
+        file_count, total_size, newest_mtime = run_watcher.get_directory_snapshot(path.join(self.temp_dir, "run"))
+
+        self.assertEqual(file_count, 1)
+        self.assertEqual(total_size, 3)
+
+    def test_parsed_run_only_data_directories(self):
+        os.makedirs(path.join(self.temp_dir, "Thumbnail_Images"))
+        with open(path.join(self.temp_dir, Parser.SAMPLE_SHEET_FILE_NAME), "w") as writer:
+            writer.write("[Data]\nSample_Name,Project_ID,File_Forward,File_Reverse\n"
+                         "sample-1,75,reads_1.fastq.gz,reads_2.fastq.gz\n")
+        for file_name in ["reads_1.fastq.gz", "reads_2.fastq.gz"]:
+            with open(path.join(self.temp_dir, file_name), "w") as writer:
+                writer.write("reads")
+        snapshot = run_watcher.get_directory_snapshot(self.temp_dir, Parser)
+
+        # files in other directories of the run are not looked at
+        with open(path.join(self.temp_dir, "Thumbnail_Images", "image.jpg"), "w") as writer:
+            writer.write("image")
+        self.assertEqual(run_watcher.get_directory_snapshot(self.temp_dir, Parser), snapshot)
+
+        with open(path.join(self.temp_dir, "reads_1.fastq.gz"), "a") as writer:
+            writer.write("more reads")
+        self.assertNotEqual(run_watcher.get_directory_snapshot(self.temp_dir, Parser), snapshot)
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+
+from core import timing
+
+
+class TestPhaseTimer(unittest.TestCase):
+    """
+    Tests the core.timing.PhaseTimer class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    @patch("core.timing.time.perf_counter")
+    def test_lap(self, mock_perf_counter):
+        mock_perf_counter.side_effect = [10.0, 12.0, 15.0]
+
+        timer = timing.PhaseTimer()
+        self.assertEqual(timer.lap("parsing"), 2.0)
+        self.assertEqual(timer.lap("upload"), 3.0)
+
+        self.assertEqual(timer.phase_list, [("parsing", 2.0, False), ("upload", 3.0, False)])
+        self.assertEqual(timer.total(), 5.0)
+
+    @patch("core.timing.time.perf_counter")
+    def test_saved(self, mock_perf_counter):
+        mock_perf_counter.side_effect = [10.0, 13.0, 13.5]
+
+        timer = timing.PhaseTimer()
+        timer.add_background("connecting", 2.0)
+        timer.lap("parsing")
+        timer.lap("waiting", waits_for_background=True)
+
+        # 2 seconds of connecting, of which only half a second was waited for
+        self.assertEqual(timer.saved(), 1.5)
+
+    @patch("core.timing.time.perf_counter")
+    def test_saved_background_slower(self, mock_perf_counter):
+        mock_perf_counter.side_effect = [10.0, 10.5, 13.0]
+
+        timer = timing.PhaseTimer()
+        timer.add_background("connecting", 3.0)
+        timer.lap("parsing")
+        timer.lap("waiting", waits_for_background=True)
+
+        self.assertEqual(timer.saved(), 0.5)
+
+    def test_log_summary(self):
+        timer = timing.PhaseTimer()
+        timer.lap("parsing")
+        timer.add_background("connecting", 1.0)
+
+        with self.assertLogs(level="INFO") as log:
+            timer.log_summary()
+
+        self.assertEqual(len(log.output), 5)
+        self.assertIn("connecting (background)", log.output[2])
@@ -0,0 +1,131 @@
+import unittest
+from os import path
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from core import upload_planner
+from parsers.exceptions import DirectoryError
+from model import Project, Sample, SequenceFile, SequencingRun
+
+
+class TestPlanSampleUploads(unittest.TestCase):
+    """
+    Tests the core.upload_planner.plan_sample_uploads function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _make_sample(self, sample_name, size_list):
+        file_list = []
+        for i, size in enumerate(size_list):
+            file_name = path.join(self.temp_dir, "{}_R{}.fastq.gz".format(sample_name, i + 1))
+            with open(file_name, "wb") as writer:
+                writer.write(b"0" * size)
+            file_list.append(file_name)
+        sample = Sample(sample_name)
+        sample.sequence_file = SequenceFile(file_list)
+        return sample
+
+    def _make_run(self):
+        project_1 = Project(id="1", sample_list=[self._make_sample("small", [10, 10]),
+                                                 self._make_sample("medium", [50])])
+        project_2 = Project(id="2", sample_list=[self._make_sample("large", [100, 100]),
+                                                 self._make_sample("medium_2", [50])])
+        return SequencingRun({"layoutType": "PAIRED_END"}, [project_1, project_2])
+
+    def _names(self, plan):
+        return [sample.sample_name for project, sample in plan]
+
+    def test_sheet_order(self):
+        plan = upload_planner.plan_sample_uploads(self._make_run(), upload_planner.SHEET_ORDER)
+
+        self.assertEqual(self._names(plan), ["small", "medium", "large", "medium_2"])
+
+    def test_largest_first_across_projects(self):
+        plan = upload_planner.plan_sample_uploads(self._make_run(), upload_planner.LARGEST_FIRST)
+
+        # samples with the same size keep their sheet order
+        self.assertEqual(self._names(plan), ["large", "medium", "medium_2", "small"])
+        self.assertEqual(plan[0][0].id, "2")
+
+    def test_smallest_first(self):
+        plan = upload_planner.plan_sample_uploads(self._make_run(), upload_planner.SMALLEST_FIRST)
+
+        self.assertEqual(self._names(plan), ["small", "medium", "medium_2", "large"])
+
+    def test_unknown_order(self):
+        with self.assertRaises(ValueError):
+            upload_planner.plan_sample_uploads(self._make_run(), "random")
+
+
+class TestPlanRunUploads(unittest.TestCase):
+    """
+    Tests the core.upload_planner.plan_run_uploads function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _make_run_directory(self, name, sequence_file_size, other_file_size):
+        directory = path.join(self.temp_dir, name)
+        os.mkdir(directory)
+        for file_name, size in [("sample_R1.fastq.gz", sequence_file_size), ("other.bin", other_file_size)]:
+            with open(path.join(directory, file_name), "wb") as writer:
+                writer.write(b"0" * size)
+        return directory
+
+    @patch("core.upload_planner.parsing_handler.get_parser_from_config")
+    def test_sized_by_sample_sheet_files(self, mock_get_parser):
+        def get_sample_sheet(directory):
+            if directory.endswith("broken"):
+                raise DirectoryError("no sample sheet", directory)
+            return directory
+
+        def get_sequencing_run(sample_sheet):
+            sample = Sample("sample")
+            sample.sequence_file = SequenceFile([path.join(sample_sheet, "sample_R1.fastq.gz")])
+            return SequencingRun({"layoutType": "SINGLE_END"}, [Project(id="1", sample_list=[sample])])
+
+        mock_get_parser.return_value.get_sample_sheet.side_effect = get_sample_sheet
+        mock_get_parser.return_value.get_sequencing_run.side_effect = get_sequencing_run
+        # files that are not in the sample sheet are not uploaded, so they do not make a run larger
+        small_run = self._make_run_directory("small", 10, 1000)
+        large_run = self._make_run_directory("large", 100, 0)
+        broken_run = path.join(self.temp_dir, "broken")
+
+        plan = upload_planner.plan_run_uploads([small_run, broken_run, large_run], upload_planner.LARGEST_FIRST)
+
+        self.assertEqual(plan, [large_run, small_run, broken_run])
+
+    def test_sheet_order_by_default(self):
+        plan = upload_planner.plan_run_uploads(["/runs/b", "/runs/a"])
+
+        self.assertEqual(plan, ["/runs/b", "/runs/a"])
+
+
+class TestSimulateMakespan(unittest.TestCase):
+    """
+    Tests the core.upload_planner.simulate_makespan function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_single_worker(self):
+        self.assertEqual(upload_planner.simulate_makespan([1, 2, 3], 1), 6)
+
+    def test_large_item_last(self):
+        # the large item starts last and runs alone
+        self.assertEqual(upload_planner.simulate_makespan([1, 1, 1, 1, 4], 2), 6)
+        self.assertEqual(upload_planner.simulate_makespan([4, 1, 1, 1, 1], 2), 4)
@@ -0,0 +1,98 @@
+import unittest
+from os import path
+import shutil
+import tempfile
+
+from core import upload_queue
+
+
+class TestUploadQueue(unittest.TestCase):
+    """
+    Tests the ordering and leasing of runs in the upload queue
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue = upload_queue.UploadQueue(path.join(self.temp_dir, "queue.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_priority_then_fifo(self):
+        self.queue.enqueue("/runs/research", "research")
+        self.queue.enqueue("/runs/routine_1", "routine")
+        self.queue.enqueue("/runs/clinical", "clinical")
+        self.queue.enqueue("/runs/routine_2", "routine")
+        self.queue.enqueue("/runs/outbreak", "outbreak")
+
+        order = []
+        while True:
+            queued_run = self.queue.lease("worker")
+            if queued_run is None:
+                break
+            order.append(queued_run.directory)
+
+        self.assertEqual(order, ["/runs/outbreak", "/runs/clinical", "/runs/routine_1", "/runs/routine_2",
+                                 "/runs/research"])
+
+    def test_enqueue_again_raises_priority(self):
+        self.queue.enqueue("/runs/a", "routine")
+        self.queue.enqueue("/runs/b", "research")
+        self.queue.enqueue("/runs/b", "outbreak")
+        self.queue.enqueue("/runs/a", "research")
+
+        self.assertEqual(len(self.queue), 2)
+        self.assertEqual([j["priority_class"] for j in self.queue.list_jobs()], ["outbreak", "routine"])
+
+    def test_unknown_priority(self):
+        with self.assertRaises(ValueError):
+            self.queue.enqueue("/runs/a", "urgent")
+
+    def test_leased_run_not_given_to_other_worker(self):
+        self.queue.enqueue("/runs/a")
+
+        queued_run = self.queue.lease("worker_1")
+
+        self.assertEqual(queued_run.attempts, 1)
+        self.assertIsNone(self.queue.lease("worker_2"))
+
+    def test_expired_lease_given_to_other_worker(self):
+        self.queue.enqueue("/runs/a")
+        first_run = self.queue.lease("worker_1", lease_time=-1)
+
+        second_run = self.queue.lease("worker_2")
+
+        self.assertEqual(second_run.directory, "/runs/a")
+        self.assertEqual(second_run.attempts, 2)
+        # the first worker no longer holds the lease
+        self.assertFalse(self.queue.renew(first_run))
+        self.assertTrue(self.queue.renew(second_run))
+
+    def test_complete_removes_run(self):
+        self.queue.enqueue("/runs/a")
+        queued_run = self.queue.lease("worker")
+
+        self.queue.complete(queued_run)
+
+        self.assertEqual(len(self.queue), 0)
+
+    def test_release_with_delay(self):
+        self.queue.enqueue("/runs/a")
+        queued_run = self.queue.lease("worker")
+
+        self.queue.release(queued_run, error="offline", retry_delay=3600)
+
+        self.assertIsNone(self.queue.lease("worker"))
+        self.assertEqual(self.queue.list_jobs()[0]["last_error"], "offline")
+
+    def test_release_keeps_place(self):
+        self.queue.enqueue("/runs/a")
+        self.queue.enqueue("/runs/b")
+        queued_run = self.queue.lease("worker")
+
+        self.queue.release(queued_run)
+
+        queued_run = self.queue.lease("worker")
+        self.assertEqual(queued_run.directory, "/runs/a")
+        self.assertEqual(queued_run.attempts, 2)
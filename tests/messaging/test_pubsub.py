@@ -0,0 +1,126 @@
+import unittest
+import threading
+
+from messaging import pubsub
+from messaging.pubsub import ApiMessage, MessageBus, MessageTopics
+
+
+def _progress(file_name, bytes_sent, total_bytes=100):
+    return ApiMessage(MessageTopics.upload_progress_topic, sequence_file_name=file_name,
+                      progress=round(bytes_sent / total_bytes * 100, 2), bytes_sent=bytes_sent, total_bytes=total_bytes)
+
+
+class TestMessageBus(unittest.TestCase):
+    """
+    Tests the messaging.pubsub.MessageBus class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.message_bus = MessageBus()
+        self.received = []
+
+    def tearDown(self):
+        self.message_bus.close()
+
+    def test_messages_delivered_in_order(self):
+        self.message_bus.subscribe([MessageTopics.upload_started_topic, MessageTopics.upload_completed_topic],
+                                   self.received.append)
+        message_list = [ApiMessage(MessageTopics.upload_started_topic, sequence_file_name="a"),
+                        ApiMessage(MessageTopics.upload_completed_topic, sequence_file_name="a"),
+                        ApiMessage(MessageTopics.upload_started_topic, sequence_file_name="b")]
+
+        for message in message_list:
+            self.message_bus.publish(message)
+        self.message_bus.flush(timeout=5)
+
+        self.assertEqual(self.received, message_list)
+
+    def test_other_topics_not_delivered(self):
+        self.message_bus.subscribe([MessageTopics.upload_failed_topic], self.received.append)
+
+        self.message_bus.publish(ApiMessage(MessageTopics.upload_started_topic))
+        self.message_bus.flush(timeout=5)
+
+        self.assertEqual(self.received, [])
+
+    def test_progress_coalesced(self):
+        # hold the subscriber in its callback while progress is published
+        release = threading.Event()
+
+        def blocking_callback(message):
+            release.wait(5)
+            self.received.append(message)
+
+        self.message_bus.subscribe([MessageTopics.upload_started_topic, MessageTopics.upload_progress_topic],
+                                   blocking_callback)
+        self.message_bus.publish(ApiMessage(MessageTopics.upload_started_topic, sequence_file_name="a"))
+        for bytes_sent in range(1, 101):
+            self.message_bus.publish(_progress("a", bytes_sent))
+            self.message_bus.publish(_progress("b", bytes_sent))
+        release.set()
+        self.message_bus.flush(timeout=5)
+
+        # the started message, then at most two rounds of progress for each file, ending with the latest
+        self.assertEqual(self.received[0].topic, MessageTopics.upload_started_topic)
+        self.assertLessEqual(len(self.received), 5)
+        self.assertEqual([m.bytes_sent for m in self.received if m.sequence_file_name == "a"][-1], 100)
+        self.assertEqual([m.bytes_sent for m in self.received if m.sequence_file_name == "b"][-1], 100)
+
+    def test_full_queue_drops_messages(self):
+        release = threading.Event()
+        subscription = self.message_bus.subscribe([MessageTopics.upload_started_topic],
+                                                  lambda message: release.wait(5), max_queue_size=2)
+
+        for _ in range(10):
+            self.message_bus.publish(ApiMessage(MessageTopics.upload_started_topic))
+        release.set()
+        self.message_bus.flush(timeout=5)
+
+        self.assertGreater(subscription.dropped_count, 0)
+
+    def test_failing_subscriber_does_not_stop_delivery(self):
+        def failing_callback(message):
+            self.received.append(message)
+            raise ValueError("subscriber error")
+
+        self.message_bus.subscribe([MessageTopics.upload_started_topic], failing_callback)
+        self.message_bus.publish(ApiMessage(MessageTopics.upload_started_topic))
+        self.message_bus.flush(timeout=5)
+        self.message_bus.publish(ApiMessage(MessageTopics.upload_started_topic))
+        self.message_bus.flush(timeout=5)
+
+        self.assertEqual(len(self.received), 2)
+
+    def test_close_delivers_waiting_messages(self):
+        self.message_bus.subscribe([MessageTopics.upload_progress_topic], self.received.append, interval=0.2)
+
+        self.message_bus.publish(_progress("a", 10))
+        self.message_bus.publish(_progress("a", 20))
+        self.message_bus.close()
+
+        self.assertEqual(self.received[-1].bytes_sent, 20)
+
+
+class TestSendMessage(unittest.TestCase):
+    """
+    Tests the messaging.pubsub.send_message function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def tearDown(self):
+        pubsub.set_message_bus(None)
+
+    def test_published_on_shared_bus(self):
+        message_bus = MessageBus()
+        pubsub.set_message_bus(message_bus)
+        received = []
+        message_bus.subscribe([MessageTopics.upload_started_topic], received.append)
+
+        pubsub.send_message(ApiMessage(MessageTopics.upload_started_topic))
+        message_bus.close()
+
+        self.assertEqual(len(received), 1)
+
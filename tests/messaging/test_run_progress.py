@@ -0,0 +1,150 @@
+import unittest
+import io
+import json
+
+from messaging.pubsub import ApiMessage, MessageTopics
+from messaging.run_progress import RunProgress, RunProgressSubscriber, format_bytes, format_duration
+
+
+class TestRunProgress(unittest.TestCase):
+    """
+    Tests the messaging.run_progress.RunProgress class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_bytes_aggregated_per_file_and_sample(self):
+        run = RunProgress(1, total_bytes=400, sample_count=2, start_time=0)
+
+        run.update_file("5", "sample1", "R1.fastq.gz", 100, now=1)
+        run.update_file("5", "sample1", "R2.fastq.gz", 50, now=2)
+        run.update_file("5", "sample1", "R1.fastq.gz", 150, now=3)
+        run.update_file("5", "sample2", "R1.fastq.gz", 20, now=4)
+
+        self.assertEqual(run.bytes_sent, 220)
+        self.assertEqual(run.get_sample_bytes_sent("5", "sample1"), 200)
+        self.assertEqual(run.get_sample_bytes_sent("5", "sample2"), 20)
+
+    def test_file_sent_again_not_counted_twice(self):
+        run = RunProgress(1, total_bytes=100, start_time=0)
+
+        run.update_file("5", "sample1", "R1.fastq.gz", 80, now=1)
+        run.update_file("5", "sample1", "R1.fastq.gz", 10, now=2)
+
+        self.assertEqual(run.bytes_sent, 10)
+
+    def test_rate_and_eta(self):
+        run = RunProgress(1, total_bytes=1000, start_time=0)
+
+        # a steady 10 bytes per second
+        for second in range(1, 11):
+            run.update_file("5", "sample1", "R1.fastq.gz", second * 10, now=second)
+
+        self.assertAlmostEqual(run.rate, 10)
+        self.assertAlmostEqual(run.get_eta(), 90)
+
+    def test_rate_follows_slow_down(self):
+        run = RunProgress(1, total_bytes=10000, start_time=0)
+        run.update_file("5", "sample1", "R1.fastq.gz", 1000, now=10)
+
+        for second in range(11, 200):
+            run.update_file("5", "sample1", "R1.fastq.gz", 1000 + (second - 10) * 10, now=second)
+
+        self.assertAlmostEqual(run.rate, 10, places=0)
+
+    def test_peak_rate(self):
+        run = RunProgress(1, total_bytes=100000, start_time=0)
+        # a burst at the start is not a peak, the rate has not been averaged for long enough
+        run.update_file("5", "sample1", "R1.fastq.gz", 5000, now=1)
+        self.assertIsNone(run.peak_rate)
+
+        bytes_sent = 5000
+        for second in range(2, 300):
+            bytes_sent += 100 if second < 100 else 10
+            run.update_file("5", "sample1", "R1.fastq.gz", bytes_sent, now=second)
+
+        self.assertGreater(run.peak_rate, 90)
+        self.assertLess(run.peak_rate, 1000)
+        self.assertAlmostEqual(run.rate, 10, places=0)
+
+    def test_no_eta_without_total(self):
+        run = RunProgress(1, start_time=0)
+        run.update_file("5", "sample1", "R1.fastq.gz", 100, now=1)
+
+        self.assertIsNone(run.get_eta())
+        self.assertEqual(run.get_status_line(), "Run 1, 100.0 B, 100.0 B/s")
+
+    def test_status_dict(self):
+        run = RunProgress(1, total_bytes=200, sample_count=2, start_time=0)
+        run.update_file("5", "sample1", "R1.fastq.gz", 100, now=10)
+        run.complete_sample("5", "sample1")
+
+        status_dict = run.get_status_dict(now=10)
+
+        self.assertEqual(status_dict["percent"], 50.0)
+        self.assertEqual(status_dict["samples_completed"], 1)
+        self.assertEqual(status_dict["bytes_per_second"], 10)
+        self.assertEqual(status_dict["eta_seconds"], 10)
+
+
+class TestRunProgressSubscriber(unittest.TestCase):
+    """
+    Tests the messaging.run_progress.RunProgressSubscriber class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.stream = io.StringIO()
+
+    def _send_run(self, subscriber):
+        subscriber(ApiMessage(MessageTopics.run_upload_started_topic, run_id=7, total_bytes=100, sample_count=1))
+        subscriber(ApiMessage(MessageTopics.upload_progress_topic, run_id=7, project_id="5", sample_name="sample1",
+                              sequence_file_name="R1.fastq.gz", bytes_sent=100, total_bytes=100))
+        self.assertEqual(subscriber.get_run_progress(7).bytes_sent, 100)
+        subscriber(ApiMessage(MessageTopics.sample_upload_completed_topic, run_id=7, project_id="5",
+                              sample_name="sample1"))
+        subscriber(ApiMessage(MessageTopics.run_upload_finished_topic, run_id=7))
+
+    def test_json_lines(self):
+        subscriber = RunProgressSubscriber(self.stream, json_lines=True)
+
+        self._send_run(subscriber)
+
+        last_status = json.loads(self.stream.getvalue().splitlines()[-1])
+        self.assertTrue(last_status["finished"])
+        self.assertEqual(last_status["run_id"], 7)
+        self.assertEqual(last_status["percent"], 100.0)
+        self.assertEqual(last_status["samples_completed"], 1)
+        # the progress of a finished run is kept, so it can be reported after the upload
+        self.assertIsNotNone(subscriber.get_run_progress(7).finish_time)
+
+    def test_status_line(self):
+        subscriber = RunProgressSubscriber(self.stream, json_lines=False)
+
+        self._send_run(subscriber)
+
+        output = self.stream.getvalue()
+        self.assertTrue(output.endswith("\n"))
+        self.assertIn("Run 7, 100.0 B of 100.0 B (100.0 %), 1 of 1 samples", output.split("\r")[-1])
+
+    def test_json_lines_when_not_a_terminal(self):
+        subscriber = RunProgressSubscriber(self.stream)
+
+        self._send_run(subscriber)
+
+        json.loads(self.stream.getvalue().splitlines()[-1])
+
+
+class TestFormat(unittest.TestCase):
+    """
+    Tests the messaging.run_progress formatting functions
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_format(self):
+        self.assertEqual(format_bytes(512), "512.0 B")
+        self.assertEqual(format_bytes(1536 * 1024 * 1024), "1.5 GiB")
+        self.assertEqual(format_duration(3725), "1:02:05")
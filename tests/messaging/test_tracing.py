@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from api.http_metrics import HttpMetrics
+from core.timing import PhaseTimer
+from messaging import tracing
+
+
+class TestTracer(unittest.TestCase):
+    """
+    Tests the messaging.tracing.Tracer class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.tracer = tracing.Tracer()
+
+    def _get_spans(self):
+        return [event for event in self.tracer.get_trace_dict()["traceEvents"] if event["ph"] == "X"]
+
+    def test_span_recorded(self):
+        with self.tracer.span("parse sample sheet", "parse", {"sample": "s1"}):
+            pass
+
+        span_list = self._get_spans()
+        self.assertEqual(len(span_list), 1)
+        self.assertEqual(span_list[0]["name"], "parse sample sheet")
+        self.assertEqual(span_list[0]["cat"], "parse")
+        self.assertEqual(span_list[0]["args"], {"sample": "s1"})
+        self.assertEqual(span_list[0]["tid"], threading.get_ident())
+        self.assertGreaterEqual(span_list[0]["dur"], 0)
+
+    def test_span_recorded_when_exception_raised(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span("upload", "phase"):
+                raise ValueError("failed")
+
+        self.assertEqual([span["name"] for span in self._get_spans()], ["upload"])
+
+    def test_child_span_inside_parent(self):
+        with self.tracer.span("parent", "phase"):
+            with self.tracer.span("child", "http"):
+                pass
+
+        parent, child = self._get_spans()
+        self.assertEqual(parent["name"], "parent")
+        self.assertGreaterEqual(child["ts"], parent["ts"])
+        self.assertLessEqual(child["ts"] + child["dur"], parent["ts"] + parent["dur"] + 0.001)
+
+    def test_threads_named(self):
+        def _send():
+            with self.tracer.span("send file", "upload"):
+                pass
+        thread = threading.Thread(target=_send, name="upload-samples-0")
+        thread.start()
+        thread.join()
+
+        event_list = self.tracer.get_trace_dict()["traceEvents"]
+        thread_name_list = [event for event in event_list if event["name"] == "thread_name"]
+        self.assertEqual(thread_name_list[0]["tid"], thread.ident)
+        self.assertEqual(thread_name_list[0]["args"]["name"], "upload-samples-0")
+        self.assertEqual(self._get_spans()[0]["tid"], thread.ident)
+
+    def test_write(self):
+        with self.tracer.span("upload", "phase"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "trace.json")
+            self.tracer.write(file_path)
+            with open(file_path) as trace_file:
+                trace_dict = json.load(trace_file)
+
+        self.assertIn("traceEvents", trace_dict)
+        self.assertEqual([event["name"] for event in trace_dict["traceEvents"] if event["ph"] == "X"], ["upload"])
+
+
+class TestTracing(unittest.TestCase):
+    """
+    Tests recording spans with the module functions, and the spans recorded by the uploader
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def tearDown(self):
+        tracing.stop_tracing()
+
+    def test_nothing_recorded_when_off(self):
+        self.assertIsNone(tracing.get_tracer())
+        with tracing.span("upload", "phase"):
+            pass
+        tracing.add_span("upload", "phase", 0, 1)
+
+        @tracing.traced("write status file", "status")
+        def _write():
+            return 5
+
+        self.assertEqual(_write(), 5)
+        self.assertIsNone(tracing.stop_tracing())
+
+    def test_traced_function(self):
+        tracer = tracing.start_tracing()
+
+        @tracing.traced("write status file", "status")
+        def _write(value):
+            return value
+
+        self.assertEqual(_write(3), 3)
+        self.assertEqual([event["name"] for event in tracer.get_trace_dict()["traceEvents"] if event["ph"] == "X"],
+                         ["write status file"])
+
+    def test_phase_and_request_spans(self):
+        tracer = tracing.start_tracing()
+        timer = PhaseTimer()
+        http_metrics = HttpMetrics()
+
+        with http_metrics.time_request("get_samples") as record:
+            record.bytes_received = 10
+        timer.lap("online validation")
+
+        span_list = [event for event in tracer.get_trace_dict()["traceEvents"] if event["ph"] == "X"]
+        phase = next(span for span in span_list if span["cat"] == "phase")
+        request = next(span for span in span_list if span["cat"] == "http")
+        self.assertEqual(phase["name"], "online validation")
+        self.assertEqual(request["name"], "get_samples")
+        self.assertEqual(request["args"], {"bytes_sent": 0, "bytes_received": 10, "error": False,
+                                            "stalled": False})
+        self.assertGreaterEqual(request["ts"], phase["ts"])
+
+    def test_stop_tracing_writes_file(self):
+        tracing.start_tracing()
+        with tracing.span("upload", "phase"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "trace.json")
+            tracer = tracing.stop_tracing(file_path)
+            with open(file_path) as trace_file:
+                trace_dict = json.load(trace_file)
+
+        self.assertIsNotNone(tracer)
+        self.assertIsNone(tracing.get_tracer())
+        self.assertEqual(len([event for event in trace_dict["traceEvents"] if event["ph"] == "X"]), 1)
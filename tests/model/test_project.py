@@ -0,0 +1,67 @@
+import unittest
+
+from model import Project, Sample
+
+
+class TestGetSample(unittest.TestCase):
+    """
+    Tests the model.Project.get_sample function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_found(self):
+        sample = Sample("sample1")
+        project = Project(id="1", sample_list=[Sample("sample2"), sample])
+
+        self.assertIs(project.get_sample("sample1"), sample)
+
+    def test_ignores_case(self):
+        sample = Sample("Sample1")
+        project = Project(id="1", sample_list=[sample])
+
+        self.assertIs(project.get_sample("SAMPLE1"), sample)
+
+    def test_not_found(self):
+        project = Project(id="1", sample_list=[Sample("sample1")])
+
+        self.assertIsNone(project.get_sample("sample2"))
+
+    def test_added_sample(self):
+        project = Project(id="1")
+        project.get_sample("sample1")
+        sample = Sample("sample1")
+        project.add_sample(sample)
+
+        self.assertIs(project.get_sample("sample1"), sample)
+
+    def test_sample_list_changed(self):
+        project = Project(id="1")
+        project.get_sample("sample1")
+        sample = Sample("sample1")
+        # changing the list directly is still seen by the index
+        project.sample_list.append(sample)
+
+        self.assertIs(project.get_sample("sample1"), sample)
+
+    def test_first_sample_with_name(self):
+        sample = Sample("sample1")
+        project = Project(id="1", sample_list=[sample, Sample("sample1")])
+
+        self.assertIs(project.get_sample("sample1"), sample)
+
+    def test_sample_replaced(self):
+        project = Project(id="1", sample_list=[Sample("sample1")])
+        project.get_sample("sample1")
+        sample = Sample("sample2")
+        project.sample_list[0] = sample
+
+        self.assertIsNone(project.get_sample("sample1"))
+        self.assertIs(project.get_sample("sample2"), sample)
+
+    def test_index_not_in_dict(self):
+        project = Project(id="1", sample_list=[Sample("sample1")])
+        project.get_sample("sample1")
+
+        self.assertEqual(sorted(project.get_dict()), ["_description", "_id", "_name", "_sample_list"])
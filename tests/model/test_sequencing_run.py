@@ -0,0 +1,40 @@
+import unittest
+
+from model import Project, SequencingRun
+
+
+class TestGetProject(unittest.TestCase):
+    """
+    Tests the model.SequencingRun.get_project function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_found(self):
+        project = Project(id="5")
+        sequencing_run = SequencingRun({}, [Project(id="4"), project])
+
+        self.assertIs(sequencing_run.get_project("5"), project)
+        # ids are stored as strings
+        self.assertIs(sequencing_run.get_project(5), project)
+
+    def test_not_found(self):
+        sequencing_run = SequencingRun({}, [Project(id="4")])
+
+        self.assertIsNone(sequencing_run.get_project("5"))
+
+    def test_project_list_replaced(self):
+        sequencing_run = SequencingRun({}, [Project(id="4")])
+        sequencing_run.get_project("4")
+        project = Project(id="5")
+        sequencing_run.project_list = [project]
+
+        self.assertIsNone(sequencing_run.get_project("4"))
+        self.assertIs(sequencing_run.get_project("5"), project)
+
+    def test_index_not_in_dict(self):
+        sequencing_run = SequencingRun({}, [Project(id="4")])
+        sequencing_run.get_project("4")
+
+        self.assertEqual(sorted(sequencing_run.get_dict()), ["_metadata", "_project_list"])
@@ -43,6 +43,20 @@ class TestBuildSequencingRunFromSamples(unittest.TestCase):
         # samples have SequenceFile
         self.assertEqual(type(sequencing_run.project_list[0].sample_list[0].sequence_file), model.SequenceFile)
 
+    def test_build_samples_do_not_share_metadata(self):
+        """
+        The upload adds the run id to each sequence file's properties, so samples must not share them
+        :return:
+        """
+        sheet_file = path.join(path_to_module, "fake_dir_data",
+                               "SampleList.csv")
+
+        sequencing_run = sample_parser.build_sequencing_run_from_samples(sheet_file)
+
+        sample_list = [s for p in sequencing_run.project_list for s in p.sample_list]
+        properties_ids = {id(s.sequence_file.properties_dict) for s in sample_list}
+        self.assertEqual(len(properties_ids), len(sample_list))
+
     def test_build_valid_extra_line_on_sample_list(self):
         """
         Ensure a valid SequencingRun is made when extra lines are present in sample list
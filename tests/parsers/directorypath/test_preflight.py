@@ -0,0 +1,89 @@
+import unittest
+import gzip
+from os import path
+import shutil
+import tempfile
+
+from parsers import exceptions
+from parsers.directorypath import preflight, sample_parser
+
+
+class TestCheckSequenceFiles(unittest.TestCase):
+    """
+    Tests the parsers.directorypath.preflight.check_sequence_files function
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write_gzip(self, file_name):
+        file_path = path.join(self.directory, file_name)
+        with gzip.open(file_path, "wb") as f:
+            f.write(b"@read\nACGT\n+\nIIII\n")
+        return file_path
+
+    def _write(self, file_name, data):
+        file_path = path.join(self.directory, file_name)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return file_path
+
+    def test_valid(self):
+        file_list = [self._write_gzip("a_R1.fastq.gz"), self._write_gzip("a_R2.fastq.gz"),
+                     self._write("b.fastq", b"@read\nACGT\n+\nIIII\n")]
+
+        validation_result = preflight.check_sequence_files(file_list)
+
+        self.assertTrue(validation_result.is_valid())
+
+    def test_all_errors_reported(self):
+        file_list = [self._write_gzip("good.fastq.gz"),
+                     path.join(self.directory, "missing.fastq.gz"),
+                     self._write("empty.fastq.gz", b""),
+                     self._write("not_gzip.fastq.gz", b"@read\nACGT\n+\nIIII\n"),
+                     self.directory]
+
+        validation_result = preflight.check_sequence_files(file_list)
+
+        self.assertEqual(validation_result.error_count(), 4)
+        for error in validation_result.error_list:
+            self.assertEqual(type(error), exceptions.SequenceFileError)
+        self.assertIn("does not exist", validation_result.error_list[0].message)
+        self.assertIn("is empty", validation_result.error_list[1].message)
+        self.assertIn("not a gzip file", validation_result.error_list[2].message)
+        self.assertIn("not a file", validation_result.error_list[3].message)
+
+    def test_empty_list(self):
+        self.assertTrue(preflight.check_sequence_files([]).is_valid())
+
+
+class TestParseSampleList(unittest.TestCase):
+    """
+    Tests the sequence file checks in parsers.directorypath.sample_parser._parse_sample_list
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_files_reported_together(self):
+        with gzip.open(path.join(self.directory, "s1_R1.fastq.gz"), "wb") as f:
+            f.write(b"@read\nACGT\n+\nIIII\n")
+        sample_sheet = path.join(self.directory, "SampleList.csv")
+        with open(sample_sheet, "w") as f:
+            f.write("[Data]\n"
+                    "Sample_Name,Project_ID,File_Forward,File_Reverse\n")
+            f.write("sample1,1,{0}/s1_R1.fastq.gz,{0}/s1_R2.fastq.gz\n".format(self.directory))
+            f.write("sample2,1,{0}/s2_R1.fastq.gz,{0}/s2_R2.fastq.gz\n".format(self.directory))
+
+        with self.assertRaises(exceptions.ValidationError) as context:
+            sample_parser._parse_sample_list(sample_sheet)
+
+        self.assertEqual(context.exception.validation_result.error_count(), 3)
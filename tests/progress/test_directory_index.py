@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import patch
+import os
+from os import path
+import shutil
+import tempfile
+
+from progress.directory_index import DirectoryIndex
+
+
+class TestDirectoryIndex(unittest.TestCase):
+    """
+    Tests the progress.directory_index.DirectoryIndex class
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(path.join(self.directory, "Data"))
+        with open(path.join(self.directory, "SampleSheet.csv"), "w") as f:
+            f.write("[Data]\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_list(self):
+        directory_index = DirectoryIndex()
+
+        self.assertEqual(directory_index.list_files(self.directory), ["SampleSheet.csv"])
+        self.assertEqual(directory_index.list_directories(self.directory), ["Data"])
+
+    def test_missing_directory(self):
+        directory_index = DirectoryIndex()
+
+        with self.assertRaises(OSError):
+            directory_index.list_files(path.join(self.directory, "missing"))
+        self.assertFalse(directory_index.exists(path.join(self.directory, "missing", "file")))
+
+    def test_file_checks(self):
+        directory_index = DirectoryIndex()
+        sample_sheet = path.join(self.directory, "SampleSheet.csv")
+
+        self.assertTrue(directory_index.exists(sample_sheet))
+        self.assertTrue(directory_index.isfile(sample_sheet))
+        self.assertFalse(directory_index.isfile(path.join(self.directory, "Data")))
+        self.assertEqual(directory_index.getsize(sample_sheet), len("[Data]\n"))
+        self.assertFalse(directory_index.exists(path.join(self.directory, "missing")))
+        with self.assertRaises(OSError):
+            directory_index.getsize(path.join(self.directory, "missing"))
+
+    def test_stat_cached(self):
+        directory_index = DirectoryIndex()
+        sample_sheet = path.join(self.directory, "SampleSheet.csv")
+        directory_index.getsize(sample_sheet)
+
+        with patch("progress.directory_index.os.stat") as mock_stat:
+            self.assertEqual(directory_index.getsize(sample_sheet), len("[Data]\n"))
+            mock_stat.assert_not_called()
+
+    def test_directory_changed(self):
+        directory_index = DirectoryIndex(revalidate_interval=0)
+        directory_index.list_files(self.directory)
+
+        with open(path.join(self.directory, "RunInfo.xml"), "w") as f:
+            f.write("")
+        # make sure the modification time changes, even on file systems with a coarse timestamp
+        directory_stat = os.stat(self.directory)
+        os.utime(self.directory, ns=(directory_stat.st_atime_ns, directory_stat.st_mtime_ns + 1000000000))
+
+        self.assertEqual(sorted(directory_index.list_files(self.directory)), ["RunInfo.xml", "SampleSheet.csv"])
+
+    def test_listing_trusted_until_revalidated(self):
+        directory_index = DirectoryIndex(revalidate_interval=60)
+        directory_index.list_files(self.directory)
+
+        with patch("progress.directory_index.os.stat") as mock_stat:
+            directory_index.list_files(self.directory)
+            mock_stat.assert_not_called()
+
+    def test_invalidate(self):
+        directory_index = DirectoryIndex(revalidate_interval=60)
+        directory_index.list_files(path.join(self.directory, "Data"))
+
+        with open(path.join(self.directory, "Data", "sample_R1.fastq.gz"), "w") as f:
+            f.write("")
+        directory_index.invalidate(self.directory)
+
+        self.assertEqual(directory_index.list_files(path.join(self.directory, "Data")), ["sample_R1.fastq.gz"])
+
+    def test_file_grows(self):
+        directory_index = DirectoryIndex(revalidate_interval=0)
+        sample_sheet = path.join(self.directory, "SampleSheet.csv")
+        directory_index.getsize(sample_sheet)
+
+        # writing to a file does not change the modification time of its directory
+        with open(sample_sheet, "a") as f:
+            f.write("more\n")
+
+        self.assertEqual(directory_index.getsize(sample_sheet), len("[Data]\nmore\n"))
+
+    def test_broken_symlink(self):
+        directory_index = DirectoryIndex()
+        os.symlink(path.join(self.directory, "missing"), path.join(self.directory, "link.fastq.gz"))
+
+        self.assertFalse(directory_index.exists(path.join(self.directory, "link.fastq.gz")))
+        self.assertFalse(directory_index.isfile(path.join(self.directory, "link.fastq.gz")))
+
+    def test_listings_bounded(self):
+        directory_index = DirectoryIndex(revalidate_interval=60, max_listings=1)
+        directory_index.list_files(self.directory)
+        directory_index.list_files(path.join(self.directory, "Data"))
+
+        with patch("progress.directory_index.os.scandir") as mock_scandir:
+            mock_scandir.return_value = []
+            self.assertEqual(directory_index.list_files(self.directory), [])
+            mock_scandir.assert_called_once_with(path.abspath(self.directory))
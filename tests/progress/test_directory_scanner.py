@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+from os import path
+from unittest.mock import patch
+
+import progress
+from model import DirectoryStatus
+
+path_to_module = path.abspath(path.dirname(__file__))
+if len(path_to_module) == 0:
+    path_to_module = '.'
+
+
+class TestListSubDirectories(unittest.TestCase):
+    """
+    Tests listing the directories in a directory
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_only_directories_listed(self):
+        res = progress.list_sub_directories(path_to_module)
+
+        self.assertIn(path.join(path_to_module, "new_dir"), res)
+        self.assertIn(path.join(path_to_module, "complete_dir"), res)
+        self.assertNotIn(path.join(path_to_module, "test_directory_scanner.py"), res)
+
+
+class TestScanDirectoryStatuses(unittest.TestCase):
+    """
+    Tests checking the status of many directories at once
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_statuses_match_single_checks(self):
+        directory_list = [path.join(path_to_module, d) for d in
+                          ["new_dir", "complete_dir", "partial_dir", "invalid_dir", "inaccessible_dir"]]
+
+        res = progress.scan_directory_statuses(directory_list, ["SampleSheet.csv"], max_workers=2)
+
+        status_dict = {r.directory: r.status for r in res}
+        self.assertEqual(len(res), len(directory_list))
+        self.assertEqual(status_dict[directory_list[0]], DirectoryStatus.NEW)
+        self.assertEqual(status_dict[directory_list[1]], DirectoryStatus.COMPLETE)
+        self.assertEqual(status_dict[directory_list[2]], DirectoryStatus.PARTIAL)
+        self.assertEqual(status_dict[directory_list[3]], DirectoryStatus.NEW)
+        self.assertEqual(status_dict[directory_list[4]], DirectoryStatus.INVALID)
+
+    def test_empty_list(self):
+        res = progress.scan_directory_statuses([], ["SampleSheet.csv"])
+
+        self.assertEqual(res, [])
+
+    @patch("progress.directory_scanner.get_indexed_directory_status")
+    def test_stop_iterating_early(self, mock_get_status):
+        release_event = threading.Event()
+
+        def get_status(directory, required_file_list, index):
+            if directory != "fast_dir":
+                release_event.wait(10)
+            return DirectoryStatus(directory)
+
+        mock_get_status.side_effect = get_status
+        statuses = progress.directory_scanner.iter_directory_statuses(
+            ["fast_dir", "slow_dir", "queued_dir"], ["SampleSheet.csv"], max_workers=2)
+
+        start_time = time.monotonic()
+        self.assertEqual(next(statuses).directory, "fast_dir")
+        statuses.close()
+        elapsed = time.monotonic() - start_time
+        release_event.set()
+
+        # the generator does not wait for the directories that are still being checked
+        self.assertLess(elapsed, 5)
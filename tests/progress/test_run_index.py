@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import patch
+from os import path
+import os
+import shutil
+import tempfile
+
+import progress
+from progress import run_index
+from model import DirectoryStatus
+
+path_to_module = path.abspath(path.dirname(__file__))
+if len(path_to_module) == 0:
+    path_to_module = '.'
+
+
+class TestRunIndex(unittest.TestCase):
+    """
+    Tests storing and reading run directories in the run index
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.index_dir = tempfile.mkdtemp()
+        self.index = run_index.RunIndex(path.join(self.index_dir, "index.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.index_dir)
+
+    def test_store_and_get(self):
+        self.index.store("/runs/a", "1:1:0", DirectoryStatus.COMPLETE, required_files=["SampleSheet.csv"],
+                         run_id=5, irida_instance="http://irida/api/")
+
+        row = self.index.get("/runs/a")
+
+        self.assertEqual(row["status"], DirectoryStatus.COMPLETE)
+        self.assertEqual(row["run_id"], "5")
+        self.assertEqual(row["irida_instance"], "http://irida/api/")
+        self.assertIsNone(self.index.get("/runs/b"))
+
+    def test_store_keeps_required_files(self):
+        self.index.store("/runs/a", "1:1:0", DirectoryStatus.NEW, required_files=["SampleSheet.csv"])
+        self.index.store("/runs/a", "2:2:2", DirectoryStatus.PARTIAL)
+
+        row = self.index.get("/runs/a")
+
+        self.assertTrue(self.index.is_current(row, "2:2:2", ["SampleSheet.csv"]))
+        self.assertFalse(self.index.is_current(row, "2:2:2", ["SampleList.csv"]))
+        self.assertFalse(self.index.is_current(row, "3:3:3", ["SampleSheet.csv"]))
+
+    def test_list_runs_in_parent(self):
+        self.index.store("/runs/a", "1", DirectoryStatus.NEW)
+        self.index.store("/runs/b", "1", DirectoryStatus.NEW)
+        self.index.store("/other/c", "1", DirectoryStatus.NEW)
+
+        res = self.index.list_runs("/runs")
+
+        self.assertEqual([r["directory"] for r in res], ["/runs/a", "/runs/b"])
+
+
+class TestIndexedDirectoryStatus(unittest.TestCase):
+    """
+    Tests that directory statuses are answered from the index, and that writing a status keeps the index current
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.temp_dir = tempfile.mkdtemp()
+        self.run_dir = path.join(self.temp_dir, "run")
+        os.mkdir(self.run_dir)
+        open(path.join(self.run_dir, "SampleSheet.csv"), "w").close()
+        self.index = run_index.RunIndex(path.join(self.temp_dir, "index.sqlite"))
+        run_index.set_run_index(self.index)
+
+    def tearDown(self):
+        run_index.set_run_index(None)
+        shutil.rmtree(self.temp_dir)
+
+    def test_unchanged_directory_not_read(self):
+        res = progress.directory_scanner.get_indexed_directory_status(self.run_dir, ["SampleSheet.csv"], self.index)
+        self.assertEqual(res.status, DirectoryStatus.NEW)
+
+        with patch("progress.directory_scanner.get_directory_status") as mock_get_status:
+            res = progress.directory_scanner.get_indexed_directory_status(
+                self.run_dir, ["SampleSheet.csv"], self.index)
+            mock_get_status.assert_not_called()
+        self.assertEqual(res.status, DirectoryStatus.NEW)
+
+    def test_changed_directory_read_again(self):
+        res = progress.directory_scanner.get_indexed_directory_status(self.run_dir, ["SampleSheet.csv"], self.index)
+        self.assertEqual(res.status, DirectoryStatus.NEW)
+
+        os.remove(path.join(self.run_dir, "SampleSheet.csv"))
+
+        res = progress.directory_scanner.get_indexed_directory_status(self.run_dir, ["SampleSheet.csv"], self.index)
+        self.assertEqual(res.status, DirectoryStatus.INVALID)
+
+    @patch("progress.upload_status.config.read_config_option")
+    def test_write_status_updates_index(self, mock_read_config_option):
+        mock_read_config_option.side_effect = ["http://irida/api/"]
+        # statuses are only written to the run directory when the status file already exists
+        with open(path.join(self.run_dir, progress.upload_status.STATUS_FILE_NAME), "w") as writer:
+            writer.write('{"Upload Status": "partial"}')
+        progress.directory_scanner.get_indexed_directory_status(self.run_dir, ["SampleSheet.csv"], self.index)
+
+        directory_status = DirectoryStatus(self.run_dir)
+        directory_status.status = DirectoryStatus.COMPLETE
+        progress.write_directory_status(directory_status, run_id=7)
+
+        with patch("progress.directory_scanner.get_directory_status") as mock_get_status:
+            res = progress.directory_scanner.get_indexed_directory_status(
+                self.run_dir, ["SampleSheet.csv"], self.index)
+            mock_get_status.assert_not_called()
+        self.assertEqual(res.status, DirectoryStatus.COMPLETE)
+        self.assertEqual(res.run_id, "7")
+        self.assertEqual(res.irida_instance, "http://irida/api/")
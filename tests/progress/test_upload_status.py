@@ -1,6 +1,8 @@
 import unittest
 from os import path
 import os
+import shutil
+import tempfile
 
 import progress
 from model import DirectoryStatus
@@ -134,3 +136,31 @@ class TestWriteDirectoryStatus(unittest.TestCase):
         # Check that file matches what we wrote
         status = progress.get_directory_status(self.directory, ["SampleSheet.csv"])
         self.assertEqual(DirectoryStatus.COMPLETE, status.status)
+
+
+class TestStatusMessage(unittest.TestCase):
+    """
+    Tests that the message of a status is written to, and read from, the status file
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.directory = tempfile.mkdtemp()
+        open(path.join(self.directory, "SampleSheet.csv"), "w").close()
+        # the status is only written to the run directory when the status file can be written
+        open(path.join(self.directory, progress.upload_status.STATUS_FILE_NAME), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_message_written(self):
+        directory_status = DirectoryStatus(self.directory)
+        directory_status.status = DirectoryStatus.ERROR
+        directory_status.message = "Duplicate of sequencing run 12"
+        progress.write_directory_status(directory_status)
+        progress.directory_index.get_directory_index().invalidate(self.directory)
+
+        status = progress.get_directory_status(self.directory, ["SampleSheet.csv"])
+
+        self.assertEqual(status.status, DirectoryStatus.ERROR)
+        self.assertEqual(status.message, "Duplicate of sequencing run 12")
@@ -4,6 +4,9 @@ import argparse
 import global_settings
 import config
 import core
+import messaging
+
+from core import metrics, profiling, upload_queue
 
 
 class ConfigAction(argparse.Action):
@@ -48,6 +51,7 @@ argument_parser.add_argument('-v', '--version',
                              action='version', version='IRIDA Uploader {}'.format(global_settings.UPLOADER_VERSION))
 # Our main argument. It is required or else an error will be thrown when the program is run
 argument_parser.add_argument('directory',
+                             nargs='?',  # Not used by --worker
                              help='Location of sequencing run to upload')
 # Optional argument, for using an alternative config file.
 argument_parser.add_argument('-c', '--config',
@@ -59,10 +63,113 @@ argument_parser.add_argument('-f', '--force',
                              action='store_true',  # This line makes it not parse a variable
                              help='Uploader will ignore the status file, '
                                   'and try to upload even when a run is in non new status.')
+# Optional argument, list the status of the runs in the directory instead of uploading
+argument_parser.add_argument('-s', '--status',
+                             action='store_true',
+                             help='Instead of uploading, list the upload status of every run in the directory. '
+                                  'Statuses are read from the local run index, '
+                                  'only runs that changed since the last check are read from disk.')
+# Optional argument, summarize the performance reports of the runs in the directory instead of uploading
+argument_parser.add_argument('-r', '--report',
+                             action='store_true',
+                             help='Instead of uploading, summarize the performance reports of the uploaded runs '
+                                  'in the directory, by the site they were uploaded from and their parser.')
+
+# Optional argument, keep running and upload new runs in the directory as soon as they are ready
+argument_parser.add_argument('-w', '--watch',
+                             action='store_true',
+                             help='Keep running and watch the directory for new runs. '
+                                  'Each run is uploaded as soon as it is complete and its files stop changing.')
+
+# Optional argument, upload every new run in the directory
+argument_parser.add_argument('-b', '--batch',
+                             action='store_true',
+                             help='Upload every new run in the directory, several runs at the same time. '
+                                  'The number of runs is set with the batch_parallel_runs config option.')
+
+# Optional argument, add the run to the upload queue instead of uploading it
+argument_parser.add_argument('-q', '--enqueue',
+                             action='store_true',
+                             help='Validate the run without connecting to IRIDA, and add it to the upload queue. '
+                                  'Queued runs are uploaded by the --worker.')
+# Optional argument, priority class of a queued run
+argument_parser.add_argument('-p', '--priority',
+                             choices=list(upload_queue.PRIORITY_CLASSES),
+                             default=upload_queue.DEFAULT_PRIORITY_CLASS,
+                             help='Priority class of a run added with --enqueue. '
+                                  'Runs in a higher class are uploaded first. Default: %(default)s')
+# Optional argument, upload the runs in the upload queue
+argument_parser.add_argument('--worker',
+                             action='store_true',
+                             help='Keep running and upload the runs in the upload queue. '
+                                  'Runs wait in the queue while IRIDA cannot be reached.')
+# Optional argument, record a trace of the upload
+argument_parser.add_argument('--trace',
+                             metavar='FILE',
+                             help='Record the phases of the upload, the files sent and the requests made to IRIDA, '
+                                  'and write them to FILE as a Chrome trace. '
+                                  'Open it in chrome://tracing or https://ui.perfetto.dev to see them on a timeline.')
+# Optional argument, profile the uploader
+argument_parser.add_argument('--profile',
+                             action='store_true',
+                             help='Profile the uploader, and write a pstats file and a collapsed stacks file '
+                                  'to the run directory when it exits. '
+                                  'Attach them when reporting that an upload is slow.')
+
+
 def main():
     # Parse the arguments passed from the command line and start the upload
     args = argument_parser.parse_args()
-    upload(args.directory, args.force)
+    if args.directory is None and not args.worker:
+        argument_parser.error("the following arguments are required: directory")
+
+    # Show the progress of uploads, and let the subscribers show the last progress before exiting
+    messaging.start_default_subscribers()
+    if args.trace:
+        messaging.tracing.start_tracing()
+    if args.profile:
+        profiling.start_profiling(args.directory)
+    try:
+        run_command(args)
+    finally:
+        if args.profile:
+            profiling.stop_profiling()
+        messaging.get_message_bus().close()
+        if args.trace:
+            messaging.tracing.stop_tracing(args.trace)
+
+
+def run_command(args):
+    """
+    run the command chosen by the arguments
+    :param args: parsed arguments
+    :return:
+    """
+    if args.enqueue:
+        enqueue(args.directory, args.priority)
+        return
+    if args.status:
+        status(args.directory)
+        return
+    if args.report:
+        report(args.directory)
+        return
+
+    # The modes that upload serve metrics while they run, when the metrics_port config option is set
+    config.setup()
+    metrics_server = metrics.start_metrics_server_from_config()
+    try:
+        if args.worker:
+            worker()
+        elif args.watch:
+            watch(args.directory)
+        elif args.batch:
+            batch(args.directory)
+        else:
+            upload(args.directory, args.force)
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
 
 
 def upload(run_directory, force_upload):
@@ -76,6 +183,66 @@ def upload(run_directory, force_upload):
     core.cli_entry.validate_and_upload_single_entry(run_directory, force_upload)
 
 
+def status(directory):
+    """
+    list the status of the runs in a directory
+    :param directory:
+    :return:
+    """
+    config.setup()
+    core.cli_entry.report_run_statuses(directory)
+
+
+def report(directory):
+    """
+    summarize the performance of the uploaded runs in a directory
+    :param directory:
+    :return:
+    """
+    config.setup()
+    core.cli_entry.report_upload_performance(directory)
+
+
+def watch(directory):
+    """
+    watch a directory and upload new runs as they are finished
+    :param directory:
+    :return:
+    """
+    config.setup()
+    core.cli_entry.watch_and_upload([directory])
+
+
+def batch(directory):
+    """
+    upload every new run in a directory
+    :param directory:
+    :return:
+    """
+    config.setup()
+    core.cli_entry.batch_upload(directory)
+
+
+def enqueue(run_directory, priority_class):
+    """
+    add a run directory to the upload queue
+    :param run_directory:
+    :param priority_class:
+    :return:
+    """
+    config.setup()
+    core.cli_entry.enqueue_run(run_directory, priority_class)
+
+
+def worker():
+    """
+    upload the runs in the upload queue
+    :return:
+    """
+    config.setup()
+    core.cli_entry.work_upload_queue()
+
+
 # This is called when the program is run for the first time
 if __name__ == "__main__":
     main()